@@ -10,6 +10,10 @@ This is due to security concerns -- because Hubble can collect arbitrary data fr
 a system, we don't want an attacker to be able to send that data to arbitrary
 endpoints.
 
+Requests go through the pooled sessions of hubblestack.utils.http_sessions:
+connections to a host are kept alive for the rest of the run, and identical
+GET requests made during a run are only sent once.
+
 Note: Now each module just returns its output (As Data gathering)
       For Audit checks, comparison logic is now moved to comparators. 
       See below sections for more understanding
@@ -226,6 +230,7 @@ import requests
 
 import hubblestack.module_runner.runner_factory as runner_factory
 import hubblestack.module_runner.runner_utils as runner_utils
+import hubblestack.utils.http_sessions
 from hubblestack.exceptions import HubbleCheckValidationError
 from hubblestack.exceptions import CommandExecutionError
 
@@ -297,6 +302,33 @@ def execute(block_id, block_dict, extra_args=None):
         log.warn('Chained value detected in curl.request module. Chained '
                  'values are unsupported in the curl module.')
 
+    function_name, url, kwargs = _request_args(block_id, block_dict)
+
+    decode_json = runner_utils.get_param_for_module(block_id, block_dict, 'decode_json')
+    if not decode_json:
+        decode_json = True
+
+    # Make the request
+    status, response = _make_request(function_name, url, **kwargs)
+    if not status:
+        return runner_utils.prepare_negative_result_for_module(block_id, response)
+
+    # Pull out the pieces we want
+    ret = _parse_response(response, decode_json)
+
+    # Status in the return is based on http status
+    try:
+        response.raise_for_status()
+        return runner_utils.prepare_positive_result_for_module(block_id, ret)
+    except requests.exceptions.HTTPError:
+        return runner_utils.prepare_negative_result_for_module(block_id, ret)
+
+
+def _request_args(block_id, block_dict):
+    """
+    Helper function that returns the method, url and the keyword arguments
+    of the request of a block
+    """
     url = runner_utils.get_param_for_module(block_id, block_dict, 'url')
 
     kwargs = {}
@@ -325,24 +357,7 @@ def execute(block_id, block_dict, extra_args=None):
         timeout = 9
     kwargs['timeout'] = int(timeout)
 
-    decode_json = runner_utils.get_param_for_module(block_id, block_dict, 'decode_json')
-    if not decode_json:
-        decode_json = True
-
-    # Make the request
-    status, response = _make_request(function_name, url, **kwargs)
-    if not status:
-        return runner_utils.prepare_negative_result_for_module(block_id, response)
-
-    # Pull out the pieces we want
-    ret = _parse_response(response, decode_json)
-
-    # Status in the return is based on http status
-    try:
-        response.raise_for_status()
-        return runner_utils.prepare_positive_result_for_module(block_id, ret)
-    except requests.exceptions.HTTPError:
-        return runner_utils.prepare_negative_result_for_module(block_id, ret)
+    return function_name, url, kwargs
 
 
 def _make_request(function, url, **kwargs):
@@ -350,12 +365,7 @@ def _make_request(function, url, **kwargs):
     Helper function that makes the HTTP request
     """
     try:
-        if function == 'GET':
-            response = requests.get(url, **kwargs)
-        elif function == 'PUT':
-            response = requests.put(url, **kwargs)
-        elif function == 'POST':
-            response = requests.post(url, **kwargs)
+        response = hubblestack.utils.http_sessions.request(function, url, **kwargs)
     except Exception as exc:
         return False, str(exc)
 
@@ -379,6 +389,28 @@ def _parse_response(response, decode_json):
     return ret
 
 
+def prefetch(block_list, extra_args=None):
+    """
+    Start a new run of the session pool (so no connection or response is
+    reused from the last one) and make the GET requests of all the blocks
+    concurrently, before they are executed
+
+    :param block_list:
+        list of (block_id, block_dict) of the blocks about to be executed
+    :param extra_args:
+        Extra argument dictionary, (If any)
+        Example: {'caller': 'Audit'}
+    """
+    pool = hubblestack.utils.http_sessions.reset()
+    gets = []
+    for block_id, block_dict in block_list:
+        function_name, url, kwargs = _request_args(block_id, block_dict)
+        if function_name == 'GET' and url:
+            gets.append((url, kwargs))
+    log.debug('Prefetching %d GET requests', len(gets))
+    pool.prefetch(gets)
+
+
 def get_filtered_params_to_log(block_id, block_dict, extra_args=None):
     """
     For getting params to log, in non-verbose logging
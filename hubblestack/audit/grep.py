@@ -313,6 +313,52 @@ def get_filtered_params_to_log(block_id, block_dict, extra_args=None):
             'pattern': pattern}
 
 
+def get_inputs(block_id, block_dict, extra_args=None):
+    """
+    The paths the block reads, for incremental runs
+
+    :param block_id:
+        id of the block
+    :param block_dict:
+        parameter for this module
+    :param extra_args:
+        Extra argument dictionary, (If any)
+        Example: {'caller': 'Audit'}
+
+    returns:
+        list of paths, or None if they can't be told (chained input, or a
+        recursive grep: the fingerprint of a directory doesn't change when a
+        file in it does)
+    """
+    if runner_utils.get_chained_param(extra_args):
+        return None
+    filepath = runner_utils.get_param_for_module(block_id, block_dict, 'path')
+    if not filepath:
+        return None
+    filepath = os.path.expanduser(filepath)
+    flags = runner_utils.get_param_for_module(block_id, block_dict, 'flags')
+    if _is_recursive(flags) or os.path.isdir(filepath):
+        return None
+    return [filepath]
+
+
+def _is_recursive(flags):
+    """
+    Whether the grep flags (a list, or a string of them) search directories
+    recursively
+    """
+    if not flags:
+        return False
+    if isinstance(flags, str):
+        flags = [flags]
+    for flag in ' '.join(str(flag) for flag in flags).split():
+        if flag in ('--recursive', '--dereference-recursive'):
+            return True
+        if flag.startswith('-') and not flag.startswith('--') and ('r' in flag or 'R' in flag):
+            return True
+    return False
+
+
 def _grep(path,
           string,
           pattern,
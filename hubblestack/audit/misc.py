@@ -591,6 +591,9 @@ def _check_service_status(block_id, block_dict, extra_args=None):
     service_name = runner_utils.get_param_for_module(block_id, block_dict, 'service_name')
     state = runner_utils.get_param_for_module(block_id, block_dict, 'state')
 
+    units = __mods__['service.units']() if 'service.units' in __mods__ else None
+    if units:
+        return _unit_file_status(service_name, state, units)
     all_services = __mods__['cmd.run']('systemctl list-unit-files')
     if re.search(service_name, all_services, re.M):
         output = __mods__['cmd.retcode']('systemctl is-enabled ' + service_name, ignore_retcode=True)
@@ -604,6 +607,21 @@ def _check_service_status(block_id, block_dict, extra_args=None):
         else:
             return 'Looks like ' + service_name + ' does not exists. Please check.'
 
+def _unit_file_status(service_name, state, units):
+    """
+    _check_service_status, answered from the unit table of the systemd service
+    module rather than one systemctl run per check
+    """
+    unit_files = [unit for unit, info in units.items() if info['unit_file_state']]
+    if any(re.search(service_name, unit) for unit in unit_files):
+        is_enabled = __mods__['service.enabled'](service_name)
+        if (state == "disabled" and not is_enabled) or (state == "enabled" and is_enabled):
+            return True
+        return __mods__['cmd.run_stdout']('systemctl is-enabled ' + service_name, ignore_retcode=True)
+    if state == "disabled":
+        return True
+    return 'Looks like ' + service_name + ' does not exists. Please check.'
+
 def _check_ssh_timeout_config(block_id, block_dict, extra_args):
     """
     Ensure SSH Idle Timeout Interval is configured
@@ -1172,4 +1190,4 @@ FUNCTION_MAP = {
     'mail_conf_check': _mail_conf_check,
     'ensure_max_password_expiration': _ensure_max_password_expiration,
     'check_sshd_parameters': _check_sshd_parameters,
-}
\ No newline at end of file
+}
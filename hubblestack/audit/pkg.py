@@ -180,11 +180,24 @@ main:
 
 import logging
 import fnmatch
+import os
 
 import hubblestack.module_runner.runner_utils as runner_utils
 from hubblestack.exceptions import HubbleCheckValidationError
 
 log = logging.getLogger(__name__)
+# what changes when packages are installed, upgraded or removed
+PACKAGE_DATABASES = [
+    '/var/lib/dpkg/status',
+    '/var/lib/rpm',
+    '/var/lib/rpm/Packages',
+    '/var/lib/rpm/rpmdb.sqlite',
+    '/usr/lib/sysimage/rpm',
+    '/usr/lib/sysimage/rpm/rpmdb.sqlite',
+    '/var/lib/pacman/local',
+    '/var/db/pkg',
+    '/var/lib/portage/world',
+]
 
 
 def validate_params(block_id, block_dict, extra_args=None):
@@ -267,4 +280,24 @@ def get_filtered_params_to_log(block_id, block_dict, extra_args=None):
     if not name:
         name = runner_utils.get_param_for_module(block_id, block_dict, 'name')
 
-    return {'name': name}
\ No newline at end of file
+    return {'name': name}
+
+
+def get_inputs(block_id, block_dict, extra_args=None):
+    """
+    The package databases of the host, for incremental runs
+
+    :param block_id:
+        id of the block
+    :param block_dict:
+        parameter for this module
+    :param extra_args:
+        Extra argument dictionary, (If any)
+        Example: {'caller': 'Audit'}
+
+    returns:
+        list of paths, or None if they can't be told (no known package
+        database on this host)
+    """
+    paths = [path for path in PACKAGE_DATABASES if os.path.exists(path)]
+    return paths or None
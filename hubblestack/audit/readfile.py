@@ -666,3 +666,24 @@ def get_filtered_params_to_log(block_id, block_dict, extra_args=None):
     # fetch required param
     filepath = runner_utils.get_param_for_module(block_id, block_dict, 'path')
     return {'path': filepath}
+
+
+def get_inputs(block_id, block_dict, extra_args=None):
+    """
+    The paths the block reads, for incremental runs
+
+    :param block_id:
+        id of the block
+    :param block_dict:
+        parameter for this module
+    :param extra_args:
+        Extra argument dictionary, (If any)
+        Example: {'caller': 'Audit'}
+
+    returns:
+        list of paths, or None if they can't be told (chained input)
+    """
+    if runner_utils.get_chained_param(extra_args):
+        return None
+    filepath = runner_utils.get_param_for_module(block_id, block_dict, 'path')
+    return [filepath] if filepath else None
@@ -258,6 +258,23 @@ def execute(block_id, block_dict, extra_args=None):
     return runner_utils.prepare_positive_result_for_module(block_id, result)
 
 
+def prefetch(block_list, extra_args=None):
+    """
+    Read the state of every unit in one pass (where the service module keeps
+    a table of them), before the blocks are executed
+
+    :param block_list:
+        list of (block_id, block_dict) of the blocks about to be executed
+    :param extra_args:
+        Extra argument dictionary, (If any)
+        Example: {'caller': 'Audit'}
+    """
+    if 'service.units' not in __mods__:
+        return
+    log.debug('Prefetching the unit states for %d blocks', len(block_list))
+    __mods__['service.units'](refresh=True)
+
+
 def get_filtered_params_to_log(block_id, block_dict, extra_args=None):
     """
     For getting params to log, in non-verbose logging
@@ -138,6 +138,9 @@ Module Arguments
     Only required if no endpoint (host, port) is provided
 - ssl_timeout (Optional, Default value - 3 seconds)
     timeout value in seconds to be honoured only if host_ip, host_port is given
+    The certificate of an endpoint is fetched once per run (the certificates
+    of all the endpoints of a profile are fetched at once before its checks
+    are executed), and shared with the fdg module.
     
 Module Output
 -------------
@@ -211,13 +214,10 @@ main:
     path: /path/to/pem/file #Optional in place of host_ip, host_port
 """
 import logging
-import OpenSSL
-import ssl
 import time
-from datetime import datetime
-from socket import setdefaulttimeout
 
 import hubblestack.module_runner.runner_utils as runner_utils
+import hubblestack.utils.tls_certs
 from hubblestack.exceptions import HubbleCheckValidationError
 
 log = logging.getLogger(__name__)
@@ -319,6 +319,38 @@ def execute(block_id, block_dict, extra_args=None):
     return runner_utils.prepare_positive_result_for_module(block_id, cert_details)
 
 
+def prefetch(block_list, extra_args=None):
+    """
+    Start a new run (forget the certificates of the last one) and fetch the
+    certificates of the endpoints of all the blocks at once, before they are
+    executed
+
+    :param block_list:
+        list of (block_id, block_dict) of the blocks about to be executed
+    :param extra_args:
+        Extra argument dictionary, (If any)
+        Example: {'caller': 'Audit'}
+    """
+    hubblestack.utils.tls_certs.reset()
+    endpoints = {}
+    for block_id, block_dict in block_list:
+        host_ip = runner_utils.get_param_for_module(block_id, block_dict, 'host_ip')
+        host_port = runner_utils.get_param_for_module(block_id, block_dict, 'host_port')
+        if not host_ip or not host_port:
+            continue
+        ssl_timeout = runner_utils.get_param_for_module(block_id, block_dict, 'ssl_timeout', 3)
+        try:
+            endpoint = (str(host_ip), int(host_port))
+        except (TypeError, ValueError):
+            continue
+        endpoints[endpoint] = max(ssl_timeout, endpoints.get(endpoint, 0))
+    # the endpoints sharing a timeout are fetched together
+    for ssl_timeout in sorted(set(endpoints.values())):
+        hubblestack.utils.tls_certs.fetch_certificates(
+            [endpoint for endpoint, timeout in endpoints.items() if timeout == ssl_timeout],
+            timeout=ssl_timeout)
+
+
 def get_filtered_params_to_log(block_id, block_dict, extra_args=None):
     """
     For getting params to log, in non-verbose logging
@@ -351,20 +383,39 @@ def get_filtered_params_to_log(block_id, block_dict, extra_args=None):
             'host_port': host_port}
 
 
+def get_inputs(block_id, block_dict, extra_args=None):
+    """
+    The inputs of the block, for incremental runs: None, the result of a
+    certificate check depends on the current date (expiry, not_after and
+    not_before windows) as much as on the certificate, so it is never reused
+
+    :param block_id:
+        id of the block
+    :param block_dict:
+        parameter for this module
+    :param extra_args:
+        Extra argument dictionary, (If any)
+        Example: {'caller': 'Audit'}
+
+    returns:
+        None
+    """
+    return None
+
+
 def _get_cert(source, port=443, ssl_timeout=3, from_file=False):
     cert = _get_cert_from_file(source) if from_file else _get_cert_from_endpoint(source, port, ssl_timeout)
     return cert
 
 
 def _get_cert_from_endpoint(server, port=443, ssl_timeout=3):
+    log.debug("ssl_certificate is checking for ssl cert on {0}:{1}".format(server, port))
     try:
-        log.debug("ssl_certificate is checking for ssl cert on {0}:{1}".format(server, port))
-        hostport = (str(server), int(port))
-        setdefaulttimeout(ssl_timeout)
-        cert_details = ssl.get_server_certificate(hostport)
-    except Exception as e:
-        log.error('Unable to retrieve certificate from {0}. Error: {1}'.format(server, e))
-        cert_details = None
+        cert_details, error = hubblestack.utils.tls_certs.get_certificate(server, port, ssl_timeout)
+    except (TypeError, ValueError) as e:
+        cert_details, error = None, e
+    if error:
+        log.error('Unable to retrieve certificate from {0}. Error: {1}'.format(server, error))
     return cert_details
 
 
@@ -386,64 +437,10 @@ def _parse_cert(cert, host, port, path):
     log.debug("Parsing the fetched certificate")
     cert_details = {}
     try:
-        x509 = OpenSSL.crypto.load_certificate(OpenSSL.crypto.FILETYPE_PEM, cert)
         cert_details['ssl_src_port'] = str(port)
         cert_details['ssl_src_host'] = str(host)
         cert_details['ssl_src_path'] = str(path)
-        if x509.get_issuer():
-            issuer_components = _format_components(x509.get_issuer())
-            cert_details['ssl_issuer_common_name'] = issuer_components.get('CN', "None")
-        if x509.get_subject():
-            subject_components = _format_components(x509.get_subject())
-            cert_details['ssl_subject_country'] = subject_components.get('C', "None")
-            cert_details['ssl_subject_organisation'] = subject_components.get('O', "None")
-            cert_details['ssl_subject_organisation_unit'] = subject_components.get('OU', "None")
-            cert_details['ssl_subject_common_name'] = subject_components.get('CN', "None")
-        not_after = datetime.strptime(x509.get_notAfter().decode('utf-8'), "%Y%m%d%H%M%SZ")
-        not_before = datetime.strptime(x509.get_notBefore().decode('utf-8'), "%Y%m%d%H%M%SZ")
-        has_expired = x509.has_expired()
-        cert_details['ssl_cert_version'] = str(x509.get_version())
-        cert_details['ssl_has_expired'] = True if has_expired == 1 else False
-        cert_details['ssl_serial_number'] = str(x509.get_serial_number())
-        cert_details['ssl_end_time'] = str(not_after)
-        cert_details['ssl_start_time'] = str(not_before)
-        cert_details['ssl_signature_algorithm'] = str(x509.get_signature_algorithm())
-        cert_details['ssl_cert_pem'] = str(cert)
-        cert_details['ssl_subject_alternative_names'] = _get_certificate_san(x509)
+        cert_details.update(hubblestack.utils.tls_certs.parse_certificate(cert))
     except Exception as e:
         cert_details['error'] = "An error occurred while parsing certificate - {0}".format(e)
     return cert_details
-
-
-def _format_components(x509name):
-    items = {}
-    for item in x509name.get_components():
-        if isinstance(item[0], bytes):
-            key = item[0].decode("utf-8")
-        else:
-            key = item[0]
-        if isinstance(item[1], bytes):
-            value = item[1].decode("utf-8")
-        else:
-            value = item[1]
-        items[key] = value
-    return items
-
-
-def _get_certificate_san(x509cert):
-    san = ''
-    trimmed_san_list = []
-    try:
-        ext_count = x509cert.get_extension_count()
-        for i in range(0, ext_count):
-            ext = x509cert.get_extension(i)
-            if 'subjectAltName' in str(ext.get_short_name()):
-                san = ext.__str__()
-        san_list = san.split(',')
-        for san in san_list:
-            trimmed_san = san.lstrip()
-            trimmed_san_list.append(trimmed_san)
-    except Exception as e:
-        message = "ssl_certificate couldn't fetch SANs: {0}".format(e)
-        log.error(message)
-    return trimmed_san_list
@@ -201,6 +201,8 @@ import hubblestack.module_runner.runner_utils as runner_utils
 from hubblestack.exceptions import HubbleCheckValidationError
 
 log = logging.getLogger(__name__)
+# where the names of the owners of a file come from
+OWNER_DATABASES = ['/etc/passwd', '/etc/group']
 
 
 def validate_params(block_id, block_dict, extra_args=None):
@@ -280,3 +282,25 @@ def get_filtered_params_to_log(block_id, block_dict, extra_args=None):
     if not filepath:
         filepath = runner_utils.get_param_for_module(block_id, block_dict, 'path')
     return {'path': filepath}
+
+
+def get_inputs(block_id, block_dict, extra_args=None):
+    """
+    The paths the block reads, for incremental runs (the user and group
+    databases too, the names of the owners are reported)
+
+    :param block_id:
+        id of the block
+    :param block_dict:
+        parameter for this module
+    :param extra_args:
+        Extra argument dictionary, (If any)
+        Example: {'caller': 'Audit'}
+
+    returns:
+        list of paths, or None if they can't be told (chained input)
+    """
+    if runner_utils.get_chained_param(extra_args):
+        return None
+    filepath = runner_utils.get_param_for_module(block_id, block_dict, 'path')
+    return [filepath] + OWNER_DATABASES if filepath else None
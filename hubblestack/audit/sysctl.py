@@ -173,6 +173,7 @@ import logging
 
 import hubblestack.module_runner.runner_utils as runner_utils
 from hubblestack.exceptions import HubbleCheckValidationError
+from hubblestack.module_runner.runner import Caller
 
 log = logging.getLogger(__name__)
 
@@ -229,7 +230,11 @@ def execute(block_id, block_dict, extra_args=None):
     if not name:
         name = runner_utils.get_param_for_module(block_id, block_dict, 'name')
 
-    sysctl_res = __mods__['sysctl.get'](name)
+    if extra_args and extra_args.get('caller') == Caller.AUDIT and 'sysctl.snapshot' in __mods__:
+        # read up front by prefetch()
+        sysctl_res = __mods__['sysctl.snapshot']([name])[name]
+    else:
+        sysctl_res = __mods__['sysctl.get'](name)
     result = {name: sysctl_res}
     if not sysctl_res or "No such file or directory" in sysctl_res:
         return runner_utils.prepare_negative_result_for_module(block_id, "Could not find attribute %s in the kernel" %(name))
@@ -240,6 +245,26 @@ def execute(block_id, block_dict, extra_args=None):
     return runner_utils.prepare_positive_result_for_module(block_id, result)
 
 
+def prefetch(block_list, extra_args=None):
+    """
+    Read the kernel parameters of all the blocks in one pass (where the sysctl
+    module can take a snapshot), before they are executed
+
+    :param block_list:
+        list of (block_id, block_dict) of the blocks about to be executed
+    :param extra_args:
+        Extra argument dictionary, (If any)
+        Example: {'caller': 'Audit'}
+    """
+    if 'sysctl.snapshot' not in __mods__:
+        return
+    names = [runner_utils.get_param_for_module(block_id, block_dict, 'name')
+             for block_id, block_dict in block_list]
+    names = [name for name in names if isinstance(name, str)]
+    log.debug('Prefetching %d kernel parameters', len(names))
+    __mods__['sysctl.snapshot'](names, refresh=True)
+
+
 def get_filtered_params_to_log(block_id, block_dict, extra_args=None):
     """
     For getting params to log, in non-verbose logging
@@ -118,6 +118,9 @@ Module Arguments
     list of strings with NTP servers to query
 - extend_chained
     boolean determining whether to format the ntp_servers with the chained value or not
+- deadline (Optional, default: 10)
+    seconds to wait for the servers to answer. They are queried all at once,
+    and their answers are reused by the other checks of the run
 
 Module Output
 -------------
@@ -125,15 +128,20 @@ Module Output
     {
         'ntp_server': 'server1',
         'replied': True,
-        'offset': 0.22
+        'offset': 0.22,
+        'elapsed': 0.031
     },
     {
         'ntp_server': 'server2',
         'replied': True,
-        'offset': 0.04
+        'offset': 0.04,
+        'elapsed': 0.018
     }
 ]
 
+elapsed is the number of seconds the query took (None for a server that
+didn't answer before the deadline)
+
 Output: (True, <Above dict>)
 
 Note: Module returns a tuple
@@ -204,6 +212,7 @@ import logging
 import hubblestack.module_runner.runner_utils as runner_utils
 from hubblestack.exceptions import HubbleCheckValidationError
 
+import hubblestack.utils.ntp
 import hubblestack.utils.platform
 
 if not hubblestack.utils.platform.is_windows():
@@ -258,27 +267,53 @@ def execute(block_id, block_dict, extra_args=None):
     log.debug('Executing time_sync module for id: {0}'.format(block_id))
 
     ntp_servers = _get_ntp_servers(block_id, block_dict, extra_args)
+    deadline = runner_utils.get_param_for_module(block_id, block_dict, 'deadline',
+                                                 hubblestack.utils.ntp.DEADLINE)
 
     time_sync_result = []
 
+    answers = hubblestack.utils.ntp.query_servers(ntp_servers, _query_ntp_server, deadline=deadline)
     for ntp_server in ntp_servers:
-        offset = _query_ntp_server(ntp_server)
+        offset = answers[ntp_server]['offset']
         if not offset:
             time_sync_result.append({
                 'ntp_server': ntp_server,
-                'replied': False
+                'replied': False,
+                'elapsed': answers[ntp_server]['elapsed']
             })
             continue
 
         time_sync_result.append({
             'ntp_server': ntp_server,
             'replied': True,
-            'offset': offset
+            'offset': offset,
+            'elapsed': answers[ntp_server]['elapsed']
         })
 
     return runner_utils.prepare_positive_result_for_module(block_id, time_sync_result)
 
 
+def prefetch(block_list, extra_args=None):
+    """
+    Start a new run (forget the answers of the last one) and query the NTP
+    servers of all the blocks at once, before they are executed
+
+    :param block_list:
+        list of (block_id, block_dict) of the blocks about to be executed
+    :param extra_args:
+        Extra argument dictionary, (If any)
+        Example: {'caller': 'Audit'}
+    """
+    hubblestack.utils.ntp.reset()
+    ntp_servers = []
+    for block_id, block_dict in block_list:
+        servers = runner_utils.get_param_for_module(block_id, block_dict, 'ntp_servers')
+        if isinstance(servers, list):
+            ntp_servers.extend(servers)
+    log.debug('Prefetching the offsets of %d NTP servers', len(ntp_servers))
+    hubblestack.utils.ntp.query_servers(ntp_servers, _query_ntp_server)
+
+
 def get_filtered_params_to_log(block_id, block_dict, extra_args=None):
     """
     For getting params to log, in non-verbose logging
@@ -336,7 +371,8 @@ def _query_ntp_server(ntp_server):
     ret = None
     try:
         ntp_client = ntplib.NTPClient()
-        response = ntp_client.request(ntp_server, version=3)
+        host, port = hubblestack.utils.ntp.split_server(ntp_server)
+        response = ntp_client.request(host, version=3, port=port)
         ret = response.offset
     except Exception:
         log.error("Unexpected error occured while querying the server.", exc_info=True)
@@ -261,11 +261,11 @@ Output: [2, 3]
 """
 
 import logging
-import re
 
 from hubblestack.utils.encoding import encode_base64 as utils_encode_base64
 from hubblestack.module_runner.runner import Caller
 import hubblestack.module_runner.runner_utils as runner_utils
+import hubblestack.utils.filter_plans as filter_plans
 from hubblestack.exceptions import HubbleCheckValidationError, ArgumentValueError
 
 log = logging.getLogger(__name__)
@@ -432,12 +432,10 @@ def _filter(block_id, seq, filter_rules):
     if not isinstance(filter_rules, dict):
         log.error("``filter_rules`` should be of type dict")
         return runner_utils.prepare_negative_result_for_module(block_id, 'invalid_format')
-    ret = seq
-    for comp, value in filter_rules.items():
-        try:
-            ret = [x for x in ret if _compare(comp, x, value)]
-        except ArgumentValueError:
-            return runner_utils.prepare_negative_result_for_module(block_id, 'invalid_format')
+    try:
+        ret = filter_plans.filter_seq(seq, filter_rules)
+    except ArgumentValueError:
+        return runner_utils.prepare_negative_result_for_module(block_id, 'invalid_format')
 
     return runner_utils.prepare_positive_result_for_module(block_id, ret)
 
@@ -506,14 +504,10 @@ def _filter_dict_helper(block_id, dct, filter_values, filter_rules):
         the function outputs {3: 'c', 4: 'd'} - key values less than or equal to 4, greater than 1,
         not equal to 2.
     """
-    ret = dct
-    for comp, value in filter_rules.items():
-        try:
-            ret = {key: val for key, val in ret.items()
-                   if (filter_values and _compare(comp, val, value)) or
-                   (not filter_values and _compare(comp, key, value))}
-        except ArgumentValueError:
-            return runner_utils.prepare_negative_result_for_module(block_id, 'invalid_format')
+    try:
+        ret = filter_plans.filter_dict(dct, filter_values, filter_rules)
+    except ArgumentValueError:
+        return runner_utils.prepare_negative_result_for_module(block_id, 'invalid_format')
 
     return runner_utils.prepare_positive_result_for_module(block_id, ret)
 
@@ -526,21 +520,7 @@ def _compare(comp, val1, val2):
         Can have values from [gt, lt, ge, le, eq, ne].
         For e.g. "gt" stands for "greater than"
     """
-    if comp == "gt":
-        return val1 > val2
-    if comp == "ge":
-        return val1 >= val2
-    if comp == "lt":
-        return val1 < val2
-    if comp == "le":
-        return val1 <= val2
-    if comp == "eq":
-        return val1 == val2
-    if comp == "ne":
-        return val1 != val2
-
-    log.error("Invalid argument '%s' - should be in [gt, ge, lt, le, eq, ne]", comp)
-    raise ArgumentValueError
+    return filter_plans.compare(comp, val1, val2)
 
 def _get_index(block_id, block_dict, extra_args):
     """
@@ -846,7 +826,7 @@ def _split_helper(phrase,
     """
     try:
         if regex:
-            ret = re.split(sep, phrase)
+            ret = filter_plans.compiled_regex(sep).split(phrase)
         else:
             ret = phrase.split(sep)
     except (AttributeError, TypeError):
@@ -960,18 +940,7 @@ def _dict_convert_none_helper(dictionary):
     if not isinstance(dictionary, dict):
         log.error("Invalid argument type - should be dict")
         return None
-    updated_dict = {}
-    for key, value in dictionary.items():
-        if value == '':
-            updated_dict[key] = None
-        elif isinstance(value, dict):
-            updated_dict[key] = _dict_convert_none_helper(value)
-        elif isinstance(value, (list, set, tuple)):
-            updated_dict[key] = _seq_convert_none_helper(value)
-        else:
-            updated_dict[key] = value
-
-    return updated_dict
+    return filter_plans.convert_none(dictionary)
 
 
 def _seq_convert_none_helper(seq):
@@ -986,16 +955,7 @@ def _seq_convert_none_helper(seq):
     if not isinstance(seq, (list, set, tuple)):
         log.error("Invalid argument type - list set or tuple expected")
         return None
-    updated_seq = []
-    for element in seq:
-        if isinstance(element, dict):
-            updated_seq.append(_dict_convert_none_helper(element))
-        elif isinstance(element, (list, set, tuple)):
-            updated_seq.append(_seq_convert_none_helper(element))
-        else:
-            updated_seq.append(element)
-
-    return updated_seq
+    return filter_plans.convert_none(seq)
 
 def _print_string(block_id, block_dict, extra_args):
     """
@@ -1102,16 +1062,7 @@ def _sterilize_dict(dictionary):
     if not isinstance(dictionary, dict):
         log.error("Invalid argument type - should be dict")
         return None
-    updated_dict = {}
-    for key, value in dictionary.items():
-        if isinstance(value, dict):
-            updated_dict[key] = _sterilize_dict(value)
-        elif isinstance(value, (set, list, tuple)):
-            updated_dict[key] = _sterilize_seq(value)
-        elif value is not None:
-            updated_dict[key] = value
-
-    return updated_dict
+    return filter_plans.sterilize(dictionary)
 
 
 def _sterilize_seq(seq):
@@ -1125,16 +1076,7 @@ def _sterilize_seq(seq):
     if not isinstance(seq, (list, set, tuple)):
         log.error('Invalid argument type - should be list, set or tuple')
         return None
-    updated_seq = []
-    for element in seq:
-        if isinstance(element, dict):
-            updated_seq.append(_sterilize_dict(element))
-        elif isinstance(element, (list, set, tuple)):
-            updated_seq.append(_sterilize_seq(element))
-        else:
-            updated_seq.append(element)
-
-    return updated_seq
+    return filter_plans.sterilize(seq)
 
 
 def _nop(block_id, block_dict, extra_args):
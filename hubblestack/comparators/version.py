@@ -29,6 +29,14 @@ Version comparator exposes various commands:
             - >= 4.28.0-1.el7
             - < 5.28.0-1.el7
 
+Versions are ordered like rpm (EVR) versions by default. Pass "scheme" to
+order them like dpkg or apk versions instead:
+
+    comparator:
+        type: version
+        scheme: dpkg
+        match: >= 1:2.30-1ubuntu1
+
 Complete Example
 
     comparator:
@@ -48,7 +56,8 @@ Complete Example
 """
 
 import logging
-from distutils.version import LooseVersion
+
+import hubblestack.utils.versions
 
 log = logging.getLogger(__name__)
 
@@ -64,7 +73,7 @@ def match(audit_id, result_to_compare, args):
     """
     log.debug('Running version::match for audit_id: {0}'.format(audit_id))
 
-    if _match(result_to_compare, args['match']):
+    if _match(result_to_compare, args['match'], args.get('scheme', 'rpm')):
         return True, "Check Passed"
     return False, "version::match failure. Got={0} Expected={1}".format(result_to_compare, str(args['match']))
 
@@ -81,7 +90,7 @@ def match_any(audit_id, result_to_compare, args):
     log.debug('Running version::match_any for check: {0}'.format(audit_id))
 
     for option_to_match in args['match_any']:
-        if _match(result_to_compare, option_to_match):
+        if _match(result_to_compare, option_to_match, args.get('scheme', 'rpm')):
             return True, "Check passed"
 
     # did not match
@@ -89,26 +98,28 @@ def match_any(audit_id, result_to_compare, args):
                                                                                        str(args['match_any']))
 
 
-def _match(result_to_compare, expected_result):
+_OPERATORS = (
+    ('<=', lambda got, expected: got <= expected),
+    ('>=', lambda got, expected: got >= expected),
+    ('==', lambda got, expected: got == expected),
+    ('!=', lambda got, expected: got != expected),
+    ('<', lambda got, expected: got < expected),
+    ('>', lambda got, expected: got > expected),
+)
+
+
+def _match(result_to_compare, expected_result, scheme='rpm'):
     """
     compare versions
     """
     # got string having some comparison operators
-    expected_result_value = expected_result.strip()
-    result_version_to_compare = LooseVersion(result_to_compare)
-
-    if expected_result_value.startswith('<='):
-        return result_version_to_compare <= LooseVersion(expected_result_value[2:].strip())
-    elif expected_result_value.startswith('>='):
-        return result_version_to_compare >= LooseVersion(expected_result_value[2:].strip())
-    elif expected_result_value.startswith('<'):
-        return result_version_to_compare < LooseVersion(expected_result_value[1:].strip())
-    elif expected_result_value.startswith('>'):
-        return result_version_to_compare > LooseVersion(expected_result_value[1:].strip())
-    elif expected_result_value.startswith('=='):
-        return result_version_to_compare == LooseVersion(expected_result_value[2:].strip())
-    elif expected_result_value.startswith('!='):
-        return result_version_to_compare != LooseVersion(expected_result_value[2:].strip())
-    else:
-        # direct comparison
-        return result_version_to_compare == LooseVersion(expected_result_value.strip())
+    expected_result_value = str(expected_result).strip()
+    result_version_to_compare = hubblestack.utils.versions.version_key(result_to_compare, scheme)
+
+    for operator, compare in _OPERATORS:
+        if expected_result_value.startswith(operator):
+            expected_version = expected_result_value[len(operator):].strip()
+            return compare(result_version_to_compare,
+                           hubblestack.utils.versions.version_key(expected_version, scheme))
+    # direct comparison
+    return result_version_to_compare == hubblestack.utils.versions.version_key(expected_result_value, scheme)
@@ -218,6 +218,10 @@ VALID_OPTS = {
     # other non-salt hubble-specific things
     "fileserver_update_frequency": int,
     "grains_refresh_frequency": int,
+    # Deadline in seconds for all grain functions of a refresh, and how many
+    # of them run concurrently (1 runs them one after the other)
+    "grains_timeout": int,
+    "grains_max_workers": int,
     "scheduler_sleep_frequency": float,
     "default_include": str,
     "logfile_maxbytes": int,
@@ -906,6 +910,8 @@ DEFAULT_OPTS = {
     "file_client": "local",
     "fileserver_update_frequency": 43200, # 12 hours
     "grains_refresh_frequency": 3600, # 1 hour
+    "grains_timeout": 60,
+    "grains_max_workers": 8,
     "scheduler_sleep_frequency": 0.5, # 500ms
     "default_include": 'hubble.d/*.conf',
     "logfile_maxbytes": 100000000, # 100MB kindof
@@ -40,6 +40,7 @@ import hubblestack.utils.stdrec
 from hubblestack import __version__
 from hubblestack.hangtime import hangtime_wrapper
 import hubblestack.status
+import hubblestack.profiler
 import hubblestack.fileclient
 import hubblestack.saltoverrides
 import hubblestack.module_runner.runner
@@ -302,6 +303,11 @@ def schedule():
 
     run_on_start
         Whether to run the scheduled job on daemon start. Defaults to False. Optional.
+
+    profile
+        Profile the runs of the job: ``sample`` (stack samples), ``cprofile``
+        or a dict of options; the profiles are written under the cachedir.
+        See hubblestack.profiler. Optional.
     """
     sf_count = 0
     base = datetime(2018, 1, 1, 0, 0)
@@ -342,18 +348,20 @@ def schedule():
             # Actually process the job
             run = _process_job(jobdata, splay, seconds, min_splay, base)
             if run:
-                _execute_function(jobdata, func, returners, args, kwargs)
+                _execute_function(jobdata, func, returners, args, kwargs, jobname=jobname)
                 sf_count += 1
         except:
             log.error("Exception in running job: %s; continuing with next job...", jobname, exc_info=True)
     return sf_count
 
 
-def _execute_function(jobdata, func, returners, args, kwargs):
+def _execute_function(jobdata, func, returners, args, kwargs, jobname=None):
     """ Run the scheduled function """
     log.debug('Executing scheduled function %s', func)
     jobdata['last_run'] = time.time()
-    ret = __mods__[func](*args, **kwargs)
+    with HSS.resource_timer('job.{0}'.format(func)), \
+            hubblestack.profiler.JobProfiler(jobname or func, jobdata, __opts__['cachedir']):
+        ret = __mods__[func](*args, **kwargs)
     if __opts__['log_level'] == 'debug':
         log.debug('Job returned:\n%s', ret)
     for returner in returners:
@@ -367,7 +375,8 @@ def _execute_function(jobdata, func, returners, args, kwargs):
                         'fun': func,
                         'fun_args': args + ([kwargs] if kwargs else []),
                         'return': ret}
-        __returners__[returner](returner_ret)
+        with HSS.resource_timer(returner):
+            __returners__[returner](returner_ret)
 
 
 def _process_job(jobdata, splay, seconds, min_splay, base):
@@ -479,6 +488,14 @@ def load_config(args=None):
         print(__buildinfo__)
         clean_up_process(None, None)
         sys.exit(0)
+    if __opts__['profile_job']:
+        # ask the running daemon to profile a job; don't become one
+        pid = hubblestack.profiler.request_profile(__opts__['cachedir'], __opts__['pidfile'],
+                                                   __opts__['profile_job'])
+        if pid is None:
+            sys.exit(1)
+        print('requested a profile of {0} from pid {1}'.format(__opts__['profile_job'], pid))
+        sys.exit(0)
     scan_proc = __opts__.get('scan_proc', False)
     if __opts__['daemonize']:
         # before becoming a daemon, check for other procs and possibly send
@@ -669,7 +686,7 @@ def _setup_dirs():
 # pick it up again.  If the hang is transient, the grain will populate
 # normally.
 #
-# repeats=True meaning: restart the signal itimer after firing the timeout
+# repeats=True meaning: restart the timer after firing the timeout
 # exception, which salt catches. In this way, we can catch multiple hangs with
 # a single timer. Each timer restart is a new 600s timeout.
 #
@@ -771,6 +788,8 @@ def refresh_grains(initial=False):
     hubblestack.utils.signing.__mods__ = __mods__
 
     HSS.start_sigusr1_signal_handler()
+    hubblestack.profiler.start_sigusr2_signal_handler()
+    HSS.start_metrics_endpoint()
     hubblestack.log.refresh_handler_std_info()
     clear_selective_context()
 
@@ -843,6 +862,9 @@ def parse_args(args=None):
         help='Optional argument to print the output of single run function in json format')
     parser.add_argument('--ignore_running', action='store_true',
                         help='Ignore any running hubble processes. This disables the pidfile.')
+    parser.add_argument('--profile-job', default=None, metavar='JOB[:RUNS]',
+                        help='Ask the running hubble daemon to profile the next RUNS '
+                             '(default: 1) runs of the scheduled job JOB')
     return vars(parser.parse_args(args=args))
 
 
@@ -12,11 +12,17 @@ Also note that this module doesn't support chaining from other fdg modules.
 This is due to security concerns -- because fdg can collect arbitrary data from
 a system, we don't want an attacker to be able to send that data to arbitrary
 endpoints.
+
+Requests go through the pooled sessions of hubblestack.utils.http_sessions:
+connections to a host are kept alive for the rest of the run, and identical
+GET requests made while executing one fdg file are only sent once.
 """
 
 import logging
 import requests
 
+import hubblestack.utils.http_sessions
+
 
 log = logging.getLogger(__name__)
 
@@ -140,12 +146,7 @@ def _make_request(function, url, **kwargs):
     Helper function that makes the HTTP request
     """
     try:
-        if function == 'GET':
-            response = requests.get(url, **kwargs)
-        elif function == 'PUT':
-            response = requests.put(url, **kwargs)
-        elif function == 'POST':
-            response = requests.post(url, **kwargs)
+        response = hubblestack.utils.http_sessions.request(function, url, **kwargs)
     except Exception as exc:
         return False, str(exc)
 
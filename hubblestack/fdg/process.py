@@ -9,8 +9,8 @@ the data outputted by a module to serve it to another module.
 
 
 import logging
-import re
 
+import hubblestack.utils.filter_plans as filter_plans
 from hubblestack.exceptions import ArgumentValueError
 from hubblestack.utils.encoding import encode_base64 as utils_encode_base64
 
@@ -71,16 +71,10 @@ def _filter_dict(dct,
         the function outputs {3: 'c', 4: 'd'} - key values less than or equal to 4, greater than 1,
         not equal to 2.
     """
-    ret = dct
-    for comp, value in filter_rules.items():
-        try:
-            ret = {key: val for key, val in ret.items()
-                   if (filter_values and _compare(comp, val, value)) or
-                   (not filter_values and _compare(comp, key, value))}
-        except ArgumentValueError:
-            return None
-
-    return ret
+    try:
+        return filter_plans.filter_dict(dct, filter_values, filter_rules)
+    except ArgumentValueError:
+        return None
 
 
 def _compare(comp, val1, val2):
@@ -92,21 +86,7 @@ def _compare(comp, val1, val2):
         Can have values from [gt, lt, ge, le, eq, ne].
         For e.g. "gt" stands for "greater than"
     """
-    if comp == "gt":
-        return val1 > val2
-    if comp == "ge":
-        return val1 >= val2
-    if comp == "lt":
-        return val1 < val2
-    if comp == "le":
-        return val1 <= val2
-    if comp == "eq":
-        return val1 == val2
-    if comp == "ne":
-        return val1 != val2
-
-    log.error("Invalid argument '%s' - should be in [gt, ge, lt, le, eq, ne]", comp)
-    raise ArgumentValueError
+    return filter_plans.compare(comp, val1, val2)
 
 
 def filter_seq(starting_seq=None, extend_chained=True, chained=None, chained_status=None, **kwargs):
@@ -173,14 +153,10 @@ def _filter(seq,
     if not isinstance(filter_rules, dict):
         log.error("``filter_rules`` should be of type dict")
         return None
-    ret = seq
-    for comp, value in filter_rules.items():
-        try:
-            ret = [x for x in ret if _compare(comp, x, value)]
-        except ArgumentValueError:
-            return None
-
-    return ret
+    try:
+        return filter_plans.filter_seq(seq, filter_rules)
+    except ArgumentValueError:
+        return None
 
 
 def get_index(index=0, starting_list=None, extend_chained=True, chained=None, chained_status=None):
@@ -397,7 +373,7 @@ def _split(phrase,
     """
     try:
         if regex:
-            ret = re.split(sep, phrase)
+            ret = filter_plans.compiled_regex(sep).split(phrase)
         else:
             ret = phrase.split(sep)
     except (AttributeError, TypeError):
@@ -481,18 +457,7 @@ def _dict_convert_none(dictionary):
     if not isinstance(dictionary, dict):
         log.error("Invalid argument type - should be dict")
         return None
-    updated_dict = {}
-    for key, value in dictionary.items():
-        if value == '':
-            updated_dict[key] = None
-        elif isinstance(value, dict):
-            updated_dict[key] = _dict_convert_none(value)
-        elif isinstance(value, (list, set, tuple)):
-            updated_dict[key] = _seq_convert_none(value)
-        else:
-            updated_dict[key] = value
-
-    return updated_dict
+    return filter_plans.convert_none(dictionary)
 
 
 def _seq_convert_none(seq):
@@ -507,16 +472,7 @@ def _seq_convert_none(seq):
     if not isinstance(seq, (list, set, tuple)):
         log.error("Invalid argument type - list set or tuple expected")
         return None
-    updated_seq = []
-    for element in seq:
-        if isinstance(element, dict):
-            updated_seq.append(_dict_convert_none(element))
-        elif isinstance(element, (list, set, tuple)):
-            updated_seq.append(_seq_convert_none(element))
-        else:
-            updated_seq.append(element)
-
-    return updated_seq
+    return filter_plans.convert_none(seq)
 
 
 def print_string(starting_string, format_chained=True, chained=None, chained_status=None):
@@ -593,16 +549,7 @@ def _sterilize_dict(dictionary):
     if not isinstance(dictionary, dict):
         log.error("Invalid argument type - should be dict")
         return None
-    updated_dict = {}
-    for key, value in dictionary.items():
-        if isinstance(value, dict):
-            updated_dict[key] = _sterilize_dict(value)
-        elif isinstance(value, (set, list, tuple)):
-            updated_dict[key] = _sterilize_seq(value)
-        elif value is not None:
-            updated_dict[key] = value
-
-    return updated_dict
+    return filter_plans.sterilize(dictionary)
 
 
 def _sterilize_seq(seq):
@@ -616,16 +563,7 @@ def _sterilize_seq(seq):
     if not isinstance(seq, (list, set, tuple)):
         log.error('Invalid argument type - should be list, set or tuple')
         return None
-    updated_seq = []
-    for element in seq:
-        if isinstance(element, dict):
-            updated_seq.append(_sterilize_dict(element))
-        elif isinstance(element, (list, set, tuple)):
-            updated_seq.append(_sterilize_seq(element))
-        else:
-            updated_seq.append(element)
-
-    return updated_seq
+    return filter_plans.sterilize(seq)
 
 
 def nop(format_chained=True, chained=None, chained_status=None):
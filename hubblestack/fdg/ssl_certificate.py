@@ -45,49 +45,27 @@ Testing -
         |          ssl_timeout: 3                                                                                                   |
         |___________________________________________________________________________________________________________________________|
 """
-import OpenSSL
-import ssl
 import time
-from socket import setdefaulttimeout
 import logging
-from datetime import datetime
-log = logging.getLogger(__name__)
 
-def _get_certificate_san(x509cert):
-    san = ''
-    trimmed_san_list = []
-    try:
-        ext_count = x509cert.get_extension_count()
-        for i in range(0, ext_count):
-            ext = x509cert.get_extension(i)
-            if 'subjectAltName' in str(ext.get_short_name()):
-                san = ext.__str__()
-        san_list = san.split(',')
-        for san in san_list:
-            trimmed_san = san.lstrip()
-            trimmed_san_list.append(trimmed_san)
-    except Exception as e:
-        message = "FDG ssl_certificate couldn't fetch SANs: {0}".format(e)
-        log.error(message)
-    return trimmed_san_list
+import hubblestack.utils.tls_certs
+
+log = logging.getLogger(__name__)
 
 def _load_certificate(ip, port, ssl_timeout):
     """
     fetch server certificate details and return Json with the first value being the
-    status of ssl.get_server_certificate function and second value being the actual
-    certificate data.
+    status of the fetch and second value being the actual certificate data.
+    The certificate of an endpoint is fetched once per run and shared with the
+    ssl_certificate audit module.
     """
-    try:
-        log.debug("FDG ssl_certificate is checking for ssl cert on {0}:{1}".format(ip,port))
-        hostport = (str(ip), int(port))
-        setdefaulttimeout(ssl_timeout)
-        cert_details = ssl.get_server_certificate(hostport)
-    except Exception as e:
-        message = "FDG ssl_certificate couldn't get cert on {0}:{1}, error : {2}".format(ip,port,e)
+    log.debug("FDG ssl_certificate is checking for ssl cert on {0}:{1}".format(ip,port))
+    cert_details, error = hubblestack.utils.tls_certs.get_certificate(ip, port, ssl_timeout)
+    if error:
+        message = "FDG ssl_certificate couldn't get cert on {0}:{1}, error : {2}".format(ip,port,error)
         log.debug(message)
         return {'result':False,'data':message}
-    else:
-        return {'result':True,'data':cert_details}
+    return {'result':True,'data':cert_details}
 
 def _parse_cert(cert, host, port):
     """
@@ -95,29 +73,9 @@ def _parse_cert(cert, host, port):
     """
     cert_details = {}
     try:
-        x509 = OpenSSL.crypto.load_certificate(OpenSSL.crypto.FILETYPE_PEM, cert.get('data', ''))
         cert_details['ssl_src_port'] = str(port)
         cert_details['ssl_src_host'] = str(host)
-        if x509.get_issuer():
-            issuer_components = _format_components(x509.get_issuer())
-            cert_details['ssl_issuer_common_name'] = issuer_components.get('CN', "None")
-        if x509.get_subject():
-            subject_components = _format_components(x509.get_subject())
-            cert_details['ssl_subject_country'] = subject_components.get('C', "None")
-            cert_details['ssl_subject_organisation'] = subject_components.get('O', "None")
-            cert_details['ssl_subject_organisation_unit'] = subject_components.get('OU', "None")
-            cert_details['ssl_subject_common_name'] = subject_components.get('CN', "None")
-        not_after = datetime.strptime(x509.get_notAfter().decode('utf-8'), "%Y%m%d%H%M%SZ")
-        not_before = datetime.strptime(x509.get_notBefore().decode('utf-8'), "%Y%m%d%H%M%SZ")
-        has_expired = x509.has_expired()
-        cert_details['ssl_cert_version'] = str(x509.get_version())
-        cert_details['ssl_has_expired'] = True if has_expired == 1 else False
-        cert_details['ssl_serial_number'] = str(x509.get_serial_number())
-        cert_details['ssl_end_time'] = str(not_after)
-        cert_details['ssl_start_time'] = str(not_before)
-        cert_details['ssl_signature_algorithm'] = str(x509.get_signature_algorithm())
-        cert_details['ssl_cert_pem'] = str(cert['data'])
-        cert_details['ssl_subject_alternative_names'] = _get_certificate_san(x509)
+        cert_details.update(hubblestack.utils.tls_certs.parse_certificate(cert.get('data', '')))
     except Exception as e:
         cert_details['error'] = "An error occurred while parsing certificate - {0}".format(e)
     return cert_details
@@ -154,7 +112,7 @@ def get_cert_details(params='', chained=None, chained_status=None):
         1. Connect to the port and fetch certificate details.
         2. Connect to the port and exit if no certificate is attached on the port.
     The first return value (status) will be False if the module encounters some
-    exception in python's ssl.get_server_certificate function.
+    exception while fetching the certificate.
 
     params
         :type dict
@@ -210,9 +168,3 @@ def _check_input_validity(host, port, ssl_timeout):
     if ssl_timeout < 0:
         return False
     return True
-
-def _format_components(x509name):
-    items = {}
-    for item in x509name.get_components():
-        items[item[0]] = item[1]
-    return items
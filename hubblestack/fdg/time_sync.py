@@ -7,6 +7,7 @@ NTP servers for differences bigger than 15 minutes.
 
 
 import logging
+import hubblestack.utils.ntp
 import hubblestack.utils.platform
 
 if not hubblestack.utils.platform.is_windows():
@@ -15,7 +16,8 @@ log = logging.getLogger(__name__)
 
 
 def time_check(ntp_servers, max_offset=15, nb_servers=4,
-               extend_chained=True, chained=None, chained_status=None):
+               extend_chained=True, deadline=hubblestack.utils.ntp.DEADLINE,
+               chained=None, chained_status=None):
     """
     Function that queries a list of NTP servers and checks if the
     offset is bigger than `max_offset` minutes. It expects the results from
@@ -41,6 +43,10 @@ def time_check(ntp_servers, max_offset=15, nb_servers=4,
     extend_chained
         boolean determining whether to format the ntp_servers with the chained value or not
 
+    deadline
+        seconds to wait for the servers to answer - they are queried all at once,
+        and their answers are reused by the other checks of the run - by default 10
+
     chained
         The value chained from the previous call
 
@@ -57,8 +63,11 @@ def time_check(ntp_servers, max_offset=15, nb_servers=4,
         return False, None
 
     checked_servers = 0
+    answers = hubblestack.utils.ntp.query_servers(ntp_servers, _query_ntp_server, deadline=deadline)
     for ntp_server in ntp_servers:
-        offset = _query_ntp_server(ntp_server)
+        offset = answers[ntp_server]['offset']
+        log.debug("%s: offset %s, queried in %s seconds",
+                  ntp_server, offset, answers[ntp_server]['elapsed'])
         if not offset:
             continue
         # offset bigger than `max_offset` minutes
@@ -94,7 +103,8 @@ def _query_ntp_server(ntp_server):
     ret = None
     try:
         ntp_client = ntplib.NTPClient()
-        response = ntp_client.request(ntp_server, version=3)
+        host, port = hubblestack.utils.ntp.split_server(ntp_server)
+        response = ntp_client.request(host, version=3, port=port)
         ret = response.offset
     except (Exception, ntplib.NTPException):
         log.error("Unexpected error occured while querying the server.", exc_info=True)
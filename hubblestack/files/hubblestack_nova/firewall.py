@@ -132,6 +132,14 @@ def audit(data_list, tags, labels, debug=False, **kwargs):
         log.debug(__tags__)
 
     ret = {'Success': [], 'Failure': [], 'Controlled': []}
+
+    # read each ruleset once, iptables.check answers from that snapshot
+    if 'iptables.snapshot' in __mods__:
+        families = set(tag_data['family'] for tag in __tags__ if fnmatch.fnmatch(tag, tags)
+                       for tag_data in __tags__[tag] if 'control' not in tag_data)
+        for family in families:
+            __mods__['iptables.snapshot'](family=family, refresh=True)
+
     for tag in __tags__:
         if fnmatch.fnmatch(tag, tags):
             for tag_data in __tags__[tag]:
@@ -528,6 +528,9 @@ def check_service_status(service_name, state):
     Return True otherwise
     state can be enabled or disabled.
     """
+    units = __mods__['service.units']() if 'service.units' in __mods__ else None
+    if units:
+        return _unit_file_status(service_name, state, units)
     all_services = __mods__['cmd.run']('systemctl list-unit-files')
     if re.search(service_name, all_services, re.M):
         output = __mods__['cmd.retcode']('systemctl is-enabled ' + service_name, ignore_retcode=True)
@@ -542,6 +545,22 @@ def check_service_status(service_name, state):
             return 'Looks like ' + service_name + ' does not exists. Please check.'
 
 
+def _unit_file_status(service_name, state, units):
+    """
+    check_service_status, answered from the unit table of the systemd service
+    module rather than one systemctl run per check
+    """
+    unit_files = [unit for unit, info in units.items() if info['unit_file_state']]
+    if any(re.search(service_name, unit) for unit in unit_files):
+        is_enabled = __mods__['service.enabled'](service_name)
+        if (state == "disabled" and not is_enabled) or (state == "enabled" and is_enabled):
+            return True
+        return __mods__['cmd.run_stdout']('systemctl is-enabled ' + service_name, ignore_retcode=True)
+    if state == "disabled":
+        return True
+    return 'Looks like ' + service_name + ' does not exists. Please check.'
+
+
 def check_ssh_timeout_config(reason=''):
     """
     Ensure SSH Idle Timeout Interval is configured
@@ -31,11 +31,16 @@ nova:
     ## - cve.vulners <-- ensure other CVE scanners are not active
     - cve.oval <-- assuming the yaml is oval.yaml in this example
 
-When run, the scanner will parse the source OVAL file into a readable
-dictionary, maps OVAL defintions directly to OVAL object and OVAL state
-references based on OVAL test reference data of the definition, and then makes
-a comparison to the local packages installed on the system to identify potential
-vulnerabilities.
+When run, the scanner streams the source OVAL file (it is never held in memory
+as a full element tree) and builds a compact package index that maps every
+package name to the (fixed version, definition) pairs referencing it.  The
+index is written under the hubble cachedir keyed by the sha256 checksum of the
+source file, so it is only rebuilt when the upstream feed actually changes.
+Remote feeds are fetched with conditional requests (the ETag and Last-Modified
+of the last download), so an unchanged feed is not downloaded again.
+Installed packages are then checked against the fixed versions in the index
+in one pass, using the dpkg or rpm version ordering of the distro, to identify
+potential vulnerabilities.
 
 This scanner currently only supports the Linux platform.
 """
@@ -43,10 +48,24 @@ This scanner currently only supports the Linux platform.
 
 
 import xml.etree.ElementTree as ET
+import glob
+import hashlib
 import json
+import os
 import requests
 import logging
+import hubblestack.utils.files
+import hubblestack.utils.hashutils
 import hubblestack.utils.platform
+import hubblestack.utils.versions
+
+NAMESPACE = {
+    'oval': 'http://oval.mitre.org/XMLSchema/oval-definitions-5',
+    'linux': 'http://oval.mitre.org/XMLSchema/oval-definitions-5#linux',
+    'common': 'http://oval.mitre.org/XMLSchema/oval-common-5'
+}
+INDEX_VERSION = 1
+CHUNK_SIZE = 65536
 
 
 def __virtual__():
@@ -69,16 +88,16 @@ def audit(data_list, tags, labels, debug=False, **kwargs):
                 return ret
             local_pkgs = __mods__['pkg.list_pkgs']()
             # Scanner options
-            opt_baseurl = data['oval_scanner']['opt_baseurl']
-            opt_remote_sourcefile = data['oval_scanner']['opt_remote_sourcefile']
-            opt_local_sourcefile = data['oval_scanner']['opt_local_sourcefile']
-            opt_output_file = data['oval_scanner']['opt_output_file']
+            opt_baseurl = data['oval_scanner'].get('opt_baseurl')
+            opt_remote_sourcefile = data['oval_scanner'].get('opt_remote_sourcefile')
+            opt_local_sourcefile = data['oval_scanner'].get('opt_local_sourcefile')
+            opt_output_file = data['oval_scanner'].get('opt_output_file')
             # Build report
-            source_content = get_source_content(distro_name, distro_release, distro_codename, opt_baseurl, opt_remote_sourcefile, opt_local_sourcefile)
-            oval_definition = build_oval(source_content)
-            oval_and_maps = map_oval_ids(oval_definition)
-            vulns = create_vulns(oval_and_maps)
-            report = get_impact_report(vulns, local_pkgs, distro_name)
+            index_dir = get_index_dir()
+            source_path, checksum = get_source_file(distro_name, distro_release, distro_codename, opt_baseurl,
+                                                    opt_remote_sourcefile, opt_local_sourcefile, index_dir)
+            index = load_index(source_path, checksum, index_dir)
+            report = get_impact_report(index, local_pkgs, distro_name)
             # Write report to file if specified
             if opt_output_file:
                 write_report_to_file(opt_output_file, report)
@@ -88,14 +107,15 @@ def audit(data_list, tags, labels, debug=False, **kwargs):
     return ret
 
 
-def parse_impact_report(report, local_pkgs, hubble_format, impacted_pkgs=[]):
+def parse_impact_report(report, local_pkgs, hubble_format, impacted_pkgs=None):
     """Parse into Hubble friendly format"""
+    if impacted_pkgs is None:
+        impacted_pkgs = set()
     for key, value in report.items():
         pkg_desc = 'Vulnerable Package(s): '
         for pkg in value['installed']:
             pkg_desc += '{0}-{1}, '.format(pkg['name'], pkg['version'])
-            if pkg['name'] not in impacted_pkgs:
-                impacted_pkgs.append(pkg['name'])
+            impacted_pkgs.add(pkg['name'])
         impact_desc = pkg_desc.strip().rstrip(',')
         impact_data = {'tag': key, 'description': impact_desc, 'detail': value}
         hubble_format['Failure'].append(impact_data)
@@ -113,43 +133,38 @@ def write_report_to_file(opt_output_file, report):
         outfile.write(json.dumps(report, indent=2, sort_keys=True))
 
 
-def get_impact_report(vulns, local_pkgs, distro_name):
+def get_impact_report(index, local_pkgs, distro_name):
     """Get impact report"""
     logging.debug('get_impact_report')
-    report = build_impact(vulns, local_pkgs, distro_name)
+    report = build_impact(index, local_pkgs, distro_name)
     logging.debug(json.dumps(report, indent=4, sort_keys=True))
     return report
 
 
 # Build an impact report
-def build_impact(vulns, local_pkgs, distro_name, result={}):
-    """Build impacts based on pkg comparisons"""
+def build_impact(index, local_pkgs, distro_name):
+    """Build impacts from the installed packages that are below a fixed version in the index"""
     logging.debug('build_impact')
-    for data in vulns.values():
-        for pkg in data['pkg']:
-            name = pkg['name']
-            ver = pkg['version']
-            if name in local_pkgs:
-                title = data['title']
+    report = {}
+    definitions = index['definitions']
+    scheme = hubblestack.utils.versions.scheme_for(distro_name)
+    vulnerable = hubblestack.utils.versions.below_fixed(local_pkgs, index['packages'], scheme)
+    for name, installed in vulnerable.items():
+        for local_ver, fixed in installed.items():
+            for ver, def_id in fixed:
+                data = definitions[def_id]
                 cve = data['cve']
-                if 'severity' in data:
-                  severity = data['severity']
-                else:
-                  severity = 'N/A'
+                severity = data.get('severity', 'N/A')
                 if distro_name in ('centos', 'redhat'):
-                    advisory = data['rhsa']
+                    advisory = data.get('rhsa', {})
                 else:
-                    if 'advisories' in data:
-                      advisory = data['advisories']
-                    else:
-                      advisory = cve
-                impact = get_impact(local_pkgs[name], name, ver, title, cve, advisory, severity)
-                if impact:
-                    result = build_impact_report(impact)
-    return result
+                    advisory = data.get('advisories', cve)
+                impact = get_impact(local_ver, name, ver, data['title'], cve, advisory, severity)
+                build_impact_report(impact, report)
+    return report
 
 
-def build_impact_report(impact, report={}):
+def build_impact_report(impact, report):
     """Build a report based on impacts"""
     logging.debug('build_impact_report')
     for adv, detail in impact.items():
@@ -167,223 +182,214 @@ def build_impact_report(impact, report={}):
 
 
 def get_impact(local_ver, name, ver, title, cve, advisory, severity):
-    """Compare local package ver to vulnerability ver in rpm distros"""
-    logging.debug('get_rpm_impact')
-    impact = {}
-    if __mods__['pkg.version_cmp'](ver, local_ver) > 0:
-        impact[title] = {
+    """Describe the impact of an installed package below the fixed version ver"""
+    return {
+        title: {
             'updated_pkg': {'name': name, 'version': ver},
             'installed': {'name': name, 'version': local_ver},
             'severity': severity,
             'advisory': advisory,
             'cve': cve
         }
-    return impact
-
-
-# Create vulnerability dictionary
-def create_vulns(oval_and_maps, vulns={}):
-    """Create vuln dict that maps definitions directly to objects and states"""
-    logging.debug('create_vulns')
-    id_maps = oval_and_maps[0]
-    oval = oval_and_maps[1]
-    for definition, data in id_maps.items():
-        if definition in oval['definitions']:
-            vulns[definition] = oval['definitions'][definition]
-            vulns[definition]['pkg'] = []
-            vuln_pkg = vulns[definition]['pkg']
-            objects = data['objects']
-            for obj in objects:
-                pkg_group = None
-                if 'name' in oval['objects'][obj['object_id']]:
-                    name = oval['objects'][obj['object_id']]['name']
-                    if name in oval['vars']:
-                        pkg_group = oval['vars'][name]['pkg_names']
-                else:
-                    continue
-                if 'version' in oval['states'][obj['state_id']]:
-                    version = oval['states'][obj['state_id']]['version']
-                else:
-                    continue
-                if name not in oval['vars']:
-                    vuln_pkg.append({'name': name, 'version': version})
-                if pkg_group:
-                    for pkg in pkg_group:
-                        vuln_pkg.append({'name': pkg, 'version': version})
-    return vulns
-
-
-# Map oval definitions to oval objects and states
-def map_oval_ids(oval, id_maps={}):
-    """For every test, grab only tests with both state and obj references"""
-    logging.debug('map_oval_ids')
-    for definition, data in oval['definitions'].items():
-        id_maps[definition] = {'objects': []}
-        objects = id_maps[definition]['objects']
-        tests = data['tests']
-        for test in tests:
-            test_def = oval['tests'][test]
-            if 'state_ref' in test_def:
-                state_id = test_def['state_ref']
-            else:
+    }
+
+
+# Persisted package index
+def get_index_dir():
+    """Directory holding the downloaded feeds and the package indexes"""
+    index_dir = os.path.join(__opts__.get('cachedir', '/var/cache/hubble'), 'oval_scanner')
+    if not os.path.isdir(index_dir):
+        os.makedirs(index_dir)
+    return index_dir
+
+
+def load_index(source_path, checksum, index_dir):
+    """
+    Load the package index for the feed with the given checksum, building
+    (and persisting) it from the source file first if it does not exist yet
+    """
+    index_file = os.path.join(index_dir, 'index-{0}.json'.format(checksum))
+    if os.path.isfile(index_file):
+        try:
+            with hubblestack.utils.files.fopen(index_file, 'r') as fh:
+                index = json.load(fh)
+            if index.get('version') == INDEX_VERSION and index.get('checksum') == checksum:
+                logging.debug('Using cached OVAL index {0}'.format(index_file))
+                return index
+        except (IOError, OSError, ValueError) as exc:
+            logging.warning('Unable to read OVAL index {0}: {1}'.format(index_file, exc))
+    index = build_index(source_path)
+    index['version'] = INDEX_VERSION
+    index['checksum'] = checksum
+    write_index(index, index_file)
+    return index
+
+
+def write_index(index, index_file):
+    """Atomically write the index and remove indexes of older feeds"""
+    tmp_file = index_file + '.tmp'
+    with hubblestack.utils.files.fopen(tmp_file, 'w') as fh:
+        json.dump(index, fh, separators=(',', ':'))
+    os.rename(tmp_file, index_file)
+    for stale in glob.glob(os.path.join(os.path.dirname(index_file), 'index-*.json')):
+        if stale != index_file:
+            try:
+                os.unlink(stale)
+            except OSError:
+                pass
+
+
+# Build the index from source
+def build_index(source_path):
+    """
+    Stream the OVAL source with iterparse and build the package index
+
+    Every direct child of the definitions, tests, objects, states and variables
+    sections is reduced to the few fields needed for matching and then cleared,
+    so memory use is bounded by the size of the resulting index rather than by
+    the size of the feed.
+    """
+    logging.debug('build_index')
+    oval = {'generator': {}, 'definitions': {}, 'tests': {}, 'objects': {}, 'states': {}, 'vars': {}}
+    builders = {
+        _tag('oval', 'definitions'): ('definitions', build_definition),
+        _tag('oval', 'tests'): ('tests', build_test),
+        _tag('oval', 'objects'): ('objects', build_object),
+        _tag('oval', 'states'): ('states', build_state),
+        _tag('oval', 'variables'): ('vars', build_var),
+    }
+    depth = 0
+    section = builder = None
+    for event, elem in ET.iterparse(source_path, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 2 and elem.tag in builders:
+                section = elem
+                builder = builders[elem.tag]
+            continue
+        depth -= 1
+        if depth == 2 and builder:
+            key, func = builder
+            primary_key = elem.attrib.get('id')
+            if primary_key:
+                oval[key][primary_key] = func(elem)
+            # drop the finished child (and its subtree) from the section
+            section.clear()
+        elif depth == 1:
+            if elem.tag == _tag('oval', 'generator'):
+                oval['generator'] = build_generator(elem)
+            section = builder = None
+            elem.clear()
+    return map_packages(oval)
+
+
+def map_packages(oval):
+    """
+    Resolve definition -> test -> object/state references into a
+    package name -> [[fixed version, definition id], ...] mapping
+    """
+    logging.debug('map_packages')
+    packages = {}
+    definitions = {}
+    for def_id, data in oval['definitions'].items():
+        seen = set()
+        for test in data.pop('tests'):
+            test_def = oval['tests'].get(test, {})
+            obj = oval['objects'].get(test_def.get('object_ref'), {})
+            state = oval['states'].get(test_def.get('state_ref'), {})
+            name = obj.get('name')
+            version = state.get('version')
+            if not name or not version:
                 continue
-            if 'object_ref' in test_def:
-                object_id = test_def['object_ref']
+            if name in oval['vars']:
+                names = oval['vars'][name]
             else:
-                continue
-            objects.append({'object_id': object_id, 'state_id': state_id})
-    oval_and_maps = (id_maps, oval)
-    return oval_and_maps
-
-
-# Build oval from source
-def build_oval(source_content, oval={}):
-    """Build oval dict from ElementTree content"""
-    logging.debug('build_oval')
-    namespace = {
-        'oval': 'http://oval.mitre.org/XMLSchema/oval-definitions-5',
-        'linux': 'http://oval.mitre.org/XMLSchema/oval-definitions-5#linux',
-        'common': 'http://oval.mitre.org/XMLSchema/oval-common-5'
-    }
-    root = build_element_tree(source_content)
-    oval['generator'] = build_generator(root, namespace)
-    oval['definitions'] = build_definitions(root, namespace)
-    oval['tests'] = build_tests(root, namespace)
-    oval['objects'] = build_objects(root, namespace)
-    oval['states'] = build_states(root, namespace)
-    oval['vars'] = build_vars(root, namespace)
-    return oval
+                names = [name]
+            for pkg in names:
+                if (pkg, version) not in seen:
+                    seen.add((pkg, version))
+                    packages.setdefault(pkg, []).append([version, def_id])
+        if seen:
+            definitions[def_id] = data
+    return {'generator': oval['generator'], 'definitions': definitions, 'packages': packages}
 
 
-def build_generator(root, namespace, gen={}):
+def build_generator(generator):
     """Build generator dict from oval source"""
-    logging.debug('build_generator')
-    generator = root.find('oval:generator', namespace)
-    if is_et(generator):
-        prod_name = generator.find('common:product_name', namespace)
-        prod_version = generator.find('common:product_version', namespace)
-        schema_version = generator.find('common:schema_version', namespace)
-        timestamp = generator.find('common:timestamp', namespace)
-        if is_et(prod_name):
-            gen['product_name'] = prod_name.text
-        if is_et(prod_version):
-            gen['product_version'] = prod_version.text
-        if is_et(schema_version):
-            gen['schema_version'] = schema_version.text
-        if is_et(timestamp):
-            gen['timestamp'] = timestamp.text
+    gen = {}
+    for field in ('product_name', 'product_version', 'schema_version', 'timestamp'):
+        elem = generator.find('common:' + field, NAMESPACE)
+        if is_et(elem):
+            gen[field] = elem.text
     return gen
 
 
-def build_definitions(root, namespace, defs={}):
-    """Build element definitions from source into oval dict"""
-    logging.debug('build_definitions')
-    definitions = root.find('oval:definitions', namespace)
-    if is_et(definitions):
-        for definition in definitions:
-            primary_key = definition.attrib['id']
-            metadata = definition.find('oval:metadata', namespace)
-            title = metadata.find('oval:title', namespace).text
-            defs[primary_key] = {}
-            definition_data = defs[primary_key]
-            definition_data['title'] = title
-            definition_data['cve'] = []
-            definition_data['tests'] = []
-            references = metadata.findall('oval:reference', namespace)
-            for reference in references:
-                ref_id = reference.attrib['ref_id']
-                ref_url = reference.attrib['ref_url']
-                source = reference.attrib['source']
-                if source in ('RHSA', 'RHBA', 'RHEA'):
-                    definition_data['rhsa'] = {ref_id: ref_url}
-                elif source in ('CVE'):
-                    definition_data['cve'].append({ref_id: ref_url})
-            advisory = metadata.find('oval:advisory', namespace)
-            if is_et(advisory):
-                severity = advisory.find('oval:severity', namespace).text
-                definition_data['severity'] = severity
-                adv_refs = advisory.findall('oval:ref', namespace)
-                advisories = []
-                for ref in adv_refs:
-                    advisories.append(ref.text)
-                definition_data['advisories'] = advisories
-            for criterion in definition.iter():
-                if is_et(criterion) and 'test_ref' in criterion.attrib:
-                    definition_data['tests'].append(criterion.attrib['test_ref'])
-    return defs
-
-
-def build_tests(root, namespace, tsts={}):
-    """Build element tests from source into oval dict"""
-    logging.debug('build_tests')
-    tests = root.find('oval:tests', namespace)
-    if is_et(tests):
-        for test in tests:
-            primary_key = test.attrib['id']
-            comment = test.attrib['comment']
-            test_object = test.find('linux:object', namespace)
-            test_state = test.find('linux:state', namespace)
-            tsts[primary_key] = {}
-            test_data = tsts[primary_key]
-            test_data['comment'] = comment
-            if is_et(test_object) and 'object_ref' in test_object.attrib:
-                test_data['object_ref'] = test_object.attrib['object_ref']
-            if is_et(test_state) and 'state_ref' in test_state.attrib:
-                test_data['state_ref'] = test_state.attrib['state_ref']
-    return tsts
-
-
-def build_objects(root, namespace, objs={}):
-    """Build element objects from source into oval dict"""
-    logging.debug('build_objects')
-    objects = root.find('oval:objects', namespace)
-    if is_et(objects):
-        for obj in objects:
-            primary_key = obj.attrib['id']
-            objs[primary_key] = {}
-            build_data = objs[primary_key]
-            object_name = obj.find('linux:name', namespace)
-            if is_et(object_name):
-                if object_name.text:
-                    name = object_name.text
-                elif object_name.attrib['var_ref']:
-                    name = object_name.attrib['var_ref']
-                build_data['name'] = name
-    return objs
-
-
-def build_states(root, namespace, stes={}):
-    """Build element states from source into oval dict"""
-    logging.debug('build_states')
-    states = root.find('oval:states', namespace)
-    if is_et(states):
-        for state in states:
-            primary_key = state.attrib['id']
-            stes[primary_key] = {}
-            state_data = stes[primary_key]
-            evr = state.find('linux:evr', namespace)
-            if is_et(evr):
-                state_data['version'] = evr.text
-                if 'operation' in evr.attrib:
-                    state_data['operation'] = evr.attrib['operation']
-    return stes
-
-
-def build_vars(root, namespace, vrs={}):
-    """Build element vars from source into oval dict (aka Ubuntu pkg names)"""
-    logging.debug('build_vars')
-    vars = root.find('oval:variables', namespace)
-    if is_et(vars):
-        for vr in vars:
-            primary_key = vr.attrib['id']
-            vrs[primary_key] = {}
-            var_data = vrs[primary_key]
-            var_data['pkg_names'] = []
-            for names in vr:
-                name_elements = names.iter()
-                for value in name_elements:
-                    var_data['pkg_names'].append(value.text)
-    return vrs
+def build_definition(definition):
+    """Build a single definition element"""
+    metadata = definition.find('oval:metadata', NAMESPACE)
+    definition_data = {'title': metadata.find('oval:title', NAMESPACE).text, 'cve': [], 'tests': []}
+    for reference in metadata.findall('oval:reference', NAMESPACE):
+        ref_id = reference.attrib['ref_id']
+        ref_url = reference.attrib.get('ref_url')
+        source = reference.attrib['source']
+        if source in ('RHSA', 'RHBA', 'RHEA'):
+            definition_data['rhsa'] = {ref_id: ref_url}
+        elif source == 'CVE':
+            definition_data['cve'].append({ref_id: ref_url})
+    advisory = metadata.find('oval:advisory', NAMESPACE)
+    if is_et(advisory):
+        severity = advisory.find('oval:severity', NAMESPACE)
+        if is_et(severity):
+            definition_data['severity'] = severity.text
+        definition_data['advisories'] = [ref.text for ref in advisory.findall('oval:ref', NAMESPACE)]
+    for criterion in definition.iter():
+        if 'test_ref' in criterion.attrib:
+            definition_data['tests'].append(criterion.attrib['test_ref'])
+    return definition_data
+
+
+def build_test(test):
+    """Build a single test element"""
+    test_data = {}
+    test_object = test.find('linux:object', NAMESPACE)
+    test_state = test.find('linux:state', NAMESPACE)
+    if is_et(test_object) and 'object_ref' in test_object.attrib:
+        test_data['object_ref'] = test_object.attrib['object_ref']
+    if is_et(test_state) and 'state_ref' in test_state.attrib:
+        test_data['state_ref'] = test_state.attrib['state_ref']
+    return test_data
+
+
+def build_object(obj):
+    """Build a single object element"""
+    build_data = {}
+    object_name = obj.find('linux:name', NAMESPACE)
+    if is_et(object_name):
+        name = object_name.text or object_name.attrib.get('var_ref')
+        if name:
+            build_data['name'] = name
+    return build_data
+
+
+def build_state(state):
+    """Build a single state element"""
+    state_data = {}
+    evr = state.find('linux:evr', NAMESPACE)
+    if is_et(evr):
+        state_data['version'] = evr.text
+        if 'operation' in evr.attrib:
+            state_data['operation'] = evr.attrib['operation']
+    return state_data
+
+
+def build_var(var):
+    """Build a single variable element (aka Ubuntu pkg names)"""
+    pkg_names = []
+    for names in var:
+        for value in names.iter():
+            if value.text:
+                pkg_names.append(value.text)
+    return pkg_names
 
 
 def is_et(item):
@@ -391,25 +397,73 @@ def is_et(item):
     return isinstance(item, ET.Element)
 
 
-def build_element_tree(source_content):
-    """Build an element tree from source content"""
-    logging.debug('build_element_tree')
-    return ET.fromstring(source_content)
+def _tag(prefix, name):
+    """Fully qualified element tag as reported by iterparse"""
+    return '{{{0}}}{1}'.format(NAMESPACE[prefix], name)
 
 
 # Get oval source
-def get_source_content(distro_name, distro_release, distro_codename, base_url, source_file, local_file=None):
-    """Get content from the source"""
-    logging.debug('get_source_content')
-    if not local_file:
-        url = get_definition_source(base_url, source_file, distro_name, distro_release, distro_codename)
-        logging.info('Reading remote file: {0}, this could take some time...'.format(url))
-        source = requests.get(url).content
-        return source
-    else:
+def get_source_file(distro_name, distro_release, distro_codename, base_url, source_file, local_file=None,
+                    index_dir=None):
+    """
+    Get the path and sha256 checksum of the source; remote sources are
+    streamed to disk in chunks instead of being read into memory, and only
+    downloaded again when the server says they changed (ETag/Last-Modified)
+    """
+    logging.debug('get_source_file')
+    if local_file:
         logging.info('Found local file: {0}'.format(local_file))
-        with open(local_file, 'rb') as f:
-            return f.read()
+        return local_file, hubblestack.utils.hashutils.get_hash(local_file, chunk_size=CHUNK_SIZE)
+    url = get_definition_source(base_url, source_file, distro_name, distro_release, distro_codename)
+    path = os.path.join(index_dir or get_index_dir(), os.path.basename(url) or 'oval.xml')
+    meta = read_source_meta(path, url)
+    headers = {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    logging.info('Reading remote file: {0}, this could take some time...'.format(url))
+    response = requests.get(url, stream=True, headers=headers)
+    if response.status_code == 304 and headers:
+        logging.debug('OVAL source {0} is unchanged, using {1}'.format(url, path))
+        response.close()
+        return path, meta['checksum']
+    response.raise_for_status()
+    hash_obj = hashlib.sha256()
+    with hubblestack.utils.files.fopen(path + '.tmp', 'wb') as fh:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            hash_obj.update(chunk)
+            fh.write(chunk)
+    os.rename(path + '.tmp', path)
+    checksum = hash_obj.hexdigest()
+    write_source_meta(path, {'url': url, 'checksum': checksum,
+                             'etag': response.headers.get('ETag'),
+                             'last_modified': response.headers.get('Last-Modified')})
+    return path, checksum
+
+
+def read_source_meta(path, url):
+    """
+    The validators (ETag, Last-Modified) and checksum of the copy of url
+    downloaded to path, or {} if there is no (usable) copy
+    """
+    try:
+        with hubblestack.utils.files.fopen(path + '.meta.json', 'r') as fh:
+            meta = json.load(fh)
+    except (IOError, OSError, ValueError):
+        return {}
+    if not isinstance(meta, dict) or meta.get('url') != url or not meta.get('checksum') \
+            or not os.path.isfile(path):
+        return {}
+    return meta
+
+
+def write_source_meta(path, meta):
+    """Atomically write the validators and checksum of the downloaded source"""
+    tmp_file = path + '.meta.json.tmp'
+    with hubblestack.utils.files.fopen(tmp_file, 'w') as fh:
+        json.dump(meta, fh)
+    os.rename(tmp_file, path + '.meta.json')
 
 
 def get_definition_source(base_url, source_file, distro_name, distro_release, distro_codename):
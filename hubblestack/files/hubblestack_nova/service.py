@@ -103,6 +103,11 @@ def audit(data_list, tags, labels, debug=False, **kwargs):
         log.debug(__tags__)
 
     ret = {'Success': [], 'Failure': [], 'Controlled': []}
+
+    # read the state of every unit once, the service checks answer from it
+    if 'service.units' in __mods__:
+        __mods__['service.units'](refresh=True)
+
     for tag in __tags__:
         if fnmatch.fnmatch(tag, tags):
             for tag_data in __tags__[tag]:
@@ -80,6 +80,13 @@ def audit(data_list, tags, labels, debug=False, **kwargs):
 
     ret = {'Success': [], 'Failure': [], 'Controlled': []}
 
+    # read all the parameters we're going to check in one pass
+    values = None
+    if 'sysctl.snapshot' in __mods__:
+        names = [tag_data['name'] for tag in __tags__ if fnmatch.fnmatch(tag, tags)
+                 for tag_data in __tags__[tag] if 'control' not in tag_data]
+        values = __mods__['sysctl.snapshot'](names, refresh=True)
+
     for tag in __tags__:
         if fnmatch.fnmatch(tag, tags):
             for tag_data in __tags__[tag]:
@@ -90,7 +97,10 @@ def audit(data_list, tags, labels, debug=False, **kwargs):
                 name = tag_data['name']
                 match_output = tag_data['match_output']
 
-                salt_ret = __mods__['sysctl.get'](name)
+                if values is not None:
+                    salt_ret = values[name]
+                else:
+                    salt_ret = __mods__['sysctl.get'](name)
                 if not salt_ret:
                     passed = False
                     tag_data['failure_reason'] = "Could not find attribute '{0}' in" \
@@ -7,6 +7,10 @@ import logging
 
 log = logging.getLogger(__name__)
 
+# the instance identity only changes if the image is booted as another
+# instance, so the metadata services are only queried once per boot
+__grains_ttl__ = 'boot'
+
 def get_cloud_details():
     """
     Gather all cloud details and return them, along with the fieldnames
@@ -34,6 +34,15 @@ except ImportError:
 
 __proxyenabled__ = ['*']
 __FQDN__ = None
+# how long the grains of these functions can be served from the grains cache,
+# see hubblestack.loader._grain_ttl
+__grains_ttl__ = {
+    'get_machine_id': 'boot',
+    'pythonversion': 'static',
+    'pythonpath': 'static',
+    'pythonexecutable': 'static',
+    'saltpath': 'static',
+}
 
 # Extend the default list of supported distros. This will be used for the
 # /etc/DISTRO-release checking that is part of linux_distribution()
@@ -9,6 +9,7 @@ import hubblestack.modules.cmdmod
 
 __mods__ = {'cmd.run_stdout': hubblestack.modules.cmdmod.run_stdout}
 log = logging.getLogger(__name__)
+__grains_ttl__ = 'boot'
 
 
 def get_system_uuid():
@@ -1,11 +1,12 @@
 try:
-    import signal
+    import ctypes
+    import threading
 
-    # windows (et al?) has no concept of signal.SIGALRM force the issue here
-    # and, if applicable, load a fake timer wrapper
+    # the watchdog needs a python we can inject exceptions into; fall back to
+    # a fake timer wrapper (eg on alternate interpreters) if it's unavailable
 
-    assert signal.SIGALRM > 0
-    from hubblestack.hangtime.linux_itimers import HangTime, hangtime_wrapper
+    assert hasattr(ctypes.pythonapi, 'PyThreadState_SetAsyncExc')
+    from hubblestack.hangtime.watchdog import HangTime, hangtime_wrapper, watch, unwatch
 
 except:
-    from .fake import HangTime, hangtime_wrapper
+    from .fake import HangTime, hangtime_wrapper, watch, unwatch
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+Module for handling timeouts in code that may not be designed for it, from any
+number of threads at once.
+
+Every active HangTime, whichever thread it was entered in, is kept in a single
+deadline heap serviced by one watchdog thread. When a deadline passes the
+watchdog:
+
+* marks an ``overrun`` counter (``overrun.<tag>`` for tagged timers) in
+  HubbleStatus and logs the overrun,
+* cancels whatever was registered with ``watch()`` for the timer: subprocesses
+  are killed and sockets are shut down, which unblocks threads waiting on them,
+* raises the HangTime in the thread that entered it. The main thread is sent
+  SIGALRM, which also interrupts blocking calls such as ``time.sleep()``. Other
+  threads get the exception asynchronously; it is raised as soon as the thread
+  runs python code again, so a thread blocked in C code is only freed by the
+  cancellations above.
+"""
+
+import ctypes
+import heapq
+import itertools
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+
+from hubblestack.status import HubbleStatus
+
+log = logging.getLogger('hangtime')
+
+hubble_status = HubbleStatus(__name__)
+
+HAS_SIGALRM = all(hasattr(signal, attr) for attr in ('SIGALRM', 'pthread_kill', 'sigtimedwait'))
+
+_local = threading.local()
+_main_lock = threading.Lock()
+_main_fired = list()
+_main_prev_handler = list()
+
+
+class _Watchdog(object):
+    """ a heap of (deadline, seq, timer) entries and the thread that fires them
+
+        Cancelled or re-armed timers are not removed from the heap; an entry is
+        simply skipped when its deadline no longer matches the timer's.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.heap = list()
+        self.seq = itertools.count()
+        self.thread = None
+
+    def schedule(self, timer, deadline):
+        """ add a deadline for timer, starting the watchdog thread if needed """
+        with self.cond:
+            heapq.heappush(self.heap, (deadline, next(self.seq), timer))
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='hangtime-watchdog')
+                self.thread.daemon = True
+                self.thread.start()
+            self.cond.notify()
+
+    def _next_expired(self):
+        with self.cond:
+            while True:
+                while self.heap and self.heap[0][2].deadline != self.heap[0][0]:
+                    heapq.heappop(self.heap)
+                if not self.heap:
+                    self.cond.wait()
+                    continue
+                wait = self.heap[0][0] - time.monotonic()
+                if wait <= 0:
+                    return heapq.heappop(self.heap)
+                self.cond.wait(wait)
+
+    def _run(self):
+        while True:
+            deadline, _, timer = self._next_expired()
+            try:
+                timer.expire(deadline)
+            except Exception:
+                log.exception("ignoring exception while expiring %s", repr(timer))
+
+    def reset(self):
+        """ forget the watchdog thread (and its lock) after a fork """
+        self.cond = threading.Condition()
+        self.thread = None
+
+
+WATCHDOG = _Watchdog()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=WATCHDOG.reset)
+
+
+def _timers():
+    """ the stack of HangTime blocks active in the current thread """
+    try:
+        return _local.timers
+    except AttributeError:
+        _local.timers = list()
+        return _local.timers
+
+
+def _is_main_thread():
+    return threading.current_thread() is threading.main_thread()
+
+
+def _on_sigalrm(*_sig_param):
+    """ SIGALRM handler: raise the first fired timer still active in the main thread """
+    with _main_lock:
+        fired = list(_main_fired)
+        del _main_fired[:]
+    active = _timers()
+    for timer in fired:
+        if timer in active:
+            raise timer
+
+
+def _restore_sigalrm(handler):
+    """ put back the SIGALRM handler, first discarding an alarm that was sent
+        for a timer but not delivered yet (it would hit the restored handler)
+    """
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+    try:
+        signal.sigtimedwait({signal.SIGALRM}, 0)
+        signal.signal(signal.SIGALRM, handler)
+        with _main_lock:
+            del _main_fired[:]
+    finally:
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGALRM})
+
+
+def _set_async_exc(thread_id, exc_type):
+    """ raise exc_type in the thread thread_id (or clear a pending one if exc_type is None) """
+    exc = ctypes.py_object(exc_type) if exc_type is not None else ctypes.c_void_p(0)
+    return ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread_id), exc)
+
+
+def cancel(obj):
+    """ cancel a watched object: kill a running subprocess, shut down a socket or
+        call any other callable
+    """
+    if hasattr(obj, 'poll') and hasattr(obj, 'kill'):
+        if obj.poll() is None:
+            obj.kill()
+    elif isinstance(obj, socket.socket):
+        try:
+            obj.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    elif callable(obj):
+        obj()
+
+
+def watch(obj):
+    """ register obj (a subprocess.Popen, a socket or a callable) with every
+        HangTime active in the current thread, so it gets cancelled if any of
+        them expires. Returns obj.
+    """
+    for timer in _timers():
+        timer.watch(obj)
+    return obj
+
+
+def unwatch(obj):
+    """ unregister obj from every HangTime active in the current thread """
+    for timer in _timers():
+        timer.unwatch(obj)
+
+
+class HangTime(Exception):
+    """
+    HangTime exception that handles timeouts in code by registering deadlines
+    with the watchdog thread. Any number of HangTime blocks can be active in
+    any number of threads.
+    """
+
+    def __init__(self, timeout=300, tag=None, repeats=False, decay=1.0):
+        """ HangTime wraps code via with block.
+
+        ... code-block:: python
+            try:
+                with HangTime(timeout=1, tag=1) as ht:
+                    ht.watch(subprocess.Popen(...))
+                    do_things_that_may_timeout()
+                except HangTime as ht:
+                    if ht.tag == 1:
+                        log.error("something bad happened (code-1):", ht) # w/o traceback
+                        log.error(ht) # with traceback
+
+        :param int timeout: timeout in seconds, default 300s
+
+        :param any tag: a tag for differentiating (eg nested) timeouts, default None
+
+        :param bool repeats: by default, HangTime simply raises itself as an
+          exception when a timeout is reached and is then done.
+
+          In repeats mode, HangTime will instead raise the exception and then
+          restart the timer. This is useful in situations where the wrapped
+          code catches exceptions internally.
+
+        :param float decay: if the timer repeats, the decay (default: 1.0)
+          is multiplied against the timeout each time the timer fires (though
+          the timer will never go below 100ms).
+        """
+        self.timeout = timeout
+        self.started = 0
+        self.tag = tag
+        self.repeats = repeats
+        self.decay = float(decay)
+        self.deadline = None
+        self.active = False
+        self.fired = 0
+        self.thread = None
+        self.watched = list()
+        self._lock = threading.Lock()
+        super(HangTime, self).__init__(repr(self))
+
+    def __repr__(self):
+        return "HT({:0.2f}s, tag={})".format(self.timeout, self.tag)
+
+    def watch(self, obj):
+        """ cancel obj (see cancel()) if this timer expires; returns obj """
+        with self._lock:
+            self.watched.append(obj)
+        return obj
+
+    def unwatch(self, obj):
+        """ stop watching obj """
+        with self._lock:
+            if obj in self.watched:
+                self.watched.remove(obj)
+
+    def _arm(self):
+        self.deadline = time.monotonic() + self.timeout
+        WATCHDOG.schedule(self, self.deadline)
+
+    def _expired_type(self):
+        """ exception type raised asynchronously in non-main threads; the
+            interpreter instantiates it without arguments, so it copies this
+            timer's settings
+        """
+        timer = self
+
+        class HangTimeExpired(HangTime):
+            def __init__(self):  # pylint: disable=super-init-not-called
+                HangTime.__init__(self, timeout=timer.timeout, tag=timer.tag,
+                                  repeats=timer.repeats, decay=timer.decay)
+                self.timer = timer
+
+        return HangTimeExpired
+
+    def expire(self, deadline):
+        """ called by the watchdog thread when the deadline passes; flags the
+            overrun, cancels watched objects, re-arms repeating timers and
+            raises the exception in the thread that owns the timer
+        """
+        with self._lock:
+            if self.deadline != deadline:
+                return
+            self.fired += 1
+            if self.repeats:
+                self.timeout = max(0.1, self.timeout * self.decay)
+                log.debug("restarting timer %s", repr(self))
+                self._arm()
+            else:
+                self.deadline = None
+            watched = list(self.watched)
+        log.info("timer fired on %s", repr(self))
+        name = 'overrun' if self.tag is None else 'overrun.{0}'.format(self.tag)
+        hubble_status.add_resource(name)
+        hubble_status.mark(name)
+        for obj in watched:
+            try:
+                cancel(obj)
+            except Exception:
+                log.exception("unable to cancel %s watched by %s", obj, repr(self))
+        # deliver under the lock so __exit__ never races with a pending delivery
+        with self._lock:
+            if not self.active:
+                return
+            if self.thread is threading.main_thread() and HAS_SIGALRM:
+                with _main_lock:
+                    _main_fired.append(self)
+                signal.pthread_kill(self.thread.ident, signal.SIGALRM)
+            else:
+                _set_async_exc(self.thread.ident, self._expired_type())
+
+    def __enter__(self):
+        """ the logic that starts the timers is normally fired by the with
+            keyword though, with just calls this __enter__ function. The timer
+            is registered with the watchdog here.
+        """
+        log.debug("watching for process hangs %s", repr(self))
+        self.thread = threading.current_thread()
+        timers = _timers()
+        if _is_main_thread() and HAS_SIGALRM and not timers:
+            _main_prev_handler.append(signal.signal(signal.SIGALRM, _on_sigalrm))
+        timers.append(self)
+        self.started = time.time()
+        with self._lock:
+            self.active = True
+            self._arm()
+        return self
+
+    def __exit__(self, e_type, e_obj, e_tb):
+        """ when the code leaves the a HangTime with block, execution enters this __exit__
+            method. It disarms the timer and drops any exception that fired too
+            late to matter.
+        """
+        while True:
+            try:
+                self._disarm(late=isinstance(e_obj, HangTime))
+                break
+            except HangTime:
+                # delivered while disarming, after the block ended: the timer
+                # is (being) disarmed, so at most one more can be pending
+                continue
+        if isinstance(e_obj, HangTime):
+            log.debug("%s exited with-block via exception", repr(self))
+        else:
+            log.debug("%s exited with-block normally", repr(self))
+
+    def _disarm(self, late=False):
+        """ take the timer off the thread's stack and out of the watchdog's
+            reach; safe to call again if interrupted
+        """
+        # first, so a dead timer never stays on the stack (nor gets raised
+        # by the SIGALRM handler)
+        timers = _timers()
+        if self in timers:
+            timers.remove(self)
+        with self._lock:
+            self.active = False
+            self.deadline = None
+            fired = self.fired
+            self.watched = list()
+        if fired and not late and not self.repeats and not _is_main_thread() \
+                and not any(timer.fired for timer in timers):
+            # the block finished before the asynchronous exception was raised
+            _set_async_exc(self.thread.ident, None)
+        if not timers:
+            if _is_main_thread() and HAS_SIGALRM and _main_prev_handler:
+                # popped after it is restored, so an interrupted restore is redone
+                _restore_sigalrm(_main_prev_handler[-1])
+                _main_prev_handler.pop()
+            log.debug("nolonger watching for process hangs %s", repr(self))
+
+
+def hangtime_wrapper(**ht_kw):
+    """ wrap decroated function in a with HangTime block and guard against exceptions
+        The options are roughly the same as for HangTime with a minor exception.
+        options:
+            callback: called with the HangTime exception when the timeout is
+              reached; the exception is logged unless the callback returns a
+              truthy value
+    """
+    callback = ht_kw.pop('callback', None)
+
+    def _decorator(actual):
+        def _frobnicator(*a, **kw):
+            try:
+                with HangTime(**ht_kw):
+                    return actual(*a, **kw)
+            except HangTime as hangtime_exception:
+                res = False
+                if callback:
+                    try:
+                        res = callback(hangtime_exception)
+                    except Exception:
+                        pass
+                if not res:
+                    log.error(hangtime_exception, exc_info=True)
+
+        return _frobnicator
+
+    return _decorator
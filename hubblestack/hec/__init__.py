@@ -1,4 +1,5 @@
 # -*- encoding: utf-8 -*-
 
-from . obj import Payload, HEC, http_event_collector
+from . obj import Payload, PayloadTemplate, HEC, http_event_collector
 from . opt import get_splunk_options, make_hec_args
+from . fanout import fan_out
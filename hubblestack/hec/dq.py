@@ -6,7 +6,9 @@ import logging
 import time
 import shutil
 import json
+import threading
 from collections import deque
+from functools import wraps
 from hubblestack.utils.misc import numbered_file_split_key
 from hubblestack.utils.encoding import encode_something_to_bytes, decode_something_to_string
 
@@ -19,9 +21,24 @@ log = logging.getLogger(__name__)
 
 OK_TYPES = (str,)
 SPLUNK_MAX_MSG = 100000 # 100k
+GZIP_MAGIC = b'\x1f\x8b' # already compressed HEC request bodies start with this
 DEFAULT_MEMORY_SIZE = SPLUNK_MAX_MSG * 5 # 500k
 DEFAULT_DISK_SIZE = DEFAULT_MEMORY_SIZE * 1000 # 0.5GB
 
+def is_gzip(dat):
+    """ whether dat is a gzip compressed (bytes) item """
+    return isinstance(dat, bytes) and dat.startswith(GZIP_MAGIC)
+
+def _locked(func):
+    """ hold the queue's lock for the duration of the method; a DiskQueue may
+        be put to by returners while a background flusher drains it
+    """
+    @wraps(func)
+    def inner(self, *a, **kw):
+        with self.lock:
+            return func(self, *a, **kw)
+    return inner
+
 class QueueTypeError(Exception):
     pass
 
@@ -55,12 +72,13 @@ class NoQueue(object):
 
 class DiskQueue(OKTypesMixin):
     sep = b' '
-    cn = sz = 0
+    cn = sz = seq = 0
 
     def __init__(self, directory, size=DEFAULT_DISK_SIZE, ok_types=OK_TYPES, fresh=False, compression=0):
         self.init_types(ok_types)
         self.init_dq(directory, size)
         self.compression = compression
+        self.lock = threading.RLock()
         log.debug('DiskQueue.__init__(%s, compression=%d)', directory, compression)
         if fresh:
             self.clear()
@@ -73,7 +91,7 @@ class DiskQueue(OKTypesMixin):
 
     def compress(self, dat):
         dat = encode_something_to_bytes(dat)
-        if not self.compression:
+        if not self.compression or is_gzip(dat):
             return dat
         def _bz2(x):
             b = bz2.BZ2Compressor(self.compression)
@@ -96,6 +114,15 @@ class DiskQueue(OKTypesMixin):
                 pass
         return dat
 
+    @staticmethod
+    def finish(dat):
+        """ gzip compressed items are returned as they were put (bytes), the
+            others as strings
+        """
+        if is_gzip(dat):
+            return dat
+        return decode_something_to_string(dat)
+
     def init_dq(self, directory, size):
         self.directory = directory
         self.size = size
@@ -108,10 +135,12 @@ class DiskQueue(OKTypesMixin):
             os.makedirs(d)
         return d
 
+    @_locked
     def clear(self):
         """ clear the queue """
         if os.path.isdir(self.directory):
             shutil.rmtree(self.directory)
+        self.cn = self.sz = self.seq = 0
 
     def _fanout(self, name):
         return (name[0:4], name[4:])
@@ -122,6 +151,7 @@ class DiskQueue(OKTypesMixin):
             return False
         return True
 
+    @_locked
     def put(self, item, **meta):
         """ Put an item in the queue at the end (FIFO order)
             put() also takes an arbitrary number of meta data items (kwargs); which,
@@ -131,7 +161,10 @@ class DiskQueue(OKTypesMixin):
         bstr = self.compress(item)
         if not self.accept(bstr):
             raise QueueCapacityError('refusing to accept item due to size')
-        fanout, remainder = self._fanout('{0}.{1}'.format(int(time.time()), self.cn))
+        # seq only ever grows; cn shrinks as items are taken from the front
+        # and would repeat the name of an item still in the queue
+        self.seq = max(self.seq, self.cn)
+        fanout, remainder = self._fanout('{0}.{1}'.format(int(time.time()), self.seq))
         d = self._mkdir(fanout)
         f = os.path.join(d, remainder)
         with open(f, 'wb') as fh:
@@ -141,6 +174,7 @@ class DiskQueue(OKTypesMixin):
             with open(f + '.meta', 'w') as fh:
                 json.dump(meta, fh)
         self.cn += 1
+        self.seq += 1
         self.sz += len(bstr)
         if self.double_check_cnsz:
             self._count(double_check_only=True, tag='put')
@@ -163,7 +197,7 @@ class DiskQueue(OKTypesMixin):
         """
         for fname in self.files:
             with open(fname, 'rb') as fh:
-                return decode_something_to_string(self.decompress(fh.read())), self.read_meta(fname)
+                return self.finish(self.decompress(fh.read())), self.read_meta(fname)
 
     def iter_peek(self):
         ''' iterate and return all items in the disk queue (without removing any) '''
@@ -177,6 +211,7 @@ class DiskQueue(OKTypesMixin):
             with open(fname, 'rb') as fh:
                 yield self.decompress(fh.read()), self.read_meta(fname)
 
+    @_locked
     def get(self):
         """ get the next item from the queue
             returns: data_octets, meta_data_dict
@@ -191,8 +226,9 @@ class DiskQueue(OKTypesMixin):
             self.sz -= sz
             if self.double_check_cnsz:
                 self._count(double_check_only=True, tag='get')
-            return decode_something_to_string(dat), mdat
+            return self.finish(dat), mdat
 
+    @_locked
     def getz(self, sz=SPLUNK_MAX_MSG):
         """ fetch items from the queue and concatenate them together using the
             spacer ' ' until the size reaches (but does not exceed) the size
@@ -201,6 +237,9 @@ class DiskQueue(OKTypesMixin):
             kwargs:
                 sz : the maxsize of the queue fetch (default: SPLUNK_MAX_MSG=100k)
 
+            gzip compressed items can't be concatenated; they are always
+            returned alone (as bytes)
+
             returns: data_octets, meta_data_dict
         """
         # Is it "dangerous" to unlink files during the os.walk (via generator)?
@@ -211,6 +250,8 @@ class DiskQueue(OKTypesMixin):
             with open(fname, 'rb') as fh:
                 partial_data = self.decompress(fh.read())
             if ret:
+                if is_gzip(ret) or is_gzip(partial_data):
+                    break
                 if len(ret) + len(self.sep) + len(partial_data) > sz:
                     break
                 ret += self.sep
@@ -234,8 +275,9 @@ class DiskQueue(OKTypesMixin):
             #
             # occasionally this will return something pessimistic
             meta_data[k] = max(meta_data[k])
-        return decode_something_to_string(ret), meta_data
+        return self.finish(ret), meta_data
 
+    @_locked
     def pop(self):
         """ remove the next item from the queue (do not return it); useful with .peek() """
         for fname in self.files:
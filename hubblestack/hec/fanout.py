@@ -0,0 +1,53 @@
+# -*- encoding: utf-8 -*-
+"""
+Dispatch the same events to every configured HEC endpoint at once.
+
+Returners build their events once and hand a send function to fan_out(),
+which calls it for each endpoint's options. With more than one endpoint the
+calls run concurrently on worker threads, so a slow (or down) endpoint no
+longer delays the others. Each call creates its own HEC object, so batching,
+retries and disk queueing stay independent per endpoint.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+MAX_WORKERS = 8
+
+
+def _describe(opts):
+    if isinstance(opts, dict):
+        return '{0}/{1}'.format(opts.get('indexer'), opts.get('index'))
+    return repr(opts)
+
+
+def _call(send, opts, args, kwargs, what):
+    try:
+        return send(opts, *args, **kwargs)
+    except Exception:
+        log.exception('Error occurred in %s sending to %s', what, _describe(opts))
+    return None
+
+
+def fan_out(opts_list, send, *args, **kwargs):
+    """ call send(opts, *args, **kwargs) for every opts in opts_list and
+        return the results (in the order of opts_list)
+
+        An exception raised for one endpoint is logged and gives a None
+        result; the other endpoints are not affected.
+
+        optional kwargs (not passed on to send):
+            what: a name for the log messages (default: the name of send)
+            max_workers: the most endpoints sent to at once (default: MAX_WORKERS)
+    """
+    what = kwargs.pop('what', getattr(send, '__name__', 'fan_out'))
+    max_workers = kwargs.pop('max_workers', MAX_WORKERS)
+    opts_list = list(opts_list)
+    if len(opts_list) < 2 or max_workers < 2:
+        return [_call(send, opts, args, kwargs, what) for opts in opts_list]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(opts_list)),
+                            thread_name_prefix='hec-fan-out') as executor:
+        futures = [executor.submit(_call, send, opts, args, kwargs, what) for opts in opts_list]
+        return [future.result() for future in futures]
@@ -0,0 +1,197 @@
+# -*- encoding: utf-8 -*-
+"""
+Drain a HEC disk queue from a background thread.
+
+By default a HEC replays its disk queue inline: the first successful send
+after an outage calls flushQueue(), which loops until the queue is empty (or
+something new gets queued) — on whatever thread happened to send, usually the
+scheduler. With disk_queue_flush_background, a successful send only kicks the
+QueueFlusher of the queue and returns; the flusher drains the queue on its own
+thread:
+
+* at most flush_events_per_second queued items and flush_bytes_per_second
+  octets per second (0 means unlimited),
+* backing off (flush_backoff seconds, doubling up to flush_max_backoff) while
+  the sends fail; the failed batch goes back into the queue as usual,
+* publishing its progress as HubbleStatus gauges (see stats()).
+"""
+
+import logging
+import threading
+import time
+
+from hubblestack.status import HubbleStatus
+from . dq import SPLUNK_MAX_MSG
+
+log = logging.getLogger(__name__)
+
+hubble_status = HubbleStatus(__name__)
+
+IDLE_INTERVAL = 60 # check the queue at least this often (seconds), even without kicks
+EMA_WEIGHT = 0.2
+
+
+class QueueFlusher(object):
+    """ the background drain of one disk queue (see the module docs)
+
+        The flusher sends with the HEC object that kicked it last, so it always
+        uses the current configuration (and connection pool) of the endpoint.
+    """
+
+    def __init__(self, queue, name, events_per_second=0, bytes_per_second=0,
+                 backoff=5, max_backoff=300):
+        self.queue = queue
+        self.name = name
+        self.events_per_second = events_per_second
+        self.bytes_per_second = bytes_per_second
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hec = None
+        self.thread = None
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.drained_events = 0
+        self.drained_bytes = 0
+        self.rate_events = None
+        self.rate_bytes = None
+
+    def configure(self, events_per_second=0, bytes_per_second=0, backoff=5, max_backoff=300):
+        """ update the limits (from the most recently created HEC) """
+        self.events_per_second = events_per_second
+        self.bytes_per_second = bytes_per_second
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def kick(self, hec):
+        """ note that hec can reach its endpoint and have the queue drained
+            (starting the flusher thread if needed); returns immediately
+        """
+        with self.lock:
+            self.hec = hec
+            if self.thread is None or not self.thread.is_alive():
+                self.stopping.clear()
+                self.thread = threading.Thread(target=self._run,
+                                               name='hec-flusher-{0}'.format(self.name))
+                self.thread.daemon = True
+                self.thread.start()
+        self.wake.set()
+
+    def stop(self, timeout=None):
+        """ stop the flusher thread (after the batch it's sending, if any) """
+        self.stopping.set()
+        self.wake.set()
+        thread = self.thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self.stopping.is_set():
+            self.wake.wait(IDLE_INTERVAL)
+            self.wake.clear()
+            if self.stopping.is_set():
+                break
+            try:
+                self.drain()
+            except Exception:
+                log.exception('ignoring exception while draining %s', self.name)
+
+    def _fetch_size(self):
+        """ the most octets to take from the queue in one batch """
+        size = getattr(self.hec, 'maxByteLength', SPLUNK_MAX_MSG) or SPLUNK_MAX_MSG
+        if self.bytes_per_second:
+            size = min(size, self.bytes_per_second)
+        return size
+
+    def _throttle(self, started, events, octets):
+        """ sleep long enough for the batch to fit the rate limits """
+        needed = 0
+        if self.events_per_second:
+            needed = float(events) / self.events_per_second
+        if self.bytes_per_second:
+            needed = max(needed, float(octets) / self.bytes_per_second)
+        remaining = needed - (time.monotonic() - started)
+        if remaining > 0:
+            self.stopping.wait(remaining)
+
+    def _record(self, started, events, octets):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.drained_events += events
+        self.drained_bytes += octets
+        rate_events = events / elapsed
+        rate_bytes = octets / elapsed
+        if self.rate_events is None:
+            self.rate_events, self.rate_bytes = rate_events, rate_bytes
+        else:
+            self.rate_events += EMA_WEIGHT * (rate_events - self.rate_events)
+            self.rate_bytes += EMA_WEIGHT * (rate_bytes - self.rate_bytes)
+        self.publish()
+
+    def drain(self):
+        """ send the queue (one batch at a time) until it's empty, the flusher
+            is stopped or a send fails; after a failure, wait out the backoff
+            (a kick cuts it short) and return
+        """
+        queue = self.queue
+        if queue.cn < 1:
+            self.publish()
+            return
+        self.hec._direct_send_msg('queue(flush) eventscount=%d', queue.cn)
+        log.error('flushing queue eventscount=%d in the background; NOTE: queued events may'
+                  ' contain more than one payload/event', queue.cn)
+        while queue.cn > 0 and not self.stopping.is_set():
+            hec = self.hec
+            started = time.monotonic()
+            with queue.lock:
+                before = queue.cn
+                dat, meta_data = queue.getz(self._fetch_size())
+                events = max(before - queue.cn, 1)
+            if not dat:
+                break
+            log.debug('pulled %d octets (%d items) from queue; meta_data: %s',
+                      len(dat), events, meta_data)
+            if hec._send(dat, meta_data=meta_data) is None:
+                self.failures += 1
+                delay = min(self.backoff * 2 ** (self.failures - 1), self.max_backoff)
+                log.error('background flush of %s failed %d time(s), backing off %0.1fs',
+                          self.name, self.failures, delay)
+                self.publish()
+                self.wake.clear()
+                self.wake.wait(delay)
+                return
+            self.failures = 0
+            self._throttle(started, events, len(dat))
+            self._record(started, events, len(dat))
+        if queue.cn < 1:
+            self.hec._direct_send_msg('queue(end)')
+            log.error('flushing complete eventscount=%d', queue.cn)
+        self.publish()
+
+    @property
+    def eta(self):
+        """ the estimated seconds until the queue is empty (None if unknown) """
+        if self.queue.cn < 1:
+            return 0
+        if not self.rate_events:
+            return None
+        return self.queue.cn / self.rate_events
+
+    def stats(self):
+        """ return the state of the drain as a dict """
+        return {
+            'events': self.queue.cn,
+            'bytes': self.queue.sz,
+            'drained_events': self.drained_events,
+            'drained_bytes': self.drained_bytes,
+            'drain_events_per_second': self.rate_events or 0,
+            'drain_bytes_per_second': self.rate_bytes or 0,
+            'eta_seconds': self.eta,
+            'failures': self.failures,
+        }
+
+    def publish(self):
+        """ set the HubbleStatus gauges queue.<name>.<stat> from stats() """
+        for key, value in self.stats().items():
+            if value is not None:
+                hubble_status.gauge('queue.{0}.{1}'.format(self.name, key), value)
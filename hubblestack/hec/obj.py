@@ -6,6 +6,8 @@ import time
 import copy
 import os
 import hashlib
+import threading
+import zlib
 
 import certifi
 import urllib3
@@ -16,20 +18,61 @@ log = logging.getLogger(__name__)
 import hubblestack.status
 hubble_status = hubblestack.status.HubbleStatus(__name__)
 
-from . dq import DiskQueue, NoQueue, QueueCapacityError
+from . dq import DiskQueue, NoQueue, QueueCapacityError, is_gzip
+from . flusher import QueueFlusher
 from hubblestack.utils.stdrec import update_payload
 from hubblestack.utils.encoding import encode_something_to_bytes
 
 __version__ = '1.0'
 
 _max_content_bytes = 100000
+_max_compressed_bytes = 100000
 http_event_collector_debug = False
 
+# octets gzipped into request bodies (in, out) by this process, for the
+# gzip:ratio gauge
+_gzip_totals = [0, 0]
+_gzip_totals_lock = threading.Lock()
+
 # the list of collector URLs given to the HEC object
 # are hashed into an md5 string that identifies the URL set
 # these maximums are per URL set, not for the entire disk cache
 max_diskqueue_size  = 10 * (1024 ** 2)
 
+# payloads are stringified with the fastest json library available; the
+# stdlib json module is used if neither is installed, or for objects the
+# faster library refuses (e.g. integers beyond 64 bits)
+try:
+    import orjson
+    json_backend = 'orjson'
+
+    def _fast_dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+except ImportError:
+    try:
+        import ujson
+        json_backend = 'ujson'
+
+        def _fast_dumps(obj):
+            return ujson.dumps(obj, escape_forward_slashes=False)
+    except ImportError:
+        json_backend = 'json'
+        _fast_dumps = json.dumps
+
+def json_dumps(obj):
+    try:
+        return _fast_dumps(obj)
+    except (TypeError, ValueError, OverflowError):
+        return json.dumps(obj)
+
+def _time_json(eventtime):
+    """ json_dumps() for the usual (int or float) event times """
+    if type(eventtime) is int: # pylint: disable=unidiomatic-typecheck
+        return str(eventtime)
+    if type(eventtime) is float and eventtime - eventtime == 0: # pylint: disable=unidiomatic-typecheck
+        return repr(eventtime)
+    return json_dumps(eventtime)
+
 def count_input(payload):
     hs_key = ':'.join(['input', payload.sourcetype])
     hubble_status.add_resource(hs_key)
@@ -38,6 +81,32 @@ def count_input(payload):
     # that ensures the first_t and last_t include the given timestamp
     # (without this, the accounting likely wouldn't work)
 
+def count_inputs(payloads):
+    """ count_input() for a whole batch of payloads: one add_resource() per
+        sourcetype and one mark() per sourcetype and status bucket
+    """
+    bucket_len = int(hubblestack.status.get_hubble_status_opt('bucket_len'))
+    groups = dict()
+    for payload in payloads:
+        try:
+            timestamp = int(float(payload.time))
+        except (TypeError, ValueError):
+            timestamp = int(time.time())
+        key = (payload.sourcetype, timestamp - timestamp % bucket_len)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = [timestamp, timestamp, 1]
+        else:
+            group[0] = min(group[0], timestamp)
+            group[1] = max(group[1], timestamp)
+            group[2] += 1
+    for (sourcetype, _), (first_t, last_t, count) in groups.items():
+        hs_key = ':'.join(['input', sourcetype])
+        hubble_status.add_resource(hs_key)
+        hubble_status.mark(hs_key, timestamp=first_t)
+        if count > 1:
+            hubble_status.mark(hs_key, timestamp=last_t, count=count - 1)
+
 class Payload(object):
     """ formatters for final payload stringification
         and a convenient place to store retry counter information
@@ -66,6 +135,16 @@ class Payload(object):
         payload['event'] = event
         return cls(payload)
 
+    @classmethod
+    def rendered(cls, dat, sourcetype, eventtime, no_queue=False):
+        """ wrap an already stringified payload (see PayloadTemplate) """
+        payload = cls.__new__(cls)
+        payload.no_queue = no_queue
+        payload.sourcetype = sourcetype
+        payload.time = eventtime
+        payload.dat = dat
+        return payload
+
     @classmethod
     def promote(cls, payload, eventtime='', no_queue=False):
         if isinstance(payload, cls):
@@ -90,7 +169,7 @@ class Payload(object):
         self.sourcetype = dat.get('sourcetype', 'hubble')
         self.time       = dat.get('time', now)
 
-        self.dat = json.dumps(dat)
+        self.dat = json_dumps(dat)
 
     def __repr__(self):
         return 'Payload({0})'.format(self)
@@ -102,6 +181,197 @@ class Payload(object):
         return len(self.dat)
 
 
+class PayloadTemplate(object):
+    """ a pre-rendered envelope for many payloads that share their host, index,
+        sourcetype and some of their event fields
+
+        Returners usually send many events that only differ by a few fields.
+        The template stringifies the constant part once and splices in only the
+        per-event fields:
+
+        tpl = PayloadTemplate(host='h', index='i', sourcetype='s',
+            defaults={'minion_id': 'm'}, overrides={'custom_site': 'x'},
+            index_extracted_fields=['minion_id'])
+        hec.batchEvent(tpl.payload({'action': 'read'}, eventtime=ts))
+
+        The event of the payload is defaults, updated with the event given to
+        payload(), updated with overrides; empty string values are then
+        dropped. Index extracted fields are added to the payload fields as
+        meta_<name> like the returners always did.
+    """
+
+    def __init__(self, host=None, index=None, sourcetype='hubble', defaults=None,
+                 overrides=None, index_extracted_fields=None):
+        if host is None:
+            if Payload.host is None:
+                Payload.host = socket.gethostname()
+            host = Payload.host
+        self.sourcetype = sourcetype
+        envelope = {'host': host, 'sourcetype': sourcetype}
+        if index is not None:
+            envelope['index'] = index
+        self.prefix = json_dumps(envelope)[:-1] + ',"time":'
+        self.defaults = dict(defaults or {})
+        self.overrides = dict(overrides or {})
+        self.index_extracted_fields = list(index_extracted_fields or [])
+        self.constant_keys = frozenset(self.defaults).union(self.overrides)
+        defaults = dict((k, v) for k, v in self.defaults.items()
+                        if k not in self.overrides and v != "")
+        overrides = dict((k, v) for k, v in self.overrides.items() if v != "")
+        self.defaults_json = self._members(defaults)
+        self.overrides_json = self._members(overrides)
+        defaults.update(overrides)
+        self.constant_fields = self._fields(defaults)
+
+    @staticmethod
+    def _members(dat):
+        """ the stringified members of dat, without the enclosing braces """
+        return json_dumps(dat)[1:-1] if dat else ''
+
+    def _fields(self, event):
+        fields = {}
+        for item in self.index_extracted_fields:
+            if item in event and not isinstance(event[item], (list, dict, tuple)):
+                fields["meta_%s" % item] = str(event[item])
+        return fields
+
+    def render(self, event, eventtime=''):
+        """ return the stringified payload for event and the time it was given """
+        if self.constant_keys.isdisjoint(event):
+            if "" in event.values():
+                event = dict((k, v) for k, v in event.items() if v != "")
+            body = json_dumps(event)
+            if self.defaults_json:
+                body = '{' + self.defaults_json + (',' + body[1:] if len(body) > 2 else '}')
+            if self.overrides_json:
+                body = body[:-1] + (',' if len(body) > 2 else '') + self.overrides_json + '}'
+            fields = self.constant_fields
+            if self.index_extracted_fields:
+                event_fields = self._fields(event)
+                if event_fields:
+                    fields = dict(fields, **event_fields)
+        else:
+            # the event redefines some constant fields; build it the long way
+            merged = dict(self.defaults)
+            merged.update(event)
+            merged.update(self.overrides)
+            merged = dict((k, v) for k, v in merged.items() if v != "")
+            body = json_dumps(merged)
+            fields = self._fields(merged)
+        if not eventtime:
+            eventtime = time.time()
+        if fields:
+            return '{0}{1},"event":{2},"fields":{3}}}'.format(
+                self.prefix, json_dumps(eventtime), body, json_dumps(fields)), eventtime
+        return '{0}{1},"event":{2}}}'.format(self.prefix, json_dumps(eventtime), body), eventtime
+
+    def payload(self, event, eventtime='', no_queue=False):
+        """ return a Payload for event (see render()) """
+        dat, eventtime = self.render(event, eventtime=eventtime)
+        return Payload.rendered(dat, self.sourcetype, eventtime, no_queue=no_queue)
+
+    def payloads(self, rows, no_queue=False):
+        """ return a Payload for every (event, eventtime) in rows; the same as
+            [tpl.payload(event, eventtime) for event, eventtime in rows], but
+            with the per-event lookups done once for all the rows
+        """
+        ret = []
+        append = ret.append
+        rendered = Payload.rendered
+        sourcetype = self.sourcetype
+        prefix = self.prefix
+        constant_keys = self.constant_keys
+        defaults_json = self.defaults_json
+        overrides_json = self.overrides_json
+        if self.index_extracted_fields:
+            # the fields depend on the events; no shortcut
+            for event, eventtime in rows:
+                dat, eventtime = self.render(event, eventtime=eventtime)
+                append(rendered(dat, sourcetype, eventtime, no_queue=no_queue))
+            return ret
+        suffix = ',"fields":{0}}}'.format(json_dumps(self.constant_fields)) if self.constant_fields else '}'
+        # payload = head + time + middle + the members of the event + tail
+        middle = ',"event":{' + defaults_json
+        tail = (',' if overrides_json else '') + overrides_json + '}' + suffix
+        if defaults_json:
+            middle += ','
+        empty = ',"event":{' + (defaults_json + ',' + overrides_json).strip(',') + '}' + suffix
+        dumps = _fast_dumps
+        now = time.time()
+        for event, eventtime in rows:
+            if not constant_keys.isdisjoint(event) or "" in event.values():
+                dat, eventtime = self.render(event, eventtime=eventtime or now)
+                append(rendered(dat, sourcetype, eventtime, no_queue=no_queue))
+                continue
+            if not eventtime:
+                eventtime = now
+            if event:
+                try:
+                    body = dumps(event)
+                except (TypeError, ValueError, OverflowError):
+                    body = json.dumps(event)
+                dat = ''.join((prefix, _time_json(eventtime), middle, body[1:-1], tail))
+            else:
+                dat = prefix + _time_json(eventtime) + empty
+            append(rendered(dat, sourcetype, eventtime, no_queue=no_queue))
+        return ret
+
+
+class GzipBatch(object):
+    """ A gzip compressed HEC request body that payloads are added to as they
+        arrive, so the size of the compressed body is known (or bounded) while
+        the batch is still being built.
+
+        The compressor buffers its input, so the compressed size is only known
+        exactly after a sync(); until then the uncompressed pending bytes are
+        counted as if they didn't compress at all. projected() is therefore
+        an upper bound and the caller only needs to sync() (which costs a few
+        bytes and a little compression) when the bound reaches the budget.
+    """
+    MARGIN = 64 # gzip header, trailer and a final empty block (with room to spare)
+
+    def __init__(self, level=6):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        self.chunks = list()
+        self.emitted = 0
+        self.pending = 0
+        self.raw = 0
+        self.count = 0
+
+    def _emit(self, chunk):
+        if chunk:
+            self.chunks.append(chunk)
+            self.emitted += len(chunk)
+
+    def projected(self, octets=0):
+        """ the most the body could compress to with octets more (uncompressed) bytes """
+        return self.emitted + self.pending + octets + octets // 1000 + self.MARGIN
+
+    def sync(self):
+        """ flush the compressor so emitted is the exact compressed size so far """
+        if self.pending:
+            self._emit(self.compressor.flush(zlib.Z_SYNC_FLUSH))
+            self.pending = 0
+
+    def add(self, dat):
+        dat = encode_something_to_bytes(dat)
+        if self.count:
+            dat = b' ' + dat
+        self._emit(self.compressor.compress(dat))
+        self.pending += len(dat)
+        self.raw += len(dat)
+        self.count += 1
+
+    def finish(self):
+        """ return the complete gzip body; the batch can't be added to afterwards """
+        self._emit(self.compressor.flush(zlib.Z_FINISH))
+        self.pending = 0
+        return b''.join(self.chunks)
+
+    def __len__(self):
+        return self.count
+
+
 class OutageInfo(object):
     def __init__(self):
         self.last_check = self.start = time.time()
@@ -123,11 +393,25 @@ class OutageInfo(object):
 # 100,000 to avoid http event collector breaking connection Auto flush will
 # occur if next event payload will exceed limit
 
+class QueueState(object):
+    """ the flush bookkeeping shared by all the HEC objects that use the same
+        set of collector URLs (and therefore the same disk queue); HEC objects
+        for different endpoints may be flushing in other threads at the same
+        time (see fanout.py)
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_flush = 0
+        self.flushing = False
+        self.abort = False
+        self.direct_logging = False
+        self.queue = None
+        self.flusher = None
+
+
 class HEC(object):
-    last_flush = 0
-    flushing_queue = False
-    abort_flush    = False
-    direct_logging = False
+    queue_states = dict()
+    queue_states_lock = threading.Lock()
     outages = dict()
     fails = dict()
 
@@ -177,7 +461,10 @@ class HEC(object):
                  max_bytes=_max_content_bytes, proxy=None, timeout=9.05,
                  disk_queue=False, disk_queue_size=max_diskqueue_size,
                  disk_queue_compression=5, max_queue_cycles=80, max_bad_request_cycles=40,
-                 outage_recheck_time=300, num_fails_indicate_outage=10):
+                 outage_recheck_time=300, num_fails_indicate_outage=10,
+                 gzip=False, gzip_level=6, max_compressed_bytes=_max_compressed_bytes,
+                 flush_background=False, flush_events_per_second=0, flush_bytes_per_second=0,
+                 flush_backoff=5, flush_max_backoff=300):
 
 
         self.max_queue_cycles = max_queue_cycles
@@ -193,6 +480,13 @@ class HEC(object):
         self.batchEvents = []
         self.maxByteLength = max_bytes
         self.currentByteLength = 0
+
+        # with gzip, batches are limited by their compressed size
+        # (max_compressed_bytes) instead of max_bytes
+        self.gzip = gzip
+        self.gzip_level = gzip_level
+        self.maxCompressedLength = max_compressed_bytes
+        self.gzipBatch = None
         self.server_uri = []
 
         if proxy and http_event_server_ssl:
@@ -229,6 +523,8 @@ class HEC(object):
             accept_encoding=True)
         self.headers.update({ 'Content-Type': 'application/json',
             'Authorization': 'Splunk {0}'.format(self.token) })
+        self.gzip_headers = dict(self.headers)
+        self.gzip_headers['Content-Encoding'] = 'gzip'
 
         # 2019-09-24: lowered retries from 3 (9s + 3*9s = 36s) to 1 (9s + 9s = 18s)
         # Each new event could potentially take half a minute with 3 retries.
@@ -256,16 +552,40 @@ class HEC(object):
         else:
             self.pool_manager = urllib3.PoolManager(**pm_kw)
 
-        if disk_queue:
-            md5 = hashlib.md5()
-            uril = sorted([ x.uri for x in self.server_uri ])
-            for u in uril:
-                md5.update(encode_something_to_bytes(u))
-            actual_disk_queue = os.path.join(disk_queue, md5.hexdigest())
-            log.debug("disk_queue for %s: %s", uril, actual_disk_queue)
-            self.queue = DiskQueue(actual_disk_queue, size=disk_queue_size, compression=disk_queue_compression)
-        else:
-            self.queue = NoQueue()
+        md5 = hashlib.md5()
+        uril = sorted([ x.uri for x in self.server_uri ])
+        for u in uril:
+            md5.update(encode_something_to_bytes(u))
+        with HEC.queue_states_lock:
+            self.queue_state = state = HEC.queue_states.setdefault(md5.hexdigest(), QueueState())
+
+            if disk_queue:
+                actual_disk_queue = os.path.join(disk_queue, md5.hexdigest())
+                log.debug("disk_queue for %s: %s", uril, actual_disk_queue)
+                # all the HEC objects of an endpoint share one DiskQueue, so
+                # its counters stay right while it's drained in the background
+                if state.queue is None or state.queue.directory != actual_disk_queue:
+                    # gzip request bodies are queued as they are (bytes)
+                    state.queue = DiskQueue(actual_disk_queue, size=disk_queue_size,
+                        compression=disk_queue_compression, ok_types=(str, bytes))
+                    if state.flusher is not None:
+                        state.flusher.queue = state.queue
+                else:
+                    state.queue.size = disk_queue_size
+                    state.queue.compression = disk_queue_compression
+                self.queue = state.queue
+            else:
+                self.queue = NoQueue()
+
+            self.flush_background = bool(disk_queue) and flush_background
+            if self.flush_background:
+                flush_kw = dict(events_per_second=flush_events_per_second,
+                                bytes_per_second=flush_bytes_per_second,
+                                backoff=flush_backoff, max_backoff=flush_max_backoff)
+                if state.flusher is None:
+                    state.flusher = QueueFlusher(self.queue, md5.hexdigest()[:8], **flush_kw)
+                else:
+                    state.flusher.configure(**flush_kw)
 
     def _payload_msg(self, message, *a):
         event = dict(loggername='hubblestack.hec.obj', message=message % a)
@@ -278,13 +598,14 @@ class HEC(object):
         self._send(self._payload_msg(message, *a))
 
     def _queue_event(self, payload, meta_data=None):
-        if HEC.flushing_queue:
-            HEC.abort_flush = True
-        if self.queue.cn < 1 and not HEC.direct_logging:
-            HEC.direct_logging = True
+        state = self.queue_state
+        if state.flushing:
+            state.abort = True
+        if self.queue.cn < 1 and not state.direct_logging:
+            state.direct_logging = True
             self._direct_send_msg('queue(start)')
-            HEC.direct_logging = False
-        p = str(payload)
+            state.direct_logging = False
+        p = payload if is_gzip(payload) else str(payload)
         # should be at info level; error for production logging:
         log.error('Sending to Splunk failed, queueing %d octets to disk', len(p))
         try:
@@ -309,39 +630,69 @@ class HEC(object):
         self._queue_event(dat)
 
     def flushQueue(self):
-        if HEC.flushing_queue:
-            log.debug('already flushing queue')
-            return
-        if self.queue.cn < 1:
-            log.debug('nothing in queue')
-            return
-        HEC.flushing_queue = True
-        HEC.abort_flush = False
+        state = self.queue_state
+        with state.lock:
+            if state.flushing:
+                log.debug('already flushing queue')
+                return
+            if self.queue.cn < 1:
+                log.debug('nothing in queue')
+                return
+            state.flushing = True
+            state.abort = False
         self._direct_send_msg('queue(flush) eventscount=%d', self.queue.cn)
-        dt = time.time() - HEC.last_flush
+        dt = time.time() - state.last_flush
         if dt >= self.retry_diskqueue_interval and self.queue.cn:
             # was at debug level. bumped to error level for production logging
             log.error('flushing queue eventscount=%d; NOTE: queued events may contain more than one payload/event',
                 self.queue.cn)
-        HEC.last_flush = time.time()
-        while HEC.flushing_queue:
+        state.last_flush = time.time()
+        while state.flushing:
             x, meta_data = self.queue.getz()
             if not x:
                 break
             log.debug('pulled %d octets from queue; meta_data: %s', len(x), meta_data)
             self._send(x, meta_data=meta_data)
-            if HEC.abort_flush:
+            if state.abort:
                 log.error('aborting flush (probably due to new queue item)')
                 break
-        HEC.flushing_queue = False
+        state.flushing = False
         if self.queue.cn < 1:
             self._direct_send_msg('queue(end)')
             log.error('flushing complete eventscount=%d', self.queue.cn)
 
 
+    def _compress(self, *payload):
+        """ gzip the payloads into a single request body """
+        batch = GzipBatch(self.gzip_level)
+        for item in payload:
+            batch.add(str(item))
+        return self._gzip_body(batch)
+
+    def _gzip_body(self, batch):
+        body = batch.finish()
+        for hs_key, count in (('gzip:bytes_in', batch.raw), ('gzip:bytes_out', len(body)),
+                ('gzip:bytes_saved', max(batch.raw - len(body), 0))):
+            hubble_status.add_resource(hs_key)
+            hubble_status.mark(hs_key, count=count)
+        with _gzip_totals_lock:
+            _gzip_totals[0] += batch.raw
+            _gzip_totals[1] += len(body)
+            # compressed/uncompressed octets of every body so far (lower is better)
+            hubble_status.gauge('gzip:ratio', float(_gzip_totals[1]) / max(_gzip_totals[0], 1))
+        log.debug('gzip compressed %d payloads from %d to %d octets (ratio %0.3f)',
+            batch.count, batch.raw, len(body), float(len(body)) / max(batch.raw, 1))
+        return body
+
     def _send(self, *payload, **kwargs):
         now = time.time()
-        data = ' '.join([ str(x) for x in payload ])
+        if len(payload) == 1 and is_gzip(payload[0]):
+            # a compressed batch (from flushBatch() or the disk queue)
+            data = payload[0]
+            headers = self.gzip_headers
+        else:
+            data = ' '.join([ str(x) for x in payload ])
+            headers = self.headers
 
         servers = [ x for x in self.server_uri if not x.bad ]
         if not servers:
@@ -399,7 +750,8 @@ class HEC(object):
             try:
                 # Remember that we tried to send this
                 meta_data['send_attempts'] += 1
-                r = self.pool_manager.request('POST', server.uri, body=data, headers=self.headers)
+                with hubble_status.resource_timer('send'):
+                    r = self.pool_manager.request('POST', server.uri, body=data, headers=headers)
                 server.fails = 0
                 if server.outage:
                     server.outage = False
@@ -462,33 +814,97 @@ class HEC(object):
     def _finish_send(self, r):
         if r is not None and hasattr(r, 'status') and hasattr(r, 'reason'):
             log.debug('_send() result: %d %s', r.status, r.reason)
-            if self.queue:
+            if self.flush_background:
+                # the endpoint is reachable; let the flusher replay the queue
+                self.queue_state.flusher.kick(self)
+            elif self.queue:
                 self.flushQueue()
 
+    def flushStats(self):
+        """ return the state of the background queue drain (see
+            QueueFlusher.stats()) or None if the queue is flushed inline
+        """
+        if self.flush_background:
+            return self.queue_state.flusher.stats()
+        return None
+
 
     def sendEvent(self, payload, eventtime='', no_queue=False):
         payload = Payload.promote(payload, eventtime=eventtime, no_queue=no_queue)
         count_input(payload)
-        r = self._send(payload)
+        if self.gzip:
+            r = self._send(self._compress(payload))
+        else:
+            r = self._send(payload)
         self._finish_send(r)
 
 
     def batchEvent(self, dat, eventtime='', no_queue=False):
         payload = Payload.promote(dat, eventtime, no_queue=False)
 
+        if self.gzip:
+            self._gzip_batch_event(payload)
+            return
+
         if (self.currentByteLength + len(payload)) > self.maxByteLength:
             self.flushBatch()
             if http_event_collector_debug:
                 log.debug('auto flushing')
-        else:
-            self.currentByteLength = self.currentByteLength + len(payload)
-        count_input(payload)
+        self.currentByteLength = self.currentByteLength + len(payload)
         self.batchEvents.append(payload)
 
 
+    def batchPayloads(self, payloads):
+        """ batchEvent() a list of payloads (Payload objects or dicts) at once;
+            the batches are flushed as they reach max_bytes, like batchEvent()
+        """
+        if self.gzip:
+            for payload in payloads:
+                self.batchEvent(payload)
+            return
+        batch = self.batchEvents
+        length = self.currentByteLength
+        limit = self.maxByteLength
+        for payload in payloads:
+            if not isinstance(payload, Payload):
+                payload = Payload(payload)
+            size = len(payload.dat)
+            if length + size > limit and batch:
+                self.currentByteLength = length
+                self.flushBatch()
+                batch = self.batchEvents
+                length = 0
+            length += size
+            batch.append(payload)
+        self.currentByteLength = length
+
+    def _gzip_batch_event(self, payload):
+        octets = len(payload) + 1
+        batch = self.gzipBatch
+        if batch is not None and batch.projected(octets) > self.maxCompressedLength:
+            # the estimate counts pending bytes as incompressible; find out
+            # what they actually compressed to before giving up on this batch
+            batch.sync()
+            if batch.projected(octets) > self.maxCompressedLength:
+                self.flushBatch()
+                if http_event_collector_debug:
+                    log.debug('auto flushing')
+                batch = None
+        if batch is None:
+            batch = self.gzipBatch = GzipBatch(self.gzip_level)
+        batch.add(str(payload))
+        # kept (uncompressed) for the input counters only
+        self.batchEvents.append(payload)
+        self.currentByteLength = self.currentByteLength + len(payload)
+
     def flushBatch(self):
         if self.batchEvents:
-            r = self._send( *self.batchEvents )
+            count_inputs(self.batchEvents)
+            if self.gzipBatch is not None:
+                r = self._send(self._gzip_body(self.gzipBatch))
+                self.gzipBatch = None
+            else:
+                r = self._send( *self.batchEvents )
             self.batchEvents = []
             self.currentByteLength = 0
             self._finish_send(r)
@@ -17,9 +17,11 @@
 #
 # we just look in [config.get]('hubblestack:returner:splunk')
 #
-# Additionally, the defaults for disk_queue, disk_queue_size and
-# disk_queue_compression can be set in the top level configuration -- although,
-# are still overridden by per-hec configs.
+# Additionally, the defaults for disk_queue, disk_queue_size,
+# disk_queue_compression and the disk_queue_flush_* options (and gzip, gzip_level and max_compressed_bytes, as
+# splunk_gzip, splunk_gzip_level and splunk_max_compressed_bytes) can be set in
+# the top level configuration -- although, are still overridden by per-hec
+# configs.
 
 
 import copy
@@ -74,6 +76,17 @@ def _get_splunk_options(space, modality, **kw):
         'disk_queue': confg('disk_queue', False),
         'disk_queue_size': confg('disk_queue_size', 100 * (1024 ** 2)),
         'disk_queue_compression': confg('disk_queue_compression', 5),
+        # drain the disk_queue from a background thread (rather than inline
+        # after a successful send), at most *_per_second (0 is unlimited)
+        'disk_queue_flush_background': confg('disk_queue_flush_background', False),
+        'disk_queue_flush_events_per_second': confg('disk_queue_flush_events_per_second', 0),
+        'disk_queue_flush_bytes_per_second': confg('disk_queue_flush_bytes_per_second', 0),
+        'disk_queue_flush_backoff': confg('disk_queue_flush_backoff', 5),
+        'disk_queue_flush_max_backoff': confg('disk_queue_flush_max_backoff', 300),
+        # gzip'd HEC requests are batched up to max_compressed_bytes (compressed)
+        'gzip': confg('splunk_gzip', False),
+        'gzip_level': confg('splunk_gzip_level', 6),
+        'max_compressed_bytes': confg('splunk_max_compressed_bytes', 100000),
     }
 
     nicknames = kw.pop('_nick', {'sourcetype_log': 'sourcetype'})
@@ -171,6 +184,14 @@ def make_hec_args(opts):
         'disk_queue': opts['disk_queue'],
         'disk_queue_size': opts['disk_queue_size'],
         'disk_queue_compression': opts['disk_queue_compression'],
+        'gzip': opts.get('gzip', False),
+        'gzip_level': opts.get('gzip_level', 6),
+        'max_compressed_bytes': opts.get('max_compressed_bytes', 100000),
+        'flush_background': opts.get('disk_queue_flush_background', False),
+        'flush_events_per_second': opts.get('disk_queue_flush_events_per_second', 0),
+        'flush_bytes_per_second': opts.get('disk_queue_flush_bytes_per_second', 0),
+        'flush_backoff': opts.get('disk_queue_flush_backoff', 5),
+        'flush_max_backoff': opts.get('disk_queue_flush_max_backoff', 300),
     }
 
     return (a, kw)
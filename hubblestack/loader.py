@@ -8,8 +8,10 @@ plugin interfaces used by Salt.
 import os
 import re
 import sys
+import copy
 import time
 import yaml
+import queue
 import logging
 import inspect
 import tempfile
@@ -21,6 +23,7 @@ import types
 from zipimport import zipimporter
 
 import hubblestack.config
+import hubblestack.payload
 import hubblestack.syspaths
 import hubblestack.utils.args
 import hubblestack.utils.context
@@ -31,8 +34,10 @@ import hubblestack.utils.lazy
 import hubblestack.utils.odict
 import hubblestack.utils.platform
 import hubblestack.utils.versions
+import hubblestack.version
 
 from hubblestack.exceptions import LoaderError
+from hubblestack.status import HubbleStatus
 from hubblestack.template import check_render_pipe_str
 from hubblestack.utils.decorators import Depends
 
@@ -258,6 +263,148 @@ def grain_funcs(opts, proxy=None):
     )
 
 
+GRAINS_TTL = ('static', 'boot', 'volatile')
+
+# per grain function results, reused by later refreshes (see _grain_ttl)
+_GRAINS_CACHE = {}
+
+hubble_status = HubbleStatus(__name__)
+
+
+def _grain_ttl(key, func):
+    '''
+    Return how long the result of a grain function stays valid, as declared by
+    the __grains_ttl__ attribute of its module: either one of
+
+    static
+        never changes on this host (python version and paths...)
+    boot
+        only changes across reboots (machine id, cloud instance identity...)
+    volatile
+        recomputed on every refresh (the default)
+
+    or a dict mapping function names to one of these. Empty results (e.g. the
+    cloud metadata services timed out) are never cached, see _grains_cacheable.
+    '''
+    ttl = getattr(func, '__globals__', {}).get('__grains_ttl__', 'volatile')
+    if isinstance(ttl, dict):
+        ttl = ttl.get(key.rsplit('.', 1)[-1], 'volatile')
+    return ttl if ttl in GRAINS_TTL else 'volatile'
+
+
+def _boot_id():
+    '''
+    Return an identifier of the current boot, or None if it cannot be found
+    '''
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as fh_:
+            return fh_.read().strip()
+    except (IOError, OSError):
+        pass
+    try:
+        import psutil
+        return str(int(psutil.boot_time()))
+    except Exception:
+        return None
+
+
+def _grains_cacheable(ret):
+    '''
+    Whether the result of a grain function can be reused: a function that
+    failed (or timed out internally) returns no grains, or only empty ones,
+    and is called again on the next refresh
+    '''
+    return isinstance(ret, dict) and any(val not in (None, '', [], {}) for val in ret.values())
+
+
+def _grains_cache_valid(entry, ttl, boot_id):
+    if not entry or entry.get('ttl') != ttl:
+        return False
+    if ttl == 'static':
+        return True
+    return ttl == 'boot' and boot_id is not None and entry.get('boot_id') == boot_id
+
+
+def _load_grains_cache(opts, cfn):
+    '''
+    Return the cached grain function results of this process, completed by the
+    ones in the grains cache file if grains_cache is enabled
+    '''
+    if opts.get('grains_cache', False) and not _GRAINS_CACHE and os.path.isfile(cfn):
+        try:
+            with hubblestack.utils.files.fopen(cfn, 'rb') as fp_:
+                cache = hubblestack.payload.Serial(opts).load(fp_)
+            if isinstance(cache, dict) and cache.get('version') == hubblestack.version.__version__:
+                _GRAINS_CACHE.update(cache.get('functions') or {})
+        except Exception as exc:
+            log.warning('Unable to read grains cache file %s: %s', cfn, exc)
+    return dict(_GRAINS_CACHE)
+
+
+def _call_grain_func(key, func, kwargs):
+    log.trace('Loading %s grain', key)
+    hubble_status.add_resource('grains.' + key)
+    start = time.time()
+    try:
+        with hubble_status.resource_timer('grains.' + key):
+            return func(**kwargs)
+    except Exception:
+        log.critical(
+            'Failed to load grains defined in grain file %s in '
+            'function %s, error:\n', key, func,
+            exc_info=True
+        )
+    finally:
+        log.debug('Loaded %s grain in %0.3fs', key, time.time() - start)
+
+
+def _call_grain_funcs(calls, max_workers, deadline):
+    '''
+    Run the grain functions in calls, a list of (key, func, kwargs, ttl), on up
+    to max_workers threads. Returns {key: result} for the functions that
+    finished before deadline (a time.monotonic() value); the others are left
+    running in the background and their result is discarded.
+    '''
+    results = {}
+    if max_workers <= 1:
+        for key, func, kwargs, _ in calls:
+            if time.monotonic() >= deadline:
+                break
+            results[key] = _call_grain_func(key, func, kwargs)
+        return results
+
+    pending = queue.Queue()
+    done = queue.Queue()
+    for call in calls:
+        pending.put(call)
+
+    def _worker():
+        while True:
+            try:
+                key, func, kwargs, _ = pending.get_nowait()
+            except queue.Empty:
+                return
+            done.put((key, _call_grain_func(key, func, kwargs)))
+
+    for idx in range(min(max_workers, len(calls))):
+        thread = threading.Thread(target=_worker, name='grains-{0}'.format(idx))
+        thread.daemon = True
+        thread.start()
+    for _ in calls:
+        try:
+            key, ret = done.get(timeout=max(0, deadline - time.monotonic()))
+        except queue.Empty:
+            break
+        results[key] = ret
+    # stop the workers from starting anything new once the deadline is past
+    while True:
+        try:
+            pending.get_nowait()
+        except queue.Empty:
+            break
+    return results
+
+
 def grains(opts, force_refresh=False, proxy=None):
     '''
     Return the functions for the dynamic grains and the values for the static
@@ -315,51 +462,59 @@ def grains(opts, force_refresh=False, proxy=None):
     funcs = grain_funcs(opts, proxy=None)
     if force_refresh:  # if we refresh, lets reload grain modules
         funcs.clear()
-    # Run core grains
-    for key in funcs:
-        if not key.startswith('core.'):
-            continue
-        log.trace('Loading %s grain', key)
-        ret = funcs[key]()
-        if not isinstance(ret, dict):
-            continue
-        if grains_deep_merge:
-            hubblestack.utils.dictupdate.update(grains_data, ret)
-        else:
-            grains_data.update(ret)
-
-    # Run the rest of the grains
-    for key in funcs:
-        if key.startswith('core.') or key == '_errors':
-            continue
-        try:
-            # Grains are loaded too early to take advantage of the injected
-            # __proxy__ variable.  Pass an instance of that LazyLoader
-            # here instead to grains functions if the grains functions take
-            # one parameter.  Then the grains can have access to the
-            # proxymodule for retrieving information from the connected
-            # device.
-            log.trace('Loading %s grain', key)
-            parameters = hubblestack.utils.args.get_function_argspec(funcs[key]).args
+    cached = {} if force_refresh else _load_grains_cache(opts, cfn)
+    boot_id = _boot_id()
+    deadline = time.monotonic() + opts.get('grains_timeout', 60)
+    max_workers = opts.get('grains_max_workers', 8)
+
+    # Grains are loaded too early to take advantage of the injected
+    # __proxy__ variable.  Pass an instance of that LazyLoader here instead
+    # to grains functions if the grains functions take one parameter.  Then
+    # the grains can have access to the proxymodule for retrieving
+    # information from the connected device. Functions taking the grains
+    # gathered so far run after all the others.
+    # Run core grains first, then the rest of the grains
+    keys = sorted((key for key in funcs if key != '_errors'), key=lambda key: not key.startswith('core.'))
+    independent, dependent = [], []
+    for key in keys:
+        parameters = hubblestack.utils.args.get_function_argspec(funcs[key]).args
+        (dependent if 'grains' in parameters else independent).append((key, parameters))
+
+    results = {}
+    for stage in (independent, dependent):
+        calls = []
+        for key, parameters in stage:
+            ttl = _grain_ttl(key, funcs[key])
+            entry = cached.get(key)
+            if _grains_cache_valid(entry, ttl, boot_id):
+                log.trace('Using cached %s grain', key)
+                results[key] = copy.deepcopy(entry['ret'])
+                continue
             kwargs = {}
             if 'proxy' in parameters:
                 kwargs['proxy'] = proxy
             if 'grains' in parameters:
                 kwargs['grains'] = grains_data
-            ret = funcs[key](**kwargs)
-        except Exception:
-            log.critical(
-                'Failed to load grains defined in grain file %s in '
-                'function %s, error:\n', key, funcs[key],
-                exc_info=True
-            )
-            continue
-        if not isinstance(ret, dict):
-            continue
-        if grains_deep_merge:
-            hubblestack.utils.dictupdate.update(grains_data, ret)
-        else:
-            grains_data.update(ret)
+            calls.append((key, funcs[key], kwargs, ttl))
+        finished = _call_grain_funcs(calls, max_workers, deadline)
+        for key, func, _, ttl in calls:
+            if key in finished:
+                if _grains_cacheable(finished[key]):
+                    _GRAINS_CACHE[key] = {'ttl': ttl, 'boot_id': boot_id, 'ret': finished[key]}
+                results[key] = finished[key]
+            elif key in cached:
+                log.warning('Grain function %s did not finish in time, using its cached value', key)
+                results[key] = copy.deepcopy(cached[key]['ret'])
+            else:
+                log.warning('Grain function %s did not finish in time, skipping it', key)
+        for key, _ in stage:
+            ret = results.get(key)
+            if not isinstance(ret, dict):
+                continue
+            if grains_deep_merge:
+                hubblestack.utils.dictupdate.update(grains_data, ret)
+            else:
+                grains_data.update(ret)
 
     grains_data.update(opts['grains'])
     # Write cache if enabled
@@ -374,7 +529,9 @@ def grains(opts, force_refresh=False, proxy=None):
                 with hubblestack.utils.files.fopen(cfn, 'w+b') as fp_:
                     try:
                         serial = hubblestack.payload.Serial(opts)
-                        serial.dump(grains_data, fp_)
+                        serial.dump({'version': hubblestack.version.__version__,
+                                     'grains': grains_data,
+                                     'functions': _GRAINS_CACHE}, fp_)
                     except TypeError as e:
                         log.error('Failed to serialize grains cache: %s', e)
                         raise  # re-throw for cleanup
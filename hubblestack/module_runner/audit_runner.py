@@ -6,6 +6,7 @@ import hubblestack.module_runner.runner
 from hubblestack.module_runner.runner import Caller
 
 import hubblestack.module_runner.comparator
+import hubblestack.module_runner.result_cache as result_cache
 
 from hubblestack.exceptions import HubbleCheckVersionIncompatibleError
 from hubblestack.exceptions import HubbleCheckValidationError
@@ -26,9 +27,23 @@ class AuditRunner(hubblestack.module_runner.runner.Runner):
 
     def __init__(self):
         super().__init__(Caller.AUDIT)
+        # ResultCache of incremental runs (if any)
+        self._result_cache = None
+        # whether to execute every check even if its inputs didn't change
+        self._full_run = False
 
     # overridden method
     def _execute(self, audit_data_dict, audit_file, args):
+        self._snapshot = args.get('snapshot')
+        self._result_cache = args.get('result_cache')
+        self._full_run = args.get('full_run', False)
+        try:
+            return self._execute_profile(audit_data_dict, audit_file, args)
+        finally:
+            self._snapshot = None
+            self._result_cache = None
+
+    def _execute_profile(self, audit_data_dict, audit_file, args):
         # got data for one audit file
         # lets parse, validate and execute one by one
         tags = args.get('tags', '*')
@@ -37,8 +52,8 @@ class AuditRunner(hubblestack.module_runner.runner.Runner):
         result_list = []
         boolean_expr_check_list = []
         audit_profile = os.path.splitext(os.path.basename(audit_file))[0]
+        matched_checks = []
         for audit_id, audit_data in audit_data_dict.items():
-            log.debug('Executing check-id: %s in audit profile: %s', audit_id, audit_profile)
             audit_impl = self._get_matched_implementation(audit_id, audit_data, tags, labels)
             if not audit_impl:
                 # no matched impl found
@@ -48,7 +63,14 @@ class AuditRunner(hubblestack.module_runner.runner.Runner):
 
             if not self._validate_audit_data(audit_id, audit_impl):
                 continue
+            matched_checks.append((audit_id, audit_data, audit_impl))
+
+        incremental = self._incremental_checks(matched_checks, verbose, audit_profile)
+        self._prefetch(self._blocks_by_module(
+            [check for check in matched_checks if incremental.get(check[0], (None, None, None))[2] is None]))
 
+        for audit_id, audit_data, audit_impl in matched_checks:
+            log.debug('Executing check-id: %s in audit profile: %s', audit_id, audit_profile)
             try:
                 # version check
                 if not self._is_hubble_version_compatible(audit_id, audit_impl):
@@ -65,7 +87,8 @@ class AuditRunner(hubblestack.module_runner.runner.Runner):
                     })
                 else:
                     # handover to module
-                    audit_result = self._execute_audit(audit_id, audit_impl, audit_data, verbose, audit_profile)
+                    audit_result = self._execute_incremental(audit_id, audit_impl, audit_data, verbose, audit_profile,
+                                                             incremental.get(audit_id))
                     result_list.append(audit_result)
             except (HubbleCheckValidationError, HubbleCheckVersionIncompatibleError) as herror:
                 # add into error/skipped section
@@ -90,6 +113,76 @@ class AuditRunner(hubblestack.module_runner.runner.Runner):
         # return list of results for a file
         return result_list
 
+    def _incremental_checks(self, matched_checks, verbose, audit_profile):
+        """
+        For incremental runs, the checks whose items all report the paths they
+        read: {audit_id: (key, fingerprint of the inputs, kept result or None)}
+        """
+        incremental = {}
+        if self._result_cache is None:
+            return incremental
+        for audit_id, audit_data, audit_impl in matched_checks:
+            if audit_impl.get('return_no_exec', False) or self._is_boolean_expression(audit_impl):
+                continue
+            items = audit_impl.get('items')
+            if not isinstance(items, list) or not items:
+                continue
+            inputs = []
+            for audit_check in items:
+                check_inputs = None
+                if isinstance(audit_check, dict):
+                    check_inputs = self._get_module_inputs(audit_impl['module'], audit_id, audit_check)
+                if check_inputs is None:
+                    break
+                inputs.extend(check_inputs)
+            else:
+                key = self._result_cache.check_key(audit_profile, audit_id, audit_data, audit_impl, verbose)
+                if key is None:
+                    continue
+                fingerprint = result_cache.fingerprint_paths(inputs)
+                kept_result = None if self._full_run else self._result_cache.get(key, fingerprint)
+                incremental[audit_id] = (key, fingerprint, kept_result)
+        return incremental
+
+    def _execute_incremental(self, audit_id, audit_impl, audit_data, verbose, audit_profile, incremental):
+        """
+        Execute the check, unless its result was kept by an earlier run and
+        its inputs didn't change since; results of incremental runs carry a
+        from_cache flag
+        """
+        if self._result_cache is None:
+            return self._execute_audit(audit_id, audit_impl, audit_data, verbose, audit_profile)
+        if incremental is not None and incremental[2] is not None:
+            log.debug('Inputs of check-id: %s did not change, reusing its result', audit_id)
+            return incremental[2]
+        audit_result = self._execute_audit(audit_id, audit_impl, audit_data, verbose, audit_profile)
+        audit_result['from_cache'] = False
+        if incremental is not None:
+            self._result_cache.put(incremental[0], incremental[1], audit_result)
+        return audit_result
+
+    def _blocks_by_module(self, matched_checks):
+        """
+        Group the items of the checks that are going to be executed by module,
+        for _prefetch(). Items the snapshot (if any) has a result for are left
+        out, and nothing is prefetched for an offline snapshot.
+        """
+        module_blocks = {}
+        if self._snapshot is not None and self._snapshot.offline:
+            return module_blocks
+        for audit_id, _audit_data, audit_impl in matched_checks:
+            if audit_impl.get('return_no_exec', False) or self._is_boolean_expression(audit_impl):
+                continue
+            items = audit_impl.get('items')
+            if not isinstance(items, list):
+                continue
+            for audit_check in items:
+                if self._snapshot is not None and self._snapshot.has(audit_impl['module'], audit_check):
+                    continue
+                if isinstance(audit_check, dict):
+                    module_blocks.setdefault(audit_impl['module'], []).append((audit_id, audit_check))
+        return module_blocks
+
     # overridden method
     def _validate_yaml_dictionary(self, yaml_dict):
         return True
@@ -3,9 +3,11 @@ from hubblestack.module_runner.runner import Caller
 import hubblestack.module_runner.comparator
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from hubblestack.exceptions import CommandExecutionError
 import hubblestack.loader
+import hubblestack.utils.http_sessions
 
 log = logging.getLogger(__name__)
 RETURNER_ID_BLOCK = None
@@ -29,6 +31,9 @@ class FdgRunner(Runner):
 
         global RETURNER_ID_BLOCK
         RETURNER_ID_BLOCK = (fdg_file, str(starting_chained))
+        # the curl blocks of this file share connections and GET responses, but
+        # nothing is reused from an earlier execution
+        hubblestack.utils.http_sessions.reset()
         # Recursive execution of the blocks
         ret = self._fdg_execute('main', yaml_data_dict, chained=starting_chained)
         return RETURNER_ID_BLOCK, ret
@@ -68,10 +73,12 @@ class FdgRunner(Runner):
 
         if 'xpipe_on_true' in block and status:
             log.debug('Piping via chaining keyword xpipe_on_true.')
-            return self._xpipe(ret, status, block_data, block['xpipe_on_true'], returner)
+            return self._xpipe(ret, status, block_data, block['xpipe_on_true'], returner,
+                               block.get('xpipe_workers'))
         elif 'xpipe_on_false' in block and not status:
             log.debug('Piping via chaining keyword xpipe_on_false.')
-            return self._xpipe(ret, status, block_data, block['xpipe_on_false'], returner)
+            return self._xpipe(ret, status, block_data, block['xpipe_on_false'], returner,
+                               block.get('xpipe_workers'))
         elif 'pipe_on_true' in block and status:
             log.debug('Piping via chaining keyword pipe_on_true.')
             return self._pipe(ret, status, block_data, block['pipe_on_true'], returner)
@@ -80,7 +87,8 @@ class FdgRunner(Runner):
             return self._pipe(ret, status, block_data, block['pipe_on_false'], returner)
         elif 'xpipe' in block:
             log.debug('Piping via chaining keyword xpipe.')
-            return self._xpipe(ret, status, block_data, block['xpipe'], returner)
+            return self._xpipe(ret, status, block_data, block['xpipe'], returner,
+                               block.get('xpipe_workers'))
         elif 'pipe' in block:
             log.debug('Piping via chaining keyword pipe.')
             return self._pipe(ret, status, block_data, block['pipe'], returner)
@@ -90,16 +98,23 @@ class FdgRunner(Runner):
                 self._return((ret, status), returner)
             return ret, status
 
-    def _xpipe(self, chained, chained_status, block_data, block_id, returner=None):
+    def _xpipe(self, chained, chained_status, block_data, block_id, returner=None, workers=None):
         """
         Iterate over the given value and for each iteration, call the given fdg
-        block by id with the iteration value as the passthrough.
+        block by id with the iteration value as the passthrough (with up to
+        ``workers`` calls at once).
 
         The results will be returned as a list.
         """
-        ret = []
-        for value in chained:
-            ret.append(self._fdg_execute(block_id, block_data, value, chained_status))
+        values = list(chained)
+        workers = int(workers or 1)
+        if workers > 1 and len(values) > 1:
+            with ThreadPoolExecutor(max_workers=min(workers, len(values)),
+                                    thread_name_prefix='fdg-xpipe') as executor:
+                ret = list(executor.map(
+                    lambda value: self._fdg_execute(block_id, block_data, value, chained_status), values))
+        else:
+            ret = [self._fdg_execute(block_id, block_data, value, chained_status) for value in values]
         if returner:
             self._return(ret, returner)
         return ret
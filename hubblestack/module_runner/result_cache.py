@@ -0,0 +1,179 @@
+# -*- encoding: utf-8 -*-
+"""
+Per-check results for incremental audit runs.
+
+Most checks only depend on a few files (readfile, grep, stat) or on the
+package database, which rarely change between two runs. An audit module can
+tell what a block reads with an optional
+
+.. code-block:: python
+
+    def get_inputs(block_id, block_dict, extra_args=None):
+        return ['/etc/ssh/sshd_config']
+
+(None when it can't tell, e.g. for network endpoints or service state, or
+when the result depends on more than its inputs, e.g. the current date for
+certificate expiry). The
+runner fingerprints those paths (inode, size, mtime, ctime, ownership and
+mode, or their absence) before executing a check whose blocks all report
+their inputs, and keeps the result of the check with the fingerprint. The
+next run returns the kept result, flagged with ``from_cache``, as long as
+the check, its profile and the fingerprint of its inputs are unchanged.
+
+Paths can be globs; their fingerprint covers the paths they match and the
+directory they are matched in.
+"""
+
+import copy
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import hubblestack.utils.atomicfile
+from hubblestack.exceptions import CommandExecutionError
+
+log = logging.getLogger(__name__)
+
+RESULT_CACHE_VERSION = 2
+# results are dropped (and the checks executed again) this long after they
+# were kept, however often they were reused
+MAX_AGE = 7 * 24 * 3600
+
+
+def _stat_fingerprint(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return [path, None]
+    return [path, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns, st.st_uid, st.st_gid, st.st_mode]
+
+
+def _glob_root(pattern):
+    """ the directory the glob pattern starts matching in """
+    parts = pattern.split(os.sep)
+    for index, part in enumerate(parts):
+        if glob.has_magic(part):
+            return os.sep.join(parts[:index]) or os.sep
+    return os.path.dirname(pattern)
+
+
+def fingerprint_paths(paths):
+    """ the fingerprint of the paths (a list that compares equal as long as
+        none of them changed)
+    """
+    fingerprint = []
+    for path in sorted(set(paths)):
+        if glob.has_magic(path):
+            fingerprint.append(_stat_fingerprint(_glob_root(path)))
+            fingerprint.extend(_stat_fingerprint(match) for match in sorted(glob.glob(path)))
+        else:
+            fingerprint.append(_stat_fingerprint(path))
+    return fingerprint
+
+
+class ResultCache(object):
+    """ the results of checks, with the fingerprint of their inputs
+
+        .. code-block:: python
+
+            cache = ResultCache.load(path, hubble_version='4.0.0')
+            key = cache.check_key(audit_profile, audit_id, audit_data, audit_impl, verbose)
+            fingerprint = fingerprint_paths(inputs)
+            result = cache.get(key, fingerprint)
+            if result is None:
+                result = execute(...)
+                cache.put(key, fingerprint, result)
+            cache.save(path)
+    """
+
+    def __init__(self, hubble_version=None):
+        self.hubble_version = hubble_version
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        # key -> {'fingerprint': ..., 'result': ..., 'kept': timestamp}
+        self._checks = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._checks)
+
+    def check_key(self, audit_profile, audit_id, audit_data, audit_impl, verbose):
+        """ the key of a check: changes when the check (or what is reported
+            of it) does; None if the check can't be cached
+        """
+        try:
+            check = json.dumps([self.hubble_version, audit_profile, audit_id, audit_data, audit_impl, bool(verbose)],
+                               sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+        return hashlib.sha256(check.encode('utf-8')).hexdigest()
+
+    def get(self, key, fingerprint):
+        """ the result kept for key if its inputs still have the fingerprint,
+            None otherwise
+        """
+        with self._lock:
+            entry = self._checks.get(key)
+            if entry is None or entry['fingerprint'] != fingerprint \
+                    or time.time() - entry['kept'] > MAX_AGE:
+                self.misses += 1
+                return None
+            self.hits += 1
+            result = copy.deepcopy(entry['result'])
+        result['from_cache'] = True
+        return result
+
+    def put(self, key, fingerprint, result):
+        """ keep the result of key, whose inputs had the fingerprint """
+        try:
+            # what is kept is what a later process gets back
+            result = json.loads(json.dumps(result))
+            fingerprint = json.loads(json.dumps(fingerprint))
+        except (TypeError, ValueError):
+            log.debug('Not keeping the result of %s, it is not serialisable', result.get('check_id'))
+            return False
+        with self._lock:
+            self._checks[key] = {'fingerprint': fingerprint, 'result': result, 'kept': time.time()}
+            self.dirty = True
+        return True
+
+    def to_dict(self):
+        """ the serialisable form of the cache (without the results kept
+            more than MAX_AGE ago)
+        """
+        oldest = time.time() - MAX_AGE
+        with self._lock:
+            checks = dict((key, entry) for key, entry in self._checks.items() if entry['kept'] >= oldest)
+        return {'version': RESULT_CACHE_VERSION, 'hubble_version': self.hubble_version, 'checks': checks}
+
+    def save(self, path):
+        """ write the cache to path (atomically) """
+        with hubblestack.utils.atomicfile.atomic_open(path, 'w') as fh:
+            json.dump(self.to_dict(), fh)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path, hubble_version=None):
+        """ the cache saved at path; an empty one if there is none, or it
+            was written by another version of the cache or of hubble
+        """
+        cache = cls(hubble_version=hubble_version)
+        if not os.path.isfile(path):
+            return cache
+        try:
+            with open(path, 'r') as fh:
+                data = json.load(fh)
+            if data.get('version') != RESULT_CACHE_VERSION or data.get('hubble_version') != hubble_version:
+                raise CommandExecutionError('written by another version')
+            for key, entry in data['checks'].items():
+                cache._checks[key] = {'fingerprint': entry['fingerprint'], 'result': entry['result'],
+                                      'kept': float(entry['kept'])}
+        except (IOError, OSError, ValueError, KeyError, TypeError, AttributeError, CommandExecutionError) as exc:
+            log.info('Not using the audit results kept in %s: %s', path, exc)
+            cache._checks.clear()
+        return cache
@@ -9,6 +9,7 @@ import yaml
 from abc import ABC, abstractmethod
 from packaging import version
 import hubblestack.module_runner.comparator
+import hubblestack.module_runner.runner_utils as runner_utils
 
 import hubblestack.loader
 from hubblestack.exceptions import CommandExecutionError
@@ -36,6 +37,8 @@ class Runner(ABC):
         super().__init__()
         # dictionary that will load modules
         self._caller = caller
+        # HostSnapshot the modules' results are taken from/recorded in (if any)
+        self._snapshot = None
 
     @abstractmethod
     def _validate_yaml_dictionary(self, yaml_dict):
@@ -133,11 +136,26 @@ class Runner(ABC):
     def _execute_module(self, module_name, profile_id, module_args, extra_args=None, chaining_args=None):
         """
         Helper method to execute a Module's execute() method.
+
+        With a snapshot, the result it has for the block is returned instead
+        (an offline snapshot without one gives a 'not_in_snapshot' error), and
+        the result of the module is recorded in it.
         """
+        snapshot = self._snapshot if chaining_args is None and extra_args is None else None
+        if snapshot is not None:
+            fact = snapshot.get(module_name, module_args)
+            if fact is not None:
+                log.debug('Taking the result of %s for %s from the snapshot', module_name, profile_id)
+                return fact
+            if snapshot.offline:
+                return runner_utils.prepare_negative_result_for_module(profile_id, 'not_in_snapshot')
         execute_method = '{0}.execute'.format(module_name)
-        return __hmods__[execute_method](profile_id, module_args, {'chaining_args': chaining_args,
-                                                                   'extra_args': extra_args,
-                                                                   'caller': self._caller})
+        status, result = __hmods__[execute_method](profile_id, module_args, {'chaining_args': chaining_args,
+                                                                             'extra_args': extra_args,
+                                                                             'caller': self._caller})
+        if snapshot is not None:
+            snapshot.put(module_name, module_args, status, result)
+        return status, result
 
     def _get_filtered_params_to_log(self, module_name, profile_id, module_args, extra_args=None, chaining_args=None):
         """
@@ -148,6 +166,39 @@ class Runner(ABC):
                                                                    'extra_args': extra_args,
                                                                    'caller': self._caller})
 
+    def _get_module_inputs(self, module_name, profile_id, module_args):
+        """
+        Helper method to execute a Module's get_inputs() method: the paths the
+        block reads, or None if the module can't tell (or has no get_inputs)
+        """
+        inputs_method = '{0}.get_inputs'.format(module_name)
+        if inputs_method not in __hmods__:
+            return None
+        try:
+            return __hmods__[inputs_method](profile_id, module_args, {'caller': self._caller})
+        except Exception as exc:
+            log.error('Error getting the inputs of %s in %s: %s', module_name, profile_id, exc)
+            return None
+
+    def _prefetch(self, module_blocks):
+        """
+        Give each module a chance to gather what all of its blocks need at once
+        (eg: a single read of every kernel parameter the sysctl checks look at)
+        before any of them is executed.
+
+        module_blocks is {module_name: [(block_id, block_dict), ...]}; modules
+        that have a prefetch(block_list, extra_args) function get their list.
+        A failing prefetch is only logged, the blocks then do their own work.
+        """
+        for module_name, block_list in module_blocks.items():
+            prefetch_method = '{0}.prefetch'.format(module_name)
+            if prefetch_method not in __hmods__:
+                continue
+            try:
+                __hmods__[prefetch_method](block_list, {'caller': self._caller})
+            except Exception as exc:
+                log.error('Error prefetching for module %s: %s', module_name, exc)
+
     def _make_file_available(self, file):
         """
         Cache file if path is salt://...
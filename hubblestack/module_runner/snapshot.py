@@ -0,0 +1,223 @@
+# -*- encoding: utf-8 -*-
+"""
+Host-state snapshots for the audit runner.
+
+Every audit run used to probe the live host for every check, even when the
+schedules of several profiles (CIS, PCI, internal baselines) ran within
+minutes of each other and asked the same questions. A snapshot records what
+the audit modules answered, keyed by module and by the block they were given
+(minus its comparator, which doesn't change what the module reads), so:
+
+- runs within the TTL of a snapshot evaluate their checks against it and
+  only probe the host for what it doesn't have yet,
+- a snapshot can be exported and the profiles evaluated against it offline
+  (see audit.run(snapshot=...)); nothing is probed then.
+
+Only successful module results are recorded; a failure is probed again by
+the next check that needs it. Results of modules that look at more than
+their block (bexpr evaluates the results of the other checks) are never
+recorded.
+
+A snapshot is a JSON document:
+
+.. code-block:: json
+
+    {"version": 1, "host": "web01", "hubble_version": "4.0.0",
+     "taken": 1603100000.0, "ttl": 300,
+     "facts": [{"module": "stat", "inputs": {"args": {"path": "/etc/passwd"}},
+                "status": true, "result": {"result": {"mode": 644}}}]}
+"""
+
+import copy
+import json
+import logging
+import threading
+import time
+
+import hubblestack.utils.atomicfile
+from hubblestack.exceptions import CommandExecutionError
+
+log = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+DEFAULT_TTL = 300
+# modules whose result depends on more than the block they are given
+NEVER_SNAPSHOT = frozenset(['bexpr'])
+
+
+class HostSnapshot(object):
+    """ the answers of the audit modules on one host at one point in time
+
+        .. code-block:: python
+
+            snapshot = HostSnapshot(ttl=300, host='web01')
+            fact = snapshot.get('stat', block_dict)
+            if fact is None:
+                status, result = execute(...)
+                snapshot.put('stat', block_dict, status, result)
+            snapshot.save('/var/cache/hubble/audit_snapshot.json')
+
+        An offline snapshot (one loaded to evaluate profiles against) never
+        expires and isn't added to.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, host=None, hubble_version=None, taken=None, offline=False):
+        self.ttl = ttl
+        self.host = host
+        self.hubble_version = hubble_version
+        self.taken = time.time() if taken is None else taken
+        self.offline = offline
+        # whether there are facts that haven't been saved yet
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        # key -> (module_name, inputs, status, result)
+        self._facts = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._facts)
+
+    @property
+    def expired(self):
+        """ whether the facts are too old to evaluate checks against """
+        return not self.offline and time.time() - self.taken > self.ttl
+
+    @staticmethod
+    def _inputs(block_dict):
+        return dict((key, val) for key, val in block_dict.items() if key != 'comparator')
+
+    @classmethod
+    def fact_key(cls, module_name, block_dict):
+        """ the key the result of module_name for block_dict is recorded under
+            (None if it can't be recorded)
+        """
+        if module_name in NEVER_SNAPSHOT or not isinstance(block_dict, dict):
+            return None
+        try:
+            return module_name + ' ' + json.dumps(cls._inputs(block_dict), sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+
+    def has(self, module_name, block_dict):
+        """ whether there is a fact for module_name and block_dict """
+        key = self.fact_key(module_name, block_dict)
+        return key is not None and key in self._facts
+
+    def get(self, module_name, block_dict):
+        """ the (status, result) recorded for module_name and block_dict, or
+            None if there is none
+        """
+        key = self.fact_key(module_name, block_dict)
+        with self._lock:
+            fact = self._facts.get(key) if key is not None else None
+            if fact is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return fact[2], copy.deepcopy(fact[3])
+
+    def put(self, module_name, block_dict, status, result):
+        """ record the (status, result) module_name returned for block_dict;
+            returns whether it was recorded
+        """
+        if self.offline or not status:
+            return False
+        key = self.fact_key(module_name, block_dict)
+        if key is None:
+            return False
+        try:
+            # what is recorded is what an exported snapshot gives back
+            result = json.loads(json.dumps(result))
+        except (TypeError, ValueError):
+            log.debug('Not recording the result of %s, it is not serialisable', module_name)
+            return False
+        with self._lock:
+            self._facts[key] = (module_name, json.loads(key[len(module_name) + 1:]), status, result)
+            self.dirty = True
+        return True
+
+    def to_dict(self):
+        """ the serialisable form of the snapshot """
+        with self._lock:
+            facts = [{'module': module_name, 'inputs': inputs, 'status': status, 'result': result}
+                     for module_name, inputs, status, result in self._facts.values()]
+        return {
+            'version': SNAPSHOT_VERSION,
+            'host': self.host,
+            'hubble_version': self.hubble_version,
+            'taken': self.taken,
+            'ttl': self.ttl,
+            'facts': facts,
+        }
+
+    @classmethod
+    def from_dict(cls, data, offline=False):
+        """ the snapshot of the serialisable form data """
+        if not isinstance(data, dict) or data.get('version') != SNAPSHOT_VERSION:
+            raise CommandExecutionError('Unsupported snapshot version: {0}'.format(
+                data.get('version') if isinstance(data, dict) else None))
+        try:
+            snapshot = cls(ttl=data['ttl'], host=data.get('host'), hubble_version=data.get('hubble_version'),
+                           taken=float(data['taken']), offline=offline)
+            for fact in data['facts']:
+                key = cls.fact_key(fact['module'], fact['inputs'])
+                if key is not None:
+                    snapshot._facts[key] = (fact['module'], fact['inputs'], fact['status'], fact['result'])
+        except (KeyError, TypeError, ValueError) as exc:
+            raise CommandExecutionError('Malformed snapshot: {0}'.format(exc))
+        return snapshot
+
+    def save(self, path):
+        """ write the snapshot to path (atomically) """
+        with hubblestack.utils.atomicfile.atomic_open(path, 'w') as fh:
+            json.dump(self.to_dict(), fh)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path, offline=False):
+        """ read the snapshot saved at path """
+        try:
+            with open(path, 'r') as fh:
+                data = json.load(fh)
+        except (IOError, OSError, ValueError) as exc:
+            raise CommandExecutionError('Could not load snapshot {0}: {1}'.format(path, exc))
+        return cls.from_dict(data, offline=offline)
+
+
+_SNAPSHOT = None
+_SNAPSHOT_LOCK = threading.Lock()
+
+
+def current(path, ttl=DEFAULT_TTL, host=None, hubble_version=None):
+    """ the snapshot live runs evaluate their checks against: the one in
+        memory, or the one saved at path (by another process), as long as it
+        is fresh and was taken on this host by this version of hubble; a new
+        one otherwise
+    """
+    global _SNAPSHOT
+
+    def _usable(snapshot):
+        return (snapshot is not None and not snapshot.expired and snapshot.ttl == ttl
+                and snapshot.host == host and snapshot.hubble_version == hubble_version)
+
+    with _SNAPSHOT_LOCK:
+        if _usable(_SNAPSHOT):
+            return _SNAPSHOT
+        snapshot = None
+        if path:
+            try:
+                snapshot = HostSnapshot.load(path)
+            except CommandExecutionError as exc:
+                log.debug('Not using the saved snapshot: %s', exc)
+        if not _usable(snapshot):
+            snapshot = HostSnapshot(ttl=ttl, host=host, hubble_version=hubble_version)
+        _SNAPSHOT = snapshot
+        return _SNAPSHOT
+
+
+def reset():
+    """ forget the snapshot in memory """
+    global _SNAPSHOT
+    with _SNAPSHOT_LOCK:
+        _SNAPSHOT = None
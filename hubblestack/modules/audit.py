@@ -86,6 +86,22 @@ The output of this module is dict containing result of execution of checks. It c
 3. Success - A check is executed and results in a success
 4. Failure - A check is executed and results in failure
 There are additional features as verbose logging, compliance and debug which can be passed as flags.
+
+Host snapshots:
+    With ``hubblestack:audit:snapshot_ttl`` set (seconds, 0 - the default - disables it),
+    the results of the audit modules are recorded in a snapshot of the host (kept in
+    the cachedir), and runs within its TTL evaluate their checks against it instead of
+    probing the host again. export_snapshot() writes the snapshot out, and
+    ``audit.run <profiles> snapshot=<path>`` evaluates profiles against an exported
+    snapshot without probing the host at all.
+
+Incremental runs:
+    With ``hubblestack:audit:incremental`` set to True, the results of the checks whose
+    items all report the files they read (readfile, grep, stat, pkg and ssl_certificate
+    with a path) are kept in the cachedir, and the next runs return them (with
+    ``from_cache`` set) rather than executing the checks again, as long as neither the
+    checks nor those files changed. ``audit.run <profiles> full_run=True`` executes every
+    check.
 """
 
 import logging
@@ -93,14 +109,18 @@ import os
 
 import yaml
 
+import hubblestack.module_runner.result_cache as result_cache
 import hubblestack.module_runner.runner_factory as runner_factory
-from hubblestack.utils.exceptions import CommandExecutionError
+import hubblestack.module_runner.snapshot as host_snapshot
+from hubblestack.exceptions import CommandExecutionError
 from hubblestack.status import HubbleStatus
 
 log = logging.getLogger(__name__)
 
 hubble_status = HubbleStatus(__name__, 'top', 'run')
 BASE_DIR_AUDIT_PROFILES = 'hubblestack_audit_profiles'
+SNAPSHOT_FILE = 'audit_snapshot.json'
+RESULT_CACHE_FILE = 'audit_results.json'
 
 CHECK_STATUS = {
     'Success': 'Success',
@@ -115,7 +135,9 @@ def run(audit_files=None,
         tags='*',
         labels=None,
         verbose=None,
-        show_compliance=None):
+        show_compliance=None,
+        snapshot=None,
+        full_run=False):
     """
     :param audit_files:
         Profile to execute. Can have one or more files
@@ -130,6 +152,13 @@ def run(audit_files=None,
         and descriptions.
     :param show_compliance:
         Whether to show compliance with results or not
+    :param snapshot:
+        Path of a snapshot written by export_snapshot() to evaluate the checks
+        against instead of the live host. Checks the snapshot has no result
+        for fail with 'not_in_snapshot'.
+    :param full_run:
+        Execute every check, even in incremental mode (their results are still
+        kept for the next runs)
     :return:
         Returns dictionary with Success, Skipped, and Failure keys and the
         results of the checks
@@ -139,7 +168,9 @@ def run(audit_files=None,
             return top(verbose=verbose,
                        tags=tags,
                        show_compliance=show_compliance,
-                       labels=labels)
+                       labels=labels,
+                       snapshot=snapshot,
+                       full_run=full_run)
 
         audit_runner = runner_factory.get_audit_runner()
 
@@ -169,15 +200,23 @@ def run(audit_files=None,
         if not audit_files:
             return result_dict
 
+        host_state = _get_snapshot(snapshot)
+        kept_results = _get_result_cache(host_state)
+
         # initialize loader
         audit_runner.init_loader()
         for audit_file in audit_files:
             ret = audit_runner.execute(audit_file, {
                 'tags': tags,
                 'labels': labels,
-                'verbose': verbose
+                'verbose': verbose,
+                'snapshot': host_state,
+                'result_cache': kept_results,
+                'full_run': full_run
             })
             combined_dict[audit_file] = ret
+        _save_snapshot(host_state)
+        _save_result_cache(kept_results)
 
         _evaluate_results(result_dict, combined_dict, show_compliance, verbose)
     except Exception as e:
@@ -186,6 +225,86 @@ def run(audit_files=None,
     return result_dict
 
 
+def export_snapshot(path):
+    """
+    Write the snapshot of this host (see hubblestack:audit:snapshot_ttl) to a
+    file, to evaluate profiles against later with ``audit.run snapshot=<path>``
+    :param path:
+        Path of the file to write
+    :return:
+        Returns a dictionary with the path, the number of results in the
+        snapshot and when it was taken
+    """
+    host_state = _get_snapshot(None)
+    if host_state is None:
+        raise CommandExecutionError('Host snapshots are disabled, set hubblestack:audit:snapshot_ttl')
+    host_state.save(path)
+    return {'path': path, 'facts': len(host_state), 'taken': host_state.taken}
+
+
+def _snapshot_path():
+    """ where the snapshot of this host is kept between processes """
+    return os.path.join(__opts__['cachedir'], SNAPSHOT_FILE)
+
+
+def _get_snapshot(snapshot):
+    """
+    The snapshot checks are evaluated against: the exported one at the path
+    snapshot, the current one of this host if snapshots are enabled, or None
+    """
+    if snapshot:
+        return host_snapshot.HostSnapshot.load(snapshot, offline=True)
+    ttl = __mods__['config.get']('hubblestack:audit:snapshot_ttl', 0)
+    try:
+        ttl = int(ttl)
+    except (TypeError, ValueError):
+        log.error('Invalid hubblestack:audit:snapshot_ttl: %s', ttl)
+        return None
+    if ttl <= 0:
+        return None
+    return host_snapshot.current(_snapshot_path(), ttl=ttl,
+                                 host=__grains__.get('id'),
+                                 hubble_version=__grains__.get('hubble_version'))
+
+
+def _save_snapshot(host_state):
+    """ keep the new results of the snapshot for the runs of other processes """
+    if host_state is None or host_state.offline or not host_state.dirty:
+        return
+    try:
+        host_state.save(_snapshot_path())
+    except (IOError, OSError) as exc:
+        log.error('Could not save the host snapshot: %s', exc)
+
+
+def _result_cache_path():
+    """ where the results of incremental runs are kept """
+    return os.path.join(__opts__['cachedir'], RESULT_CACHE_FILE)
+
+
+def _get_result_cache(host_state):
+    """
+    The results kept by earlier runs if incremental runs are enabled (and the
+    checks aren't evaluated against an exported snapshot), None otherwise
+    """
+    incremental = __mods__['config.get']('hubblestack:audit:incremental', False)
+    if type(incremental) is str:
+        incremental = incremental.lower().strip() == 'true'
+    if not incremental or (host_state is not None and host_state.offline):
+        return None
+    return result_cache.ResultCache.load(_result_cache_path(), hubble_version=__grains__.get('hubble_version'))
+
+
+def _save_result_cache(kept_results):
+    """ keep the results of this run for the next ones """
+    if kept_results is None or not kept_results.dirty:
+        return
+    try:
+        kept_results.save(_result_cache_path())
+    except (IOError, OSError) as exc:
+        log.error('Could not save the audit results: %s', exc)
+
+
 def _get_audit_files(audit_files):
     """Get audit files list, if valid
 
@@ -263,7 +382,9 @@ def top(topfile='top.audit',
         tags='*',
         verbose=None,
         show_compliance=None,
-        labels=None):
+        labels=None,
+        snapshot=None,
+        full_run=False):
     """
     Top function that is called from hubble config file
     :param topfile:
@@ -275,6 +396,10 @@ def top(topfile='top.audit',
     :param labels:
         Tests with matching labels are executed. If multiple labels are passed,
         then tests which have all those labels are executed.
+    :param snapshot:
+        Path of an exported snapshot to evaluate the checks against (see run)
+    :param full_run:
+        Execute every check, even in incremental mode (see run)
     :return:
     """
     if verbose is None:
@@ -300,7 +425,9 @@ def top(topfile='top.audit',
                   tags=tag,
                   verbose=verbose,
                   show_compliance=False,
-                  labels=labels)
+                  labels=labels,
+                  snapshot=snapshot,
+                  full_run=full_run)
 
         # Merge in the results
         for key, val in ret.items():
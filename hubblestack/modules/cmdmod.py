@@ -57,6 +57,7 @@ __virtualname__ = 'cmd'
 log = logging.getLogger(__name__)
 
 DEFAULT_SHELL = hubblestack.grains.extra.shell()['shell']
+DEFAULT_MAX_PROCS = 8
 
 
 # Overwriting the cmd python module makes debugging modules with pdb a bit
@@ -363,37 +364,62 @@ def _parse_env(env):
         env = {}
     return env
 
-def _run(cmd,
-         cwd=None,
-         stdin=None,
-         stdout=subprocess.PIPE,
-         stderr=subprocess.PIPE,
-         output_encoding=None,
-         output_loglevel='debug',
-         log_callback=None,
-         runas=None,
-         group=None,
-         shell=DEFAULT_SHELL,
-         python_shell=False,
-         env=None,
-         clean_env=False,
-         prepend_path=None,
-         rstrip=True,
-         umask=None,
-         timeout=None,
-         with_communicate=True,
-         reset_system_locale=True,
-         ignore_retcode=False,
-         saltenv='base',
-         pillarenv=None,
-         pillar_override=None,
-         password=None,
-         bg=False,
-         encoded_cmd=False,
-         success_retcodes=None,
-         **kwargs):
+def _run(cmd, *args, **kwargs):
     '''
     Do the DRY thing and only call subprocess.Popen() once
+
+    Accepts the same arguments as ``_prepare_run``.
+    '''
+    spec = _prepare_run(cmd, *args, **kwargs)
+    if 'ret' in spec:
+        return spec['ret']
+
+    # This is where the magic happens
+    try:
+        proc = hubblestack.utils.timed_subprocess.TimedProc(spec['cmd'], **spec['kwargs'])
+    except (OSError, IOError) as exc:
+        raise CommandExecutionError(_spawn_error_msg(spec, exc))
+
+    try:
+        proc.run()
+    except TimedProcTimeoutError as exc:
+        return _timeout_ret(proc, exc)
+
+    return _collect_run(proc, spec)
+
+def _prepare_run(cmd,
+                 cwd=None,
+                 stdin=None,
+                 stdout=subprocess.PIPE,
+                 stderr=subprocess.PIPE,
+                 output_encoding=None,
+                 output_loglevel='debug',
+                 log_callback=None,
+                 runas=None,
+                 group=None,
+                 shell=DEFAULT_SHELL,
+                 python_shell=False,
+                 env=None,
+                 clean_env=False,
+                 prepend_path=None,
+                 rstrip=True,
+                 umask=None,
+                 timeout=None,
+                 with_communicate=True,
+                 reset_system_locale=True,
+                 ignore_retcode=False,
+                 saltenv='base',
+                 pillarenv=None,
+                 pillar_override=None,
+                 password=None,
+                 bg=False,
+                 encoded_cmd=False,
+                 success_retcodes=None,
+                 **kwargs):
+    '''
+    Validate the arguments of a command and build everything needed to spawn
+    it and to post-process its output. If the command was already handled
+    (Windows runas) the returned dict holds the final result under ``ret``.
     '''
     if 'pillar' in kwargs and not pillar_override:
         pillar_override = kwargs['pillar']
@@ -461,8 +487,6 @@ def _run(cmd,
         else:
             cmd = 'Powershell -NonInteractive -NoProfile "{0}"'.format(cmd.replace('"', '\\"'))
 
-    ret = {}
-
     # If the pub jid is here then this is a remote ex or salt call command and needs to be
     # checked if blacklisted
     if '__pub_jid' in kwargs:
@@ -512,7 +536,7 @@ def _run(cmd,
         if isinstance(cmd, (list, tuple)):
             cmd = ' '.join(cmd)
 
-        return win_runas(cmd, runas, password, cwd)
+        return {'ret': win_runas(cmd, runas, password, cwd)}
 
     if runas and hubblestack.utils.platform.is_darwin():
         # We need to insert the user simulation into the command itself and not
@@ -759,39 +783,58 @@ def _run(cmd,
                 'success_retcodes must be a list of integers'
             )
 
-    # This is where the magic happens
-    try:
-        proc = hubblestack.utils.timed_subprocess.TimedProc(cmd, **new_kwargs)
-    except (OSError, IOError) as exc:
-        msg = (
-            'Unable to run command \'{0}\' with the context \'{1}\', '
-            'reason: '.format(
-                cmd if output_loglevel is not None else 'REDACTED',
-                new_kwargs
-            )
-        )
-        try:
-            if exc.filename is None:
-                msg += 'command not found'
-            else:
-                msg += '{0}: {1}'.format(exc, exc.filename)
-        except AttributeError:
-            # Both IOError and OSError have the filename attribute, so this
-            # is a precaution in case the exception classes in the previous
-            # try/except are changed.
-            msg += 'unknown'
-        raise CommandExecutionError(msg)
+    return {'cmd': cmd,
+            'kwargs': new_kwargs,
+            'output_encoding': output_encoding,
+            'output_loglevel': output_loglevel,
+            'log_callback': log_callback,
+            'rstrip': rstrip,
+            'ignore_retcode': ignore_retcode,
+            'success_retcodes': success_retcodes}
 
+def _spawn_error_msg(spec, exc):
+    '''
+    Build the error message for a command that could not be started
+    '''
+    msg = (
+        'Unable to run command \'{0}\' with the context \'{1}\', '
+        'reason: '.format(
+            spec['cmd'] if spec['output_loglevel'] is not None else 'REDACTED',
+            spec['kwargs']
+        )
+    )
     try:
-        proc.run()
-    except TimedProcTimeoutError as exc:
-        ret['stdout'] = str(exc)
-        ret['stderr'] = ''
-        ret['retcode'] = None
-        ret['pid'] = proc.process.pid
-        # ok return code for timeouts?
-        ret['retcode'] = 1
-        return ret
+        if exc.filename is None:
+            msg += 'command not found'
+        else:
+            msg += '{0}: {1}'.format(exc, exc.filename)
+    except AttributeError:
+        # Both IOError and OSError have the filename attribute, so this
+        # is a precaution in case the exception classes in the previous
+        # try/except are changed.
+        msg += 'unknown'
+    return msg
+
+def _timeout_ret(proc, exc):
+    '''
+    Return data for a command that was killed after its timeout
+    '''
+    # ok return code for timeouts?
+    return {'stdout': str(exc),
+            'stderr': '',
+            'retcode': 1,
+            'pid': proc.process.pid}
+
+def _collect_run(proc, spec):
+    '''
+    Decode, log and return the output of a finished command
+    '''
+    cmd = spec['cmd']
+    output_encoding = spec['output_encoding']
+    output_loglevel = spec['output_loglevel']
+    log_callback = spec['log_callback']
+    ignore_retcode = spec['ignore_retcode']
+    ret = {}
 
     if output_loglevel != 'quiet' and output_encoding is not None:
         log.debug('Decoding output from command %s using %s encoding',
@@ -833,14 +876,14 @@ def _run(cmd,
                 'characters have been replaced', cmd
             )
 
-    if rstrip:
+    if spec['rstrip']:
         if out is not None:
             out = out.rstrip()
         if err is not None:
             err = err.rstrip()
     ret['pid'] = proc.process.pid
     ret['retcode'] = proc.process.returncode
-    if ret['retcode'] in success_retcodes:
+    if ret['retcode'] in spec['success_retcodes']:
         ret['retcode'] = 0
     ret['stdout'] = out
     ret['stderr'] = err
@@ -1173,6 +1216,139 @@ def run_all(cmd,
         ret['stdout'] = ret['stderr'] = ''
     return ret
 
+def _run_many(cmds, max_procs=None, **kwargs):
+    '''
+    Prepare every command of ``cmds``, run them concurrently with at most
+    ``max_procs`` children alive at once and return their ``_run`` style
+    results in input order.
+
+    Each item of ``cmds`` is either a command or a dict holding the command
+    under ``cmd`` plus any keyword arguments overriding ``kwargs`` for that
+    command only. A command that cannot be started, or whose arguments are
+    invalid, gets ``retcode`` 1 and the error in ``stderr`` instead of
+    aborting the whole batch.
+    '''
+    if max_procs is None:
+        try:
+            max_procs = __opts__.get('cmd_max_procs', DEFAULT_MAX_PROCS)
+        except NameError:
+            max_procs = DEFAULT_MAX_PROCS
+
+    def _error_ret(msg):
+        return {'pid': None, 'retcode': 1, 'stdout': '', 'stderr': str(msg)}
+
+    specs = []
+    for item in cmds:
+        opts = dict(kwargs)
+        if isinstance(item, dict):
+            opts.update(item)
+            cmd = opts.pop('cmd')
+        else:
+            cmd = item
+        if hubblestack.utils.platform.is_windows():
+            # pipes cannot be multiplexed on Windows, run sequentially
+            try:
+                specs.append({'ret': _run(cmd, **opts)})
+            except (CommandExecutionError, HubbleInvocationError) as exc:
+                specs.append({'ret': _error_ret(exc)})
+            continue
+        try:
+            specs.append(_prepare_run(cmd, **opts))
+        except (CommandExecutionError, HubbleInvocationError) as exc:
+            specs.append({'ret': _error_ret(exc)})
+
+    jobs = [(spec['cmd'], spec['kwargs']) for spec in specs if 'ret' not in spec]
+    procs = iter(hubblestack.utils.timed_subprocess.run_many(jobs, max_procs=max_procs))
+
+    ret = []
+    for spec in specs:
+        if 'ret' in spec:
+            ret.append(spec['ret'])
+            continue
+        proc = next(procs)
+        if isinstance(proc, (OSError, IOError)):
+            ret.append(_error_ret(_spawn_error_msg(spec, proc)))
+        elif isinstance(proc, Exception):
+            ret.append(_error_ret(proc))
+        elif proc.timed_out:
+            ret.append(_timeout_ret(proc, proc.timeout_error()))
+        else:
+            ret.append(_collect_run(proc, spec))
+    return ret
+
+def run_all_many(cmds,
+                 max_procs=None,
+                 python_shell=None,
+                 redirect_stderr=False,
+                 hide_output=False,
+                 **kwargs):
+    '''
+    Execute several commands concurrently and return a list of ``run_all``
+    style dicts, in the same order as ``cmds``
+
+    All children are driven by one reaper loop in the calling thread instead
+    of a watchdog thread per command, which makes this much cheaper than
+    calling ``run_all`` in a loop for many short commands.
+
+    :param list cmds: The commands to run. Each item is either a command, as
+        accepted by ``run_all``, or a dict with the command under ``cmd`` and
+        any ``run_all`` keyword arguments (``timeout``, ``cwd``, ``stdin``,
+        ``env``, ...) that apply to that command only.
+
+    :param int max_procs: The maximum number of commands running at the same
+        time. Defaults to the ``cmd_max_procs`` config option, or 8.
+
+    Any other keyword argument accepted by ``run_all`` is used as the default
+    for every command, e.g. ``timeout`` is a per-command timeout. A command
+    which could not be started gets a ``retcode`` of 1 and the reason in
+    ``stderr``; timed out commands are reported exactly like ``run_all`` does.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' cmd.run_all_many '["systemctl is-enabled sshd", "systemctl is-enabled crond"]' timeout=5
+    '''
+    python_shell = _python_shell_default(python_shell,
+                                         kwargs.get('__pub_jid', ''))
+    stderr = subprocess.STDOUT if redirect_stderr else subprocess.PIPE
+    ret = _run_many(cmds,
+                    max_procs=max_procs,
+                    python_shell=python_shell,
+                    stderr=stderr,
+                    **kwargs)
+    if hide_output:
+        for item in ret:
+            item['stdout'] = item['stderr'] = ''
+    return ret
+
+def run_many(cmds,
+             max_procs=None,
+             python_shell=None,
+             hide_output=False,
+             **kwargs):
+    '''
+    Execute several commands concurrently and return a list with the output of
+    each, in the same order as ``cmds``. Like ``run``, stderr is merged into
+    the output.
+
+    Takes the same arguments as ``run_all_many``.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' cmd.run_many '["sysctl -n kernel.randomize_va_space", "uname -r"]' max_procs=4
+    '''
+    python_shell = _python_shell_default(python_shell,
+                                         kwargs.get('__pub_jid', ''))
+    ret = _run_many(cmds,
+                    max_procs=max_procs,
+                    python_shell=python_shell,
+                    stderr=subprocess.STDOUT,
+                    **kwargs)
+    return [item['stdout'] if not hide_output else '' for item in ret]
+
 def _retcode_quiet(cmd,
                    cwd=None,
                    stdin=None,
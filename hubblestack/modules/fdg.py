@@ -110,6 +110,17 @@ value in the iteration. The results are put in a list, which is then returned.
 The ``chained`` kwarg of the called module.function is the destination for
 these ``xpipe`` values, same as with the ``pipe`` chaining keywords.
 
+The calls of an ``xpipe`` are made one after another, unless the block sets
+``xpipe_workers`` to the number of calls that can be in flight at once (eg:
+for chained blocks that query URLs)::
+
+    unique_id:
+        module: module_name.function
+        xpipe: url_block
+        xpipe_workers: 8
+
+The results are in the order of the iterated values either way.
+
 If there are no chaining keywords that are valid to execute, the fdg execution
 will end and any ``return`` keywords will be evaluated as we move back up the
 call chain.
@@ -117,12 +128,14 @@ call chain.
 
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import yaml
 
 import hubblestack.module_runner.runner_factory as runner_factory
 from hubblestack.exceptions import CommandExecutionError
 import hubblestack.loader
+import hubblestack.utils.http_sessions
 
 log = logging.getLogger(__name__)
 __fdg__ = None
@@ -181,6 +194,9 @@ def fdg(fdg_file, starting_chained=None):
     # so that we don't have to pass new arguments everywhere
     global RETURNER_ID_BLOCK
     RETURNER_ID_BLOCK = (fdg_file, str(starting_chained))
+    # the curl blocks of this file share connections and GET responses, but
+    # nothing is reused from an earlier execution
+    hubblestack.utils.http_sessions.reset()
     # Recursive execution of the blocks
     ret = _fdg_execute('main', block_data, chained=starting_chained)
     return RETURNER_ID_BLOCK, ret
@@ -322,10 +338,12 @@ def _fdg_execute(block_id, block_data, chained=None, chained_status=None):
 
     if 'xpipe_on_true' in block and status:
         log.debug('Piping via chaining keyword xpipe_on_true.')
-        return _xpipe(ret, status, block_data, block['xpipe_on_true'], returner)
+        return _xpipe(ret, status, block_data, block['xpipe_on_true'], returner,
+                      block.get('xpipe_workers'))
     elif 'xpipe_on_false' in block and not status:
         log.debug('Piping via chaining keyword xpipe_on_false.')
-        return _xpipe(ret, status, block_data, block['xpipe_on_false'], returner)
+        return _xpipe(ret, status, block_data, block['xpipe_on_false'], returner,
+                      block.get('xpipe_workers'))
     elif 'pipe_on_true' in block and status:
         log.debug('Piping via chaining keyword pipe_on_true.')
         return _pipe(ret, status, block_data, block['pipe_on_true'], returner)
@@ -334,7 +352,8 @@ def _fdg_execute(block_id, block_data, chained=None, chained_status=None):
         return _pipe(ret, status, block_data, block['pipe_on_false'], returner)
     elif 'xpipe' in block:
         log.debug('Piping via chaining keyword xpipe.')
-        return _xpipe(ret, status, block_data, block['xpipe'], returner)
+        return _xpipe(ret, status, block_data, block['xpipe'], returner,
+                      block.get('xpipe_workers'))
     elif 'pipe' in block:
         log.debug('Piping via chaining keyword pipe.')
         return _pipe(ret, status, block_data, block['pipe'], returner)
@@ -365,6 +384,7 @@ def _check_block(block, block_id):
         'pipe_on_false',
         'args',
         'kwargs',
+        'xpipe_workers',
     }
     for key in block:
         if key not in acceptable_block_args:
@@ -373,16 +393,23 @@ def _check_block(block, block_id):
                                         .format(block_id, key))
     return True
 
-def _xpipe(chained, chained_status, block_data, block_id, returner=None):
+def _xpipe(chained, chained_status, block_data, block_id, returner=None, workers=None):
     """
     Iterate over the given value and for each iteration, call the given fdg
-    block by id with the iteration value as the passthrough.
+    block by id with the iteration value as the passthrough (with up to
+    ``workers`` calls at once).
 
     The results will be returned as a list.
     """
-    ret = []
-    for value in chained:
-        ret.append(_fdg_execute(block_id, block_data, value, chained_status))
+    values = list(chained)
+    workers = int(workers or 1)
+    if workers > 1 and len(values) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(values)),
+                                thread_name_prefix='fdg-xpipe') as executor:
+            ret = list(executor.map(
+                lambda value: _fdg_execute(block_id, block_data, value, chained_status), values))
+    else:
+        ret = [_fdg_execute(block_id, block_data, value, chained_status) for value in values]
     if returner:
         _return(ret, returner)
     return ret
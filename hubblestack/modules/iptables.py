@@ -28,10 +28,13 @@ master config. The configuration is read using :py:func:`config.get
 import logging
 
 # Import python libs
+import copy
+import ipaddress
 import os
 import re
 import string
 import sys
+import time
 import uuid
 
 # Import hubble libs
@@ -109,6 +112,39 @@ _STATE_INTERNAL_KEYWORDS = STATE_REQUISITE_KEYWORDS.union(
     STATE_REQUISITE_IN_KEYWORDS
 ).union(STATE_RUNTIME_KEYWORDS)
 
+# how long snapshot() keeps the ruleset it read (seconds)
+SNAPSHOT_TTL = 60
+
+# long option -> the form iptables-save prints
+_RULE_OPTION_ALIASES = {
+    "--protocol": "-p",
+    "--source": "-s",
+    "--src": "-s",
+    "--destination": "-d",
+    "--dst": "-d",
+    "--in-interface": "-i",
+    "--out-interface": "-o",
+    "--jump": "-j",
+    "--goto": "-g",
+    "--match": "-m",
+    "--fragment": "-f",
+    "--source-port": "--sport",
+    "--destination-port": "--dport",
+    "--source-ports": "--sports",
+    "--destination-ports": "--dports",
+    "--state": "--ctstate",
+}
+# the options whose values _canonical_rule() knows how iptables-save prints;
+# rules with any other option are checked with iptables itself
+_RULE_OPTIONS = frozenset(
+    [
+        "-p", "-s", "-d", "-i", "-o", "-j", "-g", "-m", "-f",
+        "--sport", "--dport", "--sports", "--dports",
+        "--ctstate", "--comment", "--reject-with", "--log-prefix",
+    ]
+)
+_PROTOCOL_NUMBERS = {"1": "icmp", "6": "tcp", "17": "udp", "58": "ipv6-icmp"}
+
 
 def __virtual__():
     """
@@ -242,6 +278,189 @@ def _regex_iptables_save(cmd_output, filters=None):
     return cmd_output
 
 
+def _index_save(output):
+    """
+    Index the output of iptables-save by table and chain:
+    {table: {chain: {"policy": policy, "rules": [rule, ...]}}}, where each rule
+    is the rest of its "-A <chain>" line
+    """
+    ret = {}
+    table = None
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith("*"):
+            table = ret.setdefault(line[1:], {})
+        elif table is None:
+            continue
+        elif line.startswith(":"):
+            comps = line[1:].split()
+            if comps:
+                table[comps[0]] = {
+                    "policy": comps[1] if len(comps) > 1 else "-",
+                    "rules": [],
+                }
+        elif line.startswith("-A "):
+            comps = line.split(None, 2)
+            if len(comps) > 1:
+                chain = table.setdefault(comps[1], {"policy": "-", "rules": []})
+                chain["rules"].append(comps[2] if len(comps) > 2 else "")
+    return ret
+
+
+def _canonical_rule(rule, family="ipv4"):
+    """
+    Return a rule (the part after "-A <chain>" in iptables-save's format, or
+    what build_rule() returns) in a form that compares equal for equivalent
+    rules: long options replaced by short ones, implicit protocol matches
+    dropped, addresses as networks, state as conntrack, option order ignored.
+
+    Returns None if the rule has options we don't know how iptables-save
+    normalizes (or can't be parsed); only iptables can tell about those.
+    """
+    try:
+        args = hubblestack.utils.args.shlex_split(rule)
+    except ValueError:
+        return None
+    items = []
+    negate = False
+    idx = 0
+    while idx < len(args):
+        arg = args[idx]
+        idx += 1
+        if arg == "!":
+            negate = True
+            continue
+        if not arg.startswith("-") or arg == "-":
+            return None
+        option = _RULE_OPTION_ALIASES.get(arg, arg)
+        values = []
+        while idx < len(args) and args[idx] != "!" and not args[idx].startswith("-"):
+            values.append(args[idx])
+            idx += 1
+        if option not in _RULE_OPTIONS:
+            return None
+        items.append([negate, option, " ".join(values)])
+        negate = False
+
+    protocol = None
+    for item in items:
+        if item[1] == "-p":
+            protocol = _PROTOCOL_NUMBERS.get(item[2], item[2].lower())
+            if protocol in ("icmpv6", "icmp6"):
+                protocol = "ipv6-icmp"
+            item[2] = protocol
+
+    ret = []
+    for negate, option, value in items:
+        if option == "-p" and value == "all" and not negate:
+            continue
+        if option == "-m":
+            value = value.lower()
+            if value == "state":
+                value = "conntrack"
+            # iptables-save spells out the match of the protocol (-m tcp)
+            if value == protocol or (value == "icmp6" and protocol == "ipv6-icmp"):
+                continue
+        elif option in ("-s", "-d"):
+            try:
+                value = ",".join(
+                    str(ipaddress.ip_network(addr, strict=False))
+                    for addr in value.split(",")
+                )
+            except ValueError:
+                # host names are resolved by iptables
+                return None
+        elif option in ("--sport", "--dport", "--sports", "--dports"):
+            if not re.match(r"^[0-9:,]+$", value):
+                # service names are resolved by iptables
+                return None
+        elif option == "--ctstate":
+            value = ",".join(sorted(value.upper().split(",")))
+        ret.append((negate, option, value))
+
+    if (False, "-j", "REJECT") in ret:
+        # iptables-save spells out the default reject-with
+        if "--reject-with" not in (x[1] for x in ret):
+            default = "icmp6-port-unreachable" if family == "ipv6" else "icmp-port-unreachable"
+            ret.append((False, "--reject-with", default))
+    return tuple(sorted(ret))
+
+
+def _snapshot(family="ipv4", refresh=False):
+    """
+    Return the memoised iptables-save snapshot of the family (taking a new
+    one if there is none, it is older than SNAPSHOT_TTL or refresh is set)
+    """
+    snapshots = __context__.setdefault("iptables.snapshot", {})
+    memo = snapshots.get(family)
+    now = time.time()
+    if refresh or memo is None or now - memo["taken"] > SNAPSHOT_TTL:
+        cmd = "{0}-save".format(_iptables_cmd(family))
+        output = __mods__["cmd.run"](cmd, output_loglevel="quiet")
+        if not isinstance(output, str):
+            output = ""
+        memo = snapshots[family] = {
+            "taken": now,
+            "output": output,
+            "tables": _index_save(output),
+            "canonical": {},
+            "parsed": None,
+        }
+    return memo
+
+
+def _forget_snapshot(family="ipv4"):
+    """
+    Drop the memoised snapshot of the family (after changing the ruleset)
+    """
+    __context__.get("iptables.snapshot", {}).pop(family, None)
+
+
+def _check_snapshot(table, chain, rule, family="ipv4"):
+    """
+    Check for the rule in the snapshot of the ruleset: True or False, or None
+    if the snapshot can't tell (the table isn't in it, or the rule has options
+    _canonical_rule() doesn't know)
+    """
+    memo = _snapshot(family)
+    chains = memo["tables"].get(table)
+    if chains is None:
+        return None
+    if chain not in chains:
+        return False
+    wanted = _canonical_rule(rule, family)
+    if wanted is None:
+        return None
+    canonical = memo["canonical"].get((table, chain))
+    if canonical is None:
+        canonical = memo["canonical"][(table, chain)] = set(
+            _canonical_rule(x, family) for x in chains[chain]["rules"]
+        )
+    return wanted in canonical
+
+
+def snapshot(family="ipv4", refresh=False):
+    """
+    Return the current ruleset indexed by table and chain:
+    ``{table: {chain: {"policy": policy, "rules": [rule, ...]}}}``
+
+    The ruleset is read with a single iptables-save and kept for SNAPSHOT_TTL
+    seconds; check(), check_chain(), get_rules() and get_policy() answer from
+    it in the meantime. Pass ``refresh=True`` to read it again (eg: at the
+    start of an audit run). Changing the ruleset with this module drops it.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' iptables.snapshot
+
+        IPv6:
+        salt '*' iptables.snapshot family=ipv6
+    """
+    return copy.deepcopy(_snapshot(family, refresh=refresh)["tables"])
+
+
 def version(family="ipv4"):
     """
     Return version from iptables --version
@@ -676,7 +895,8 @@ def get_rules(family="ipv4"):
         salt '*' iptables.get_rules family=ipv6
 
     """
-    return _parse_conf(in_mem=True, family=family)
+    # _parse_conf() memoises the in-memory rules, don't hand those out
+    return copy.deepcopy(_parse_conf(in_mem=True, family=family))
 
 
 def get_saved_policy(table="filter", chain=None, conf_file=None, family="ipv4"):
@@ -753,6 +973,7 @@ def set_policy(table="filter", chain=None, policy=None, family="ipv4"):
         _iptables_cmd(family), wait, table, chain, policy
     )
     out = __mods__["cmd.run"](cmd)
+    _forget_snapshot(family)
     return out
 
 
@@ -813,6 +1034,11 @@ def check(table="filter", chain=None, rule=None, family="ipv4"):
         return "Error: Chain needs to be specified"
     if not rule:
         return "Error: Rule needs to be specified"
+
+    found = _check_snapshot(table, chain, rule, family)
+    if found is not None:
+        return found
+
     ipt_cmd = _iptables_cmd(family)
 
     if _has_option("--check", family):
@@ -864,6 +1090,10 @@ def check_chain(table="filter", chain=None, family="ipv4"):
     if not chain:
         return "Error: Chain needs to be specified"
 
+    chains = _snapshot(family)["tables"].get(table)
+    if chains is not None:
+        return chain in chains
+
     cmd = "{0}-save -t {1}".format(_iptables_cmd(family), table)
     out = __mods__["cmd.run"](cmd).find(":{0} ".format(chain))
 
@@ -897,6 +1127,7 @@ def new_chain(table="filter", chain=None, family="ipv4"):
     wait = "--wait" if _has_option("--wait", family) else ""
     cmd = "{0} {1} -t {2} -N {3}".format(_iptables_cmd(family), wait, table, chain)
     out = __mods__["cmd.run"](cmd)
+    _forget_snapshot(family)
 
     if not out:
         out = True
@@ -925,6 +1156,7 @@ def delete_chain(table="filter", chain=None, family="ipv4"):
     wait = "--wait" if _has_option("--wait", family) else ""
     cmd = "{0} {1} -t {2} -X {3}".format(_iptables_cmd(family), wait, table, chain)
     out = __mods__["cmd.run"](cmd)
+    _forget_snapshot(family)
 
     if not out:
         out = True
@@ -965,6 +1197,7 @@ def append(table="filter", chain=None, rule=None, family="ipv4"):
         _iptables_cmd(family), wait, table, chain, rule
     )
     out = __mods__["cmd.run"](cmd)
+    _forget_snapshot(family)
     return not out
 
 
@@ -1016,6 +1249,7 @@ def insert(table="filter", chain=None, position=None, rule=None, family="ipv4"):
         _iptables_cmd(family), wait, table, chain, position, rule
     )
     out = __mods__["cmd.run"](cmd)
+    _forget_snapshot(family)
     return out
 
 
@@ -1055,6 +1289,7 @@ def delete(table, chain=None, position=None, rule=None, family="ipv4"):
         _iptables_cmd(family), wait, table, chain, rule
     )
     out = __mods__["cmd.run"](cmd)
+    _forget_snapshot(family)
     return out
 
 
@@ -1076,6 +1311,7 @@ def flush(table="filter", chain="", family="ipv4"):
     wait = "--wait" if _has_option("--wait", family) else ""
     cmd = "{0} {1} -t {2} -F {3}".format(_iptables_cmd(family), wait, table, chain)
     out = __mods__["cmd.run"](cmd)
+    _forget_snapshot(family)
     return out
 
 
@@ -1088,12 +1324,16 @@ def _parse_conf(conf_file=None, in_mem=False, family="ipv4"):
         conf_file = _conf(family)
 
     rules = ""
+    memo = None
     if conf_file:
         with hubblestack.utils.files.fopen(conf_file, "r") as ifile:
             rules = ifile.read()
     elif in_mem:
-        cmd = "{0}-save".format(_iptables_cmd(family))
-        rules = __mods__["cmd.run"](cmd)
+        # parse the snapshot (once)
+        memo = _snapshot(family)
+        if memo["parsed"] is not None:
+            return memo["parsed"]
+        rules = memo["output"]
     else:
         raise HubbleException("A file was not found to parse")
 
@@ -1149,6 +1389,8 @@ def _parse_conf(conf_file=None, in_mem=False, family="ipv4"):
                 comment = parsed_args["comment"][0].strip('"')
                 ret[table][chain[0]]["rules_comment"][comment] = ret_args
             ret[table][chain[0]]["rules"].append(ret_args)
+    if memo is not None:
+        memo["parsed"] = ret
     return ret
 
 
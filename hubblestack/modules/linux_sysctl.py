@@ -7,6 +7,7 @@ Module for viewing and modifying sysctl parameters
 import logging
 import os
 import re
+import time
 
 import hubblestack.utils.systemd
 from hubblestack.exceptions import CommandExecutionError
@@ -19,6 +20,13 @@ log = logging.getLogger(__name__)
 # Define the module's virtual name
 __virtualname__ = "sysctl"
 
+PROC_SYS = "/proc/sys"
+# how long snapshot() keeps the values it read (seconds)
+SNAPSHOT_TTL = 60
+# sysctl names use dots where /proc/sys uses slashes and vice versa
+# (eg: net.ipv4.conf.eth0/100.rp_filter is /proc/sys/net/ipv4/conf/eth0.100/rp_filter)
+_SWAP_DOTS_SLASHES = "".maketrans("./", "/.")
+
 # TODO: Add unpersist() to remove either a sysctl or sysctl/value combo from
 # the config
 
@@ -95,18 +103,104 @@ def show(config_file=False):
     return ret
 
 
+def _proc_path(name):
+    """
+    Return the /proc/sys file of a sysctl parameter, or None if the name
+    points outside of /proc/sys. Like sysctl(8), a name whose first separator
+    is a slash is taken as a path.
+    """
+    dot, slash = name.find("."), name.find("/")
+    if dot >= 0 and (slash < 0 or dot < slash):
+        name = name.translate(_SWAP_DOTS_SLASHES)
+    path = os.path.normpath(os.path.join(PROC_SYS, name.strip("/")))
+    if not path.startswith(PROC_SYS + "/"):
+        return None
+    return path
+
+
+def _read_proc(path):
+    """
+    Return the value in a /proc/sys file the way ``sysctl -n`` prints it, or
+    None if it can't be read (write-only or unsupported parameters, missing
+    privileges) -- sysctl itself reports those best.
+    """
+    try:
+        with open(path, "rb") as fh_:
+            data = fh_.read()
+    except (IOError, OSError):
+        return None
+    return hubblestack.utils.stringutils.to_str(data, errors="replace").rstrip()
+
+
 def get(name):
     """
     Return a single sysctl parameter for this minion
+
+    The value is read from /proc/sys directly; ``sysctl -n`` is only run for
+    names /proc/sys doesn't have a (readable) file for.
+
     CLI Example:
     .. code-block:: bash
         salt '*' sysctl.get net.ipv4.ip_forward
     """
+    path = _proc_path(name)
+    if path is not None and os.path.isfile(path):
+        out = _read_proc(path)
+        if out is not None:
+            return out
     cmd = "sysctl -n {0}".format(name)
     out = __mods__["cmd.run"](cmd, python_shell=False)
     return out
 
 
+def _read_all():
+    """
+    Return {name: value} for every readable file under /proc/sys
+    """
+    ret = {}
+    for root, _dirs, files in os.walk(PROC_SYS):
+        prefix = os.path.relpath(root, PROC_SYS).translate(_SWAP_DOTS_SLASHES)
+        for fname in files:
+            value = _read_proc(os.path.join(root, fname))
+            if value is None:
+                continue
+            fname = fname.translate(_SWAP_DOTS_SLASHES)
+            ret[fname if prefix == "/" else "{0}.{1}".format(prefix, fname)] = value
+    return ret
+
+
+def snapshot(names=None, refresh=False):
+    """
+    Return {name: value} for the given sysctl parameters (default: all of
+    them), like get() would for each of them
+
+    The values are memoised for SNAPSHOT_TTL seconds, so the checks of an
+    audit run can read every parameter they need in one pass up front and
+    then look them up. Pass ``refresh=True`` to drop the memoised values
+    first (eg: at the start of a run).
+
+    CLI Example:
+    .. code-block:: bash
+        salt '*' sysctl.snapshot '[net.ipv4.ip_forward, kernel.randomize_va_space]'
+    """
+    now = time.time()
+    memo = __context__.get("sysctl.snapshot")
+    if refresh or memo is None or now - memo["taken"] > SNAPSHOT_TTL:
+        memo = __context__["sysctl.snapshot"] = {"taken": now, "values": {}, "complete": False}
+    values = memo["values"]
+    if names is None:
+        if not memo["complete"]:
+            values.update(_read_all())
+            memo["complete"] = True
+        return dict(values)
+    if isinstance(names, str):
+        names = [names]
+    for name in names:
+        if name not in values:
+            values[name] = get(name)
+    return dict((name, values[name]) for name in names)
+
+
 def assign(name, value):
     """
     Assign a single sysctl parameter for this minion
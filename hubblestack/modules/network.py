@@ -10,6 +10,7 @@ import logging
 import os
 import re
 import socket
+import struct
 import time
 from multiprocessing.pool import ThreadPool
 
@@ -18,7 +19,7 @@ import hubblestack.utils.decorators.path
 import hubblestack.utils.network
 import hubblestack.utils.validate.net
 from hubblestack.utils._compat import ipaddress
-from hubblestack.utils.exceptions import CommandExecutionError
+from hubblestack.exceptions import CommandExecutionError
 
 log = logging.getLogger(__name__)
 
@@ -206,6 +207,211 @@ def _ss_linux():
     return ret
 
 
+PROC_NET = "/proc/net"
+# the sockets netstat -tulpnea lists
+DEFAULT_PROTOS = ("tcp", "tcp6", "udp", "udp6")
+# the socket states of /proc/net/{tcp,udp,raw}* (include/net/tcp_states.h)
+_INET_STATES = {
+    "01": "ESTABLISHED",
+    "02": "SYN_SENT",
+    "03": "SYN_RECV",
+    "04": "FIN_WAIT1",
+    "05": "FIN_WAIT2",
+    "06": "TIME_WAIT",
+    "07": "CLOSE",
+    "08": "CLOSE_WAIT",
+    "09": "LAST_ACK",
+    "0A": "LISTEN",
+    "0B": "CLOSING",
+}
+_UNIX_STATES = {"01": "", "02": "CONNECTING", "03": "CONNECTED", "04": "DISCONNECTING"}
+_UNIX_TYPES = {"0001": "STREAM", "0002": "DGRAM", "0005": "SEQPACKET"}
+_UNIX_ACCEPTCON = 0x10000
+
+
+def _proc_net_address(hexaddr, cache):
+    """
+    The host:port of a /proc/net address (the address is in host byte order,
+    one 32 bit word at a time), formatted like netstat -n does
+    """
+    if hexaddr in cache:
+        return cache[hexaddr]
+    addr, port = hexaddr.split(":")
+    if len(addr) == 8:
+        host = socket.inet_ntop(socket.AF_INET, struct.pack("=I", int(addr, 16)))
+    else:
+        words = [int(addr[i:i + 8], 16) for i in range(0, 32, 8)]
+        host = socket.inet_ntop(socket.AF_INET6, struct.pack("=4I", *words))
+    port = int(port, 16)
+    ret = cache[hexaddr] = "{0}:{1}".format(host, port or "*")
+    return ret
+
+
+def _socket_programs(inodes=None):
+    """
+    Map the inodes of the sockets open in any process to "pid/program" (like
+    netstat -p shows them), from one scan of /proc/*/fd; stop as soon as all
+    the given inodes are found
+    """
+    ret = {}
+    wanted = set(inodes) if inodes is not None else None
+    try:
+        pids = [pid for pid in os.listdir("/proc") if pid.isdigit()]
+    except OSError:
+        return ret
+    for pid in pids:
+        fd_dir = os.path.join("/proc", pid, "fd")
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            # gone, or not ours to look at
+            continue
+        program = None
+        for fd in fds:
+            try:
+                link = os.readlink(os.path.join(fd_dir, fd))
+            except OSError:
+                continue
+            if not link.startswith("socket:["):
+                continue
+            inode = link[8:-1]
+            if wanted is not None and inode not in wanted:
+                continue
+            if program is None:
+                program = "{0}/{1}".format(pid, _program_name(pid))
+            ret[inode] = program
+            if wanted is not None:
+                wanted.discard(inode)
+                if not wanted:
+                    return ret
+    return ret
+
+
+def _program_name(pid):
+    """
+    The program name netstat -p shows: the basename of argv[0], else the comm
+    """
+    try:
+        with open(os.path.join("/proc", pid, "cmdline"), "rb") as fh:
+            argv0 = fh.read().split(b"\0", 1)[0]
+        if argv0:
+            return os.path.basename(argv0.decode("utf-8", "replace")).split(" ", 1)[0]
+        with open(os.path.join("/proc", pid, "comm"), "rb") as fh:
+            return fh.read().decode("utf-8", "replace").strip()
+    except (IOError, OSError):
+        return "-"
+
+
+def _proc_net_inet(proto, states):
+    """
+    The sockets of /proc/net/<proto> (tcp, tcp6, udp, udp6, raw or raw6), in
+    the states given (state names, None for all of them)
+    """
+    ret = []
+    cache = {}
+    tcp = proto.startswith("tcp")
+    with open(os.path.join(PROC_NET, proto)) as fh:
+        next(fh)
+        for line in fh:
+            comps = line.split()
+            if len(comps) < 10:
+                continue
+            state = _INET_STATES.get(comps[3], comps[3])
+            if states is not None:
+                # unconnected udp and raw sockets are the listening ones
+                # (as far as netstat -l is concerned)
+                if not (state in states or (not tcp and state == "CLOSE" and "LISTEN" in states)):
+                    continue
+            tx_queue, rx_queue = comps[4].split(":")
+            entry = {
+                "proto": proto,
+                "recv-q": str(int(rx_queue, 16)),
+                "send-q": str(int(tx_queue, 16)),
+                "local-address": _proc_net_address(comps[1], cache),
+                "remote-address": _proc_net_address(comps[2], cache),
+            }
+            if tcp:
+                entry["state"] = state
+            entry["user"] = comps[7]
+            entry["inode"] = comps[9]
+            ret.append(entry)
+    return ret
+
+
+def _proc_net_unix(states):
+    """
+    The unix sockets of /proc/net/unix, in the states given (state names,
+    LISTEN for the listening ones; None for all of them)
+    """
+    ret = []
+    with open(os.path.join(PROC_NET, "unix")) as fh:
+        next(fh)
+        for line in fh:
+            comps = line.split(None, 7)
+            if len(comps) < 7:
+                continue
+            flags = int(comps[3], 16)
+            if flags & _UNIX_ACCEPTCON:
+                state = "LISTENING"
+            else:
+                state = _UNIX_STATES.get(comps[5], comps[5])
+            if states is not None and state not in states \
+                    and not (state == "LISTENING" and "LISTEN" in states):
+                continue
+            ret.append(
+                {
+                    "proto": "unix",
+                    "refcnt": str(int(comps[1], 16)),
+                    "flags": comps[3],
+                    "type": _UNIX_TYPES.get(comps[4], comps[4]),
+                    "state": state,
+                    "inode": comps[6],
+                    "path": comps[7].rstrip("\n") if len(comps) > 7 else "",
+                }
+            )
+    return ret
+
+
+def _proc_net_linux(protos=DEFAULT_PROTOS, states=None, programs=True):
+    """
+    Return netstat information for Linux from /proc/net, in the format of
+    _netstat_linux
+
+    protos:   the socket tables to read (tcp, tcp6, udp, udp6, raw, raw6, unix)
+    states:   only return the sockets in these states (eg: ['LISTEN'])
+    programs: look up the pid/program of every socket (one /proc/*/fd scan)
+    """
+    ret = []
+    for proto in protos:
+        try:
+            if proto == "unix":
+                ret.extend(_proc_net_unix(states))
+            else:
+                ret.extend(_proc_net_inet(proto, states))
+        except (IOError, OSError) as exc:
+            # no ipv6 (or no raw sockets) on this host
+            log.debug("Unable to read %s/%s: %s", PROC_NET, proto, exc)
+    if programs:
+        owners = _socket_programs(entry["inode"] for entry in ret if entry["inode"] != "0")
+    else:
+        owners = {}
+    for entry in ret:
+        entry["program"] = owners.get(entry["inode"], "-")
+    return ret
+
+
+def _filter_states(entries, states):
+    """
+    Filter the output of _netstat_linux and _ss_linux by state (their udp
+    sockets have no state, they are all listed by netstat -l)
+    """
+    return [
+        entry
+        for entry in entries
+        if entry.get("state") in states or ("state" not in entry and "LISTEN" in states)
+    ]
+
+
 def _netinfo_openbsd():
     """
     Get process information for network connections using fstat
@@ -821,10 +1027,27 @@ def _netstat_route_aix():
     return ret
 
 
-def netstat():
+def netstat(state=None, proto=None, programs=True):
     """
     Return information on open ports and states
 
+    On Linux the sockets are read from /proc/net (falling back to netstat or
+    ss when it can't be read), and the results can be narrowed down:
+
+    state
+        Only return the sockets in the given state or states (eg: ``LISTEN``;
+        for udp, raw and unix sockets ``LISTEN`` means the sockets netstat -l
+        lists). Filtered while /proc/net is read, the full table isn't built.
+
+    proto
+        The sockets to return: ``tcp``, ``tcp6``, ``udp``, ``udp6``, ``raw``,
+        ``raw6`` and/or ``unix`` (default: the tcp and udp ones, like netstat
+        -tulpnea)
+
+    programs
+        Find the pid/program of each socket (default: True); skipping it
+        saves a scan of the open files of every process
+
     .. note::
         On BSD minions, the output contains PID info (where available) for each
         netstat entry, fetched from sockstat/fstat output.
@@ -844,10 +1067,18 @@ def netstat():
 
         salt '*' network.netstat
     """
+    if isinstance(state, str):
+        state = [state]
+    if isinstance(proto, str):
+        proto = [proto]
     if __grains__["kernel"] == "Linux":
+        if os.path.isfile(os.path.join(PROC_NET, "tcp")):
+            return _proc_net_linux(proto or DEFAULT_PROTOS, state, programs)
         if not __utils__["path.which"]("netstat"):
-            return _ss_linux()
-        return _netstat_linux()
+            ret = _ss_linux()
+        else:
+            ret = _netstat_linux()
+        return ret if state is None else _filter_states(ret, state)
     elif __grains__["kernel"] in ("OpenBSD", "FreeBSD", "NetBSD"):
         return _netstat_bsd()
     elif __grains__["kernel"] == "SunOS":
@@ -15,6 +15,8 @@ Watch files and translate the changes into salt events
 import types
 import base64
 import collections
+import collections.abc
+import copy
 import fnmatch
 import os
 import re
@@ -22,6 +24,7 @@ import yaml
 import time
 
 from hubblestack.exceptions import CommandExecutionError
+from hubblestack.utils.pathtrie import PathTrie, OwnedView
 import hubblestack.utils.platform
 
 try:
@@ -42,6 +45,9 @@ except ImportError:
 
 __virtualname__ = 'pulsar'
 SPAM_TIME = 0 # track spammy status message times
+# pulsar config keys that aren't paths to watch
+NON_PATH_KEYS = ('return', 'checksum', 'stats', 'batch', 'verbose', 'paths',
+                 'refresh_interval', 'contents_size', 'checksum_size')
 TOP = None
 TOP_STALENESS = 0
 
@@ -63,6 +69,34 @@ def _get_mask(mask):
     return MASKS.get(mask, 0)
 
 
+def _watch_mask(pconfig):
+    """
+    Return the int mask to watch a path with, given its config
+    """
+    if not isinstance(pconfig, dict):
+        return DEFAULT_MASK
+    mask = pconfig.get('mask', DEFAULT_MASK)
+    if isinstance(mask, list):
+        r_mask = 0
+        for sub in mask:
+            r_mask |= _get_mask(sub)
+        mask = r_mask
+    elif isinstance(mask, bytes):
+        mask = _get_mask(mask)
+    if pconfig.get('watch_files', False):
+        # we're going to get dup modify events if watch_files is set
+        # and we still monitor modify for the dir
+        mask_and_modify = mask & pyinotify.IN_MODIFY
+        if mask_and_modify:
+            log.debug("mask={0} -= mask & pyinotify.IN_MODIFY={1}" \
+                " ==> {2}".format(
+                    mask,
+                    mask_and_modify,
+                    mask-mask_and_modify))
+            mask -= mask_and_modify
+    return mask
+
+
 def _enqueue(revent):
     """
     Enqueue the event
@@ -188,7 +222,7 @@ class ConfigManager(object):
 
 class PulsarWatchManager(pyinotify.WatchManager):
     """ Subclass of pyinotify.WatchManager for the purposes:
-        * adding dict() based watch_db (for faster lookups)
+        * adding a PathTrie based watch_db (for faster lookups)
         * adding file watches (to notice changes to hardlinks outside the watched locations)
         * adding various convenience functions
 
@@ -200,6 +234,12 @@ class PulsarWatchManager(pyinotify.WatchManager):
 
             for path in path_list:
                 wd = wm.get_wd(i) # search watch-list in an internal for loop
+
+        watch_db maps path -> wd and records which watch (the owner) each
+        recursive or file watch was added on behalf of; parent_db is a read-only
+        owner -> set(paths) view of the same. The paths are stored as a tree of
+        interned components (see hubblestack.utils.pathtrie), so path and wd
+        lookups are O(depth) and 100k watches cost a few MB rather than tens.
     """
 
     def __init__(self, *a, **kw):
@@ -210,12 +250,16 @@ class PulsarWatchManager(pyinotify.WatchManager):
         self.__super = super(PulsarWatchManager, self)
 
         self.__super.__init__(*a, **kw)
-        self.watch_db  = dict()
-        self.parent_db = dict()
+        self.watch_db  = PathTrie()
+        self.parent_db = OwnedView(self.watch_db)
 
         self._last_config_update = 0
         self.update_config()
 
+        # path -> the config it was last watched with (see reconcile())
+        self.watched_config = dict()
+        self.full_reconcile = True
+
     @classmethod
     def _iterate_anything(cls, x, discard_none=True):
         """ iterate any amount of list/tuple nesting
@@ -243,29 +287,33 @@ class PulsarWatchManager(pyinotify.WatchManager):
     def _add_db(self, parent, items):
         if parent and not items:
             return
-        todo = {}
         for i in items:
             if items[i] > 0:
-                todo[i] = items[i]
-        self.watch_db.update(todo)
-        if parent in todo:
-            del todo[parent]
-        if todo:
-            if parent not in self.parent_db:
-                self.parent_db[parent] = set()
-            self.parent_db[parent].update(todo)
+                self.watch_db[i] = items[i]
+                if i != parent:
+                    self.watch_db.set_owner(i, parent)
 
     def _get_wdl(self, *pathlist):
         """ inverse pathlist and return a flat list of wd's for the paths and their child paths
-            probably O( (N+M)^2 ); use sparingly
         """
-        super_list = self._listify_anything(pathlist,
-            [ x if isinstance(x,int) else self.parent_db.get(x) for x in self._iterate_anything(pathlist) ])
-        return self._listify_anything([ x if isinstance(x,int) else self.watch_db.get(x) for x in super_list ])
+        def _wds():
+            for x in self._iterate_anything(pathlist):
+                if isinstance(x, int):
+                    yield x
+                else:
+                    yield self.watch_db.get(x)
+                    for wd in self.watch_db.owned_values(x):
+                        yield wd
+        return self._listify_anything(_wds())
 
     def _get_paths(self, *wdl):
-        wdl = self._listify_anything(wdl)
-        return self._listify_anything([ k for k,v in self.watch_db.items() if v in wdl ])
+        return self._listify_anything([ self.watch_db.paths_of(wd) for wd in self._iterate_anything(wdl) ])
+
+    def get_wd(self, path):
+        """ pyinotify.WatchManager.get_wd() searches every watch for the path;
+            look it up in the watch_db instead
+        """
+        return self.watch_db.get(os.path.normpath(path))
 
     def update_config(self):
         """ (re)check the config files for inotify_limits:
@@ -382,7 +430,6 @@ class PulsarWatchManager(pyinotify.WatchManager):
                 if isinstance(excludes, (list,tuple)):
                     pfft = excludes
                     excludes = lambda x: x in pfft
-                file_track = self.parent_db.get(path, {})
                 pre_count = len(self.watch_db)
                 for wpath,wdirs,wfiles in os.walk(path):
                     if rec or wpath == path:
@@ -392,8 +439,8 @@ class PulsarWatchManager(pyinotify.WatchManager):
                                 continue
                             if not os.path.isfile(wpathname):
                                 continue
-                            if wpathname in file_track: # checking file_track isn't strictly necessary
-                                continue                # but gives a slight speedup
+                            if self.watch_db.owner(wpathname) is not None: # not strictly necessary
+                                continue                                   # but gives a slight speedup
                             self._add_recursed_file_watch( wpathname, parent=path )
                 ft_count = len(self.watch_db) - pre_count
                 if ft_count > 0:
@@ -454,26 +501,70 @@ class PulsarWatchManager(pyinotify.WatchManager):
             self._add_db(path, res)
         return res
 
+    @staticmethod
+    def _events_keep_current(pconfig):
+        """ whether inotify events keep the watches of an (already watched)
+            path current without walking it again: recursive watches only pick
+            up new directories with auto_add, and the per-file watches of
+            watch_files can be lost to events that aren't watched (or were
+            dropped), so those paths are always walked again (walking skips
+            the files that are still watched)
+        """
+        if not isinstance(pconfig, dict):
+            return True
+        if pconfig.get('watch_files', False):
+            return False
+        if pconfig.get('recurse', False) and not pconfig.get('auto_add', False):
+            return False
+        return True
+
+    def reconcile(self, config):
+        """ diff the pulsar config against the one the watches were last
+            updated with (by the previous reconcile())
+
+            returns (paths, prune): the paths that need watch() and whether
+            prune() is needed. Paths whose config is unchanged are skipped,
+            unless they aren't watched (anymore), events alone don't keep their
+            watches current (see _events_keep_current) or full_reconcile is
+            set (at startup and after the inotify queue overflowed).
+        """
+        previous = self.watched_config
+        current = dict()
+        paths = list()
+        prune = self.full_reconcile
+        for path in config:
+            if path in NON_PATH_KEYS:
+                continue
+            pconfig = current[path] = copy.deepcopy(config[path])
+            if path not in previous or previous[path] != pconfig:
+                prune = True
+                paths.append(path)
+            elif self.full_reconcile or not self.watch_db.get(os.path.abspath(path)) \
+                    or not self._events_keep_current(pconfig):
+                paths.append(path)
+        if set(previous) - set(current):
+            prune = True
+        self.watched_config = current
+        self.full_reconcile = False
+        return paths, prune
+
     def _prune_paths_to_stop_watching(self):
-        inverse_parent_db = {}
-        for k,v in self.parent_db.items():
-            for i in v:
-                inverse_parent_db[i] = k
-        for dirpath in self.watch_db:
+        # materialized first: the caller removes the watches we yield
+        for dirpath, owner in list(self.watch_db.ownership()):
             pc = self.cm.path_config(dirpath, falsifyable=True)
             if pc is False:
-                if dirpath in self.parent_db:
+                if self.watch_db.has_owned(dirpath):
                     # there's no config for this dir, but it had child watches at one point
                     # probably this is just nolonger configured
-                    for item in self.parent_db[dirpath]:
+                    for item in self.watch_db.owned(dirpath):
                         yield item
                     yield dirpath
-                elif dirpath not in inverse_parent_db:
+                elif owner is None:
                     # this doesn't seem to be in parent_db or the reverse
                     # probably nolonger configured
                     yield dirpath
-            elif dirpath in self.parent_db:
-                for item in self.parent_db[dirpath]:
+            elif self.watch_db.has_owned(dirpath):
+                for item in self.watch_db.owned(dirpath):
                     if os.path.isdir(item):
                         if not pc['recurse']:
                             # there's config for this dir, but it nolonger recurses
@@ -491,23 +582,11 @@ class PulsarWatchManager(pyinotify.WatchManager):
         self.rm_watch(to_rm)
 
     def _rm_db(self, wd):
-        plist = set( self._get_paths(wd) )
-        for dirpath in plist:
+        # removing a path from the watch_db also forgets what it owned and
+        # what owned it
+        for dirpath in self._get_paths(wd):
             if dirpath in self.watch_db:
                 del self.watch_db[dirpath]
-            if dirpath in self.parent_db:
-                del self.parent_db[dirpath]
-
-        # in the interests of being really really thourough make sure none of
-        # the parent_db sets contain any of the removed dirpaths
-        # and then make sure there's no empty sets in the parent_db
-        to_fully_delete = set()
-        for d,s in self.parent_db.items():
-            s -= plist
-            if not s:
-                to_fully_delete.add(d)
-        for item in to_fully_delete:
-            del self.parent_db[item]
 
     def del_watch(self, wd):
         """ remove a watch from the watchmanager database
@@ -759,6 +838,8 @@ def process(configfile='salt://hubblestack_pulsar/hubblestack_pulsar_config.yaml
             if event.maskname == 'IN_Q_OVERFLOW':
                 log.warn('Your inotify queue is overflowing.')
                 log.warn('Fix by increasing /proc/sys/fs/inotify/max_queued_events')
+                # events were lost, walk everything at the next update
+                wm.full_reconcile = True
                 continue
 
             log.debug("queue {0}".format(event)) # shows mask/name/pathname/wd and other things
@@ -829,9 +910,9 @@ def process(configfile='salt://hubblestack_pulsar/hubblestack_pulsar_config.yaml
                     ret.append(sub)
 
                 if not event.mask & pyinotify.IN_ISDIR:
-                    if event.mask & pyinotify.IN_CREATE:
-                        watch_this = config[cpath].get('watch_new_files', False) \
-                            or config[cpath].get('watch_files', False)
+                    watch_this = config[cpath].get('watch_new_files', False) \
+                        or config[cpath].get('watch_files', False)
+                    if event.mask & (pyinotify.IN_CREATE | pyinotify.IN_MOVED_TO):
                         if watch_this:
                             if not excludes(pathname):
                                 log.debug("add file-watch path={0} mask={1}".format(pathname,
@@ -839,48 +920,30 @@ def process(configfile='salt://hubblestack_pulsar/hubblestack_pulsar_config.yaml
                                 wm.watch(pathname, pyinotify.IN_MODIFY, new_file=True)
                     elif event.mask & RM_WATCH_MASK:
                         wm.rm_watch(pathname)
+                        # a file replaced by a rename (package managers, sed -i)
+                        # loses its watch but is still there: watch the new one
+                        if watch_this and os.path.isfile(pathname) and not excludes(pathname):
+                            log.debug("re-add file-watch path={0} mask={1}".format(pathname,
+                                pyinotify.IN_MODIFY))
+                            wm.watch(pathname, pyinotify.IN_MODIFY, new_file=True)
             else:
                 log.debug('Excluding {0} from event for {1}'.format(pathname, cpath))
         dt.fin()
 
     if update_watches:
         dt.mark('update_watches')
-        log.debug("update watches")
-        # Update existing watches and add new ones
-        for path in config:
+        # Update the watches of new, changed and unwatched paths; the others
+        # are kept current by inotify events (see PulsarWatchManager.reconcile)
+        to_watch, to_prune = wm.reconcile(config)
+        log.debug("update watches: {0} of the configured paths".format(len(to_watch)))
+        for path in to_watch:
             excludes = lambda x: False
-            if path in ['return', 'checksum', 'stats', 'batch', 'verbose',
-                        'paths', 'refresh_interval', 'contents_size',
-                        'checksum_size']:
-                continue
+            mask = _watch_mask(config[path])
             if isinstance(config[path], dict):
-                mask = config[path].get('mask', DEFAULT_MASK)
-                watch_files = config[path].get('watch_files', False)
-                if watch_files:
-                    # we're going to get dup modify events if watch_files is set
-                    # and we still monitor modify for the dir
-                    mask_and_modify = mask & pyinotify.IN_MODIFY
-                    if mask_and_modify:
-                        log.debug("mask={0} -= mask & pyinotify.IN_MODIFY={1}" \
-                            " ==> {2}".format(
-                                mask,
-                                mask_and_modify,
-                                mask-mask_and_modify))
-                        mask -= mask_and_modify
                 excludes = _preprocess_excludes( config[path].get('exclude') )
-                if isinstance(mask, list):
-                    r_mask = 0
-                    for sub in mask:
-                        r_mask |= _get_mask(sub)
-                elif isinstance(mask, bytes):
-                    r_mask = _get_mask(mask)
-                else:
-                    r_mask = mask
-                mask = r_mask
                 rec = config[path].get('recurse', False)
                 auto_add = config[path].get('auto_add', False)
             else:
-                mask = DEFAULT_MASK
                 rec = False
                 auto_add = False
 
@@ -914,9 +977,10 @@ def process(configfile='salt://hubblestack_pulsar/hubblestack_pulsar_config.yaml
             wm.watch(path, mask, rec=rec, auto_add=auto_add, exclude_filter=excludes)
 
         dt.fin()
-        dt.mark('prune_watches')
-        wm.prune()
-        dt.fin()
+        if to_prune:
+            dt.mark('prune_watches')
+            wm.prune()
+            dt.fin()
 
     if __mods__['config.get']('hubblestack:pulsar:maintenance', False):
         # We're in maintenance mode, throw away findings
@@ -938,7 +1002,7 @@ def process(configfile='salt://hubblestack_pulsar/hubblestack_pulsar_config.yaml
                 f = 'pulsar-watch.db'
             f = '/tmp/{}'.format(f)
             with open(f, 'w') as fh:
-                json.dump(wm.watch_db, fh)
+                json.dump(dict(wm.watch_db.items()), fh)
             log.debug("wrote watch_db to {}".format(f))
 
     return ret
@@ -972,8 +1036,8 @@ def _dict_update(dest, upd, recursive_update=True, merge_lists=False):
     This behavior is only activated when recursive_update=True. By default
     merge_lists=False.
     """
-    if (not isinstance(dest, collections.Mapping)) \
-            or (not isinstance(upd, collections.Mapping)):
+    if (not isinstance(dest, collections.abc.Mapping)) \
+            or (not isinstance(upd, collections.abc.Mapping)):
         raise TypeError('Cannot update using non-dict types in dictupdate.update()')
     updkeys = list(upd.keys())
     if not set(list(dest.keys())) & set(updkeys):
@@ -985,8 +1049,8 @@ def _dict_update(dest, upd, recursive_update=True, merge_lists=False):
                 dest_subkey = dest.get(key, None)
             except AttributeError:
                 dest_subkey = None
-            if isinstance(dest_subkey, collections.Mapping) \
-                    and isinstance(val, collections.Mapping):
+            if isinstance(dest_subkey, collections.abc.Mapping) \
+                    and isinstance(val, collections.abc.Mapping):
                 ret = _dict_update(dest_subkey, val, merge_lists=merge_lists)
                 dest[key] = ret
             elif isinstance(dest_subkey, list) \
@@ -18,6 +18,7 @@ import os
 import fnmatch
 import re
 import shlex
+import time
 
 # Import Salt libs
 import hubblestack.utils.files
@@ -26,6 +27,12 @@ import hubblestack.utils.stringutils
 import hubblestack.utils.systemd
 from hubblestack.exceptions import CommandExecutionError
 
+try:
+    import dbus
+    HAS_DBUS = True
+except ImportError:
+    HAS_DBUS = False
+
 log = logging.getLogger(__name__)
 
 __func_alias__ = {
@@ -38,6 +45,16 @@ LOCAL_CONFIG_PATH = '/etc/systemd/system'
 INITSCRIPT_PATH = '/etc/init.d'
 VALID_UNIT_TYPES = ('service', 'socket', 'device', 'mount', 'automount',
                     'swap', 'target', 'path', 'timer')
+UNITS_TTL = 60
+# the unit file states 'systemctl is-enabled' exits 0 for (aliases are left
+# to systemctl, it resolves them to the unit they point at)
+ENABLED_STATES = ('enabled', 'enabled-runtime', 'static', 'indirect', 'generated')
+DISABLED_STATES = ('disabled', 'masked', 'masked-runtime', 'linked', 'linked-runtime', 'bad')
+# the states the unit file of an alias (a symlink to another unit) can show
+ALIAS_STATES = ('alias', 'enabled', 'enabled-runtime', 'linked', 'linked-runtime')
+# the active states 'systemctl is-active' exits 0 for
+ACTIVE_STATES = ('active', 'reloading')
+_UNIT_MARKERS = ('*', '\u25cf', '\u00d7')
 
 # Define the module's virtual name
 __virtualname__ = 'service'
@@ -91,6 +108,15 @@ def status(name, sig=None):  # pylint: disable=unused-argument
         services = [name]
     results = {}
     for service in services:
+        unit = _unit(service)
+        if unit is not None:
+            if unit['active'] is not None:
+                results[service] = unit['active'] in ACTIVE_STATES
+                continue
+            if '@' not in service and unit['unit_file_state'] not in ALIAS_STATES:
+                # not loaded (and not another name of a loaded unit)
+                results[service] = False
+                continue
         _check_for_unit_changes(service)
         results[service] = __mods__['cmd.retcode'](_systemctl_cmd('is-active', service),
                                                    python_shell=False,
@@ -112,6 +138,12 @@ def available(name):
 
         salt '*' service.available sshd
     '''
+    unit = _unit(name)
+    if unit is not None:
+        if unit['unit_file_state'] or unit['load'] not in (None, 'not-found'):
+            return True
+        if '@' not in name:
+            return False
     _check_for_unit_changes(name)
     return _check_available(name)
 
@@ -127,6 +159,14 @@ def enabled(name, **kwargs):  # pylint: disable=unused-argument
 
         salt '*' service.enabled <service name>
     '''
+    unit = _unit(name)
+    if unit is not None and '@' not in name:
+        if unit['unit_file_state'] in ENABLED_STATES:
+            return True
+        if unit['unit_file_state'] in DISABLED_STATES:
+            return False
+        if unit['unit_file_state'] is None and name not in _get_sysv_services():
+            return False
     # Try 'systemctl is-enabled' first, then look for a symlink created by
     # systemctl (older systemd releases did not support using is-enabled to
     # check templated services), and lastly check for a sysvinit service.
@@ -164,6 +204,112 @@ def get_all():
     ret.update(set(_get_sysv_services(systemd_services=ret)))
     return sorted(ret)
 
+def units(refresh=False):
+    '''
+    Return the state of every unit systemd knows about, by unit name: the
+    units it has loaded (``systemctl list-units --all``) and the unit files
+    it can find (``systemctl list-unit-files``), from the systemd D-Bus API
+    when the dbus module is available
+
+    .. code-block:: python
+
+        {'sshd.service': {'load': 'loaded', 'active': 'active', 'sub': 'running',
+                          'description': 'OpenSSH Daemon',
+                          'unit_file_state': 'enabled'}}
+
+    The keys a unit has no answer for (eg: the load state of a unit file
+    nothing loaded) are None. The table is memoised for UNITS_TTL seconds,
+    status, enabled and available answer from it rather than running
+    systemctl once per service (and without checking for changed unit files
+    first: a daemon-reload changes neither answer); pass ``refresh=True`` to
+    read it again (eg: at the start of an audit run). An empty table means
+    systemd couldn't be asked and the functions above run systemctl per
+    service as before.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' service.units
+    '''
+    now = time.time()
+    memo = __context__.get('systemd.units')
+    if refresh or memo is None or now - memo['taken'] > UNITS_TTL:
+        table = None
+        if HAS_DBUS:
+            try:
+                table = _dbus_units()
+            except dbus.exceptions.DBusException as exc:
+                log.debug('Unable to list the systemd units over D-Bus: %s', exc)
+        if table is None:
+            table = _systemctl_units()
+        memo = __context__['systemd.units'] = {'taken': now, 'units': table}
+    return memo['units']
+
+def _unit(name):
+    '''
+    The entry of the named unit in the units() table (with every state None
+    if systemd doesn't know the unit), None if there is no table to ask
+    '''
+    table = units()
+    if not table:
+        return None
+    return table.get(_canonical_unit_name(name)) or _new_unit({}, name)
+
+def _new_unit(table, name):
+    if name not in table:
+        table[name] = {'load': None, 'active': None, 'sub': None,
+                       'description': None, 'unit_file_state': None}
+    return table[name]
+
+def _dbus_units():
+    '''
+    The units() table from the ListUnits and ListUnitFiles methods of the
+    systemd manager
+    '''
+    bus = dbus.SystemBus()
+    manager = dbus.Interface(
+        bus.get_object('org.freedesktop.systemd1', '/org/freedesktop/systemd1'),
+        'org.freedesktop.systemd1.Manager')
+    table = {}
+    # (name, description, load, active, sub, following, path, job id, job type, job path)
+    for unit in manager.ListUnits():
+        entry = _new_unit(table, str(unit[0]))
+        entry.update(description=str(unit[1]), load=str(unit[2]),
+                     active=str(unit[3]), sub=str(unit[4]))
+    for path, state in manager.ListUnitFiles():
+        _new_unit(table, os.path.basename(str(path)))['unit_file_state'] = str(state)
+    return table
+
+def _systemctl_units():
+    '''
+    The units() table from one ``systemctl list-units --all`` and one
+    ``systemctl list-unit-files``
+    '''
+    table = {}
+    flags = ['--full', '--no-legend', '--no-pager']
+    out = __mods__['cmd.run_all'](_systemctl_cmd(['list-units', '--all'] + flags),
+                                  python_shell=False, ignore_retcode=True)
+    if out['retcode'] == 0:
+        for line in out['stdout'].splitlines():
+            fields = line.split()
+            # failed and not-found units are marked in the first column
+            if fields and fields[0] in _UNIT_MARKERS:
+                fields.pop(0)
+            if len(fields) < 4:
+                continue
+            entry = _new_unit(table, fields[0])
+            entry.update(load=fields[1], active=fields[2], sub=fields[3],
+                         description=' '.join(fields[4:]))
+    out = __mods__['cmd.run_all'](_systemctl_cmd(['list-unit-files'] + flags),
+                                  python_shell=False, ignore_retcode=True)
+    if out['retcode'] == 0:
+        for line in out['stdout'].splitlines():
+            fields = line.split()
+            if len(fields) >= 2:
+                _new_unit(table, fields[0])['unit_file_state'] = fields[1]
+    return table
+
 def _get_systemd_services():
     '''
     Use os.listdir() to get all the unit files
@@ -362,7 +508,7 @@ def _clear_context():
     # raise a RuntimeError.
     for key in list(__context__):
         try:
-            if key.startswith('systemd._systemctl_status.'):
+            if key.startswith('systemd._systemctl_status.') or key == 'systemd.units':
                 __context__.pop(key)
         except AttributeError:
             continue
@@ -437,4 +583,4 @@ def _default_runlevel():
     except Exception:
         pass
 
-    return runlevel
\ No newline at end of file
+    return runlevel
@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+"""
+Profile individual runs of scheduled jobs.
+
+A job in the schedule config can ask to have its runs profiled:
+
+.. code-block:: yaml
+
+    schedule:
+      job1:
+        function: hubble.audit
+        seconds: 3600
+        profile: sample       # or cprofile; or a dict with the options below
+
+    schedule:
+      job1:
+        function: hubble.audit
+        seconds: 3600
+        profile:
+          mode: sample        # sample (default) or cprofile
+          rate: 100           # stack samples per second (sample mode)
+          max_seconds: 300    # stop sampling after this long (sample mode)
+          top: 20             # frames/functions in the summary
+          splunk: True        # also send the summary to splunk (needs splunklogging)
+          keep: 10            # profiles of the job to keep in the cachedir
+
+In sample mode a background thread records the stack of the thread running
+the job ``rate`` times per second, so the overhead stays the same however
+much python code the job runs; the stacks are written in the collapsed format
+(one ``frame;frame;frame count`` line per distinct stack; flamegraph.pl and
+speedscope read it). In cprofile mode the run is profiled deterministically
+with cProfile and written as pstats (which is exact, but slows the job down).
+The files go to ``<cachedir>/profiles/<job>.<time>.collapsed`` (or
+``.pstats``); a summary of the hottest frames is logged.
+
+Jobs without a profile config can be profiled on demand: ``hubble
+--profile-job job1:3`` asks the running daemon (with SIGUSR2, see
+request_profile()) to profile the next 3 runs of job1.
+"""
+
+import collections
+import cProfile
+import io
+import logging
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+REQUEST_FILE = 'profile_request'
+PROFILE_DIR = 'profiles'
+
+DEFAULTS = {
+    'mode': 'sample',
+    'rate': 100,
+    'max_seconds': 300,
+    'top': 20,
+    'splunk': False,
+    'keep': 10,
+}
+
+_pending = dict()  # job name -> runs still to profile (from requests)
+_pending_lock = threading.Lock()
+# set by SIGUSR2; the request file is read by the next job run (not in the
+# signal handler, which could interrupt the main thread holding _pending_lock)
+_requested = list()
+_signaled = list()
+
+
+class StackSampler(object):
+    """ sample the stack of one thread from a background thread
+
+        .. code-block:: python
+
+            sampler = StackSampler(rate=100)
+            with sampler:
+                do_things()
+            print(sampler.collapsed())
+    """
+
+    def __init__(self, thread_id=None, rate=DEFAULTS['rate'], max_seconds=DEFAULTS['max_seconds']):
+        self.thread_id = thread_id
+        self.interval = 1.0 / max(float(rate), 1.0)
+        self.max_seconds = max_seconds
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.truncated = False
+        self._labels = dict()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _label(self, frame):
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, 'co_qualname', code.co_name)
+            module = frame.f_globals.get('__name__') or os.path.basename(code.co_filename)
+            label = self._labels[code] = '{0}.{1}'.format(module, name).replace(';', ':')
+        return label
+
+    def _stack(self, frame):
+        stack = list()
+        while frame is not None:
+            stack.append(self._label(frame))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _run(self):
+        deadline = time.monotonic() + self.max_seconds if self.max_seconds else None
+        while not self._stop.wait(self.interval):
+            if deadline is not None and time.monotonic() > deadline:
+                self.truncated = True
+                log.info('profile sampling stopped after max_seconds=%s', self.max_seconds)
+                break
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            self.stacks[self._stack(frame)] += 1
+            self.samples += 1
+            del frame
+
+    def start(self):
+        """ start sampling (the current thread, unless thread_id was given) """
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='hubble-profiler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ stop sampling and wait for the sampler thread """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_exc):
+        self.stop()
+
+    def collapsed(self):
+        """ the stacks in the collapsed format (one 'a;b;c count' line each) """
+        return ''.join('{0} {1}\n'.format(';'.join(stack), count)
+                       for stack, count in sorted(self.stacks.items()))
+
+    def top(self, count=DEFAULTS['top']):
+        """ the count frames seen in the most samples: a list of dicts with the
+            frame, the samples it was running in (self) and the samples it was
+            on the stack in (total)
+        """
+        own = collections.Counter()
+        total = collections.Counter()
+        for stack, samples in self.stacks.items():
+            own[stack[-1]] += samples
+            for label in set(stack):
+                total[label] += samples
+        ranked = sorted(total, key=lambda label: (own[label], total[label]), reverse=True)
+        return [{'frame': label, 'self': own[label], 'total': total[label]}
+                for label in ranked[:count]]
+
+
+def _cprofile_top(profile, count=DEFAULTS['top']):
+    """ the count functions with the most internal time in a cProfile.Profile """
+    stats = pstats.Stats(profile, stream=io.StringIO())
+    ranked = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)
+    ret = list()
+    for (filename, lineno, name), (_cc, ncalls, tottime, cumtime, _callers) in ranked[:count]:
+        ret.append({'function': '{0}:{1}({2})'.format(filename, lineno, name),
+                    'ncalls': ncalls, 'tottime': tottime, 'cumtime': cumtime})
+    return ret
+
+
+def job_profile_config(jobdata):
+    """ the profile options of a job (see the module docs) or None when its
+        runs aren't profiled
+    """
+    config = jobdata.get('profile')
+    if not config:
+        return None
+    if isinstance(config, str):
+        config = {'mode': config}
+    elif not isinstance(config, dict):
+        config = {}
+    ret = dict(DEFAULTS)
+    ret.update(config)
+    if ret['mode'] not in ('sample', 'cprofile'):
+        log.error("unknown profile mode %s, using 'sample'", ret['mode'])
+        ret['mode'] = 'sample'
+    return ret
+
+
+def _take_pending(jobname, cachedir):
+    if _requested:
+        del _requested[:]
+        read_requests(cachedir)
+    with _pending_lock:
+        remaining = _pending.get(jobname, 0)
+        if remaining < 1:
+            return False
+        if remaining == 1:
+            del _pending[jobname]
+        else:
+            _pending[jobname] = remaining - 1
+        return True
+
+
+def pending():
+    """ the requested runs still to profile, by job name """
+    with _pending_lock:
+        return dict(_pending)
+
+
+def _prune(directory, jobname, keep):
+    prefix = jobname + '.'
+    mine = sorted(fname for fname in os.listdir(directory)
+                  if fname.startswith(prefix) and fname[len(prefix):][:1].isdigit())
+    for fname in mine[:max(len(mine) - keep, 0)]:
+        try:
+            os.unlink(os.path.join(directory, fname))
+        except OSError:
+            pass
+
+
+def _write(cachedir, jobname, config, sampler=None, profile=None):
+    """ write the profile to the cachedir; returns the filename """
+    directory = os.path.join(cachedir, PROFILE_DIR)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+    safe_name = jobname.replace(os.sep, '_')
+    now = time.time()
+    stamp = '{0}.{1:03d}'.format(time.strftime('%Y%m%dT%H%M%S', time.gmtime(now)),
+                                 int(now * 1000) % 1000)
+    if sampler is not None:
+        filename = os.path.join(directory, '{0}.{1}.collapsed'.format(safe_name, stamp))
+        with open(filename, 'w') as fh:
+            fh.write(sampler.collapsed())
+    else:
+        filename = os.path.join(directory, '{0}.{1}.pstats'.format(safe_name, stamp))
+        profile.dump_stats(filename)
+    _prune(directory, safe_name, int(config['keep']))
+    return filename
+
+
+def _report(jobname, config, elapsed, filename, sampler=None, profile=None):
+    summary = {'job': jobname, 'mode': config['mode'], 'seconds': round(elapsed, 3),
+               'filename': filename}
+    if sampler is not None:
+        summary.update(samples=sampler.samples, rate=1.0 / sampler.interval,
+                       truncated=sampler.truncated, top=sampler.top(config['top']))
+    else:
+        summary['top'] = _cprofile_top(profile, config['top'])
+    log.info('profiled job %s (%0.2fs): %s', jobname, elapsed, filename)
+    for entry in summary['top']:
+        log.info('profile %s: %s', jobname, entry)
+    if config['splunk']:
+        # lazy load to avoid circular import
+        import hubblestack.log
+        hubblestack.log.emit_to_splunk(summary, 'INFO', 'hubblestack.profile')
+    return summary
+
+
+class JobProfiler(object):
+    """ a context manager that profiles the job run it wraps, if the job asks
+        for it (profile in its config) or a run was requested for it;
+        otherwise it does nothing
+
+        .. code-block:: python
+
+            with JobProfiler(jobname, jobdata, __opts__['cachedir']):
+                ret = __mods__[func](*args, **kwargs)
+    """
+
+    def __init__(self, jobname, jobdata, cachedir):
+        self.jobname = jobname
+        self.cachedir = cachedir
+        self.config = job_profile_config(jobdata)
+        if _take_pending(jobname, cachedir) and self.config is None:
+            self.config = dict(DEFAULTS)
+        self.sampler = None
+        self.profile = None
+        self.started = None
+        self.summary = None
+
+    def __enter__(self):
+        if self.config is None:
+            return self
+        self.started = time.monotonic()
+        try:
+            if self.config['mode'] == 'cprofile':
+                self.profile = cProfile.Profile()
+                self.profile.enable()
+            else:
+                self.sampler = StackSampler(rate=self.config['rate'],
+                                            max_seconds=self.config['max_seconds'])
+                self.sampler.start()
+        except Exception:
+            log.exception('unable to profile job %s', self.jobname)
+            self.config = None
+        return self
+
+    def __exit__(self, *_exc):
+        if self.config is None:
+            return
+        elapsed = time.monotonic() - self.started
+        try:
+            if self.profile is not None:
+                self.profile.disable()
+            else:
+                self.sampler.stop()
+            filename = _write(self.cachedir, self.jobname, self.config,
+                              sampler=self.sampler, profile=self.profile)
+            self.summary = _report(self.jobname, self.config, elapsed, filename,
+                                   sampler=self.sampler, profile=self.profile)
+        except Exception:
+            log.exception('unable to write the profile of job %s', self.jobname)
+
+
+def parse_request(spec):
+    """ parse 'jobname[:runs]' into (jobname, runs) """
+    jobname, _, runs = spec.rpartition(':')
+    if not jobname or not runs.isdigit():
+        return spec, 1
+    return jobname, max(int(runs), 1)
+
+
+def add_request(jobname, runs=1):
+    """ profile the next runs runs of jobname (in this process) """
+    with _pending_lock:
+        _pending[jobname] = _pending.get(jobname, 0) + runs
+    log.info('profiling the next %d run(s) of job %s', runs, jobname)
+
+
+def read_requests(cachedir):
+    """ take the requests written by request_profile() from the cachedir """
+    filename = os.path.join(cachedir, REQUEST_FILE)
+    try:
+        with open(filename, 'r') as fh:
+            lines = fh.read().splitlines()
+        os.unlink(filename)
+    except (IOError, OSError):
+        return
+    for line in lines:
+        if line.strip():
+            add_request(*parse_request(line.strip()))
+
+
+def request_profile(cachedir, pidfile, spec):
+    """ ask the daemon running with pidfile to profile a job: append spec
+        ('jobname[:runs]') to the request file in the cachedir and send the
+        daemon SIGUSR2. Returns the pid signalled (or None).
+    """
+    with open(os.path.join(cachedir, REQUEST_FILE), 'a') as fh:
+        fh.write(spec + '\n')
+    try:
+        with open(pidfile, 'r') as fh:
+            pid = int(fh.readline().strip())
+        os.kill(pid, signal.SIGUSR2)
+    except (IOError, OSError, ValueError) as exc:
+        log.error('unable to signal the hubble daemon (pidfile=%s): %s', pidfile, exc)
+        return None
+    return pid
+
+
+def _on_sigusr2(*_a):
+    _requested.append(True)
+
+
+def start_sigusr2_signal_handler():
+    """ start the signal.SIGUSR2 handler: the next job run reads the profile
+        requests from the cachedir (see request_profile())
+    """
+    if _signaled:
+        return
+    _signaled.append(True)
+    if not hasattr(signal, 'SIGUSR2'):
+        log.info("signal package lacks SIGUSR2, skipping profile request handler setup")
+        return
+    signal.signal(signal.SIGUSR2, _on_sigusr2)
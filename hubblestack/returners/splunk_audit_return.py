@@ -44,7 +44,7 @@ import socket
 import json
 import logging
 
-from hubblestack.hec import http_event_collector, get_splunk_options, make_hec_args
+from hubblestack.hec import http_event_collector, get_splunk_options, make_hec_args, fan_out
 
 log = logging.getLogger(__name__)
 
@@ -65,35 +65,43 @@ def returner(ret):
         opts_list = get_splunk_options(sourcetype='hubble_audit_v2',
                                        _nick={'sourcetype_audit': 'sourcetype'})
 
-        for opts in opts_list:
-            log.debug('Options: %s', json.dumps(opts))
-            custom_fields = opts['custom_fields']
-            # Set up the collector
-            args, kwargs = make_hec_args(opts)
-            hec = http_event_collector(*args, **kwargs)
-            host_args['hec'] = hec
-
-            # Failure checks
-            _publish_data(args=host_args, checks=data.get('Failure', []), check_result='Failure',
-                          cloud_details=cloud_details, opts=opts)
-
-            # Success checks
-            _publish_data(args=host_args, checks=data.get('Success', []), check_result='Success',
-                          cloud_details=cloud_details, opts=opts)
-
-            # Compliance checks
-            if data.get('Compliance', None):
-                host_args['Compliance'] = data['Compliance']
-                event = _generate_event(args=host_args, cloud_details=cloud_details,
-                                        custom_fields=custom_fields, check_type='compliance')
-                _publish_event(fqdn=host_args['fqdn'], event=event, opts=opts, hec=hec)
-
-            hec.flushBatch()
+        fan_out(opts_list, _send_data, data, host_args, cloud_details,
+                what='splunk_audit_return')
     except Exception:
         log.exception('Error occurred in splunk_audit_return')
     return
 
 
+def _send_data(opts, data, host_args, cloud_details):
+    """
+    Send the checks to the endpoint described by opts
+    """
+    log.debug('Options: %s', json.dumps(opts))
+    custom_fields = opts['custom_fields']
+    # Set up the collector
+    args, kwargs = make_hec_args(opts)
+    hec = http_event_collector(*args, **kwargs)
+    # every endpoint gets its own copy (the endpoints are sent to concurrently)
+    host_args = dict(host_args, hec=hec)
+
+    # Failure checks
+    _publish_data(args=host_args, checks=data.get('Failure', []), check_result='Failure',
+                  cloud_details=cloud_details, opts=opts)
+
+    # Success checks
+    _publish_data(args=host_args, checks=data.get('Success', []), check_result='Success',
+                  cloud_details=cloud_details, opts=opts)
+
+    # Compliance checks
+    if data.get('Compliance', None):
+        host_args['Compliance'] = data['Compliance']
+        event = _generate_event(args=host_args, cloud_details=cloud_details,
+                                custom_fields=custom_fields, check_type='compliance')
+        _publish_event(fqdn=host_args['fqdn'], event=event, opts=opts, hec=hec)
+
+    hec.flushBatch()
+
+
 def event_return(event):
     """
     When called from the master via event_return.
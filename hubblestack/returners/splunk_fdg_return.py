@@ -46,7 +46,7 @@ import socket
 import re
 import json
 import logging
-from hubblestack.hec import http_event_collector, get_splunk_options, make_hec_args
+from hubblestack.hec import http_event_collector, get_splunk_options, make_hec_args, fan_out
 
 
 _MAX_CONTENT_BYTES = 100000
@@ -78,38 +78,45 @@ def returner(ret):
                                        add_query_to_sourcetype=True,
                                        _nick={'sourcetype_fdg': 'sourcetype'})
 
-        for opts in opts_list:
-            logging.debug('Options: %s', json.dumps(opts))
-
-            # Set up the fields to be extracted at index time. The field values must be strings.
-            # Note that these fields will also still be available in the event data
-            index_extracted_fields = []
-            try:
-                index_extracted_fields.extend(__opts__.get('splunk_index_extracted_fields', []))
-            except TypeError:
-                pass
-
-            args, kwargs = make_hec_args(opts)
-            hec = http_event_collector(*args, **kwargs)
-
-            for fdg_info, fdg_results in data.items():
-
-                if not isinstance(fdg_results, list):
-                    fdg_results = [fdg_results]
-                for fdg_result in fdg_results:
-                    payload = _generate_payload(args=host_args, opts=opts,
-                                                index_extracted_fields=index_extracted_fields,
-                                                fdg_args={'fdg_info': fdg_info,
-                                                          'fdg_result': fdg_result},
-                                                cloud_details=cloud_details)
-                    hec.batchEvent(payload)
-
-            hec.flushBatch()
+        fan_out(opts_list, _send_data, data, host_args, cloud_details,
+                what='splunk_fdg_return')
     except Exception:
         log.exception('Error ocurred in splunk_fdg_return')
     return
 
 
+def _send_data(opts, data, host_args, cloud_details):
+    """
+    Send the fdg results to the endpoint described by opts
+    """
+    logging.debug('Options: %s', json.dumps(opts))
+
+    # Set up the fields to be extracted at index time. The field values must be strings.
+    # Note that these fields will also still be available in the event data
+    index_extracted_fields = []
+    try:
+        index_extracted_fields.extend(__opts__.get('splunk_index_extracted_fields', []))
+    except TypeError:
+        pass
+
+    args, kwargs = make_hec_args(opts)
+    hec = http_event_collector(*args, **kwargs)
+
+    for fdg_info, fdg_results in data.items():
+
+        if not isinstance(fdg_results, list):
+            fdg_results = [fdg_results]
+        for fdg_result in fdg_results:
+            payload = _generate_payload(args=host_args, opts=opts,
+                                        index_extracted_fields=index_extracted_fields,
+                                        fdg_args={'fdg_info': fdg_info,
+                                                  'fdg_result': fdg_result},
+                                        cloud_details=cloud_details)
+            hec.batchEvent(payload)
+
+    hec.flushBatch()
+
+
 def _generate_event(fdg_args, args, starting_chained, cloud_details, custom_fields):
     """
     Helper function that builds and returns the event dict
@@ -18,7 +18,7 @@ event collector. Required config/pillar settings:
 
 import time
 import hubblestack.utils.stdrec as stdrec
-from hubblestack.hec import http_event_collector, get_splunk_options, make_hec_args
+from hubblestack.hec import http_event_collector, get_splunk_options, make_hec_args, fan_out
 
 
 def _get_key(dat, key, default_value=None):
@@ -68,33 +68,45 @@ def returner(retdata):
     except KeyError:
         return
 
+    # _get_key() pops the keys, so look at retdata once (not once per endpoint)
+    t_sourcetype = _get_key(retdata, 'sourcetype', 'hubble_generic')
+    t_time = _get_key(retdata, 'time', time.time())
+    events = _get_key(retdata, 'event', _get_key(retdata, 'events'))
+
+    if events is None:
+        return
+
+    if not isinstance(events, (list, tuple)):
+        events = [events]
+
+    if len(events) < 1 or (len(events) == 1 and events[0] is None):
+        return
+
+    payloads = list()
+    for event in events:
+        payload = {
+            'host': stdrec.get_fqdn(),
+            'event': event,
+            'sourcetype': _get_key(event, 'sourcetype', t_sourcetype),
+            'time': str(int(_get_key(event, 'time', t_time)))}
+        # add various std host info data and index extracted fields
+        stdrec.update_payload(payload)
+        payloads.append(payload)
+
     opts_list = get_splunk_options()
-    for opts in opts_list:
-        hec = _build_hec(opts)
-        t_sourcetype = _get_key(retdata, 'sourcetype', 'hubble_generic')
-        t_time = _get_key(retdata, 'time', time.time())
-        events = _get_key(retdata, 'event', _get_key(retdata, 'events'))
-
-        if events is None:
-            return
-
-        if not isinstance(events, (list, tuple)):
-            events = [events]
-
-        if len(events) < 1 or (len(events) == 1 and events[0] is None):
-            return
-
-        idx = opts.get('index')
-
-        for event in events:
-            payload = {
-                'host': stdrec.get_fqdn(),
-                'event': event,
-                'sourcetype': _get_key(event, 'sourcetype', t_sourcetype),
-                'time': str(int(_get_key(event, 'time', t_time)))}
-            if idx:
-                payload['index'] = idx
-            # add various std host info data and index extracted fields
-            stdrec.update_payload(payload)
-            hec.batchEvent(payload)
-        hec.flushBatch()
+    fan_out(opts_list, _send_payloads, payloads, what='splunk_generic_return')
+
+
+def _send_payloads(opts, payloads):
+    """
+    Send the payloads to the endpoint described by opts
+    """
+    hec = _build_hec(opts)
+    idx = opts.get('index')
+    for payload in payloads:
+        # Payload() modifies the dict it's given; each endpoint gets a copy
+        payload = dict(payload)
+        if idx:
+            payload['index'] = idx
+        hec.batchEvent(payload)
+    hec.flushBatch()
@@ -44,7 +44,7 @@ import json
 import logging
 import time
 from datetime import datetime
-from hubblestack.hec import http_event_collector, get_splunk_options, make_hec_args
+from hubblestack.hec import http_event_collector, get_splunk_options, make_hec_args, PayloadTemplate, fan_out
 
 
 _MAX_CONTENT_BYTES = 100000
@@ -65,42 +65,62 @@ def returner(ret):
     # Get cloud details
     cloud_details = __grains__.get('cloud_details', {})
     try:
+        # the rows and their times are the same for every endpoint
+        queries = _collect_queries(ret['return'])
         opts_list = get_splunk_options(sourcetype='hubble_osquery',
                                        add_query_to_sourcetype=True,
                                        _nick={'sourcetype_nebula': 'sourcetype'})
-        for opts in opts_list:
-            logging.debug('Options: %s', json.dumps(opts))
-
-            # Set up the fields to be extracted at index time. The field values must be strings.
-            # Note that these fields will also still be available in the event data
-            index_extracted_fields = []
-            try:
-                index_extracted_fields.extend(__opts__.get('splunk_index_extracted_fields', []))
-            except TypeError:
-                pass
-
-            # Set up the collector
-            args, kwargs = make_hec_args(opts)
-            hec = http_event_collector(*args, **kwargs)
-
-            for query in ret['return']:
-                for query_name, query_results in query.items():
-                    if 'data' not in query_results:
-                        query_results['data'] = [{'error': 'result missing'}]
-                    for query_result in query_results['data']:
-                        payload = _generate_payload(host_args=host_args, opts=opts,
-                                                    query_data={'query_name': query_name,
-                                                                'query_result': query_result},
-                                                    index_extracted_fields=index_extracted_fields,
-                                                    cloud_details=cloud_details)
-                        event_time = _check_time(query_result)
-                        hec.batchEvent(payload, eventtime=event_time)
-            hec.flushBatch()
+        fan_out(opts_list, _send_queries, queries, host_args, cloud_details,
+                what='splunk_nebula_return')
     except Exception:
         log.exception('Error ocurred in splunk_nebula_return')
     return
 
 
+def _collect_queries(queries):
+    """
+    Return a list of (query_name, [(query_result, event_time), ...])
+    """
+    ret = []
+    for query in queries:
+        for query_name, query_results in query.items():
+            if 'data' not in query_results:
+                query_results['data'] = [{'error': 'result missing'}]
+            ret.append((query_name, [(query_result, _check_time(query_result))
+                                     for query_result in query_results['data']]))
+    return ret
+
+
+def _send_queries(opts, queries, host_args, cloud_details):
+    """
+    Send the query results to the endpoint described by opts
+    """
+    logging.debug('Options: %s', json.dumps(opts))
+
+    # Set up the fields to be extracted at index time. The field values must be strings.
+    # Note that these fields will also still be available in the event data
+    index_extracted_fields = []
+    try:
+        index_extracted_fields.extend(__opts__.get('splunk_index_extracted_fields', []))
+    except TypeError:
+        pass
+
+    # Set up the collector
+    args, kwargs = make_hec_args(opts)
+    hec = http_event_collector(*args, **kwargs)
+
+    # the custom fields are looked up once, not for every event
+    custom_fields = _custom_fields(opts['custom_fields'])
+    for query_name, rows in queries:
+        template = _generate_template(host_args=host_args, opts=opts, query_name=query_name,
+                                      custom_fields=custom_fields,
+                                      index_extracted_fields=index_extracted_fields,
+                                      cloud_details=cloud_details)
+        for query_result, event_time in rows:
+            hec.batchEvent(template.payload(query_result, eventtime=event_time))
+    hec.flushBatch()
+
+
 def _build_args(ret):
     """
     Helper function that builds the args that will be passed on to the event - cleaner way of
@@ -140,66 +160,46 @@ def _build_args(ret):
     return args
 
 
-def _generate_event(host_args, query_result, query_name, custom_fields, cloud_details):
+def _custom_fields(custom_fields):
     """
-    Helper function that builds and returns the event dict
+    Helper function that returns the values of the custom fields to add to the events
     """
-    event = {}
-    event.update(query_result)
-    event.update({'query': query_name,
-                  'job_id': host_args['job_id'],
-                  'minion_id': host_args['minion_id'],
-                  'dest_host': host_args['fqdn'],
-                  'dest_ip': host_args['fqdn_ip4'],
-                  'dest_fqdn': host_args['local_fqdn'],
-                  'system_uuid': __grains__.get('system_uuid')})
-    event.update(cloud_details)
-
+    ret = {}
     for custom_field in custom_fields:
         custom_field_name = 'custom_' + custom_field
         custom_field_value = __mods__['config.get'](custom_field, '')
         if isinstance(custom_field_value, str):
-            event.update({custom_field_name: custom_field_value})
+            ret[custom_field_name] = custom_field_value
         elif isinstance(custom_field_value, list):
             custom_field_value = ','.join(custom_field_value)
-            event.update({custom_field_name: custom_field_value})
-
-    # Remove any empty fields from the event payload
-    remove_keys = [k for k in event if event[k] == ""]
-    for k in remove_keys:
-        del event[k]
+            ret[custom_field_name] = custom_field_value
 
-    return event
+    return ret
 
 
-def _generate_payload(host_args, opts, query_data, cloud_details, index_extracted_fields):
+def _generate_template(host_args, opts, query_name, custom_fields, cloud_details, index_extracted_fields):
     """
-    Build the payload that will be published to Splunk
+    Build the envelope of the payloads of a query that will be published to
+    Splunk. The query, host, cloud and custom fields override the fields of
+    the query results, empty fields are removed.
     """
-    query_name = query_data['query_name']
-    query_result = query_data['query_result']
-    payload = {'host': host_args['fqdn'],
-               'index': opts['index']}
     if opts['add_query_to_sourcetype']:
-        payload.update(
-            {'sourcetype': "%s_%s" % (opts['sourcetype'], query_name)})
+        sourcetype = "%s_%s" % (opts['sourcetype'], query_name)
     else:
-        payload.update({'sourcetype': opts['sourcetype']})
-
-    event = _generate_event(host_args, query_result, query_name,
-                            opts['custom_fields'], cloud_details)
-    payload['event'] = event
-
-    # Potentially add metadata fields:
-    fields = {}
-    for item in index_extracted_fields:
-        if item in payload['event'] and not isinstance(payload['event'][item],
-                                                       (list, dict, tuple)):
-            fields["meta_%s" % item] = str(payload['event'][item])
-    if fields:
-        payload.update({'fields': fields})
-
-    return payload
+        sourcetype = opts['sourcetype']
+
+    overrides = {'query': query_name,
+                 'job_id': host_args['job_id'],
+                 'minion_id': host_args['minion_id'],
+                 'dest_host': host_args['fqdn'],
+                 'dest_ip': host_args['fqdn_ip4'],
+                 'dest_fqdn': host_args['local_fqdn'],
+                 'system_uuid': __grains__.get('system_uuid')}
+    overrides.update(cloud_details)
+    overrides.update(custom_fields)
+
+    return PayloadTemplate(host=host_args['fqdn'], index=opts['index'], sourcetype=sourcetype,
+                           overrides=overrides, index_extracted_fields=index_extracted_fields)
 
 
 def _check_time(query_result):
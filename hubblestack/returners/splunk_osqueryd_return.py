@@ -43,11 +43,11 @@ import socket
 import json
 import logging
 import time
-import copy
-from datetime import datetime
-from hubblestack.hec import http_event_collector, get_splunk_options, make_hec_args
+from hubblestack.hec import http_event_collector, get_splunk_options, make_hec_args, PayloadTemplate, fan_out
 
 _MAX_CONTENT_BYTES = 100000
+# event times older than this (seconds) are replaced by the time of sending
+_MAX_EVENT_AGE = 366 * 24 * 3600
 HTTP_EVENT_COLLECTOR_DEBUG = False
 
 log = logging.getLogger(__name__)
@@ -65,77 +65,122 @@ def returner(ret):
     cloud_details = __grains__.get('cloud_details', {})
 
     try:
+        # the events are the same for every endpoint, only the envelope differs
+        queries = _group_by_query(data)
         opts_list = get_splunk_options(sourcetype='hubble_osqueryd',
                                        add_query_to_sourcetype=True,
                                        _nick={'sourcetype_osqueryd': 'sourcetype'})
-        for opts in opts_list:
-            logging.debug('Options: %s', json.dumps(opts))
-            # Set up the collector
-            args, kwargs = make_hec_args(opts)
-            hec = http_event_collector(*args, **kwargs)
-            for query_results in data:
-                event = _generate_event(host_args=host_args, query_name=query_results['name'],
-                                        query_results=query_results, cloud_details=cloud_details)
-                if 'columns' in query_results:  # This means we have result log event
-                    event.update(query_results['columns'])
-                    _generate_and_send_payload(hec=hec, host_args=host_args, opts=opts, event=event,
-                                               query_results=query_results)
-                elif 'snapshot' in query_results:  # This means we have snapshot log event
-                    for q_result in query_results['snapshot']:
-                        n_event = copy.deepcopy(event)
-                        n_event.update(q_result)
-                        _generate_and_send_payload(hec=hec, host_args=host_args, opts=opts,
-                                                   event=n_event, query_results=query_results)
-                else:
-                    log.error("Incompatible event data captured")
-            hec.flushBatch()
+        fan_out(opts_list, _send_queries, queries, host_args, cloud_details,
+                what='splunk_osqueryd_return')
     except Exception:
         log.exception('Error ocurred in splunk_osqueryd_return')
     return
 
 
-def _generate_and_send_payload(hec, host_args, opts, event, query_results):
+def _group_by_query(data):
     """
-    Function that builds the payload dict and sends it to the event collector (hec)
+    Build the events of the results, grouped by query name (osqueryd logs
+    differential results one row at a time, so the same query comes up over
+    and over). Returns a list of (query_name, [(event, event_time), ...])
+    """
+    now = int(time.time())
+    groups = {}
+    for query_results in data:
+        query_name = query_results['name']
+        rows = groups.get(query_name)
+        if rows is None:
+            rows = groups[query_name] = []
+        event = _generate_event(query_results=query_results, query_name=query_name)
+        event_time = _event_time(query_results, now)
+        if 'columns' in query_results:  # This means we have result log event
+            event.update(query_results['columns'])
+            rows.append((event, event_time))
+        elif 'snapshot' in query_results:  # This means we have snapshot log event
+            for q_result in query_results['snapshot']:
+                n_event = dict(event)
+                n_event.update(q_result)
+                rows.append((n_event, event_time))
+        else:
+            log.error("Incompatible event data captured")
+    return list(groups.items())
+
+
+def _send_queries(opts, queries, host_args, cloud_details):
+    """
+    Send the grouped query results to the endpoint described by opts
+    """
+    logging.debug('Options: %s', json.dumps(opts))
+    # Set up the collector
+    args, kwargs = make_hec_args(opts)
+    hec = http_event_collector(*args, **kwargs)
+    # the envelope of the events only depends on the sourcetype
+    templates = {}
+    custom_fields = _custom_fields(opts['custom_fields'])
+    index_extracted_fields = _index_extracted_fields()
+    for query_name, rows in queries:
+        sourcetype = _sourcetype(opts, query_name)
+        template = templates.get(sourcetype)
+        if template is None:
+            template = templates[sourcetype] = _build_template(
+                host_args, opts, sourcetype, cloud_details, custom_fields, index_extracted_fields)
+        hec.batchPayloads(template.payloads(rows))
+    hec.flushBatch()
+
+
+def _sourcetype(opts, query_name):
+    """
+    Return the sourcetype of the events of a query
     """
-    # Generate the payload fields
-    event = _update_event(opts['custom_fields'], event)
-    sourcetype = opts['sourcetype']
     if opts['add_query_to_sourcetype']:
         # Remove 'pack_' from query name to shorten the sourcetype length
-        sourcetype = opts['sourcetype'] + '_' + query_results['name'].replace('pack_', '')
-    # If the osquery query includes a field called 'time' it will be checked.
-    # If it's within the last year, it will be used as the eventtime.
+        return opts['sourcetype'] + '_' + query_name.replace('pack_', '')
+    return opts['sourcetype']
+
+
+def _event_time(query_results, now=None):
+    """
+    If the osquery query includes a field called 'time' it will be checked.
+    If it's within the last year, it will be used as the eventtime.
+    """
+    if now is None:
+        now = int(time.time())
     event_time = query_results.get('unixTime', query_results.get('time', ''))
     try:
-        if (datetime.fromtimestamp(time.time()) - datetime.fromtimestamp(
-                float(event_time))).days > 365:
+        if now - int(float(event_time)) >= _MAX_EVENT_AGE:
             event_time = ''
     except Exception:
         event_time = ''
-    # Set up the fields to be extracted at index time. The field values must be strings.
-    # Note that these fields will also still be available in the event data
+    return event_time
+
+
+def _index_extracted_fields():
+    """
+    Return the fields to be extracted at index time. The field values must be strings.
+    Note that these fields will also still be available in the event data
+    """
     index_extracted_fields = []
     try:
         index_extracted_fields.extend(__opts__.get('splunk_index_extracted_fields', []))
     except TypeError:
         pass
+    return index_extracted_fields
 
-    payload = {'host': host_args['fqdn'],
-               'index': opts['index'],
-               'sourcetype': sourcetype,
-               'event': event}
 
-    # Potentially add metadata fields:
-    fields = {}
-    for item in index_extracted_fields:
-        if item in payload['event'] and not isinstance(payload['event'][item], (list, dict, tuple)):
-            fields["meta_%s" % item] = str(payload['event'][item])
-    if fields:
-        payload['fields'] = fields
-    # Send payload to hec
-    log.debug("Sending logs to splunk: %s", payload)
-    hec.batchEvent(payload, eventtime=event_time)
+def _build_template(host_args, opts, sourcetype, cloud_details, custom_fields,
+                    index_extracted_fields):
+    """
+    Build the envelope shared by all the payloads of a sourcetype
+    """
+    defaults = {'job_id': host_args['job_id'],
+                'minion_id': host_args['minion_id'],
+                'dest_host': host_args['fqdn'],
+                'dest_ip': host_args['fqdn_ip4'],
+                'dest_fqdn': host_args['local_fqdn'],
+                'system_uuid': __grains__.get('system_uuid')}
+    defaults.update(cloud_details)
+    return PayloadTemplate(host=host_args['fqdn'], index=opts['index'], sourcetype=sourcetype,
+                           defaults=defaults, overrides=custom_fields,
+                           index_extracted_fields=index_extracted_fields)
 
 
 def _build_args(ret):
@@ -178,42 +223,31 @@ def _build_args(ret):
     return args
 
 
-def _generate_event(host_args, query_results, cloud_details, query_name):
+def _generate_event(query_results, query_name):
     """
-    Helper function that builds and returns the event dict
+    Helper function that builds and returns the per query fields of the event
+    (the host and cloud fields come from the payload template)
     """
     event = {'query': query_name,
-             'job_id': host_args['job_id'],
-             'minion_id': host_args['minion_id'],
-             'dest_host': host_args['fqdn'],
-             'dest_ip': host_args['fqdn_ip4'],
-             'dest_fqdn': host_args['local_fqdn'],
-             'system_uuid': __grains__.get('system_uuid'),
              'epoch': query_results['epoch'],
              'counter': query_results['counter'],
              'action': query_results['action'],
              'unixTime': query_results['unixTime']}
-    event.update(cloud_details)
 
     return event
 
 
-def _update_event(custom_fields, event):
+def _custom_fields(custom_fields):
     """
-    Helper function that updates the event with the values from custom fields and removes duplicates
+    Helper function that returns the values of the custom fields to add to the events
     """
-    # update event data
+    ret = {}
     for custom_field in custom_fields:
         custom_field_name = 'custom_' + custom_field
         custom_field_value = __mods__['config.get'](custom_field, '')
         if isinstance(custom_field_value, list):
             custom_field_value = ','.join(custom_field_value)
         if isinstance(custom_field_value, str):
-            event.update({custom_field_name: custom_field_value})
+            ret[custom_field_name] = custom_field_value
 
-    # Remove any empty fields from the event payload
-    remove_keys = [k for k in event if event[k] == ""]
-    for k in remove_keys:
-        del event[k]
-
-    return event
+    return ret
@@ -45,7 +45,7 @@ import json
 import logging
 import os
 from collections import defaultdict
-from hubblestack.hec import http_event_collector, get_splunk_options, make_hec_args
+from hubblestack.hec import http_event_collector, get_splunk_options, make_hec_args, PayloadTemplate, fan_out
 
 log = logging.getLogger(__name__)
 
@@ -70,41 +70,58 @@ def returner(ret):
     # Get cloud details
     cloud_details = __grains__.get('cloud_details', {})
     try:
+        # the events are the same for every endpoint, only the envelope differs
+        events = _build_events(alerts)
         opts_list = get_splunk_options(sourcetype='hubble_fim',
                                        _nick={'sourcetype_pulsar': 'sourcetype'})
-        for opts in opts_list:
-            logging.debug('Options: %s', json.dumps(opts))
-            # Set up the fields to be extracted at index time. The field values must be strings.
-            # Note that these fields will also still be available in the event data
-            index_extracted_fields = []
-            try:
-                index_extracted_fields.extend(__opts__.get('splunk_index_extracted_fields', []))
-            except TypeError:
-                pass
-            # Set up the collector
-            args, kwargs = make_hec_args(opts)
-            hec = http_event_collector(*args, **kwargs)
-
-            for alert in alerts:
-                if 'change' in alert:  # Linux, normal pulsar
-                    # The second half of the change will be '|IN_ISDIR' for directories
-                    change = alert['change'].split('|')[0]
-                    # Skip the IN_IGNORED events
-                    if change == 'IN_IGNORED':
-                        continue
-                    event = _build_linux_event(alert, change)
-                else:  # Windows, win_pulsar
-                    event = _build_windows_event(alert)
-                event = _update_event(opts['custom_fields'], host_args, cloud_details, event)
-                payload = _build_payload(host_args, event, opts, index_extracted_fields)
-                hec.batchEvent(payload)
-
-            hec.flushBatch()
+        fan_out(opts_list, _send_events, events, host_args, cloud_details,
+                what='splunk_pulsar_return')
     except Exception:
         log.exception('Error ocurred in splunk_pulsar_return')
     return
 
 
+def _build_events(alerts):
+    """
+    Build the event dicts of the alerts
+    """
+    events = []
+    for alert in alerts:
+        if 'change' in alert:  # Linux, normal pulsar
+            # The second half of the change will be '|IN_ISDIR' for directories
+            change = alert['change'].split('|')[0]
+            # Skip the IN_IGNORED events
+            if change == 'IN_IGNORED':
+                continue
+            events.append(_build_linux_event(alert, change))
+        else:  # Windows, win_pulsar
+            events.append(_build_windows_event(alert))
+    return events
+
+
+def _send_events(opts, events, host_args, cloud_details):
+    """
+    Send the events to the endpoint described by opts
+    """
+    logging.debug('Options: %s', json.dumps(opts))
+    # Set up the fields to be extracted at index time. The field values must be strings.
+    # Note that these fields will also still be available in the event data
+    index_extracted_fields = []
+    try:
+        index_extracted_fields.extend(__opts__.get('splunk_index_extracted_fields', []))
+    except TypeError:
+        pass
+    # Set up the collector
+    args, kwargs = make_hec_args(opts)
+    hec = http_event_collector(*args, **kwargs)
+    template = _build_template(host_args, opts, cloud_details, index_extracted_fields)
+
+    for event in events:
+        hec.batchEvent(template.payload(event))
+
+    hec.flushBatch()
+
+
 def _dedup_list(input_list):
     """
     Function that removes duplicates from a list
@@ -298,29 +315,25 @@ def _build_args(ret):
     return args
 
 
-def _update_event(custom_fields, host_args, cloud_details, event):
+def _host_fields(custom_fields, host_args, cloud_details):
     """
-    Helper function that updates the event with the values from custom fields and removes duplicates
+    Helper function that returns the host, cloud and custom fields added to every event
     """
-    event.update({'minion_id': host_args['minion_id'],
-                  'dest_host': host_args['fqdn'],
-                  'dest_ip': host_args['fqdn_ip4'],
-                  'dest_fqdn': host_args['local_fqdn'],
-                  'system_uuid': __grains__.get('system_uuid')})
-    event.update(cloud_details)
+    fields = {'minion_id': host_args['minion_id'],
+              'dest_host': host_args['fqdn'],
+              'dest_ip': host_args['fqdn_ip4'],
+              'dest_fqdn': host_args['local_fqdn'],
+              'system_uuid': __grains__.get('system_uuid')}
+    fields.update(cloud_details)
     for custom_field in custom_fields:
         custom_field_name = 'custom_' + custom_field
         custom_field_value = __mods__['config.get'](custom_field, '')
         if isinstance(custom_field_value, list):
             custom_field_value = ','.join(custom_field_value)
         if isinstance(custom_field_value, str):
-            event.update({custom_field_name: custom_field_value})
-    # Remove any empty fields from the event payload
-    remove_keys = [k for k in event if event[k] == ""]
-    for k in remove_keys:
-        del event[k]
+            fields.update({custom_field_name: custom_field_value})
 
-    return event
+    return fields
 
 
 def _build_alerts(data):
@@ -337,22 +350,12 @@ def _build_alerts(data):
     return alerts
 
 
-def _build_payload(host_args, event, opts, index_extracted_fields):
+def _build_template(host_args, opts, cloud_details, index_extracted_fields):
     """
-    Construct the payload that will be posted to Splunk
+    Construct the envelope of the payloads that will be posted to Splunk; the
+    host fields override the fields of the events, empty fields are removed
     """
-    payload = {'host': host_args['fqdn'],
-               'index': opts['index'],
-               'sourcetype': opts['sourcetype'],
-               'event': event}
-
-    # Potentially add metadata fields:
-    fields = {}
-    for item in index_extracted_fields:
-        if item in payload['event'] and not isinstance(payload['event'][item],
-                                                       (list, dict, tuple)):
-            fields["meta_%s" % item] = str(payload['event'][item])
-    if fields:
-        payload['fields'] = fields
-
-    return payload
+    return PayloadTemplate(host=host_args['fqdn'], index=opts['index'],
+                           sourcetype=opts['sourcetype'],
+                           overrides=_host_fields(opts['custom_fields'], host_args, cloud_details),
+                           index_extracted_fields=index_extracted_fields)
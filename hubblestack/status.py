@@ -28,9 +28,24 @@ hubblestack.status options:
     hubble:status:good_time
         If any counter has advanced or updated in the last (default) 60s, then
         the status dump will report the status as "yes."
+
+    hubble:status:metrics_listen
+        If set, serve the counters and the latency percentiles in the
+        Prometheus text format from a background thread, so they can be read
+        without signalling the process. Either ``host:port`` (eg
+        ``127.0.0.1:9747``) for a local HTTP endpoint or an absolute path for a
+        Unix socket (eg ``/var/run/hubble/metrics.sock``). Default: disabled.
+
+.. code-block:: shell
+    curl -s http://127.0.0.1:9747/metrics
+    curl -s --unix-socket /var/run/hubble/metrics.sock http://localhost/metrics
 """
 
 from functools import wraps
+import http.server
+import math
+import socketserver
+import threading
 import time
 import json
 import signal
@@ -46,6 +61,7 @@ DEFAULTS = {
     'good_time': 60,
     'bucket_len': 3600,
     'max_buckets': 3,
+    'metrics_listen': None,
 }
 
 
@@ -73,7 +89,7 @@ def get_hubble_status_opt(name, require_type=None):
         Various defaults are defined in hubblestack.status.DEFAULTS
     """
     for hubble_status_loc in (('hubble_status', name), ('hubble', 'status', name),
-                              ('hubble_status_' + name)):
+                              ('hubble_status_' + name,)):
         opts = __opts__
         for k in hubble_status_loc:
             if isinstance(opts, dict):
@@ -114,12 +130,76 @@ class ResourceTimer(object):
     def __init__(self, hubble_status, hs_key):
         self.hubble_status = hubble_status
         self.hs_key = hs_key
+        self.stat_handle = None
 
     def __enter__(self):
-        self.hubble_status.mark(self.hs_key)
+        self.stat_handle = self.hubble_status.mark(self.hs_key)
+        return self.stat_handle
+
+    def __exit__(self, *_exc):
+        self.stat_handle.fin()
 
-    def __exit__(self):
-        self.hubble_status.fin(self.hs_key)
+
+class Histogram(object):
+    """ A fixed memory log-linear latency histogram.
+
+        Every power of two between 2**MIN_EXP and 2**MAX_EXP seconds (about 1µs
+        to 1.1h) is split into SUB_BUCKETS linear sub-buckets, so any recorded
+        duration is known to within 1/SUB_BUCKETS (12.5%) of its value. Values
+        outside that range are clamped into the first/last bucket.
+    """
+    MIN_EXP = -20
+    MAX_EXP = 12
+    SUB_BUCKETS = 8
+    SIZE = (MAX_EXP - MIN_EXP) * SUB_BUCKETS
+
+    def __init__(self):
+        self.counts = [0] * self.SIZE
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    @classmethod
+    def index(cls, value):
+        """ the bucket index for value (in seconds) """
+        if value <= 0:
+            return 0
+        mantissa, exponent = math.frexp(value)  # value = mantissa * 2**exponent, 0.5 <= mantissa < 1
+        idx = (exponent - 1 - cls.MIN_EXP) * cls.SUB_BUCKETS + int((mantissa * 2 - 1) * cls.SUB_BUCKETS)
+        return min(max(idx, 0), cls.SIZE - 1)
+
+    @classmethod
+    def upper_bound(cls, idx):
+        """ the largest value (in seconds) that falls into bucket idx """
+        exponent, sub = divmod(idx, cls.SUB_BUCKETS)
+        return math.ldexp(1 + float(sub + 1) / cls.SUB_BUCKETS, exponent + cls.MIN_EXP)
+
+    def record(self, value):
+        """ add a duration (in seconds) """
+        self.counts[self.index(value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, quant):
+        """ estimate the quant (0 < quant <= 1) quantile; None without samples """
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(quant * self.count)))
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.upper_bound(idx), self.max)
+        return self.max
+
+    def percentiles(self, quantiles=(0.5, 0.95, 0.99)):
+        """ return a dict like {'p50': .., 'p95': .., 'p99': .., 'count': .., 'sum': ..} """
+        ret = {'count': self.count, 'sum': self.sum, 'max': self.max}
+        for quant in quantiles:
+            ret['p{0:g}'.format(quant * 100)] = self.quantile(quant)
+        return ret
 
 
 class HubbleStatus(object):
@@ -132,6 +212,7 @@ class HubbleStatus(object):
         * dur: the time between mark(name) and fin(name)
         * ema_dt: an exponential moving average of dt
         * ema_dur: an exponential moving average of dur
+        * latency: p50/p95/p99 of dur over the life of the process (see Histogram)
 
         The invocations are made most clear with a few examples.
 
@@ -172,8 +253,12 @@ class HubbleStatus(object):
                 return
     """
     _signaled = False
+    _metrics_server = None
+    # counters are marked from more than one thread (e.g. HEC fan-out)
+    _lock = threading.RLock()
     dat = dict()
     resources = list()
+    gauges = dict()
 
     class Stat(object):
         """ Data sample container for a named mark.
@@ -187,9 +272,15 @@ class HubbleStatus(object):
             * ema_dur: the average duration between mark()/fin() cycles
         """
 
-        def __init__(self, t=None):
+        def __init__(self, t=None, hist=None):
             self.bucket, self.bucket_len = t_bucket(timestamp=t)
             self.next = None
+            # tail and length are only maintained on the first (oldest)
+            # bucket of the list, the one stored in HubbleStatus.dat
+            self.tail = self
+            self.length = 1
+            # all buckets of a resource share one latency histogram
+            self.hist = Histogram() if hist is None else hist
             self.last_t = self.first_t = 0
             self.count = 0
             self.ema_dt = None
@@ -203,16 +294,18 @@ class HubbleStatus(object):
             """ find the bucket with the `bucket` id and return it or append it to the list of
             buckets of the class """
             bucket, _ = t_bucket(timestamp=bucket)
+            if self.tail.bucket == bucket:
+                # the common case: marking the current bucket
+                return self.tail
             for i in self:
                 if i.bucket == bucket:
                     return i
-            new_bucket = self.__class__(t=bucket)
+            new_bucket = self.__class__(t=bucket, hist=self.hist)
             if no_append:
                 return new_bucket
-            aux = self
-            while aux.next is not None:
-                aux = aux.next
-            aux.next = new_bucket
+            self.tail.next = new_bucket
+            self.tail = new_bucket
+            self.length += 1
             return new_bucket
 
         def find_bucket(self, bucket):
@@ -245,11 +338,12 @@ class HubbleStatus(object):
                 ret.update({'dur': self.dur, 'ema_dur': self.ema_dur})
             return ret
 
-        def mark(self, timestamp=None):
+        def mark(self, timestamp=None, count=1):
             """ mark a counter (ie, increment the count, mark the last_t =
                 time.time(), and update the ema_dt)
 
                 optional param "t": integer timestamp of mark
+                optional param "count": number of occurrences to count at once
             """
             if timestamp is None:
                 timestamp = time.time()
@@ -264,7 +358,7 @@ class HubbleStatus(object):
                     self.last_t = timestamp
             if not self.first_t:
                 self.first_t = timestamp
-            self.count += 1
+            self.count += count
             last_mark = self.dt
             self.last_t = timestamp
             self.ema_dt = last_mark if self.ema_dt is None else 0.5 * self.ema_dt + 0.5 * last_mark
@@ -282,6 +376,7 @@ class HubbleStatus(object):
             """
             self.dur = self.dt
             self.ema_dur = self.dur if self.ema_dur is None else 0.5 * self.ema_dur + 0.5 * self.dur
+            self.hist.record(self.dur)
 
         def __iter__(self):
             if self.next is not None:
@@ -312,10 +407,11 @@ class HubbleStatus(object):
     def add_resource(self, name):
         """ add the resource indentified by `name` to self.resources and self.dat if not present """
         res_id = self._namespaced(name)
-        if res_id not in self.resources:
-            self.resources.append(res_id)
-        if res_id not in self.dat:
-            self.dat[res_id] = self.Stat()
+        with self._lock:
+            if res_id not in self.resources:
+                self.resources.append(res_id)
+            if res_id not in self.dat:
+                self.dat[res_id] = self.Stat()
 
     def _namespaced(self, name):
         """ resolve `name` as a namespaced resource identifier
@@ -337,26 +433,39 @@ class HubbleStatus(object):
         return res_id
 
     def _check_depth(self, resource):
-        """ make sure we never have more than max_depth memory of past buckets """
+        """ make sure we never have more than max_depth memory of past buckets
+
+            this is O(1) unless a new bucket pushed the list past max_depth
+        """
         max_depth = int(get_hubble_status_opt('max_buckets'))
         resource = self._namespaced(resource)
         node = self.dat[resource]
-        bucket_list = node.buckets
-        if len(bucket_list) > max_depth:
+        if node.length > max_depth:
             nb_list = sorted(node, key=lambda x: x.bucket)[-max_depth:]
             for idx, nb_node in enumerate(nb_list[:-1]):
                 nb_node.next = nb_list[idx + 1]
             nb_list[-1].next = None
+            nb_list[0].tail = nb_list[-1]
+            nb_list[0].length = len(nb_list)
             self.dat[resource] = nb_list[0]
 
-    def mark(self, resource, timestamp=None):
+    def mark(self, resource, timestamp=None, count=1):
         """ mark the named resource `resource` — meaning increment the counters,
          update the last_t, etc """
         resource = self._checkmark(resource)
-        ret = self.dat[resource].mark(timestamp=timestamp)
-        self._check_depth(resource)
+        with self._lock:
+            ret = self.dat[resource].mark(timestamp=timestamp, count=count)
+            self._check_depth(resource)
         return ret
 
+    def gauge(self, name, value):
+        """ set the gauge `name` (namespaced like the counters) to `value`;
+            gauges are reported as they were last set — under GAUGES in
+            stats() and as hubble_status_gauge in as_prometheus()
+        """
+        with self._lock:
+            self.gauges[self._namespaced(name)] = value
+
     @classmethod
     def get_reported(cls, resource, bucket):
         """ return the reported list of the bucket `bucket` in the cls.dat[resource] """
@@ -473,6 +582,9 @@ class HubbleStatus(object):
         """
 
         stats_short = cls.short()
+        for k, latency in cls.latency().items():
+            if k in stats_short:
+                stats_short[k]['latency'] = latency
 
         min_dt = min([x['dt'] for x in stats_short.values()])
         max_t = max([x['last_t'] for x in stats_short.values()])
@@ -482,6 +594,8 @@ class HubbleStatus(object):
             'buckets': {k: n.buckets for k, n in cls.dat.items()},
             'last_activity': time_stats,
         }
+        if cls.gauges:
+            stats_short['GAUGES'] = dict(cls.gauges)
         stats_short['__doc__'] = {
             'service.name.here': {
                 "count": 'number of times the counter was called',
@@ -491,7 +605,9 @@ class HubbleStatus(object):
                 "dur": 'duration of the last call',
                 "last_t": 'the last time the counter was called',
                 "first_t": 'the first time the counter was called',
+                "latency": 'count, sum, max and p50/p95/p99 of all call durations',
             },
+            'GAUGES': 'values as they were last set (e.g. the disk queue drain rates)',
             'HEALTH': {
                 "last_activity": {
                     "dt": 'the minimum dt across all tracked counters',
@@ -528,6 +644,41 @@ class HubbleStatus(object):
             return [cls.short(b) for b in cls.buckets()]
         return {k: v.asdict(bucket) for k, v in cls.dat.items() if v.first_t > 0}
 
+    @classmethod
+    def latency(cls):
+        """ return the latency percentiles of every resource with durations """
+        return {k: v.hist.percentiles() for k, v in list(cls.dat.items()) if v.hist.count}
+
+    @classmethod
+    def as_prometheus(cls):
+        """ return the counters and latency summaries in the Prometheus text format """
+        lines = ['# HELP hubble_status_count number of times the counter was called',
+                 '# TYPE hubble_status_count counter']
+        last = ['# HELP hubble_status_last_timestamp_seconds the last time the counter was called',
+                '# TYPE hubble_status_last_timestamp_seconds gauge']
+        dur = ['# HELP hubble_status_duration_seconds duration of the calls',
+               '# TYPE hubble_status_duration_seconds summary']
+        gauges = ['# HELP hubble_status_gauge value as it was last set',
+                  '# TYPE hubble_status_gauge gauge']
+        for k, value in sorted(list(cls.gauges.items())):
+            label = 'resource="{0}"'.format(k.replace('\\', '\\\\').replace('"', '\\"'))
+            gauges.append('hubble_status_gauge{{{0}}} {1!r}'.format(label, float(value)))
+        for k, node in sorted(list(cls.dat.items())):
+            label = 'resource="{0}"'.format(k.replace('\\', '\\\\').replace('"', '\\"'))
+            buckets = list(node)
+            lines.append('hubble_status_count{{{0}}} {1}'.format(label, sum(x.count for x in buckets)))
+            last.append('hubble_status_last_timestamp_seconds{{{0}}} {1}'.format(
+                label, max(x.last_t for x in buckets)))
+            hist = node.hist
+            if not hist.count:
+                continue
+            for quant in (0.5, 0.95, 0.99):
+                dur.append('hubble_status_duration_seconds{{{0},quantile="{1}"}} {2!r}'.format(
+                    label, quant, hist.quantile(quant)))
+            dur.append('hubble_status_duration_seconds_sum{{{0}}} {1!r}'.format(label, hist.sum))
+            dur.append('hubble_status_duration_seconds_count{{{0}}} {1}'.format(label, hist.count))
+        return '\n'.join(lines + last + dur + gauges) + '\n'
+
     @classmethod
     def as_json(cls, indent=2):
         """ return the stats as json with customizable indent size"""
@@ -574,6 +725,33 @@ class HubbleStatus(object):
                 return
             signal.signal(signal.SIGUSR1, cls.dumpster_fire)
 
+    @classmethod
+    def start_metrics_endpoint(cls):
+        """ start serving as_prometheus() (and as_json() under /status.json)
+            from a daemon thread on hubble:status:metrics_listen, if configured
+        """
+        listen = get_hubble_status_opt('metrics_listen')
+        if not listen or cls._metrics_server is not None:
+            return cls._metrics_server
+        try:
+            if listen.startswith('/'):
+                if os.path.exists(listen):
+                    os.unlink(listen)
+                server = _UnixHTTPServer(listen, _MetricsHandler)
+                os.chmod(listen, 0o600)
+            else:
+                host, _, port = listen.rpartition(':')
+                server = _TCPHTTPServer((host or '127.0.0.1', int(port)), _MetricsHandler)
+        except Exception:
+            log.exception("unable to serve HubbleStatus metrics on %s", listen)
+            return None
+        thread = threading.Thread(target=server.serve_forever, name='hubble-status-metrics')
+        thread.daemon = True
+        thread.start()
+        log.info("serving HubbleStatus metrics on %s", listen)
+        cls._metrics_server = server
+        return server
+
     def resource_timer(self, hs_key):
         """ return an object suitable for a with-block for timing code
 
@@ -594,6 +772,50 @@ class HubbleStatus(object):
         return ResourceTimer(self, hs_key)
 
 
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """ serves /metrics (Prometheus text format) and /status.json """
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """ answer a scrape """
+        path = self.path.split('?', 1)[0]
+        if path in ('/', '/metrics'):
+            body = HubbleStatus.as_prometheus()
+            ctype = 'text/plain; version=0.0.4; charset=utf-8'
+        elif path == '/status.json':
+            body = HubbleStatus.as_json()
+            ctype = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # unix socket clients have no address
+        return str(self.client_address or 'unix')
+
+    def log_message(self, *_a):
+        # scrapes are frequent, don't fill the hubble log with them
+        pass
+
+
+class _TCPHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        def get_request(self):
+            request, _ = self.socket.accept()
+            return request, ''
+
+
 def _setup_for_testing():
     global __opts__
     import hubblestack.daemon
@@ -0,0 +1,126 @@
+# -*- encoding: utf-8 -*-
+"""
+Precompiled filters and the None/empty-string cleanups for the data
+processing modules (audit util and fdg process).
+
+Filtering used to look up the comparison of every rule for every element
+(one pass over the data per rule) and splitting by a regex recompiled it for
+every phrase. Here the rules of a block are turned into one predicate up
+front and applied in a single pass, and compiled regexes are kept. The
+cleanups always return new dicts and lists, so a chained block that changes
+their result in place never changes the input.
+"""
+
+import functools
+import logging
+import operator
+import re
+
+from hubblestack.exceptions import ArgumentValueError
+
+log = logging.getLogger(__name__)
+
+COMPARISONS = {
+    'gt': operator.gt,
+    'ge': operator.ge,
+    'lt': operator.lt,
+    'le': operator.le,
+    'eq': operator.eq,
+    'ne': operator.ne,
+}
+SEQUENCE_TYPES = (list, set, tuple)
+
+
+def _invalid_comparison(comp):
+    def _fail(_val1, _val2):
+        log.error("Invalid argument '%s' - should be in [gt, ge, lt, le, eq, ne]", comp)
+        raise ArgumentValueError
+    return _fail
+
+
+def compare(comp, val1, val2):
+    """ compare val1 to val2 with comp (one of gt, ge, lt, le, eq, ne);
+        raises ArgumentValueError for any other comp
+    """
+    return (COMPARISONS.get(comp) or _invalid_comparison(comp))(val1, val2)
+
+
+def compile_filter(filter_rules):
+    """ the predicate an element has to satisfy to pass filter_rules, a dict
+        of (comparison_type, value) pairs: every comparison is looked up once
+        here rather than for every element. An unknown comparison type raises
+        ArgumentValueError when an element gets to it.
+    """
+    checks = [(COMPARISONS.get(comp) or _invalid_comparison(comp), value)
+              for comp, value in filter_rules.items()]
+    if len(checks) == 1:
+        compare_to, value = checks[0]
+        return lambda element: compare_to(element, value)
+
+    def _matches(element):
+        for compare_to, value in checks:
+            if not compare_to(element, value):
+                return False
+        return True
+    return _matches
+
+
+def filter_seq(seq, filter_rules):
+    """ the elements of seq (as a list) that pass filter_rules; seq itself if
+        there are no rules
+    """
+    if not filter_rules:
+        return seq
+    matches = compile_filter(filter_rules)
+    return [element for element in seq if matches(element)]
+
+
+def filter_dict(dct, filter_values, filter_rules):
+    """ the items of dct whose key (or value, with filter_values) passes
+        filter_rules; dct itself if there are no rules
+    """
+    if not filter_rules:
+        return dct
+    matches = compile_filter(filter_rules)
+    if filter_values:
+        return {key: val for key, val in dct.items() if matches(val)}
+    return {key: val for key, val in dct.items() if matches(key)}
+
+
+@functools.lru_cache(maxsize=256)
+def compiled_regex(pattern):
+    """ re.compile(pattern), compiled once """
+    return re.compile(pattern)
+
+
+def _sterilize_value(value):
+    if isinstance(value, dict):
+        return {key: _sterilize_value(val) for key, val in value.items() if val is not None}
+    if isinstance(value, SEQUENCE_TYPES):
+        return [_sterilize_value(element) for element in value]
+    return value
+
+
+def sterilize(value):
+    """ a copy of value without the keys of its (nested) dicts that have
+        values of None; sequences become lists. The dicts and lists are new
+        (chained blocks may change them), the other values are shared.
+    """
+    return _sterilize_value(value)
+
+
+def _convert_none_value(value):
+    if isinstance(value, dict):
+        return {key: None if isinstance(val, str) and val == '' else _convert_none_value(val)
+                for key, val in value.items()}
+    if isinstance(value, SEQUENCE_TYPES):
+        return [_convert_none_value(element) for element in value]
+    return value
+
+
+def convert_none(value):
+    """ a copy of value with the empty string values of its (nested) dicts
+        replaced by None; sequences become lists. The dicts and lists are new,
+        the other values are shared.
+    """
+    return _convert_none_value(value)
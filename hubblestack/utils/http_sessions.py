@@ -0,0 +1,173 @@
+# -*- encoding: utf-8 -*-
+"""
+Pooled HTTP sessions for the modules that query URLs (the curl audit and fdg
+modules).
+
+requests.get() and friends build a new connection pool for every call, so
+each check paid for a DNS lookup, a TCP connect and (for https) a TLS
+handshake, even when the previous check queried the same host. The pool here
+keeps one requests.Session per (scheme, host, port, TLS options) for the
+duration of a run, so connections are kept alive between checks.
+
+A run starts with reset() (the audit module does that before its checks are
+executed, the fdg module before the blocks of a file are) and keeps the
+responses of identical GET requests, so a URL queried by several checks is
+only fetched once. Requests made outside of such a run go through a pool that
+lasts RUN_TTL seconds from the first request and only keeps the connections:
+a scheduled health check always gets a fresh response.
+Cookies are not kept between requests, like with requests.get().
+"""
+
+import http.cookiejar
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+import requests.adapters
+
+log = logging.getLogger(__name__)
+
+RUN_TTL = 60
+MAX_WORKERS = 8
+# connections kept alive per host (per session)
+POOL_MAXSIZE = MAX_WORKERS
+
+
+class SessionPool(object):
+    """ run-scoped requests sessions (and GET responses, with cache_responses)
+
+        .. code-block:: python
+
+            pool = SessionPool(cache_responses=True)
+            response = pool.request('GET', 'https://localhost:8443/health', timeout=3)
+            pool.close()
+
+        Safe to use from several threads at once.
+    """
+
+    def __init__(self, ttl=RUN_TTL, cache_responses=False):
+        self.ttl = ttl
+        self.cache_responses = cache_responses
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._responses = {}
+
+    @property
+    def expired(self):
+        """ whether the run this pool belongs to is over """
+        return time.time() - self.started > self.ttl
+
+    @staticmethod
+    def _session_key(url, kwargs):
+        parts = urlsplit(url)
+        return (parts.scheme.lower(), parts.hostname, parts.port,
+                repr(kwargs.get('verify')), repr(kwargs.get('cert')))
+
+    @staticmethod
+    def _response_key(url, kwargs):
+        # the timeout doesn't change what the response is
+        request = dict((key, val) for key, val in kwargs.items() if key != 'timeout')
+        return url + ' ' + json.dumps(request, sort_keys=True, default=repr)
+
+    def session(self, url, **kwargs):
+        """ the session requests to url (with the TLS options in kwargs) go through """
+        key = self._session_key(url, kwargs)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = requests.Session()
+                session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+                adapter = requests.adapters.HTTPAdapter(pool_maxsize=POOL_MAXSIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+        return session
+
+    def request(self, function, url, **kwargs):
+        """ make a request like requests.request(function, url, **kwargs);
+            GET responses are remembered for the rest of the run (if the
+            pool caches responses)
+        """
+        if function != 'GET' or not self.cache_responses:
+            return self.session(url, **kwargs).request(function, url, **kwargs)
+        key = self._response_key(url, kwargs)
+        with self._lock:
+            response = self._responses.get(key)
+        if response is not None:
+            log.debug('Reusing the response of GET %s', url)
+            return response
+        response = self.session(url, **kwargs).request(function, url, **kwargs)
+        with self._lock:
+            self._responses[key] = response
+        return response
+
+    def prefetch(self, requests_list, max_workers=MAX_WORKERS):
+        """ make the GET requests of requests_list, [(url, kwargs), ...],
+            concurrently so the checks find their responses waiting; failed
+            requests are left to the checks (and their error reporting);
+            does nothing if the pool doesn't cache responses
+        """
+        if not self.cache_responses:
+            return
+
+        def _get(url, kwargs):
+            try:
+                self.request('GET', url, **kwargs)
+            except Exception as exc:
+                log.debug('Prefetching %s failed: %s', url, exc)
+
+        if len(requests_list) < 2 or max_workers < 2:
+            for url, kwargs in requests_list:
+                _get(url, kwargs)
+            return
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(requests_list)),
+                                thread_name_prefix='http-prefetch') as executor:
+            for future in [executor.submit(_get, url, kwargs) for url, kwargs in requests_list]:
+                future.result()
+
+    def close(self):
+        """ close the connections and forget the responses """
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+            self._responses.clear()
+        for session in sessions:
+            session.close()
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool():
+    """ the pool of the current run (a new one, which doesn't keep any
+        responses, if the last run is over)
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None or _POOL.expired:
+            if _POOL is not None:
+                _POOL.close()
+            _POOL = SessionPool()
+        return _POOL
+
+
+def reset():
+    """ start a new run: drop the connections and responses of the last one;
+        GET responses are reused until the next reset() (or RUN_TTL seconds)
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.close()
+        _POOL = SessionPool(cache_responses=True)
+        return _POOL
+
+
+def request(function, url, **kwargs):
+    """ make a request through the pool of the current run """
+    return get_pool().request(function, url, **kwargs)
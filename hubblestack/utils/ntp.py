@@ -0,0 +1,112 @@
+# -*- encoding: utf-8 -*-
+"""
+Concurrent, memoised NTP queries for the time_sync audit and fdg modules.
+
+Querying a list of NTP servers one after another costs a full timeout for
+every server that doesn't answer, and several checks of a profile usually
+query the same servers. query_servers() queries them all at once under one
+overall deadline, and remembers the answer (or the lack of one) of each
+server for RUN_TTL seconds, so repeated checks don't touch the network.
+
+Servers can be given as ``host:port`` (or ``[ipv6]:port``) to query an NTP
+server on a port other than 123.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+log = logging.getLogger(__name__)
+
+RUN_TTL = 60
+# seconds to wait for all the servers of one query_servers() call
+DEADLINE = 10
+MAX_WORKERS = 8
+
+# server -> (taken, offset, elapsed)
+_results = {}
+# server -> future of the query still in flight
+_pending = {}
+_lock = threading.Lock()
+
+
+def split_server(ntp_server):
+    """ the (host, port) of an NTP server given as host, host:port or [ipv6]:port """
+    if ntp_server.startswith('['):
+        host, _, port = ntp_server[1:].partition(']')
+        return host, int(port[1:]) if port.startswith(':') else 'ntp'
+    if ntp_server.count(':') == 1:
+        host, port = ntp_server.split(':')
+        return host, int(port)
+    return ntp_server, 'ntp'
+
+
+def reset():
+    """ forget the answers of the last run """
+    with _lock:
+        _results.clear()
+        _pending.clear()
+
+
+def _query(ntp_server, query):
+    started = time.perf_counter()
+    try:
+        offset = query(ntp_server)
+    except Exception:
+        log.error('Unexpected error occured while querying %s.', ntp_server, exc_info=True)
+        offset = None
+    elapsed = time.perf_counter() - started
+    with _lock:
+        _results[ntp_server] = (time.time(), offset, elapsed)
+        _pending.pop(ntp_server, None)
+    return {'offset': offset, 'elapsed': elapsed}
+
+
+def query_servers(ntp_servers, query, deadline=DEADLINE, max_workers=MAX_WORKERS):
+    """ query the given NTP servers (all at once) and return
+        {server: {'offset': seconds or None, 'elapsed': seconds or None}}
+
+        query(server) queries one server and returns its offset (None if it
+        couldn't be queried). Servers that haven't answered by the deadline
+        get None for both (their answer is still remembered for the next
+        call when it comes in, and the next call waits for it rather than
+        querying the server again).
+    """
+    now = time.time()
+    ret = {}
+    futures = {}
+    todo = []
+    with _lock:
+        for ntp_server in ntp_servers:
+            if ntp_server in ret or ntp_server in todo or ntp_server in futures.values():
+                continue
+            memo = _results.get(ntp_server)
+            if memo is not None and now - memo[0] <= RUN_TTL:
+                ret[ntp_server] = {'offset': memo[1], 'elapsed': memo[2]}
+            elif ntp_server in _pending:
+                futures[_pending[ntp_server]] = ntp_server
+            else:
+                todo.append(ntp_server)
+    if not futures and (len(todo) < 2 or max_workers < 2):
+        for ntp_server in todo:
+            ret[ntp_server] = _query(ntp_server, query)
+        return ret
+
+    if todo:
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(todo)),
+                                      thread_name_prefix='ntp-query')
+        with _lock:
+            for ntp_server in todo:
+                future = _pending[ntp_server] = executor.submit(_query, ntp_server, query)
+                futures[future] = ntp_server
+        # don't wait for the stragglers, they finish (and are remembered) on their own
+        executor.shutdown(wait=False)
+    done, _not_done = wait(futures, timeout=deadline)
+    for future, ntp_server in futures.items():
+        if future in done:
+            ret[ntp_server] = future.result()
+        else:
+            log.error('No answer from %s within %s seconds', ntp_server, deadline)
+            ret[ntp_server] = {'offset': None, 'elapsed': None}
+    return ret
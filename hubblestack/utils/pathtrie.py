@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""
+A compact mapping of absolute paths to small positive integers (eg: inotify
+watch descriptors), for tables that hold hundreds of thousands of paths.
+
+Paths are stored as a tree of interned path components, so the common
+directory prefixes of the paths are stored once, instead of once per path.
+The per-node data lives in arrays indexed by node number, and the values are
+indexed the same way (value -> node), so:
+
+    * trie[path], path in trie, del trie[path]   are O(depth of path)
+    * trie.paths_of(value)                       is O(depth of the path(s))
+
+Besides the value, every path may have an owner: another path, above it in
+the tree, that it was added on behalf of (eg: the recursive watch that added
+the watch). The owner of a path is forgotten when either path loses its
+value.
+
+Only absolute, normalized paths are supported (the components are split on
+os.sep and empty components are ignored).
+"""
+
+import collections.abc
+import os
+import sys
+from array import array
+
+_NONE = -1
+
+
+class PathTrie(collections.abc.MutableMapping):
+    """ MutableMapping of absolute path -> positive int
+
+        .. code-block:: python
+
+            db = PathTrie()
+            db['/etc/ssh'] = 3
+            db['/etc/ssh/sshd_config'] = 7
+            db.set_owner('/etc/ssh/sshd_config', '/etc/ssh')
+            db.paths_of(7)         # ['/etc/ssh/sshd_config']
+            list(db.owned('/etc/ssh')) # ['/etc/ssh/sshd_config']
+    """
+
+    def __init__(self, *a, **kw):
+        # node 0 is the root directory (os.sep)
+        self._parent = array('l', [_NONE])
+        self._depth = array('H', [0])
+        self._value = array('l', [0])
+        self._owner = array('l', [_NONE])
+        self._owned = array('l', [0])
+        self._name = ['']
+        self._children = [None]
+        self._free = []
+        # value -> node; values shared by several paths (hardlinked
+        # directories, bind mounts) keep the other nodes in _more_nodes
+        self._node_of = array('l')
+        self._more_nodes = {}
+        self._count = 0
+        self._owners = 0
+        self.update(*a, **kw)
+
+    # -- nodes
+
+    @staticmethod
+    def _split(path):
+        if not path.startswith(os.sep):
+            raise KeyError(path)
+        return [x for x in path.split(os.sep) if x]
+
+    def _find(self, path):
+        node = 0
+        children = self._children
+        for name in self._split(path):
+            kids = children[node]
+            if kids is None:
+                return _NONE
+            node = kids.get(name, _NONE)
+            if node == _NONE:
+                return _NONE
+        return node
+
+    def _new_node(self, parent, name):
+        name = sys.intern(name)
+        depth = self._depth[parent] + 1
+        if self._free:
+            node = self._free.pop()
+            self._parent[node] = parent
+            self._depth[node] = depth
+            self._value[node] = 0
+            self._owner[node] = _NONE
+            self._owned[node] = 0
+            self._name[node] = name
+            self._children[node] = None
+        else:
+            node = len(self._name)
+            self._parent.append(parent)
+            self._depth.append(depth)
+            self._value.append(0)
+            self._owner.append(_NONE)
+            self._owned.append(0)
+            self._name.append(name)
+            self._children.append(None)
+        if self._children[parent] is None:
+            self._children[parent] = {}
+        self._children[parent][name] = node
+        return node
+
+    def _make(self, path):
+        node = 0
+        children = self._children
+        for name in self._split(path):
+            kids = children[node]
+            child = _NONE if kids is None else kids.get(name, _NONE)
+            if child == _NONE:
+                child = self._new_node(node, name)
+            node = child
+        return node
+
+    def _release(self, node):
+        """ free node and its (now useless) ancestors """
+        while node > 0 and not self._value[node] and not self._owned[node] \
+                and not self._children[node]:
+            parent = self._parent[node]
+            del self._children[parent][self._name[node]]
+            if not self._children[parent]:
+                self._children[parent] = None
+            self._name[node] = ''
+            self._parent[node] = _NONE
+            self._free.append(node)
+            node = parent
+
+    def _path(self, node):
+        names = []
+        parent = self._parent
+        name = self._name
+        while node > 0:
+            names.append(name[node])
+            node = parent[node]
+        names.reverse()
+        return os.sep + os.sep.join(names)
+
+    def _descendants(self, node):
+        """ the nodes below node (depth first) """
+        children = self._children
+        stack = list(children[node].values()) if children[node] else []
+        while stack:
+            node = stack.pop()
+            yield node
+            if children[node]:
+                stack.extend(children[node].values())
+
+    # -- value index
+
+    def _index(self, value, node):
+        if value >= len(self._node_of):
+            self._node_of.extend([_NONE] * (value + 1 - len(self._node_of)))
+        if self._node_of[value] == _NONE:
+            self._node_of[value] = node
+        elif self._node_of[value] != node:
+            self._more_nodes.setdefault(value, set()).add(node)
+
+    def _unindex(self, value, node):
+        more = self._more_nodes.get(value)
+        if self._node_of[value] == node:
+            self._node_of[value] = more.pop() if more else _NONE
+        elif more:
+            more.discard(node)
+        if not more and value in self._more_nodes:
+            del self._more_nodes[value]
+
+    def _nodes_of(self, value):
+        if not isinstance(value, int) or value <= 0 or value >= len(self._node_of):
+            return []
+        node = self._node_of[value]
+        if node == _NONE:
+            return []
+        return [node] + list(self._more_nodes.get(value, ()))
+
+    # -- ownership
+
+    def _disown(self, node):
+        owner = self._owner[node]
+        if owner != _NONE:
+            self._owner[node] = _NONE
+            self._owned[owner] -= 1
+            if not self._owned[owner]:
+                self._owners -= 1
+                self._release(owner)
+
+    def _clear(self, node):
+        self._unindex(self._value[node], node)
+        self._value[node] = 0
+        self._count -= 1
+        self._disown(node)
+        if self._owned[node]:
+            for child in self._descendants(node):
+                if self._owner[child] == node:
+                    self._disown(child)
+                    if not self._owned[node]:
+                        break
+
+    # -- MutableMapping
+
+    def __getitem__(self, path):
+        node = self._find(path)
+        if node == _NONE or not self._value[node]:
+            raise KeyError(path)
+        return self._value[node]
+
+    def __setitem__(self, path, value):
+        if not isinstance(value, int) or value <= 0:
+            raise ValueError('PathTrie values must be positive integers, not {0!r}'.format(value))
+        node = self._make(path)
+        old = self._value[node]
+        if old == value:
+            return
+        if old:
+            self._unindex(old, node)
+        else:
+            self._count += 1
+        self._value[node] = value
+        self._index(value, node)
+
+    def __delitem__(self, path):
+        node = self._find(path)
+        if node == _NONE or not self._value[node]:
+            raise KeyError(path)
+        self._clear(node)
+        self._release(node)
+
+    def __contains__(self, path):
+        try:
+            node = self._find(path)
+        except (KeyError, AttributeError):
+            return False
+        return node != _NONE and self._value[node] > 0
+
+    def get(self, path, default=None):
+        try:
+            node = self._find(path)
+        except (KeyError, AttributeError):
+            return default
+        if node == _NONE or not self._value[node]:
+            return default
+        return self._value[node]
+
+    def __iter__(self):
+        for path, _value in self.items():
+            yield path
+
+    def items(self):
+        """ (path, value) of every path, depth first; builds the paths as it
+            goes rather than walking back up from every node
+        """
+        value = self._value
+        children = self._children
+        if value[0]:
+            yield os.sep, value[0]
+        stack = [(os.sep, children[0])]
+        while stack:
+            prefix, kids = stack.pop()
+            if not kids:
+                continue
+            for name, node in kids.items():
+                path = prefix + name
+                if value[node]:
+                    yield path, value[node]
+                if children[node]:
+                    stack.append((path + os.sep, children[node]))
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(self.__class__.__name__, dict(self.items()))
+
+    # -- lookups by value
+
+    def paths_of(self, value):
+        """ the paths with the given value (usually one) """
+        return [self._path(node) for node in self._nodes_of(value)]
+
+    # -- ownership
+
+    def set_owner(self, path, owner):
+        """ record that path was added on behalf of owner (an ancestor of path
+            in the tree); a path has one owner, the nearest one wins
+        """
+        node = self._find(path)
+        if node == _NONE or not self._value[node]:
+            raise KeyError(path)
+        onode = self._make(owner)
+        if onode == node:
+            return
+        current = self._owner[node]
+        if current == onode:
+            return
+        if current != _NONE:
+            if self._depth[current] > self._depth[onode]:
+                self._release(onode)
+                return
+            self._disown(node)
+        self._owner[node] = onode
+        if not self._owned[onode]:
+            self._owners += 1
+        self._owned[onode] += 1
+
+    def owner(self, path):
+        """ the owner of path (or None) """
+        node = self._find(path)
+        if node == _NONE or self._owner[node] == _NONE:
+            return None
+        return self._path(self._owner[node])
+
+    def has_owned(self, path):
+        """ whether any path is owned by path """
+        node = self._find(path)
+        return node != _NONE and self._owned[node] > 0
+
+    def owned(self, path):
+        """ iterate the paths owned by path """
+        node = self._find(path)
+        if node == _NONE or not self._owned[node]:
+            return
+        remaining = self._owned[node]
+        for child in self._descendants(node):
+            if self._owner[child] == node:
+                yield self._path(child)
+                remaining -= 1
+                if not remaining:
+                    break
+
+    def owned_values(self, path):
+        """ iterate the values of the paths owned by path """
+        node = self._find(path)
+        if node == _NONE or not self._owned[node]:
+            return
+        remaining = self._owned[node]
+        for child in self._descendants(node):
+            if self._owner[child] == node:
+                yield self._value[child]
+                remaining -= 1
+                if not remaining:
+                    break
+
+    def owners(self):
+        """ iterate the paths that own other paths """
+        for node in range(len(self._name)):
+            if self._owned[node] > 0:
+                yield self._path(node)
+
+    def ownership(self):
+        """ (path, owner or None) of every path, depth first """
+        for path, _value in self.items():
+            yield path, self.owner(path)
+
+    @property
+    def owner_count(self):
+        """ the number of paths that own other paths """
+        return self._owners
+
+
+class OwnedView(collections.abc.Mapping):
+    """ read-only owner path -> set(owned paths) view of a PathTrie, for code
+        written against a dict of sets; the sets are built on access
+    """
+
+    def __init__(self, trie):
+        self._trie = trie
+
+    def __getitem__(self, path):
+        if not self._trie.has_owned(path):
+            raise KeyError(path)
+        return set(self._trie.owned(path))
+
+    def __contains__(self, path):
+        try:
+            return self._trie.has_owned(path)
+        except (KeyError, AttributeError):
+            return False
+
+    def get(self, path, default=None):
+        try:
+            return self[path]
+        except (KeyError, AttributeError):
+            return default
+
+    def __iter__(self):
+        return self._trie.owners()
+
+    def __len__(self):
+        return self._trie.owner_count
@@ -3,10 +3,16 @@
 For running command line executables with a timeout
 '''
 
+import collections
+import os
+import select
+import selectors
 import shlex
 import subprocess
 import threading
+import time
 import hubblestack.exceptions
+import hubblestack.hangtime
 import hubblestack.utils.data
 import hubblestack.utils.stringutils
 
@@ -72,6 +78,20 @@ class TimedProc(object):
             args = hubblestack.utils.data.decode(args)
             self.process = subprocess.Popen(args, **kwargs)
         self.command = args
+        self.timed_out = False
+        # let an enclosing HangTime kill the child if it expires
+        hubblestack.hangtime.watch(self.process)
+
+    def timeout_error(self):
+        '''
+        The exception describing that this process ran past its timeout
+        '''
+        return hubblestack.exceptions.TimedProcTimeoutError(
+            '{0} : Timed out after {1} seconds'.format(
+                self.command,
+                str(self.timeout),
+            )
+        )
 
     def run(self):
         '''
@@ -85,7 +105,10 @@ class TimedProc(object):
                 self.process.wait()
 
         if not self.timeout:
-            receive()
+            try:
+                receive()
+            finally:
+                hubblestack.hangtime.unwatch(self.process)
         else:
             rt = threading.Thread(target=receive)
             rt.start()
@@ -98,10 +121,135 @@ class TimedProc(object):
                     if rt.isAlive():
                         self.process.terminate()
                 threading.Timer(10, terminate).start()
-                raise hubblestack.exceptions.TimedProcTimeoutError(
-                    '{0} : Timed out after {1} seconds'.format(
-                        self.command,
-                        str(self.timeout),
-                    )
-                )
+                self.timed_out = True
+                raise self.timeout_error()
+            hubblestack.hangtime.unwatch(self.process)
         return self.process.returncode
+
+
+# how long the reaper sleeps between polls of children that closed their
+# pipes but have not been reaped yet
+_REAP_INTERVAL = 0.05
+_READ_SIZE = 32768
+# bytes that can be written to a pipe reported as writable without blocking
+_PIPE_BUF = getattr(select, 'PIPE_BUF', 512)
+
+
+class _BatchEntry(object):
+    '''
+    Book-keeping for one running child of ``run_many``
+    '''
+    def __init__(self, index, proc):
+        self.index = index
+        self.proc = proc
+        self.deadline = time.monotonic() + proc.timeout if proc.timeout else None
+        self.output = {}
+        self.stdin_offset = 0
+
+
+def run_many(jobs, max_procs=8):
+    '''
+    Run several commands concurrently from the calling thread.
+
+    ``jobs`` is a list of ``(args, kwargs)`` pairs as accepted by ``TimedProc``.
+    At most ``max_procs`` children are alive at any time. Rather than one
+    watchdog thread per child, a single selector loop multiplexes the pipes of
+    all running children, reaps them and enforces each ``timeout``.
+
+    Returns a list in input order with, for every job, either the finished
+    ``TimedProc`` (``stdout``/``stderr`` hold the collected bytes and
+    ``timed_out`` is set if the child had to be killed) or the exception
+    raised while starting it. POSIX only, pipes cannot be selected on Windows.
+    '''
+    results = [None] * len(jobs)
+    pending = collections.deque(enumerate(jobs))
+    running = []
+    selector = selectors.DefaultSelector()
+    max_procs = max(1, int(max_procs))
+
+    def _close(stream):
+        selector.unregister(stream)
+        stream.close()
+
+    def _finish(entry):
+        proc = entry.proc
+        for stream in (proc.process.stdin, proc.process.stdout, proc.process.stderr):
+            if stream is not None and not stream.closed:
+                _close(stream)
+        proc.stdout = b''.join(entry.output[proc.process.stdout]) \
+            if proc.process.stdout is not None else None
+        proc.stderr = b''.join(entry.output[proc.process.stderr]) \
+            if proc.process.stderr is not None else None
+        results[entry.index] = proc
+        running.remove(entry)
+        hubblestack.hangtime.unwatch(proc.process)
+
+    try:
+        while pending or running:
+            while pending and len(running) < max_procs:
+                index, (args, kwargs) = pending.popleft()
+                kwargs = dict(kwargs, bg=False, with_communicate=True)
+                try:
+                    proc = TimedProc(args, **kwargs)
+                except (OSError, IOError, hubblestack.exceptions.TimedProcTimeoutError) as exc:
+                    results[index] = exc
+                    continue
+                entry = _BatchEntry(index, proc)
+                for stream in (proc.process.stdout, proc.process.stderr):
+                    if stream is not None:
+                        entry.output[stream] = []
+                        selector.register(stream, selectors.EVENT_READ, entry)
+                if proc.process.stdin is not None:
+                    if proc.stdin:
+                        selector.register(proc.process.stdin, selectors.EVENT_WRITE, entry)
+                    else:
+                        proc.process.stdin.close()
+                running.append(entry)
+
+            now = time.monotonic()
+            deadlines = [entry.deadline for entry in running if entry.deadline is not None]
+            wait = max(0, min(deadlines) - now) if deadlines else None
+            if any(all(stream.closed for stream in entry.output) for entry in running):
+                # someone closed its pipes and is waiting to be reaped
+                wait = _REAP_INTERVAL if wait is None else min(wait, _REAP_INTERVAL)
+            if selector.get_map():
+                events = selector.select(wait)
+            else:
+                events = []
+                time.sleep(wait or 0)
+
+            for key, mask in events:
+                entry = key.data
+                if mask & selectors.EVENT_WRITE:
+                    chunk = entry.proc.stdin[entry.stdin_offset:entry.stdin_offset + _PIPE_BUF]
+                    try:
+                        entry.stdin_offset += os.write(key.fd, chunk)
+                    except BrokenPipeError:
+                        entry.stdin_offset = len(entry.proc.stdin)
+                    if entry.stdin_offset >= len(entry.proc.stdin):
+                        _close(key.fileobj)
+                else:
+                    data = os.read(key.fd, _READ_SIZE)
+                    if data:
+                        entry.output[key.fileobj].append(data)
+                    else:
+                        _close(key.fileobj)
+
+            now = time.monotonic()
+            for entry in list(running):
+                streams_open = any(not stream.closed for stream in entry.output)
+                if not streams_open and entry.proc.process.poll() is not None:
+                    _finish(entry)
+                elif entry.deadline is not None and now >= entry.deadline:
+                    entry.proc.process.kill()
+                    entry.proc.process.wait()
+                    entry.proc.timed_out = True
+                    _finish(entry)
+    finally:
+        for entry in list(running):
+            entry.proc.process.kill()
+            entry.proc.process.wait()
+            _finish(entry)
+        selector.close()
+    return results
+
@@ -0,0 +1,221 @@
+# -*- encoding: utf-8 -*-
+"""
+Concurrent, memoised TLS certificate fetching for the ssl_certificate audit
+and fdg modules.
+
+The modules used to fetch a certificate with socket.setdefaulttimeout() and
+ssl.get_server_certificate(), one endpoint after another. setdefaulttimeout()
+changes the timeout of every socket the process creates afterwards (the
+returners' included), and an endpoint that doesn't answer cost a full timeout
+for every check that asked for it. get_certificate() connects with a timeout
+of its own, remembers the certificate (or the failure) of each (host, port)
+for RUN_TTL seconds, and fetch_certificates() fetches the certificates of
+many endpoints at once. parse_certificate() keeps the parsed details of each
+certificate for RUN_TTL seconds as well, so the audit and fdg modules share
+them; whether a certificate has expired is decided when it is asked for.
+"""
+
+import logging
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+import OpenSSL
+
+log = logging.getLogger(__name__)
+
+RUN_TTL = 60
+TIMEOUT = 3
+MAX_WORKERS = 8
+
+# (host, port) -> (taken, timeout, pem, error)
+_certs = {}
+# (host, port) -> future of the fetch still in flight
+_pending = {}
+# pem -> (parsed, not_after, details)
+_parsed = {}
+_lock = threading.Lock()
+
+
+def reset():
+    """ forget the certificates of the last run """
+    with _lock:
+        _certs.clear()
+        _pending.clear()
+        _parsed.clear()
+
+
+def _fetch_pem(host, port, timeout):
+    """ the certificate (PEM) the endpoint presents; the timeout only applies
+        to this connection
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        with context.wrap_socket(sock, server_hostname=host) as tls_sock:
+            der = tls_sock.getpeercert(binary_form=True)
+    return ssl.DER_cert_to_PEM_cert(der)
+
+
+def _expire(now):
+    """ drop the memos older than RUN_TTL, so processes that never reset()
+        (fdg only deployments) don't keep every certificate they saw
+        (must be called with _lock held)
+    """
+    for memo, taken_at in ((_certs, 0), (_parsed, 0)):
+        for key in [key for key, entry in memo.items() if now - entry[taken_at] > RUN_TTL]:
+            del memo[key]
+
+
+def _fetch(key, timeout):
+    host, port = key
+    log.debug('Fetching the ssl cert of %s:%s', host, port)
+    try:
+        pem, error = _fetch_pem(host, port, timeout), None
+    except Exception as exc:
+        pem, error = None, str(exc) or exc.__class__.__name__
+    with _lock:
+        now = time.time()
+        _expire(now)
+        _certs[key] = (now, timeout, pem, error)
+        _pending.pop(key, None)
+    return pem, error
+
+
+def _lookup(key, timeout, now):
+    """ the memo of key if it can be used, the future fetching it, or None
+        (must be called with _lock held)
+    """
+    memo = _certs.get(key)
+    # a failure is retried if the caller is willing to wait longer
+    if memo is not None and now - memo[0] <= RUN_TTL and (memo[2] is not None or timeout <= memo[1]):
+        return memo
+    return _pending.get(key)
+
+
+def get_certificate(host, port, timeout=TIMEOUT):
+    """ fetch the certificate of host:port and return (pem, None), or
+        (None, error message) if it couldn't be fetched
+    """
+    key = (str(host), int(port))
+    with _lock:
+        found = _lookup(key, timeout, time.time())
+    if found is None:
+        return _fetch(key, timeout)
+    if isinstance(found, tuple):
+        log.debug('Reusing the ssl cert of %s:%s', host, port)
+        return found[2], found[3]
+    # fetched by someone else right now
+    done, _not_done = wait([found], timeout=timeout)
+    if done:
+        return found.result()
+    return None, 'timed out'
+
+
+def fetch_certificates(endpoints, timeout=TIMEOUT, max_workers=MAX_WORKERS):
+    """ fetch the certificates of endpoints, [(host, port), ...], concurrently
+        (and parse them) so the checks find them waiting
+    """
+    now = time.time()
+    todo = []
+    with _lock:
+        for host, port in endpoints:
+            key = (str(host), int(port))
+            if key not in todo and _lookup(key, timeout, now) is None:
+                todo.append(key)
+    if not todo:
+        return
+
+    def _fetch_and_parse(key):
+        pem, _error = _fetch(key, timeout)
+        if pem is not None:
+            try:
+                parse_certificate(pem)
+            except Exception as exc:
+                log.debug('Unable to parse the ssl cert of %s:%s: %s', key[0], key[1], exc)
+
+    log.debug('Fetching the ssl certs of %d endpoints', len(todo))
+    with ThreadPoolExecutor(max_workers=max(min(max_workers, len(todo)), 1),
+                            thread_name_prefix='tls-fetch') as executor:
+        with _lock:
+            futures = [executor.submit(_fetch_and_parse, key) for key in todo]
+            for key, future in zip(todo, futures):
+                _pending[key] = future
+        for future in futures:
+            future.result()
+
+
+def parse_certificate(pem):
+    """ the details of the certificate pem (a dict of the ssl_* fields the
+        ssl_certificate modules report); raises if pem can't be loaded
+    """
+    now = time.time()
+    with _lock:
+        entry = _parsed.get(pem)
+    if entry is None or now - entry[0] > RUN_TTL:
+        not_after, details = _parse(pem)
+        with _lock:
+            _expire(now)
+            _parsed[pem] = entry = (now, not_after, details)
+    _parsed_at, not_after, details = entry
+    ret = dict(details)
+    ret['ssl_has_expired'] = datetime.utcnow() > not_after
+    ret['ssl_subject_alternative_names'] = list(details['ssl_subject_alternative_names'])
+    return ret
+
+
+def _parse(pem):
+    """ the notAfter time (UTC) of the certificate pem and its details,
+        but for ssl_has_expired
+    """
+    x509 = OpenSSL.crypto.load_certificate(OpenSSL.crypto.FILETYPE_PEM, pem)
+    details = {}
+    if x509.get_issuer():
+        issuer_components = _format_components(x509.get_issuer())
+        details['ssl_issuer_common_name'] = issuer_components.get('CN', "None")
+    if x509.get_subject():
+        subject_components = _format_components(x509.get_subject())
+        details['ssl_subject_country'] = subject_components.get('C', "None")
+        details['ssl_subject_organisation'] = subject_components.get('O', "None")
+        details['ssl_subject_organisation_unit'] = subject_components.get('OU', "None")
+        details['ssl_subject_common_name'] = subject_components.get('CN', "None")
+    not_after = datetime.strptime(x509.get_notAfter().decode('utf-8'), "%Y%m%d%H%M%SZ")
+    not_before = datetime.strptime(x509.get_notBefore().decode('utf-8'), "%Y%m%d%H%M%SZ")
+    details['ssl_cert_version'] = str(x509.get_version())
+    details['ssl_serial_number'] = str(x509.get_serial_number())
+    details['ssl_end_time'] = str(not_after)
+    details['ssl_start_time'] = str(not_before)
+    details['ssl_signature_algorithm'] = str(x509.get_signature_algorithm())
+    details['ssl_cert_pem'] = str(pem)
+    details['ssl_subject_alternative_names'] = _get_certificate_san(x509)
+    return not_after, details
+
+
+def _format_components(x509name):
+    items = {}
+    for key, value in x509name.get_components():
+        if isinstance(key, bytes):
+            key = key.decode("utf-8")
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        items[key] = value
+    return items
+
+
+def _get_certificate_san(x509cert):
+    san = ''
+    trimmed_san_list = []
+    try:
+        for i in range(0, x509cert.get_extension_count()):
+            ext = x509cert.get_extension(i)
+            if 'subjectAltName' in str(ext.get_short_name()):
+                san = ext.__str__()
+        for san in san.split(','):
+            trimmed_san_list.append(san.lstrip())
+    except Exception as exc:
+        log.error("ssl_certificate couldn't fetch SANs: %s", exc)
+    return trimmed_san_list
@@ -9,11 +9,20 @@
 
     Version parsing based on distutils.version which works under python 3
     because on python 3 you can no longer compare strings against integers.
+
+    Package version ordering for dpkg, rpm (EVR) and apk is implemented by
+    version_key(), which pre-parses a version string into a plain tuple that
+    sorts the way the package manager would order the versions. Keys are
+    cached per string, so sorting or range queries over every installed
+    package only parse each distinct version once.
 '''
 
 # Import Python libs
+import bisect
+import functools
 import logging
 import numbers
+import re
 import sys
 import warnings
 from distutils.version import LooseVersion as _LooseVersion
@@ -77,3 +86,199 @@ def version_cmp(pkg1, pkg2, ignore_epoch=False):
         log.exception(exc)
     return None
 
+
+
+# Package manager version ordering
+SCHEMES = ('rpm', 'dpkg', 'apk')
+SCHEME_BY_OS = {
+    'debian': 'dpkg', 'ubuntu': 'dpkg',
+    'redhat': 'rpm', 'centos': 'rpm', 'fedora': 'rpm', 'amazon': 'rpm', 'suse': 'rpm',
+    'alpine': 'apk',
+}
+KEY_CACHE_SIZE = 65536
+
+_RPM_TOKEN = re.compile(r'~|\^|\d+|[a-zA-Z]+')
+# rpm token weights: tilde sorts before the end of the string, caret after it
+_RPM_TILDE, _RPM_END, _RPM_CARET, _RPM_ALPHA, _RPM_NUM = range(5)
+_RPM_END_KEY = (_RPM_END,)
+
+_DPKG_CHUNK = re.compile(r'(\D*)(\d*)')
+_DPKG_END_KEY = ((0,), 0)
+
+_APK_VERSION = re.compile(
+    r'^(\d+(?:\.\d+)*)([a-z]?)((?:_(?:alpha|beta|pre|rc|cvs|svn|git|hg|p)\d*)*)'
+    r'(?:~[0-9a-f]+)?(?:-r(\d+))?$')
+_APK_SUFFIX = re.compile(r'_(alpha|beta|pre|rc|cvs|svn|git|hg|p)(\d*)')
+_APK_SUFFIX_RANK = dict((suffix, rank) for rank, suffix in
+                        enumerate(('alpha', 'beta', 'pre', 'rc', '', 'cvs', 'svn', 'git', 'hg', 'p')))
+_APK_NO_SUFFIX_KEY = ((_APK_SUFFIX_RANK[''], 0),)
+
+
+def scheme_for(os_name, default='rpm'):
+    '''
+    Return the version scheme (rpm, dpkg or apk) used by the given os or
+    os_family grain value
+    '''
+    return SCHEME_BY_OS.get(str(os_name).lower(), default)
+
+
+def _split_epoch(verstring):
+    epoch, sep, rest = verstring.partition(':')
+    if not sep:
+        return 0, verstring
+    try:
+        return int(epoch), rest
+    except ValueError:
+        return 0, rest
+
+
+def _rpm_segments(verstring):
+    ''' rpmvercmp() as a key: separators are dropped, numeric segments sort
+        above alpha ones and the string is terminated by an end marker
+    '''
+    key = []
+    for token in _RPM_TOKEN.findall(verstring):
+        if token == '~':
+            key.append((_RPM_TILDE,))
+        elif token == '^':
+            key.append((_RPM_CARET,))
+        elif token.isdigit():
+            key.append((_RPM_NUM, int(token)))
+        else:
+            key.append((_RPM_ALPHA, token))
+    key.append(_RPM_END_KEY)
+    return tuple(key)
+
+
+@functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+def rpm_key(verstring):
+    '''
+    Sort key for an rpm [epoch:]version[-release] string. A missing epoch is
+    0 and a missing release sorts before any release.
+    '''
+    epoch, rest = _split_epoch(verstring)
+    version, _, release = rest.partition('-')
+    return epoch, _rpm_segments(version), _rpm_segments(release)
+
+
+def _dpkg_weight(char):
+    if char == '~':
+        return -1
+    if char.isalpha():
+        return ord(char)
+    return ord(char) + 256
+
+
+def _dpkg_segments(verstring):
+    ''' verrevcmp() as a key: alternating non-digit and digit chunks; each
+        non-digit chunk ends with a 0 weight so that it sorts like dpkg's
+        end-of-string (above '~', below everything else)
+    '''
+    key = []
+    for chars, digits in _DPKG_CHUNK.findall(verstring):
+        if chars or digits:
+            key.append((tuple(_dpkg_weight(c) for c in chars) + (0,), int(digits or 0)))
+    while key and key[-1] == _DPKG_END_KEY:
+        key.pop()
+    key.append(_DPKG_END_KEY)
+    return tuple(key)
+
+
+@functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+def dpkg_key(verstring):
+    '''
+    Sort key for a dpkg [epoch:]upstream_version[-debian_revision] string
+    '''
+    epoch, rest = _split_epoch(verstring)
+    upstream, _, revision = rest.rpartition('-')
+    if not upstream:
+        upstream, revision = revision, ''
+    return epoch, _dpkg_segments(upstream), _dpkg_segments(revision)
+
+
+@functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+def apk_key(verstring):
+    '''
+    Sort key for an apk version (1.2.3a_rc1-r0). Strings that are not valid
+    apk versions sort below all valid ones, ordered like rpm versions.
+    '''
+    match = _APK_VERSION.match(verstring)
+    if not match:
+        return 0, _rpm_segments(verstring)
+    digits, letter, suffixes, release = match.groups()
+    suffix_key = tuple((_APK_SUFFIX_RANK[name], int(num or 0))
+                       for name, num in _APK_SUFFIX.findall(suffixes))
+    return (1, tuple(int(part) for part in digits.split('.')), letter,
+            suffix_key + _APK_NO_SUFFIX_KEY, int(release or 0))
+
+
+_KEY_FUNCS = {'rpm': rpm_key, 'dpkg': dpkg_key, 'apk': apk_key}
+
+
+def version_key(verstring, scheme='rpm'):
+    '''
+    Return a tuple that sorts verstring the way the given package scheme
+    (rpm, dpkg or apk) orders versions. Keys are cached per version string.
+    '''
+    try:
+        key_func = _KEY_FUNCS[scheme]
+    except KeyError:
+        raise ValueError('unknown version scheme: {0}'.format(scheme))
+    return key_func(str(verstring).strip())
+
+
+def compare(ver1, ver2, scheme='rpm'):
+    '''
+    cmp-style comparison of two versions in the given scheme. Return -1 if
+    ver1 < ver2, 0 if ver1 == ver2, and 1 if ver1 > ver2.
+    '''
+    key1 = version_key(ver1, scheme)
+    key2 = version_key(ver2, scheme)
+    return (key1 > key2) - (key1 < key2)
+
+
+def sort_versions(versions, scheme='rpm', reverse=False):
+    '''
+    Sort an iterable of version strings in the given scheme
+    '''
+    return sorted(versions, key=lambda ver: version_key(ver, scheme), reverse=reverse)
+
+
+def below_fixed(installed, fixed, scheme='rpm'):
+    '''
+    Find the installed packages that are older than some fixed version.
+
+    installed
+        Mapping of package name to the installed version (or a list of
+        versions, as returned by pkg.list_pkgs with versions_as_list=True)
+
+    fixed
+        Mapping of package name to an iterable of fixed versions, or of
+        (fixed version, data) pairs, e.g. the advisories fixing that package
+
+    Returns a dict mapping every installed version that is below at least one
+    fixed version to the list of those fixed entries, as
+    ``{name: {installed_version: [entry, ...]}}``. The fixed versions of a
+    package are sorted once, so each installed version costs a single bisect.
+    '''
+    ret = {}
+    for name, entries in fixed.items():
+        installed_versions = installed.get(name)
+        if not installed_versions:
+            continue
+        if isinstance(installed_versions, str):
+            installed_versions = [installed_versions]
+        keyed = sorted(((version_key(_fixed_version(entry), scheme), idx, entry)
+                        for idx, entry in enumerate(entries)), key=lambda item: item[:2])
+        keys = [item[0] for item in keyed]
+        for installed_version in installed_versions:
+            pos = bisect.bisect_right(keys, version_key(installed_version, scheme))
+            if pos < len(keyed):
+                ret.setdefault(name, {})[installed_version] = [item[2] for item in keyed[pos:]]
+    return ret
+
+
+def _fixed_version(entry):
+    if isinstance(entry, (list, tuple)):
+        return entry[0]
+    return entry
@@ -0,0 +1,160 @@
+# coding: utf-8
+"""
+Benchmark AuditRunner._execute() with a synthetic CIS-sized profile: stat and
+grep checks against files in a temporary directory plus some boolean
+expressions over them, like a CIS benchmark for a linux distribution has.
+
+    python tests/benchmarks/bench_audit.py [--checks 300] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+
+import yaml
+
+import benchlib
+from benchlib import Timer, summarize
+
+# pylint: disable=wrong-import-position
+import hubblestack.config
+import hubblestack.loader
+import hubblestack.module_runner.audit_runner
+import hubblestack.module_runner.runner
+from hubblestack.module_runner.audit_runner import AuditRunner
+from hubblestack.version import __version__
+
+GRAINS = {'id': 'bench', 'kernel': 'Linux', 'os': 'Ubuntu', 'os_family': 'Debian',
+          'osfinger': 'Ubuntu-22.04', 'osrelease': '22.04', 'fqdn': 'bench.example.com',
+          'hubble_version': __version__}
+
+SSHD_CONFIG = """\
+Protocol 2
+LogLevel INFO
+X11Forwarding no
+MaxAuthTries 4
+IgnoreRhosts yes
+HostbasedAuthentication no
+PermitRootLogin no
+PermitEmptyPasswords no
+PermitUserEnvironment no
+ClientAliveInterval 300
+ClientAliveCountMax 0
+LoginGraceTime 60
+"""
+
+
+def _implementation(module, items, grains='G@kernel:Linux'):
+    return [{'filter': {'grains': grains}, 'module': module, 'items': items}]
+
+
+def make_profile(directory, checks=300):
+    """ write the config files the checks look at into directory and return
+        the profile (a dict of checks): 2/3 stat checks, 1/4 grep checks, the
+        rest boolean expressions over the grep checks
+    """
+    sshd = os.path.join(directory, 'sshd_config')
+    with open(sshd, 'w') as fh:
+        fh.write(SSHD_CONFIG)
+    options = [line.split() for line in SSHD_CONFIG.splitlines()]
+    profile = {}
+    grep_ids = []
+    for idx in range(checks):
+        check_id = 'bench_{0}'.format(idx)
+        check = {'description': 'synthetic check {0}'.format(idx), 'tag': 'CIS-{0}'.format(idx)}
+        kind = idx % 12
+        if kind < 8:
+            name = os.path.join(directory, 'file{0}'.format(idx))
+            with open(name, 'w') as fh:
+                fh.write('bench\n')
+            os.chmod(name, 0o600)
+            check['implementations'] = _implementation('stat', [{
+                'args': {'path': name},
+                'comparator': {'type': 'dict', 'match': {
+                    'uid': os.getuid(), 'gid': os.getgid(),
+                    'mode': {'type': 'file_permission',
+                             'match': {'required_value': '644', 'allow_more_strict': True}}}}}])
+        elif kind < 11:
+            option, value = options[idx % len(options)]
+            check['sub_check'] = True
+            check['implementations'] = _implementation('grep', [{
+                'args': {'path': sshd, 'pattern': '^{0}'.format(option), 'flags': ['-E']},
+                'comparator': {'type': 'string', 'match': '{0} {1}'.format(option, value)}}])
+            grep_ids.append(check_id)
+        else:
+            expr = ' AND '.join(grep_ids[-3:]) or 'true'
+            check['implementations'] = _implementation('bexpr', [{
+                'args': {'expr': expr},
+                'comparator': {'type': 'boolean', 'match': True}}])
+        profile[check_id] = check
+    return profile
+
+
+def setup(cachedir):
+    """ load the execution modules the audit modules use (without the grains
+        modules and whatever else the daemon does on startup) and inject the
+        loader globals into the runner modules
+    """
+    config = os.path.join(cachedir, 'hubble.conf')
+    with open(config, 'w') as fh:
+        yaml.safe_dump({'cachedir': cachedir, 'log_file': os.path.join(cachedir, 'hubble.log'),
+                        'file_roots': {'base': [cachedir]}, 'fileserver_backend': ['roots']}, fh)
+    opts = hubblestack.config.get_config(config)
+    opts['grains'] = GRAINS
+    opts['pillar'] = {}
+    utils = hubblestack.loader.utils(opts)
+    mods = hubblestack.loader.modules(opts, utils=utils, context={})
+    for module in (hubblestack.module_runner.runner, hubblestack.module_runner.audit_runner):
+        module.__opts__ = opts
+        module.__mods__ = mods
+        module.__grains__ = GRAINS
+    runner = AuditRunner()
+    runner.init_loader()
+    return runner
+
+
+def run(checks=300, repeat=5):
+    """ run the profile repeat times; the latencies are those of whole
+        profile runs, the ops are the checks evaluated
+    """
+    directory = tempfile.mkdtemp(prefix='hubble-bench-audit-')
+    try:
+        runner = setup(directory)
+        profile = make_profile(directory, checks=checks)
+        timer = Timer()
+        evaluated = 0
+        outcome = {}
+        for _ in range(repeat):
+            timer.start()
+            results = runner._execute(profile, 'bench.yaml', {})
+            timer.stop()
+            evaluated += len(results)
+        for result in results:
+            outcome[result['check_result']] = outcome.get(result['check_result'], 0) + 1
+        ret = summarize('audit.run', timer.samples, ops=evaluated, cpu=timer.cpu,
+                        checks=checks, repeat=repeat)
+        ret['results'] = outcome
+        return ret
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+BENCHMARKS = [
+    ('audit.run', run, {'checks': 300, 'repeat': 3}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--checks', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    result = run(checks=args.checks, repeat=args.repeat)
+    result['peak_rss_kb'] = benchlib.peak_rss_kb()
+    print(json.dumps(result, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# coding: utf-8
+"""
+Benchmark the HEC DiskQueue: filling a queue with 10k-100k entries (put) and
+draining it in HEC sized batches (getz), in a temporary directory.
+
+    python tests/benchmarks/bench_disk_queue.py [--entries 10000] [--compression 0]
+"""
+
+import argparse
+import json
+import shutil
+import tempfile
+
+import benchlib
+from benchlib import Timer, summarize
+
+# pylint: disable=wrong-import-position
+from hubblestack.hec.dq import DiskQueue, SPLUNK_MAX_MSG
+
+
+def make_item(idx, size):
+    """ a HEC payload-like string of about size octets """
+    event = json.dumps({'event': {'idx': idx, 'message': 'x' * size}, 'sourcetype': 'hubble_bench',
+                        'time': 1700000000 + idx, 'index': 'hubble'})
+    return event[:size - 2] + '}}' if len(event) > size else event
+
+
+def _fill(directory, entries, size, compression, timer=None):
+    queue = DiskQueue(directory, size=entries * size * 4, compression=compression, fresh=True)
+    items = [make_item(idx, size) for idx in range(entries)]
+    for item in items:
+        if timer is None:
+            queue.put(item)
+        else:
+            with timer:
+                queue.put(item)
+    return queue
+
+
+def put(entries=10000, size=512, compression=0):
+    """ put entries items of size octets into an empty queue """
+    directory = tempfile.mkdtemp(prefix='hubble-bench-dq-')
+    try:
+        timer = Timer()
+        _fill(directory, entries, size, compression, timer)
+        return summarize('disk_queue.put', timer.samples, cpu=timer.cpu,
+                         entries=entries, size=size, compression=compression)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def getz(entries=10000, size=512, compression=0, batches=50):
+    """ take (at most) batches getz() batches from a queue of entries items;
+        ops are the items taken
+    """
+    directory = tempfile.mkdtemp(prefix='hubble-bench-dq-')
+    try:
+        queue = _fill(directory, entries, size, compression)
+        timer = Timer()
+        taken = 0
+        for _ in range(batches):
+            if queue.cn < 1:
+                break
+            before = queue.cn
+            timer.start()
+            queue.getz(SPLUNK_MAX_MSG)
+            timer.stop()
+            taken += before - queue.cn
+        return summarize('disk_queue.getz', timer.samples, ops=taken, cpu=timer.cpu,
+                         entries=entries, size=size, compression=compression, batches=len(timer.samples))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+BENCHMARKS = [
+    ('disk_queue.put', put, {'entries': 10000}),
+    ('disk_queue.put', put, {'entries': 100000}),
+    ('disk_queue.put', put, {'entries': 10000, 'compression': 5}),
+    ('disk_queue.getz', getz, {'entries': 10000}),
+    ('disk_queue.getz', getz, {'entries': 100000}),
+    ('disk_queue.getz', getz, {'entries': 10000, 'compression': 5}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=10000)
+    parser.add_argument('--size', type=int, default=512)
+    parser.add_argument('--compression', type=int, default=0)
+    args = parser.parse_args()
+    for func in (put, getz):
+        result = func(entries=args.entries, size=args.size, compression=args.compression)
+        result['peak_rss_kb'] = benchlib.peak_rss_kb()
+        print(json.dumps(result, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+# coding: utf-8
+"""
+Benchmark sending events with the HEC object to a local stand-in HTTP event
+collector (plain HTTP on 127.0.0.1, the server only counts what it gets).
+
+    python tests/benchmarks/bench_hec_send.py [--events 20000] [--gzip]
+"""
+
+import argparse
+import gzip as gzip_module
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import benchlib
+from benchlib import summarize
+
+# pylint: disable=wrong-import-position
+from hubblestack.hec import HEC
+
+SUCCESS = b'{"text":"Success","code":0}'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep-alive, like splunk
+    disable_nagle_algorithm = True # or every response waits out a delayed ack
+
+    def do_POST(self): # pylint: disable=invalid-name
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip_module.decompress(body)
+        self.server.received(body)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(SUCCESS)))
+        self.end_headers()
+        self.wfile.write(SUCCESS)
+
+    def log_message(self, *_a): # pylint: disable=arguments-differ
+        pass
+
+
+class StandInHEC(ThreadingHTTPServer):
+    """ a local HTTP event collector that accepts everything; use as a
+        context manager, the server runs on a thread in the meantime
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.octets = 0
+        self.thread = None
+
+    def received(self, body):
+        with self.lock:
+            self.requests += 1
+            self.octets += len(body)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.serve_forever, name='stand-in-hec')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_exc):
+        self.shutdown()
+        self.server_close()
+
+
+def make_events(events):
+    """ pulsar-like file change events """
+    return [{'change': 'IN_MODIFY', 'path': '/etc/bench/file{0}'.format(idx),
+             'tag': '/etc/bench', 'name': 'file{0}'.format(idx), 'pulsar_config': 'bench.yaml',
+             'checksum': '{0:064x}'.format(idx), 'checksum_type': 'sha256'}
+            for idx in range(events)]
+
+
+def send(events=20000, gzip=False):
+    """ batchEvent() events events and flush them; the latencies are those of
+        the HTTP requests, the ops are the events
+    """
+    data = make_events(events)
+    with StandInHEC() as server:
+        hec = HEC('bench-token', 'hubble', '127.0.0.1', host='bench', http_event_port=server.port,
+                  http_event_server_ssl=False, gzip=gzip)
+        samples = []
+        request = hec.pool_manager.request
+
+        def timed_request(*a, **kw):
+            started = time.perf_counter()
+            try:
+                return request(*a, **kw)
+            finally:
+                samples.append(time.perf_counter() - started)
+
+        hec.pool_manager.request = timed_request
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        for event in data:
+            hec.batchEvent({'event': event, 'sourcetype': 'hubble_fim', 'time': 1700000000})
+        hec.flushBatch()
+        seconds = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        requests, octets = server.requests, server.octets
+    result = summarize('hec.send', samples, ops=events, cpu=cpu, seconds=seconds,
+                       events=events, gzip=gzip)
+    result['requests'] = requests
+    result['octets'] = octets
+    return result
+
+
+BENCHMARKS = [
+    ('hec.send', send, {'events': 20000}),
+    ('hec.send', send, {'events': 20000, 'gzip': True}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--gzip', action='store_true')
+    args = parser.parse_args()
+    result = send(events=args.events, gzip=args.gzip)
+    result['peak_rss_kb'] = benchlib.peak_rss_kb()
+    print(json.dumps(result, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# coding: utf-8
+"""
+Benchmark the splunk_osqueryd_return returner: the CPU time it takes to turn
+osqueryd results into HEC payloads (nothing is actually sent).
+
+    python tests/benchmarks/bench_osqueryd_return.py [--rows 10000] [--endpoints 1]
+"""
+
+import argparse
+import gc
+import json
+import time
+
+import benchlib
+from benchlib import Timer, summarize
+
+# pylint: disable=wrong-import-position
+import hubblestack.returners.splunk_osqueryd_return as osqueryd_return
+from hubblestack.hec import HEC
+
+GRAINS = {'fqdn': 'bench.example.com', 'local_ip4': '10.1.2.3', 'ipv4': ['10.1.2.3'],
+          'system_uuid': 'bench-uuid', 'cloud_details': {'cloud_instance_id': 'i-bench'}}
+
+OPTS = {'token': 'token', 'index': 'hubble', 'port': '8088', 'custom_fields': ['site'],
+        'sourcetype': 'hubble_osqueryd', 'http_event_server_ssl': True, 'proxy': None,
+        'timeout': 9.05, 'index_extracted_fields': [], 'http_event_collector_ssl_verify': True,
+        'add_query_to_sourcetype': True, 'disk_queue': False, 'disk_queue_size': 0,
+        'disk_queue_compression': 0}
+
+
+def make_rows(rows, queries=20, snapshot_every=10):
+    """ osqueryd results: mostly differential rows (one result per row, like
+        osqueryd logs them) plus some snapshot results of 100 rows
+    """
+    now = int(time.time())
+    data = []
+    idx = 0
+    while idx < rows:
+        name = 'pack_bench_query_{0}'.format(idx % queries)
+        common = {'name': name, 'epoch': 0, 'counter': idx, 'unixTime': now - idx % 600,
+                  'hostIdentifier': 'bench', 'calendarTime': 'Mon Jan  1 00:00:00 2024 UTC'}
+        if idx % (snapshot_every * 100) == 0 and rows - idx >= 100:
+            snapshot = [{'pid': str(i), 'name': 'proc{0}'.format(i), 'path': '/usr/bin/proc{0}'.format(i),
+                         'cmdline': 'proc{0} --flag'.format(i), 'uid': '0'} for i in range(100)]
+            data.append(dict(common, action='snapshot', snapshot=snapshot))
+            idx += 100
+        else:
+            columns = {'pid': str(idx), 'name': 'proc{0}'.format(idx), 'path': '/usr/bin/proc',
+                       'cmdline': 'proc --flag {0}'.format(idx), 'uid': '0', 'gid': '0',
+                       'start_time': str(now - idx), 'parent': '1'}
+            data.append(dict(common, action='added', columns=columns))
+            idx += 1
+    return data
+
+
+def setup(endpoints=1):
+    """ inject the loader globals and stub out the options and the network """
+    osqueryd_return.__grains__ = GRAINS
+    osqueryd_return.__opts__ = {}
+    osqueryd_return.__mods__ = {'config.get': lambda key, default=None: 'bench-site'}
+    opts_list = [dict(OPTS, indexer='indexer{0}'.format(i)) for i in range(endpoints)]
+    osqueryd_return.get_splunk_options = lambda *a, **kw: opts_list
+    sent = []
+    HEC._send = lambda self, *payload, **kw: sent.append(len(payload))
+    return sent
+
+
+def run(rows=10000, endpoints=1, repeat=5):
+    """ call the returner repeat times; the latencies are those of the
+        returner calls, the ops are the rows turned into payloads
+    """
+    sent = setup(endpoints)
+    data = make_rows(rows)
+    timer = Timer()
+    for _ in range(repeat):
+        del sent[:]
+        ret = {'id': 'bench', 'jid': '1', 'return': data}
+        gc.collect()
+        with timer:
+            osqueryd_return.returner(ret)
+    result = summarize('osqueryd_return.returner', timer.samples, ops=rows * repeat, cpu=timer.cpu,
+                       rows=rows, endpoints=endpoints)
+    result['requests'] = len(sent)
+    return result
+
+
+BENCHMARKS = [
+    ('osqueryd_return.returner', run, {'rows': 10000}),
+    ('osqueryd_return.returner', run, {'rows': 10000, 'endpoints': 3}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--endpoints', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    result = run(rows=args.rows, endpoints=args.endpoints, repeat=args.repeat)
+    result['peak_rss_kb'] = benchlib.peak_rss_kb()
+    print(json.dumps(result, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+# coding: utf-8
+"""
+Benchmark pulsar: watching a synthetic directory tree (the first process()
+sweep), turning inotify event storms in it into pulsar events and the memory
+and lookups of the watch database itself.
+
+    python tests/benchmarks/bench_pulsar.py [--dirs 100] [--files 50] [--rounds 10] [--watches 100000]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import yaml
+
+import benchlib
+from benchlib import Timer, summarize
+
+# pylint: disable=wrong-import-position
+import hubblestack.modules.pulsar as pulsar
+from hubblestack.utils.pathtrie import PathTrie
+
+
+def make_tree(top, dirs, files):
+    """ dirs directories (two levels deep) with files files each under top;
+        returns the file names
+    """
+    names = []
+    for dnum in range(dirs):
+        directory = os.path.join(top, 'd{0}'.format(dnum // 10), 'd{0}'.format(dnum))
+        os.makedirs(directory, exist_ok=True)
+        for fnum in range(files):
+            name = os.path.join(directory, 'f{0}'.format(fnum))
+            with open(name, 'w') as fh:
+                fh.write('bench\n')
+            names.append(name)
+    return names
+
+
+def setup(top, watch_files=False):
+    """ point pulsar at a config that watches top recursively; returns the
+        config file to pass to process()
+    """
+    config = os.path.join(top, 'bench.pulsar')
+    watched = os.path.join(top, 'tree')
+    os.mkdir(watched)
+    with open(config, 'w') as fh:
+        yaml.safe_dump({watched: {'recurse': True, 'auto_add': True, 'watch_files': watch_files,
+                                  'exclude': [{os.path.join(watched, r'.*\.swp$'): {'regex': True}}]},
+                        'refresh_interval': 300}, fh)
+
+    def config_get(_, default=None):
+        return default
+
+    pulsar.__opts__ = {'pulsar': {}}
+    pulsar.__mods__ = {'config.get': config_get, 'cp.cache_file': lambda path: path}
+    pulsar.__context__ = {}
+    # forget the config of the previous benchmark (it's kept on the class)
+    pulsar.ConfigManager._config = {}
+    pulsar.ConfigManager._last_update = 0
+    return config, watched
+
+
+def sweep(dirs=100, files=50, watch_files=False):
+    """ the first process() call, which adds the watches for the whole tree;
+        ops are the watches added
+    """
+    top = tempfile.mkdtemp(prefix='hubble-bench-pulsar-')
+    try:
+        config, watched = setup(top, watch_files=watch_files)
+        make_tree(watched, dirs, files)
+        timer = Timer()
+        with timer:
+            pulsar.process(configfile=config)
+        watches = len(pulsar.__context__['pulsar.notifier']._watch_manager.watch_db)
+        return summarize('pulsar.sweep', timer.samples, ops=watches, cpu=timer.cpu,
+                         dirs=dirs, files=files, watch_files=watch_files)
+    finally:
+        shutil.rmtree(top, ignore_errors=True)
+
+
+def update(dirs=100, files=50, rounds=10, watch_files=False):
+    """ rounds times: let the config go stale and process() it again, with no
+        changes to the config or the tree (the update_watches part of the
+        sweep); ops are the process() calls
+    """
+    top = tempfile.mkdtemp(prefix='hubble-bench-pulsar-')
+    try:
+        config, watched = setup(top, watch_files=watch_files)
+        make_tree(watched, dirs, files)
+        pulsar.process(configfile=config)
+        timer = Timer()
+        for _ in range(rounds):
+            # the next process() re-reads the config and updates the watches
+            pulsar.ConfigManager._last_update = 0
+            with timer:
+                pulsar.process(configfile=config)
+        return summarize('pulsar.update', timer.samples, cpu=timer.cpu,
+                         dirs=dirs, files=files, rounds=rounds, watch_files=watch_files)
+    finally:
+        shutil.rmtree(top, ignore_errors=True)
+
+
+def storm(dirs=100, files=50, rounds=10, watch_files=False):
+    """ rounds times: modify every file in the tree, then process() the
+        resulting inotify events; the latencies are those of the process()
+        calls, the ops are the pulsar events returned
+    """
+    top = tempfile.mkdtemp(prefix='hubble-bench-pulsar-')
+    try:
+        config, watched = setup(top, watch_files=watch_files)
+        names = make_tree(watched, dirs, files)
+        pulsar.process(configfile=config)
+        # let the config (and the watches) go stale, like between two sweeps
+        time.sleep(2.1)
+        pulsar.process(configfile=config)
+        timer = Timer()
+        events = 0
+        for rnd in range(rounds):
+            for name in names:
+                with open(name, 'a') as fh:
+                    fh.write('{0}\n'.format(rnd))
+            timer.start()
+            ret = pulsar.process(configfile=config)
+            timer.stop()
+            events += len(ret)
+        return summarize('pulsar.storm', timer.samples, ops=events, cpu=timer.cpu,
+                         dirs=dirs, files=files, rounds=rounds, watch_files=watch_files)
+    finally:
+        shutil.rmtree(top, ignore_errors=True)
+
+
+def watch_db(watches=100000, lookups=10000):
+    """ fill a watch database with watches synthetic paths (no inotify
+        involved), the way PulsarWatchManager._add_db() does: directories
+        owned by the recursive watch at the top, files by their directory;
+        the latencies are those of the wd -> path lookups, and the memory
+        the database takes is reported as rss_kb_per_100k
+    """
+    top = '/var/lib/hubble-bench/tree'
+    paths = []
+    dnum = 0
+    while len(paths) < watches:
+        directory = '{0}/d{1}/d{2}'.format(top, dnum // 10, dnum)
+        paths.append(directory)
+        paths.extend('{0}/file-{1}.conf'.format(directory, fnum) for fnum in range(49))
+        dnum += 1
+    del paths[watches:]
+
+    # the paths already exist, so the growth of the RSS is the database's own
+    before = benchlib.rss_kb()
+    db = PathTrie()
+    fill = Timer()
+    fill.start()
+    db[top] = 1
+    for wd, path in enumerate(paths, 2):
+        db[path] = wd
+        db.set_owner(path, top)
+    fill.stop(ops=len(paths))
+    after = benchlib.rss_kb()
+
+    timer = Timer()
+    step = max(watches // lookups, 1)
+    for wd in range(2, watches + 2, step):
+        with timer:
+            db.paths_of(wd)
+    result = summarize('pulsar.watch_db', timer.samples, cpu=timer.cpu,
+                       watches=watches, lookups=lookups)
+    result['fill_per_second'] = len(db) / sum(fill.samples)
+    if before is not None:
+        result['rss_kb_per_100k'] = (after - before) * 100000 // watches
+    return result
+
+
+BENCHMARKS = [
+    ('pulsar.sweep', sweep, {'dirs': 100, 'files': 50}),
+    ('pulsar.sweep', sweep, {'dirs': 100, 'files': 50, 'watch_files': True}),
+    ('pulsar.update', update, {'dirs': 100, 'files': 50, 'watch_files': True}),
+    ('pulsar.storm', storm, {'dirs': 100, 'files': 50, 'rounds': 10}),
+    ('pulsar.watch_db', watch_db, {'watches': 100000}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dirs', type=int, default=100)
+    parser.add_argument('--files', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--watch-files', action='store_true')
+    parser.add_argument('--watches', type=int, default=100000)
+    args = parser.parse_args()
+    results = [sweep(dirs=args.dirs, files=args.files, watch_files=args.watch_files),
+               update(dirs=args.dirs, files=args.files, rounds=args.rounds,
+                      watch_files=args.watch_files),
+               storm(dirs=args.dirs, files=args.files, rounds=args.rounds,
+                     watch_files=args.watch_files),
+               watch_db(watches=args.watches)]
+    for result in results:
+        result['peak_rss_kb'] = benchlib.peak_rss_kb()
+        print(json.dumps(result, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+# coding: utf-8
+"""
+Helpers shared by the benchmarks in this directory (see run.py).
+
+A benchmark is a function that does some work and returns summarize(...): a
+dict with the throughput and latency percentiles of one operation. Each
+benchmark module lists its benchmarks in BENCHMARKS as (name, function,
+params) tuples; run.py calls every one of them in a fresh interpreter, so the
+peak RSS it reports belongs to that benchmark alone.
+"""
+
+import gc
+import os
+import resource
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(ordered, pct):
+    """ the pct-th percentile (nearest rank) of the sorted list ordered """
+    if not ordered:
+        return None
+    rank = max(int(round(pct / 100.0 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def rss_kb():
+    """ the current resident set size of this process (KiB) """
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except (IOError, ValueError):
+        pass
+    return None
+
+
+def peak_rss_kb():
+    """ the peak resident set size of this process so far (KiB) """
+    # linux carries ru_maxrss over an exec (so a child run.py starts out with
+    # the peak of its parent); the high water mark of the address space doesn't
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (IOError, ValueError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # bytes on macOS, KiB everywhere else
+        peak //= 1024
+    return peak
+
+
+class Timer(object):
+    """ collect the wall clock latency of individual operations
+
+        .. code-block:: python
+
+            timer = Timer()
+            for item in items:
+                with timer:
+                    do_something(item)
+            return summarize('thing', timer.samples)
+
+        The garbage collector is disabled while the timer is running (like
+        timeit does) so a collection triggered by the setup code isn't charged
+        to whichever operation happens to be timed when it runs.
+    """
+
+    def __init__(self):
+        self.samples = []
+        self.cpu = 0.0
+        self._started = None
+        self._cpu_started = None
+        self._gc_was_enabled = None
+
+    def start(self):
+        """ start timing one operation """
+        self._gc_was_enabled = gc.isenabled()
+        gc.disable()
+        self._cpu_started = time.process_time()
+        self._started = time.perf_counter()
+
+    def stop(self, ops=1):
+        """ stop timing; ops operations were done since start() (each is
+            recorded with the average latency)
+        """
+        elapsed = time.perf_counter() - self._started
+        self.cpu += time.process_time() - self._cpu_started
+        if self._gc_was_enabled:
+            gc.enable()
+        if ops == 1:
+            self.samples.append(elapsed)
+        elif ops > 1:
+            self.samples.extend([elapsed / ops] * ops)
+        return elapsed
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_exc):
+        self.stop()
+
+
+def summarize(name, samples, ops=None, cpu=None, seconds=None, **params):
+    """ build the result of a benchmark
+
+        name:    the name of the operation (e.g. 'disk_queue.put')
+        samples: the latency of each operation (seconds)
+        ops:     the number of operations (default: one per sample)
+        cpu:     the CPU seconds spent (optional)
+        seconds: the wall clock seconds spent (default: the sum of samples)
+        params:  the parameters of the run (sizes etc), reported as they are
+    """
+    ordered = sorted(samples)
+    if seconds is None:
+        seconds = sum(ordered)
+    if ops is None:
+        ops = len(ordered)
+    result = {
+        'name': name,
+        'params': params,
+        'ops': ops,
+        'seconds': seconds,
+        'throughput': ops / seconds if seconds else None,
+        'latency': dict(('p{0}'.format(pct), percentile(ordered, pct)) for pct in PERCENTILES),
+    }
+    result['latency']['max'] = ordered[-1] if ordered else None
+    if cpu is not None:
+        result['cpu_seconds'] = cpu
+    return result
@@ -0,0 +1,151 @@
+# coding: utf-8
+"""
+Run the hubble benchmark suite and write the results as JSON.
+
+    python tests/benchmarks/run.py [-o results.json] [--compare old.json] [pattern ...]
+
+The benchmarks are listed in the BENCHMARKS of the bench_*.py modules in this
+directory (see benchlib.py); patterns (fnmatch, e.g. 'disk_queue.*') select
+some of them by name. Every benchmark runs in a fresh interpreter, so the
+peak_rss_kb of its result is its own. The JSON document holds the commit and
+python version next to the results, so runs from different commits can be
+compared with --compare.
+"""
+
+import argparse
+import fnmatch
+import glob
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import benchlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def discover():
+    """ return [(module name, index, benchmark name, params)] for every benchmark """
+    found = []
+    for path in sorted(glob.glob(os.path.join(BENCH_DIR, 'bench_*.py'))):
+        module_name = os.path.splitext(os.path.basename(path))[0]
+        module = importlib.import_module(module_name)
+        for idx, (name, _func, params) in enumerate(getattr(module, 'BENCHMARKS', [])):
+            found.append((module_name, idx, name, params))
+    return found
+
+
+def run_child(module_name, idx):
+    """ run one benchmark in this process and print its result """
+    module = importlib.import_module(module_name)
+    _name, func, params = module.BENCHMARKS[idx]
+    result = func(**params)
+    result['peak_rss_kb'] = benchlib.peak_rss_kb()
+    sys.stdout.write(json.dumps(result, sort_keys=True) + '\n')
+
+
+def run_one(module_name, idx):
+    """ run one benchmark in a child interpreter and return its result """
+    cmd = [sys.executable, os.path.abspath(__file__), '--child', module_name, str(idx)]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, cwd=benchlib.REPO_ROOT)
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        errors = proc.stderr.strip().splitlines()
+        return {'error': errors[-1] if errors else 'exit status {0}'.format(proc.returncode)}
+    return json.loads(lines[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=benchlib.REPO_ROOT,
+                                       stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_key(result):
+    return '{0} {1}'.format(result['name'], json.dumps(result['params'], sort_keys=True))
+
+
+def compare(baseline, results, out=sys.stderr):
+    """ print the throughput and p95 latency changes against baseline (a
+        document written by an earlier run)
+    """
+    old = dict((result_key(r), r) for r in baseline.get('results', []) if 'error' not in r)
+    out.write('{0:<70} {1:>10} {2:>10}\n'.format('benchmark (vs {0})'.format(
+        (baseline.get('commit') or 'baseline')[:12]), 'throughput', 'p95'))
+    for result in results:
+        if 'error' in result:
+            continue
+        key = result_key(result)
+        if key not in old:
+            out.write('{0:<70} {1:>10} {2:>10}\n'.format(key, 'new', 'new'))
+            continue
+        changes = []
+        for new_value, old_value in ((result['throughput'], old[key]['throughput']),
+                                     (result['latency']['p95'], old[key]['latency']['p95'])):
+            if new_value is None or not old_value:
+                changes.append('-')
+            else:
+                changes.append('{0:+.1f}%'.format((new_value / old_value - 1) * 100))
+        out.write('{0:<70} {1:>10} {2:>10}\n'.format(key, *changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('patterns', nargs='*', help='run the benchmarks with matching names')
+    parser.add_argument('-o', '--output', help='write the JSON results here (default: stdout)')
+    parser.add_argument('--compare', metavar='JSON', help='compare with the results of an earlier run')
+    parser.add_argument('--list', action='store_true', help='list the benchmarks and exit')
+    parser.add_argument('--child', nargs=2, metavar=('MODULE', 'INDEX'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], int(args.child[1]))
+        return
+
+    selected = [bench for bench in discover()
+                if not args.patterns or any(fnmatch.fnmatch(bench[2], pat) for pat in args.patterns)]
+    if args.list:
+        for _module_name, _idx, name, params in selected:
+            print('{0} {1}'.format(name, json.dumps(params, sort_keys=True)))
+        return
+
+    results = []
+    for module_name, idx, name, params in selected:
+        sys.stderr.write('{0} {1} ...\n'.format(name, json.dumps(params, sort_keys=True)))
+        result = run_one(module_name, idx)
+        result.setdefault('name', name)
+        result.setdefault('params', params)
+        results.append(result)
+
+    document = {
+        'suite': 'hubble-bench',
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': int(time.time()),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(document, fh, indent=2, sort_keys=True)
+    else:
+        json.dump(document, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+    if args.compare:
+        with open(args.compare) as fh:
+            compare(json.load(fh), results)
+
+    if any('error' in result for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -117,3 +117,18 @@ class TestService(TestCase):
             {"name": "service1", "running": True, "enabled": True},
             {"name": "service2", "running": False, "enabled": True}
             ]})
+
+    def test_prefetch(self):
+        """
+        The unit table is read again before the blocks run
+        """
+        def _units(refresh=False):
+            calls.append(refresh)
+            return {}
+        calls = []
+        service.__mods__ = {"service.units": _units}
+        service.prefetch([("test-1", {"args": {"name": "sshd"}})], {"caller": "Audit"})
+        self.assertEqual(calls, [True])
+
+        service.__mods__ = {}
+        service.prefetch([("test-1", {"args": {"name": "sshd"}})], {"caller": "Audit"})
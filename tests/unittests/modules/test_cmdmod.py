@@ -413,3 +413,30 @@ class CMDMODTestCase(TestCase, LoaderModuleMockMixin):
             ret = cmdmod.run_all('some command', output_encoding='latin1')
 
         self.assertEqual(ret['stdout'], stdout)
+
+    @skipIf(hubblestack.utils.platform.is_windows(), 'Do not run on Windows')
+    def test_run_all_many(self):
+        '''
+        Test that a batch of commands is returned in input order, with per
+        command options and without a bad command aborting the batch
+        '''
+        with patch.object(builtins, '__salt_system_encoding__', 'utf-8'):
+            ret = cmdmod.run_all_many(['echo one',
+                                       {'cmd': 'cat', 'stdin': 'two'},
+                                       {'cmd': 'echo three', 'cwd': '/path/to/nowhere'},
+                                       {'cmd': 'sleep 10', 'timeout': 0.2}],
+                                      max_procs=2)
+        self.assertEqual([item['stdout'] for item in ret[:2]], ['one', 'two'])
+        self.assertEqual(ret[2]['retcode'], 1)
+        self.assertIn('/path/to/nowhere', ret[2]['stderr'])
+        self.assertEqual(ret[3]['retcode'], 1)
+        self.assertIn('Timed out', ret[3]['stdout'])
+
+    @skipIf(hubblestack.utils.platform.is_windows(), 'Do not run on Windows')
+    def test_run_many_merges_stderr(self):
+        '''
+        Test that run_many behaves like run and merges stderr into the output
+        '''
+        with patch.object(builtins, '__salt_system_encoding__', 'utf-8'):
+            ret = cmdmod.run_many(['echo out', 'echo err >&2'], python_shell=True)
+        self.assertEqual(ret, ['out', 'err'])
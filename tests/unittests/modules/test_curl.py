@@ -4,6 +4,7 @@ import pytest
 
 
 from hubblestack.audit import curl
+from hubblestack.utils import http_sessions
 from hubblestack.exceptions import HubbleCheckValidationError
 
 
@@ -67,10 +68,12 @@ class TestCurl(TestCase):
         block_dict={"args": {"function": "GET", "url": "test"}}
         result_mock = ResultMock(200)
         expected_result = {'status': 200, 'response': {'id': 1, 'name': 'test'}}
-        with patch('hubblestack.audit.curl.requests') as requests_mock:
-            requests_mock.get.return_value = result_mock
+        with patch('hubblestack.utils.http_sessions.requests') as requests_mock:
+            http_sessions.reset()
+            requests_mock.Session.return_value.request.return_value = result_mock
             status, res = curl.execute('test', block_dict, {})
             self.assertEqual(res['result'], expected_result)
+            requests_mock.Session.return_value.request.assert_called_once_with('GET', 'test', timeout=9)
 
     def test_execute_post(self):
         """
@@ -86,10 +89,12 @@ class TestCurl(TestCase):
         block_dict={"args": {"function": "POST", "url": "test"}}
         result_mock = ResultMock(200)
         expected_result = {'status': 200, 'response': {'id': 1, 'name': 'test'}}
-        with patch('hubblestack.audit.curl.requests') as requests_mock:
-            requests_mock.post.return_value = result_mock
+        with patch('hubblestack.utils.http_sessions.requests') as requests_mock:
+            http_sessions.reset()
+            requests_mock.Session.return_value.request.return_value = result_mock
             status, res = curl.execute('test', block_dict, {})
             self.assertEqual(res['result'], expected_result)
+            requests_mock.Session.return_value.request.assert_called_once_with('POST', 'test', timeout=9)
 
     def test_execute_put(self):
         """
@@ -105,7 +110,24 @@ class TestCurl(TestCase):
         block_dict={"args": {"function": "PUT", "url": "test"}}
         result_mock = ResultMock(200)
         expected_result = {'status': 200, 'response': {'id': 1, 'name': 'test'}}
-        with patch('hubblestack.audit.curl.requests') as requests_mock:
-            requests_mock.put.return_value = result_mock
+        with patch('hubblestack.utils.http_sessions.requests') as requests_mock:
+            http_sessions.reset()
+            requests_mock.Session.return_value.request.return_value = result_mock
             status, res = curl.execute('test', block_dict, {})
-            self.assertEqual(res['result'], expected_result)
\ No newline at end of file
+            self.assertEqual(res['result'], expected_result)
+            requests_mock.Session.return_value.request.assert_called_once_with('PUT', 'test', timeout=9)
+    def test_prefetch(self):
+        """
+        the GET requests of the blocks are made up front, in a new run
+        """
+        blocks = [
+            ('get-1', {"args": {"url": "http://localhost/a", "timeout": 3}}),
+            ('post-1', {"args": {"function": "POST", "url": "http://localhost/b"}}),
+            ('get-2', {"args": {"function": "GET", "url": "http://localhost/c", "params": {"x": 1}}}),
+        ]
+        with patch('hubblestack.audit.curl.hubblestack.utils.http_sessions.reset') as reset_mock:
+            curl.prefetch(blocks, {'caller': 'Audit'})
+            reset_mock.return_value.prefetch.assert_called_once_with([
+                ("http://localhost/a", {'timeout': 3}),
+                ("http://localhost/c", {'params': {"x": 1}, 'timeout': 9}),
+            ])
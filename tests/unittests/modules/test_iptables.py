@@ -454,6 +454,52 @@ class IptablesTestCase(TestCase, LoaderModuleMockMixin):
                         )
                     )
 
+    def test_check_snapshot(self):
+        """
+        Test if check answers from one iptables-save snapshot
+        """
+        save = "\n".join([
+            "# Generated by iptables-save v1.8.7",
+            "*filter",
+            ":INPUT DROP [0:0]",
+            ":OUTPUT ACCEPT [10:600]",
+            ":f2b-sshd - [0:0]",
+            "-A INPUT -i lo -j ACCEPT",
+            "-A INPUT -m conntrack --ctstate RELATED,ESTABLISHED -j ACCEPT",
+            "-A INPUT -s 10.0.0.1/32 -p tcp -m tcp --dport 22 -j ACCEPT",
+            "-A INPUT -p tcp -m multiport --dports 80,443 -j REJECT --reject-with icmp-port-unreachable",
+            '-A INPUT -p udp -m udp --sport 53 -m comment --comment "dns replies" -j ACCEPT',
+            "-A INPUT -p icmp -m icmp --icmp-type 8 -j DROP",
+            "COMMIT",
+        ])
+        mock_cmd = MagicMock(return_value=save)
+        with patch.object(iptables, "_iptables_cmd", MagicMock(return_value="iptables")), patch.dict(
+            iptables.__mods__, {"cmd.run": mock_cmd}
+        ), patch.dict(iptables.__context__, {}):
+            for rule in (
+                "-m state --state ESTABLISHED,RELATED --jump ACCEPT",
+                "-p tcp --dport 22 --source 10.0.0.1 --jump ACCEPT",
+                "-p tcp -m multiport --dports 80,443 --jump REJECT",
+                '-p udp --sport 53 -m comment --comment "dns replies" --jump ACCEPT',
+            ):
+                self.assertIs(iptables.check(table="filter", chain="INPUT", rule=rule), True)
+            self.assertIs(iptables.check(table="filter", chain="INPUT", rule="-p tcp --dport 23 -j ACCEPT"), False)
+            self.assertIs(iptables.check(table="filter", chain="FORWARD", rule="-j ACCEPT"), False)
+            self.assertTrue(iptables.check_chain(table="filter", chain="f2b-sshd"))
+            self.assertEqual(iptables.snapshot()["filter"]["INPUT"]["policy"], "DROP")
+            mock_cmd.assert_called_once_with("iptables-save", output_loglevel="quiet")
+
+            # options iptables-save rewrites in ways we don't know go to iptables -C
+            with patch.object(iptables, "_has_option", MagicMock(return_value=True)):
+                mock_cmd.return_value = ""
+                self.assertTrue(
+                    iptables.check(table="filter", chain="INPUT", rule="-p icmp --icmp-type echo-request -j DROP")
+                )
+                mock_cmd.assert_called_with(
+                    "iptables -t filter -C INPUT -p icmp --icmp-type echo-request -j DROP",
+                    output_loglevel="quiet",
+                )
+
     # 'check_chain' function tests: 1
 
     def test_check_chain(self):
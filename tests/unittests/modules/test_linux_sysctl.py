@@ -22,11 +22,51 @@ class LinuxSysctlTestCase(TestCase, LoaderModuleMockMixin):
 
     def test_get(self):
         """
-        Tests the return of get function
+        Tests the return of get function for names /proc/sys doesn't have
         """
         mock_cmd = MagicMock(return_value=1)
-        with patch.dict(linux_sysctl.__mods__, {"cmd.run": mock_cmd}):
+        with patch.dict(linux_sysctl.__mods__, {"cmd.run": mock_cmd}), patch(
+            "os.path.isfile", MagicMock(return_value=False)
+        ):
             self.assertEqual(linux_sysctl.get("net.ipv4.ip_forward"), 1)
+        mock_cmd.assert_called_once_with("sysctl -n net.ipv4.ip_forward", python_shell=False)
+
+    def test_get_proc_sys(self):
+        """
+        Tests get reads /proc/sys without running sysctl
+        """
+        mock_cmd = MagicMock(return_value="1")
+        with patch.dict(linux_sysctl.__mods__, {"cmd.run": mock_cmd}), patch(
+            "os.path.isfile", MagicMock(return_value=True)
+        ), patch("hubblestack.modules.linux_sysctl.open", mock_open(read_data=b"4096\t87380\t6291456\n")) as m_open:
+            self.assertEqual(linux_sysctl.get("net.ipv4.tcp_rmem"), "4096\t87380\t6291456")
+        self.assertEqual(list(m_open.filehandles), ["/proc/sys/net/ipv4/tcp_rmem"])
+        mock_cmd.assert_not_called()
+
+    def test_proc_path(self):
+        """
+        Tests the translation of sysctl names to /proc/sys files
+        """
+        self.assertEqual(linux_sysctl._proc_path("net.ipv4.ip_forward"), "/proc/sys/net/ipv4/ip_forward")
+        self.assertEqual(linux_sysctl._proc_path("net/ipv4/ip_forward"), "/proc/sys/net/ipv4/ip_forward")
+        self.assertEqual(
+            linux_sysctl._proc_path("net.ipv4.conf.eth0/100.rp_filter"),
+            "/proc/sys/net/ipv4/conf/eth0.100/rp_filter",
+        )
+        self.assertIsNone(linux_sysctl._proc_path("/../../etc/shadow"))
+
+    def test_snapshot(self):
+        """
+        Tests snapshot reads each parameter once until it is refreshed
+        """
+        mock_cmd = MagicMock(side_effect=["1", "2", "3"])
+        with patch.dict(linux_sysctl.__mods__, {"cmd.run": mock_cmd}), patch.dict(
+            linux_sysctl.__context__, {}
+        ), patch("os.path.isfile", MagicMock(return_value=False)):
+            self.assertEqual(linux_sysctl.snapshot(["a.b", "c.d"]), {"a.b": "1", "c.d": "2"})
+            self.assertEqual(linux_sysctl.snapshot("a.b"), {"a.b": "1"})
+            self.assertEqual(mock_cmd.call_count, 2)
+            self.assertEqual(linux_sysctl.snapshot(["a.b"], refresh=True), {"a.b": "3"})
 
     def test_assign_proc_sys_failed(self):
         """
@@ -5,12 +5,14 @@ from __future__ import absolute_import, print_function, unicode_literals
 
 import logging
 import os.path
+import shutil
 import socket
+import tempfile
 
 import hubblestack.config
 import hubblestack.modules.network as network
 from hubblestack.utils._compat import ipaddress
-from hubblestack.utils.exceptions import CommandExecutionError
+from hubblestack.exceptions import CommandExecutionError
 
 # Import Salt Testing Libs
 from tests.support.mixins import LoaderModuleMockMixin
@@ -55,9 +57,12 @@ class NetworkTestCase(TestCase, LoaderModuleMockMixin):
         Test for return information on open ports and states
         """
         with patch.dict(network.__grains__, {"kernel": "Linux"}):
-            with patch.object(network, "_netstat_linux", return_value="A"):
-                with patch.object(network, "_ss_linux", return_value="A"):
-                    self.assertEqual(network.netstat(), "A")
+            with patch.object(network, "_proc_net_linux", return_value="B"):
+                self.assertEqual(network.netstat(), "B")
+            with patch.object(network, "PROC_NET", "/nonexistent"):
+                with patch.object(network, "_netstat_linux", return_value="A"):
+                    with patch.object(network, "_ss_linux", return_value="A"):
+                        self.assertEqual(network.netstat(), "A")
 
         with patch.dict(network.__grains__, {"kernel": "OpenBSD"}):
             with patch.object(network, "_netstat_bsd", return_value="A"):
@@ -66,6 +71,82 @@ class NetworkTestCase(TestCase, LoaderModuleMockMixin):
         with patch.dict(network.__grains__, {"kernel": "A"}):
             self.assertRaises(CommandExecutionError, network.netstat)
 
+    def test_proc_net_linux(self):
+        """
+        Test for the sockets read from /proc/net
+        """
+        tables = {
+            "tcp": (
+                "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+                "   0: 00000000:0016 00000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 1001 1 0\n"
+                "   1: 0100007F:0019 00000000:0000 0A 00000000:00000003 00:00000000 00000000     0        0 1002 1 0\n"
+                "   2: 0F02000A:0016 0202000A:D431 01 00000024:00000000 01:00000016 00000000     0        0 1003 4 0\n"
+            ),
+            "tcp6": (
+                "  sl  local_address                         remote_address                        st tx_queue "
+                "rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+                "   0: 00000000000000000000000000000000:0016 00000000000000000000000000000000:0000 0A "
+                "00000000:00000000 00:00000000 00000000     0        0 1004 1 0\n"
+                "   1: 0000000000000000FFFF00000100007F:1F90 00000000000000000000000000000000:0000 0A "
+                "00000000:00000000 00:00000000 00000000   998        0 1005 1 0\n"
+            ),
+            "udp": (
+                "   sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+                "  100: 00000000:0044 00000000:0000 07 00000000:00000000 00:00000000 00000000     0        0 1006 2 0\n"
+                "  101: 0F02000A:A0F1 08080808:0035 01 00000000:00000000 00:00000000 00000000   998        0 1007 2 0\n"
+            ),
+            "unix": (
+                "Num       RefCount Protocol Flags    Type St Inode Path\n"
+                "0000000000000000: 00000002 00000000 00010000 0001 01 1008 /run/systemd/private\n"
+                "0000000000000000: 00000003 00000000 00000000 0001 03 1009\n"
+            ),
+        }
+
+        proc_net = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, proc_net)
+        for name, table in tables.items():
+            with open(os.path.join(proc_net, name), "w") as fh:
+                fh.write(table)
+
+        programs = MagicMock(return_value={"1001": "812/sshd"})
+        with patch.object(network, "PROC_NET", proc_net), patch.object(network, "_socket_programs", programs):
+            ret = network._proc_net_linux()
+            self.assertEqual(
+                ret[0],
+                {
+                    "proto": "tcp",
+                    "recv-q": "0",
+                    "send-q": "0",
+                    "local-address": "0.0.0.0:22",
+                    "remote-address": "0.0.0.0:*",
+                    "state": "LISTEN",
+                    "user": "0",
+                    "inode": "1001",
+                    "program": "812/sshd",
+                },
+            )
+            self.assertEqual(
+                [(x["proto"], x["local-address"], x["remote-address"], x.get("state"), x["program"]) for x in ret[1:]],
+                [
+                    ("tcp", "127.0.0.1:25", "0.0.0.0:*", "LISTEN", "-"),
+                    ("tcp", "10.0.2.15:22", "10.0.2.2:54321", "ESTABLISHED", "-"),
+                    ("tcp6", ":::22", ":::*", "LISTEN", "-"),
+                    ("tcp6", "::ffff:127.0.0.1:8080", ":::*", "LISTEN", "-"),
+                    ("udp", "0.0.0.0:68", "0.0.0.0:*", None, "-"),
+                    ("udp", "10.0.2.15:41201", "8.8.8.8:53", None, "-"),
+                ],
+            )
+            self.assertEqual(ret[1]["recv-q"], "3")
+            self.assertEqual(ret[2]["send-q"], "36")
+
+            # only the listening sockets, without their programs
+            programs.reset_mock()
+            ret = network._proc_net_linux(protos=("tcp", "udp", "unix"), states=["LISTEN"], programs=False)
+            self.assertEqual([x["inode"] for x in ret], ["1001", "1002", "1006", "1008"])
+            self.assertEqual(ret[-1]["path"], "/run/systemd/private")
+            self.assertEqual(ret[-1]["state"], "LISTENING")
+            programs.assert_not_called()
+
     def test_active_tcp(self):
         """
         Test for return a dict containing information on all
@@ -81,7 +162,7 @@ class NetworkTestCase(TestCase, LoaderModuleMockMixin):
         """
         Test for Performs a DNS lookup with dig
         """
-        with patch("salt.utils.path.which", MagicMock(return_value="dig")), patch.dict(
+        with patch("hubblestack.utils.path.which", MagicMock(return_value="dig")), patch.dict(
             network.__utils__, {"network.sanitize_host": MagicMock(return_value="A")}
         ), patch.dict(network.__mods__, {"cmd.run": MagicMock(return_value="A")}):
             self.assertEqual(network.dig("host"), "A")
@@ -92,7 +173,7 @@ class NetworkTestCase(TestCase, LoaderModuleMockMixin):
         """
         with patch.dict(
             network.__mods__, {"cmd.run": MagicMock(return_value="A,B,C,D\nE,F,G,H\n")}
-        ), patch("salt.utils.path.which", MagicMock(return_value="")):
+        ), patch("hubblestack.utils.path.which", MagicMock(return_value="")):
             self.assertDictEqual(network.arp(), {})
 
     def test_interfaces(self):
@@ -92,4 +92,27 @@ class TestSysctl(TestCase):
 
         status, res = sysctl.execute(check_id, block_dict, {})
         self.assertFalse(status)
-        self.assertEqual(res, {"error": "An error occurred while reading the value of kernel attribute vm.zone_reclaim_mode"})
\ No newline at end of file
+        self.assertEqual(res, {"error": "An error occurred while reading the value of kernel attribute vm.zone_reclaim_mode"})
+    def test_prefetch(self):
+        """
+        Audit checks read the kernel params prefetched in one snapshot
+        """
+        snapshots = []
+        def _snapshot(names, refresh=False):
+            if refresh:
+                snapshots.append(list(names))
+            return {name: "1" for name in names}
+        def _get(name):
+            raise AssertionError("sysctl.get should not be called")
+        sysctl.__mods__ = {
+            "sysctl.get": _get,
+            "sysctl.snapshot": _snapshot
+        }
+        blocks = [("test-7", {"args": {"name": "vm.zone_reclaim_mode"}}),
+                  ("test-8", {"args": {"name": "kernel.randomize_va_space"}})]
+        sysctl.prefetch(blocks, {"caller": "AUDIT"})
+        self.assertEqual(snapshots, [["vm.zone_reclaim_mode", "kernel.randomize_va_space"]])
+
+        status, res = sysctl.execute("test-7", blocks[0][1], {"caller": "AUDIT"})
+        self.assertTrue(status)
+        self.assertEqual(res, {"result": {"vm.zone_reclaim_mode": "1"}})
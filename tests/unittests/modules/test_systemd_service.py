@@ -58,6 +58,23 @@ timer1.timer                               enabled
 timer2.timer                               disabled
 timer3.timer                               static'''
 
+_LIST_UNITS = '''\
+  -.mount                  loaded    active   mounted   Root Mount
+  sshd.service             loaded    active   running   OpenSSH server daemon
+\u25cf kdump.service            loaded    failed   failed    Crash recovery kernel arming
+  getty@tty1.service       loaded    active   running   Getty on tty1
+  rpcbind.service          not-found inactive dead      rpcbind.service'''
+
+_LIST_UNIT_FILES_ALL = '''\
+-.mount                  generated
+sshd.service             enabled   enabled
+sshd@.service            static    -
+kdump.service            enabled   enabled
+getty@.service           enabled   enabled
+cups.service             disabled  enabled
+ssh.service              alias     -
+telnet.socket            masked    disabled'''
+
 
 @skipIf(NO_MOCK, NO_MOCK_REASON)
 class SystemdTestCase(TestCase, LoaderModuleMockMixin):
@@ -117,6 +134,10 @@ class SystemdTestCase(TestCase, LoaderModuleMockMixin):
         Test to check that the given service is available
         '''
         mock = MagicMock(side_effect=lambda x: _SYSTEMCTL_STATUS[x])
+        # no unit table, ask systemctl
+        patcher = patch.object(systemd, 'units', MagicMock(return_value={}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
         # systemd < 231
         with patch.dict(systemd.__context__, {'hubblestack.utils.systemd.version': 230}):
@@ -137,3 +158,52 @@ class SystemdTestCase(TestCase, LoaderModuleMockMixin):
                 with patch.object(systemd, '_systemctl_status', mock):
                     self.assertTrue(systemd.available('sshd.service'))
                     self.assertFalse(systemd.available('bar.service'))
+
+    def test_units(self):
+        '''
+        Test the unit table read from systemctl list-units and list-unit-files
+        '''
+        mock = MagicMock(side_effect=[
+            {'stdout': _LIST_UNITS, 'stderr': '', 'retcode': 0, 'pid': 1},
+            {'stdout': _LIST_UNIT_FILES_ALL, 'stderr': '', 'retcode': 0, 'pid': 2},
+        ])
+        with patch.object(systemd, 'HAS_DBUS', False), \
+                patch.dict(systemd.__mods__, {'cmd.run_all': mock}):
+            units = systemd.units(refresh=True)
+            self.assertEqual(units['sshd.service'], {
+                'load': 'loaded', 'active': 'active', 'sub': 'running',
+                'description': 'OpenSSH server daemon', 'unit_file_state': 'enabled'})
+            self.assertEqual(units['kdump.service']['active'], 'failed')
+            self.assertEqual(units['-.mount']['unit_file_state'], 'generated')
+            self.assertIsNone(units['cups.service']['load'])
+            self.assertIsNone(units['getty@tty1.service']['unit_file_state'])
+            # memoised
+            self.assertIs(systemd.units(), units)
+            self.assertEqual(mock.call_count, 2)
+
+            # one table answers all the questions
+            mock.reset_mock()
+            mock.side_effect = AssertionError('systemctl should not run')
+            with patch.object(systemd, '_get_sysv_services', MagicMock(return_value=['oldinit'])):
+                self.assertTrue(systemd.status('sshd'))
+                self.assertFalse(systemd.status('kdump'))
+                self.assertTrue(systemd.status('getty@tty1'))
+                self.assertFalse(systemd.status('cups'))
+                self.assertFalse(systemd.status('nosuchthing'))
+                self.assertTrue(systemd.enabled('sshd'))
+                self.assertTrue(systemd.enabled('-.mount'))
+                self.assertFalse(systemd.enabled('cups'))
+                self.assertFalse(systemd.enabled('telnet.socket'))
+                self.assertFalse(systemd.enabled('nosuchthing'))
+                self.assertTrue(systemd.available('cups'))
+                self.assertTrue(systemd.available('getty@tty1'))
+                self.assertFalse(systemd.available('nosuchthing'))
+
+                # aliases, templates and sysv scripts are left to systemctl
+                retcode = MagicMock(return_value=0)
+                with patch.dict(systemd.__mods__, {'cmd.retcode': retcode}), \
+                        patch.object(systemd, '_check_for_unit_changes', MagicMock()):
+                    self.assertTrue(systemd.status('ssh'))
+                    self.assertTrue(systemd.enabled('oldinit'))
+                    self.assertTrue(systemd.enabled('getty@tty2'))
+                self.assertEqual(retcode.call_count, 3)
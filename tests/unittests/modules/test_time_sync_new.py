@@ -4,12 +4,16 @@ import pytest
 
 from hubblestack.audit import time_sync
 from hubblestack.exceptions import HubbleCheckValidationError
+import hubblestack.utils.ntp
 
 
 class TestTimeSync(TestCase):
     """
     Unit tests for time_sync module
     """
+    def setUp(self):
+        hubblestack.utils.ntp.reset()
+
     def test_invalid_params1(self):
         """
         No mandatory param is passed
@@ -66,6 +70,7 @@ class TestTimeSync(TestCase):
             status, res = time_sync.execute(check_id, block_dict)
             print(res['result'])
             self.assertEqual(status, True)
+            self.assertTrue(all(isinstance(x.pop('elapsed'), float) for x in res['result']))
             self.assertEqual(res['result'], [{'ntp_server': 'server1', 'replied': True, 'offset': 5}, {'ntp_server': 'server2', 'replied': True, 'offset': 5}, {'ntp_server': 'server3', 'replied': True, 'offset': 5}, {'ntp_server': 'server4', 'replied': True, 'offset': 5}, {'ntp_server': 'server5', 'replied': True, 'offset': 5}])
 
     def test_execute2(self):
@@ -87,6 +92,7 @@ class TestTimeSync(TestCase):
 
             status, res = time_sync.execute(check_id, block_dict)
             self.assertEqual(status, True)
+            self.assertTrue(all(isinstance(x.pop('elapsed'), float) for x in res['result']))
             self.assertEqual(res['result'], [{'ntp_server': 'server1', 'replied': True, 'offset': 5}, {'ntp_server': 'server2', 'replied': True, 'offset': 5}])
 
 class TestClass:
@@ -0,0 +1,230 @@
+import datetime
+import os
+
+import mock
+
+import hubblestack.module_runner.audit_runner
+import hubblestack.module_runner.comparator
+import hubblestack.module_runner.runner
+from hubblestack.audit import grep, ssl_certificate
+from hubblestack.comparators import certificate
+from hubblestack.module_runner import result_cache
+from hubblestack.module_runner.audit_runner import AuditRunner
+
+
+def _touch(path, content):
+    with open(path, 'w') as fh:
+        fh.write(content)
+
+
+def test_fingerprint_paths(tmpdir):
+    conf = os.path.join(str(tmpdir), 'a.conf')
+    _touch(conf, 'a = 1\n')
+    missing = os.path.join(str(tmpdir), 'missing.conf')
+    pattern = os.path.join(str(tmpdir), '*.conf')
+    fingerprint = result_cache.fingerprint_paths([conf, missing, pattern])
+    assert fingerprint == result_cache.fingerprint_paths([pattern, missing, conf, conf])
+    assert [missing, None] in fingerprint
+
+    _touch(conf, 'a = 22\n')
+    changed = result_cache.fingerprint_paths([conf, missing, pattern])
+    assert changed != fingerprint
+    os.chmod(conf, 0o600)
+    assert result_cache.fingerprint_paths([conf, missing, pattern]) != changed
+    # a new file matching the glob changes it too
+    changed = result_cache.fingerprint_paths([pattern])
+    _touch(os.path.join(str(tmpdir), 'b.conf'), '')
+    assert result_cache.fingerprint_paths([pattern]) != changed
+
+
+def test_result_cache(tmpdir):
+    path = os.path.join(str(tmpdir), 'results.json')
+    cache = result_cache.ResultCache.load(path, hubble_version='4.0.0')
+    key = cache.check_key('cis', 'check-1', {'tag': 'CIS-1'}, {'module': 'stat'}, False)
+    assert key != cache.check_key('cis', 'check-1', {'tag': 'CIS-1'}, {'module': 'stat'}, True)
+    assert cache.get(key, [['/etc/passwd', 1]]) is None
+    assert cache.put(key, [['/etc/passwd', 1]], {'check_id': 'check-1', 'check_result': 'Success'})
+    assert cache.get(key, [['/etc/passwd', 2]]) is None
+    assert cache.get(key, [['/etc/passwd', 1]]) == {'check_id': 'check-1', 'check_result': 'Success',
+                                                    'from_cache': True}
+    cache.save(path)
+
+    loaded = result_cache.ResultCache.load(path, hubble_version='4.0.0')
+    assert loaded.get(key, [['/etc/passwd', 1]])['check_result'] == 'Success'
+    # results of another version of hubble aren't used
+    assert len(result_cache.ResultCache.load(path, hubble_version='4.1.0')) == 0
+    _touch(path, '{garbage')
+    assert len(result_cache.ResultCache.load(path, hubble_version='4.0.0')) == 0
+
+
+def test_result_cache_max_age():
+    cache = result_cache.ResultCache(hubble_version='4.0.0')
+    cache.put('key', [], {'check_id': 'check-1'})
+    assert cache.get('key', []) is not None
+    # reusing a result doesn't keep it alive past MAX_AGE
+    later = result_cache.time.time() + result_cache.MAX_AGE + 1
+    with mock.patch.object(result_cache.time, 'time', return_value=later):
+        assert cache.get('key', []) is None
+        assert cache.to_dict()['checks'] == {}
+
+
+def test_incremental_run(tmpdir):
+    conf = os.path.join(str(tmpdir), 'sshd_config')
+    _touch(conf, 'PermitRootLogin no\n')
+    calls = []
+
+    def _execute(block_id, block_dict, extra_args=None):
+        calls.append(block_id)
+        return True, {'result': {'mode': 644}}
+
+    def _get_inputs(block_id, block_dict, extra_args=None):
+        return [block_dict['args']['path']] if 'path' in block_dict['args'] else None
+
+    hmods = {
+        'stat.validate_params': lambda *args: None,
+        'stat.execute': _execute,
+        'stat.get_filtered_params_to_log': lambda *args: {},
+        'stat.get_inputs': _get_inputs,
+    }
+
+    def _check(args):
+        return {'description': 'sshd_config', 'tag': 'CIS-1',
+                'implementations': [{'filter': {'grains': '*'}, 'module': 'stat',
+                                     'items': [{'args': args, 'comparator': {'type': 'dict'}}]}]}
+
+    profile = {'check-1': _check({'path': conf}), 'check-2': _check({'name': 'sshd'})}
+    cache = result_cache.ResultCache(hubble_version='4.0.0')
+
+    def _run(**args):
+        runner = AuditRunner()
+        results = runner._execute(profile, '/profiles/cis.yaml', dict(verbose=False, result_cache=cache, **args))
+        return dict((result['check_id'], result) for result in results)
+
+    with mock.patch.object(hubblestack.module_runner.runner, '__hmods__', hmods, create=True), \
+            mock.patch.object(hubblestack.module_runner.runner, '__grains__', {'hubble_version': '4.0.0'},
+                              create=True), \
+            mock.patch.object(hubblestack.module_runner.audit_runner, '__mods__',
+                              {'match.compound': lambda target: True}, create=True), \
+            mock.patch('hubblestack.module_runner.comparator.run', return_value=(True, None)):
+        results = _run()
+        assert calls == ['check-1', 'check-2']
+        assert results['check-1']['from_cache'] is False
+        assert results['check-1']['check_result'] == 'Success'
+
+        # check-2 doesn't tell what it reads, so it is executed every time
+        results = _run()
+        assert calls == ['check-1', 'check-2', 'check-2']
+        assert results['check-1']['from_cache'] is True
+        assert results['check-1']['check_result'] == 'Success'
+        assert results['check-2']['from_cache'] is False
+
+        _run(full_run=True)
+        assert calls[3:] == ['check-1', 'check-2']
+
+        _touch(conf, 'PermitRootLogin yes\n')
+        assert _run()['check-1']['from_cache'] is False
+        assert calls[5:] == ['check-1', 'check-2']
+
+        # without a cache, nothing is kept and results don't carry the flag
+        results = AuditRunner()._execute(profile, '/profiles/cis.yaml', {'verbose': False})
+        assert 'from_cache' not in results[0]
+        assert calls[7:] == ['check-1', 'check-2']
+
+
+def test_recursive_grep_is_not_cached(tmpdir):
+    profile_d = os.path.join(str(tmpdir), 'profile.d')
+    os.mkdir(profile_d)
+    script = os.path.join(profile_d, 'umask.sh')
+    _touch(script, 'umask 027\n')
+    calls = []
+
+    def _execute(block_id, block_dict, extra_args=None):
+        calls.append(block_id)
+        return True, {'result': 'umask 027'}
+
+    hmods = {
+        'grep.validate_params': lambda *args: None,
+        'grep.execute': _execute,
+        'grep.get_filtered_params_to_log': lambda *args: {},
+        'grep.get_inputs': grep.get_inputs,
+    }
+
+    def _check(args):
+        return {'description': 'umask', 'tag': 'CIS-5.4.4',
+                'implementations': [{'filter': {'grains': '*'}, 'module': 'grep',
+                                     'items': [{'args': args, 'comparator': {'type': 'string'}}]}]}
+
+    profile = {'recursive': _check({'path': profile_d, 'pattern': 'umask', 'flags': ['-r']}),
+               'directory': _check({'path': profile_d, 'pattern': 'umask'}),
+               'file': _check({'path': script, 'pattern': 'umask', 'flags': '-i -n'})}
+    cache = result_cache.ResultCache(hubble_version='4.0.0')
+
+    with mock.patch.object(hubblestack.module_runner.runner, '__hmods__', hmods, create=True), \
+            mock.patch.object(hubblestack.module_runner.runner, '__grains__', {'hubble_version': '4.0.0'},
+                              create=True), \
+            mock.patch.object(hubblestack.module_runner.audit_runner, '__mods__',
+                              {'match.compound': lambda target: True}, create=True), \
+            mock.patch('hubblestack.module_runner.comparator.run', return_value=(True, None)):
+        AuditRunner()._execute(profile, '/profiles/cis.yaml', {'verbose': False, 'result_cache': cache})
+        assert sorted(calls) == ['directory', 'file', 'recursive']
+        # a file in the grepped directory changes, the directory doesn't
+        _touch(script, 'umask 000\n')
+        del calls[:]
+        results = AuditRunner()._execute(profile, '/profiles/cis.yaml', {'verbose': False, 'result_cache': cache})
+        assert sorted(calls) == ['directory', 'file', 'recursive']
+        assert all(result['from_cache'] is False for result in results)
+
+    assert grep._is_recursive(['-n', '-Ri'])
+    assert grep._is_recursive('--recursive')
+    assert not grep._is_recursive(['-i', '--regexp=r'])
+
+
+def test_certificate_checks_are_not_cached(tmpdir):
+    cert_file = os.path.join(str(tmpdir), 'server.pem')
+    _touch(cert_file, '-----BEGIN CERTIFICATE-----\n')
+    calls = []
+
+    def _execute(block_id, block_dict, extra_args=None):
+        calls.append(block_id)
+        return True, {'result': {'ssl_start_time': '2020-01-01 00:00:00', 'ssl_end_time': '2030-01-01 00:00:00'}}
+
+    hmods = {
+        'ssl_certificate.validate_params': lambda *args: None,
+        'ssl_certificate.execute': _execute,
+        'ssl_certificate.get_filtered_params_to_log': lambda *args: {},
+        'ssl_certificate.get_inputs': ssl_certificate.get_inputs,
+    }
+    profile = {'cert-expiry': {
+        'description': 'certificate expiry', 'tag': 'CERT-1',
+        'implementations': [{'filter': {'grains': '*'}, 'module': 'ssl_certificate',
+                             'items': [{'args': {'path': cert_file},
+                                        'comparator': {'type': 'certificate', 'match': {'not_after': 30}}}]}]}}
+    cache = result_cache.ResultCache(hubble_version='4.0.0')
+
+    class _Clock(datetime.datetime):
+        today = datetime.datetime(2025, 1, 1)
+
+        @classmethod
+        def now(cls, tz=None):
+            return cls.today
+
+    def _run():
+        results = AuditRunner()._execute(profile, '/profiles/certs.yaml', {'verbose': False, 'result_cache': cache})
+        return results[0]['check_result']
+
+    with mock.patch.object(hubblestack.module_runner.runner, '__hmods__', hmods, create=True), \
+            mock.patch.object(hubblestack.module_runner.runner, '__grains__', {'hubble_version': '4.0.0'},
+                              create=True), \
+            mock.patch.object(hubblestack.module_runner.audit_runner, '__mods__',
+                              {'match.compound': lambda target: True}, create=True), \
+            mock.patch.object(hubblestack.module_runner.comparator, '__comparator__',
+                              {'certificate.match': certificate.match}, create=True), \
+            mock.patch.object(certificate, 'datetime', _Clock):
+        assert _run() == 'Success'
+        # the certificate file is untouched, but its not_after window is reached
+        _Clock.today = datetime.datetime(2029, 12, 20)
+        assert _run() == 'Failure'
+        _Clock.today = datetime.datetime(2030, 6, 1)
+        assert _run() == 'Failure'
+    assert calls == ['cert-expiry'] * 3
+    assert len(cache) == 0
@@ -0,0 +1,125 @@
+import json
+import os
+
+import mock
+import pytest
+
+import hubblestack.module_runner.runner
+from hubblestack.exceptions import CommandExecutionError
+from hubblestack.module_runner import snapshot as host_snapshot
+from hubblestack.module_runner.audit_runner import AuditRunner
+
+
+def _block(path, mode=644):
+    return {'args': {'path': path}, 'comparator': {'type': 'dict', 'match': {'mode': mode}}}
+
+
+def test_facts():
+    snapshot = host_snapshot.HostSnapshot(ttl=60, host='web01')
+    assert snapshot.get('stat', _block('/etc/passwd')) is None
+    assert snapshot.put('stat', _block('/etc/passwd'), True, {'result': {'mode': 644, 'ids': (0, 0)}})
+    assert snapshot.dirty
+    # the comparator isn't part of what the module is asked
+    assert snapshot.has('stat', _block('/etc/passwd', mode=600))
+    status, result = snapshot.get('stat', _block('/etc/passwd', mode=600))
+    assert status is True
+    assert result == {'result': {'mode': 644, 'ids': [0, 0]}}
+    result['result']['mode'] = 600
+    assert snapshot.get('stat', _block('/etc/passwd'))[1]['result']['mode'] == 644
+    assert (snapshot.hits, snapshot.misses) == (2, 1)
+
+    # failures, other checks' results and what can't be serialised aren't recorded
+    assert not snapshot.put('stat', _block('/etc/shadow'), False, {'error': 'file_not_found'})
+    assert not snapshot.put('bexpr', {'args': {'expr': 'a AND b'}}, True, {'result': True})
+    assert not snapshot.put('stat', _block('/etc/group'), True, {'result': object()})
+    assert not snapshot.put('stat', {'args': {'path': object()}}, True, {'result': 1})
+    assert len(snapshot) == 1
+
+    assert not snapshot.expired
+    snapshot.taken -= 61
+    assert snapshot.expired
+
+
+def test_save_load(tmpdir):
+    path = os.path.join(str(tmpdir), 'snapshot.json')
+    snapshot = host_snapshot.HostSnapshot(ttl=60, host='web01', hubble_version='4.0.0')
+    snapshot.put('stat', _block('/etc/passwd'), True, {'result': {'mode': 644}})
+    snapshot.save(path)
+    assert not snapshot.dirty
+    with open(path) as fh:
+        data = json.load(fh)
+    assert data['version'] == host_snapshot.SNAPSHOT_VERSION
+    assert data['facts'] == [{'module': 'stat', 'inputs': {'args': {'path': '/etc/passwd'}},
+                              'status': True, 'result': {'result': {'mode': 644}}}]
+
+    loaded = host_snapshot.HostSnapshot.load(path, offline=True)
+    assert loaded.get('stat', _block('/etc/passwd')) == (True, {'result': {'mode': 644}})
+    assert (loaded.host, loaded.hubble_version, loaded.taken) == ('web01', '4.0.0', snapshot.taken)
+    # an offline snapshot is what it is
+    loaded.taken -= 3600
+    assert not loaded.expired
+    assert not loaded.put('stat', _block('/etc/group'), True, {'result': {'mode': 644}})
+
+    data['version'] = host_snapshot.SNAPSHOT_VERSION + 1
+    with open(path, 'w') as fh:
+        json.dump(data, fh)
+    with pytest.raises(CommandExecutionError):
+        host_snapshot.HostSnapshot.load(path)
+    with pytest.raises(CommandExecutionError):
+        host_snapshot.HostSnapshot.load(os.path.join(str(tmpdir), 'missing.json'))
+
+
+def test_current(tmpdir):
+    path = os.path.join(str(tmpdir), 'snapshot.json')
+    host_snapshot.reset()
+    snapshot = host_snapshot.current(path, ttl=60, host='web01', hubble_version='4.0.0')
+    assert host_snapshot.current(path, ttl=60, host='web01', hubble_version='4.0.0') is snapshot
+    snapshot.put('stat', _block('/etc/passwd'), True, {'result': {'mode': 644}})
+    snapshot.save(path)
+
+    # another process picks up the saved snapshot
+    host_snapshot.reset()
+    saved = host_snapshot.current(path, ttl=60, host='web01', hubble_version='4.0.0')
+    assert saved is not snapshot
+    assert saved.has('stat', _block('/etc/passwd'))
+    # unless it was taken by another version of hubble or is too old
+    host_snapshot.reset()
+    assert len(host_snapshot.current(path, ttl=60, host='web01', hubble_version='4.1.0')) == 0
+    host_snapshot.reset()
+    saved.taken -= 61
+    saved.save(path)
+    assert len(host_snapshot.current(path, ttl=60, host='web01', hubble_version='4.0.0')) == 0
+    host_snapshot.reset()
+
+
+def test_runner():
+    calls = []
+
+    def _execute(block_id, block_dict, extra_args=None):
+        calls.append(block_dict['args']['path'])
+        if block_dict['args']['path'] == '/missing':
+            return False, {'error': 'file_not_found'}
+        return True, {'result': {'mode': 644}}
+
+    hmods = {'stat.execute': _execute}
+    runner = AuditRunner()
+    with mock.patch.object(hubblestack.module_runner.runner, '__hmods__', hmods, create=True):
+        runner._snapshot = host_snapshot.HostSnapshot(ttl=60)
+        for _ in range(2):
+            assert runner._execute_module('stat', 'check-1', _block('/etc/passwd')) == (True, {'result': {'mode': 644}})
+            assert runner._execute_module('stat', 'check-2', _block('/missing'))[0] is False
+        assert calls == ['/etc/passwd', '/missing', '/missing']
+
+        matched = [('check-1', {}, {'module': 'stat', 'items': [_block('/etc/passwd'), _block('/etc/group')]})]
+        assert runner._blocks_by_module(matched) == {'stat': [('check-1', _block('/etc/group'))]}
+
+        # offline, nothing is probed
+        runner._snapshot = host_snapshot.HostSnapshot.from_dict(runner._snapshot.to_dict(), offline=True)
+        assert runner._execute_module('stat', 'check-1', _block('/etc/passwd'))[0] is True
+        assert runner._execute_module('stat', 'check-3', _block('/etc/group')) == (False, {'error': 'not_in_snapshot'})
+        assert runner._blocks_by_module(matched) == {}
+        assert calls == ['/etc/passwd', '/missing', '/missing']
+
+        runner._snapshot = None
+        runner._execute_module('stat', 'check-1', _block('/etc/passwd'))
+        assert calls[-1] == '/etc/passwd' and len(calls) == 4
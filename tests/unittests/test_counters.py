@@ -1,5 +1,6 @@
 # coding: utf-8
 
+import socket
 import time
 import pytest
 import logging
@@ -103,6 +104,77 @@ def test_bucket_len():
 
 
 
+def test_histogram_percentiles():
+    hist = hubblestack.status.Histogram()
+    assert hist.quantile(0.5) is None
+    for i in range(1, 1001):
+        hist.record(i / 1000.0)
+    pct = hist.percentiles()
+    assert pct['count'] == 1000
+    assert pct['p50'] == pytest.approx(0.5, rel=0.125)
+    assert pct['p95'] == pytest.approx(0.95, rel=0.125)
+    assert pct['p99'] == pytest.approx(0.99, rel=0.125)
+    assert pct['max'] == 1.0
+    # fixed memory no matter how extreme the samples
+    hist.record(0)
+    hist.record(1e9)
+    assert len(hist.counts) == hubblestack.status.Histogram.SIZE
+
+def test_latency_and_prometheus():
+    with HubbleStatusContext('test1', 'test2') as hubble_status:
+        for _ in range(3):
+            with hubble_status.resource_timer('test1'):
+                time.sleep(0.01)
+        hubble_status.mark('test2')
+
+        latency = hubble_status.latency()
+        assert set(latency) == {'x.test1'}
+        assert latency['x.test1']['count'] == 3
+        assert latency['x.test1']['p50'] == pytest.approx(0.01, rel=0.5)
+        assert hubble_status.stats()['x.test1']['latency'] == latency['x.test1']
+
+        text = hubble_status.as_prometheus()
+        assert 'hubble_status_count{resource="x.test1"} 3' in text
+        assert 'hubble_status_count{resource="x.test2"} 1' in text
+        assert 'hubble_status_duration_seconds_count{resource="x.test1"} 3' in text
+        assert 'hubble_status_duration_seconds{resource="x.test1",quantile="0.99"}' in text
+        assert 'hubble_status_duration_seconds_count{resource="x.test2"}' not in text
+
+def test_gauges():
+    with HubbleStatusContext('test1') as hubble_status:
+        hubble_status.mark('test1')
+        hubble_status.gauge('queue.abc.eta_seconds', 12.5)
+        hubble_status.gauge('queue.abc.eta_seconds', 10)
+        assert hubble_status.stats()['GAUGES'] == {'x.queue.abc.eta_seconds': 10}
+        text = hubble_status.as_prometheus()
+        assert 'hubble_status_gauge{resource="x.queue.abc.eta_seconds"} 10.0' in text
+
+def test_metrics_endpoint(tmpdir):
+    sock_path = str(tmpdir.join('metrics.sock'))
+    with HubbleStatusContext('test1') as hubble_status:
+        hubblestack.status.__opts__['hubble_status']['metrics_listen'] = sock_path
+        hubble_status.mark('test1').fin()
+        server = hubble_status.start_metrics_endpoint()
+        try:
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.connect(sock_path)
+            client.sendall(b'GET /metrics HTTP/1.0\r\n\r\n')
+            response = b''
+            while True:
+                chunk = client.recv(4096)
+                if not chunk:
+                    break
+                response += chunk
+            client.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+            hubblestack.status.HubbleStatus._metrics_server = None
+        assert response.startswith(b'HTTP/1.0 200')
+        assert b'hubble_status_count{resource="x.test1"} 1' in response
+
+
+
 class HubbleStatusContext(object):
     # The tests below really mess up hubble_status.  They change settings and
     # mess with a session global variable (HubbleStatus.dat).  If we don't
@@ -121,10 +193,12 @@ class HubbleStatusContext(object):
         log.debug("__enter__ nuking HubbleStatus.dat and tuning __opts__")
 
         self.orig_dat = hubblestack.status.HubbleStatus.dat
+        self.orig_gauges = hubblestack.status.HubbleStatus.gauges
         self.orig_opt = hubblestack.status.__opts__.get('hubble_status')
 
         # completely reset the status stack
         hubblestack.status.HubbleStatus.dat = dict()
+        hubblestack.status.HubbleStatus.gauges = dict()
 
         # setup opts
         bucket_len = self.kwargs.pop('bucket_len', 30e6) # 30Msec is roughly a year‡
@@ -143,6 +217,7 @@ class HubbleStatusContext(object):
     def __exit__(self, *_):
         log.debug("__exit__ restoring HubbleStatus.dat and repairing __opts__")
         hubblestack.status.HubbleStatus.dat = self.orig_dat
+        hubblestack.status.HubbleStatus.gauges = self.orig_gauges
         if self.orig_opt is not None:
             hubblestack.status.__opts__['hubble_status'] = self.orig_opt
 
@@ -0,0 +1,54 @@
+import pytest
+
+from hubblestack.exceptions import ArgumentValueError
+from hubblestack.utils import filter_plans
+
+
+def test_compile_filter():
+    between = filter_plans.compile_filter({'gt': 1, 'le': 4})
+    assert [x for x in range(6) if between(x)] == [2, 3, 4]
+    assert filter_plans.filter_seq((5, 1, 3), {'ne': 3}) == [5, 1]
+    seq = [1, 2]
+    assert filter_plans.filter_seq(seq, {}) is seq
+    assert filter_plans.filter_dict({'a': 1, 'b': 2}, True, {'eq': 2}) == {'b': 2}
+    assert filter_plans.filter_dict({'a': 1, 'b': 2}, False, {'lt': 'b'}) == {'a': 1}
+
+    # an invalid comparison only fails once there is something to compare
+    invalid = filter_plans.compile_filter({'gt': 1, 'foo': 2})
+    assert filter_plans.filter_seq([], {'foo': 2}) == []
+    assert not invalid(0)
+    with pytest.raises(ArgumentValueError):
+        invalid(2)
+    with pytest.raises(ArgumentValueError):
+        filter_plans.compare('foo', 1, 2)
+    assert filter_plans.compare('ge', 2, 2)
+
+
+def test_compiled_regex():
+    assert filter_plans.compiled_regex(r'\s+') is filter_plans.compiled_regex(r'\s+')
+    assert filter_plans.compiled_regex(r'\s+').split('a  b\tc') == ['a', 'b', 'c']
+
+
+def test_sterilize():
+    data = {'a': {'b': [1, {'c': None}], 'f': {'g': 1}}, 'd': None, 'h': (2, None)}
+    sterilized = filter_plans.sterilize(data)
+    assert sterilized == {'a': {'b': [1, {}], 'f': {'g': 1}}, 'h': [2, None]}
+    assert data['d'] is None and data['a']['b'][1] == {'c': None}
+
+    # the result is a copy, even where nothing changed
+    unchanged = {'a': {'b': [1, {'c': 2}]}, 'd': 'e'}
+    copied = filter_plans.sterilize(unchanged)
+    assert copied == unchanged
+    copied['a']['b'][1]['c'] = 3
+    copied['a']['b'].append(4)
+    assert unchanged == {'a': {'b': [1, {'c': 2}]}, 'd': 'e'}
+
+
+def test_convert_none():
+    data = {'a': '', 'b': [{'c': ''}, 'e'], 'f': {'g': 0}}
+    converted = filter_plans.convert_none(data)
+    assert converted == {'a': None, 'b': [{'c': None}, 'e'], 'f': {'g': 0}}
+    assert data['a'] == ''
+    assert converted['f'] is not data['f']
+    # only the values of dicts are converted
+    assert filter_plans.convert_none(('', {'a': ''})) == ['', {'a': None}]
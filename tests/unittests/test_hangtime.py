@@ -1,5 +1,9 @@
 
-from hubblestack.hangtime import HangTime, hangtime_wrapper
+from hubblestack.hangtime import HangTime, hangtime_wrapper, watch
+from hubblestack.status import HubbleStatus
+import os
+import subprocess
+import threading
 import time
 import signal
 import pytest
@@ -127,3 +131,86 @@ def test_fake_refresh_grains():
     dt = t2-t1
     assert x == 5
     assert dt == pytest.approx(target_time, rel=1e-1)
+
+
+def test_threads_have_independent_timers():
+    results = {}
+
+    def worker(tag, timeout, work):
+        try:
+            with HangTime(timeout=timeout, tag=tag):
+                t_end = time.time() + work
+                while time.time() < t_end:
+                    time.sleep(0.01)
+            results[tag] = 'finished'
+        except HangTime as ht:
+            results[tag] = ht.tag
+
+    threads = [threading.Thread(target=worker, args=('fast', 0.3, 1.0)),
+               threading.Thread(target=worker, args=('slow', 2.0, 0.5)),
+               threading.Thread(target=worker, args=('nested-ok', 1.5, 0.1))]
+    t1 = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {'fast': 'fast', 'slow': 'finished', 'nested-ok': 'finished'}
+    assert time.time() - t1 < 1.0
+    assert signal.getsignal(signal.SIGALRM) == signal.SIG_DFL
+
+
+def test_watched_subprocess_is_killed():
+    results = {}
+
+    def worker():
+        try:
+            with HangTime(timeout=0.3, tag='proc'):
+                proc = watch(subprocess.Popen(['sleep', '10']))
+                # a thread blocked in C code only gets unblocked by the kill
+                proc.wait()
+        except HangTime as ht:
+            results['tag'] = ht.tag
+        results['pid'] = proc.pid
+
+    t1 = time.time()
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+
+    assert results['tag'] == 'proc'
+    with pytest.raises(ProcessLookupError):
+        os.kill(results['pid'], 0)
+    assert time.time() - t1 < 5
+
+
+def test_overrun_is_flagged():
+    with pytest.raises(HangTime):
+        with HangTime(timeout=0.1, tag='flagged'):
+            time.sleep(1)
+    assert HubbleStatus.short()['hubblestack.hangtime.watchdog.overrun.flagged']['count'] >= 1
+
+
+def test_exception_during_exit_leaves_no_timer(monkeypatch):
+    from hubblestack.hangtime import watchdog
+
+    # a late exception lands in __exit__, before the timer is off the stack
+    real_timers = watchdog._timers
+    late = list()
+
+    def _timers():
+        if late:
+            raise late.pop()
+        return real_timers()
+
+    monkeypatch.setattr(watchdog, '_timers', _timers)
+    ht = HangTime(timeout=0.2, tag='late')
+    with ht:
+        late.append(HangTime(tag='late'))
+
+    assert real_timers() == []
+    assert not ht.active and ht.deadline is None
+    assert signal.getsignal(signal.SIGALRM) == signal.SIG_DFL
+    # the disarmed timer doesn't fire later on
+    time.sleep(0.4)
+    assert ht.fired == 0
@@ -77,3 +77,17 @@ def test_disk_queue_put_estimator(dq):
         dq._count()
         more = dq.cn, dq.sz
         assert post == more
+
+def test_disk_queue_gzip_items(dqc):
+    import gzip
+    dqc.init_types((str, bytes))
+    body = gzip.compress(b'{"event": "compressed"}')
+    dqc.put('one')
+    dqc.put(body, testinator=1)
+    dqc.put('two')
+    dqc.put('three')
+
+    # gzip bodies are kept as they are and never concatenated with others
+    assert dqc.getz() == ('one', {})
+    assert dqc.getz() == (body, {'testinator': 1})
+    assert dqc.getz() == ('two three', {})
@@ -38,3 +38,189 @@ def test_queue_things_with_compression(mock_send, __opts__, __mods__):
     cat_gz = ' '.join(gz)
 
     assert cat_rez == cat_gz
+
+def test_payload_template():
+    from hubblestack.hec import PayloadTemplate
+    tpl = PayloadTemplate(host='h', index='i', sourcetype='st',
+        defaults={'minion_id': 'm', 'cloud': '', 'action': 'default'},
+        overrides={'custom_site': 'x', 'custom_empty': ''},
+        index_extracted_fields=['minion_id', 'path', 'custom_site', 'missing'])
+
+    payload = tpl.payload({'path': '/etc/passwd', 'size': 1, 'empty': ''}, eventtime=1234)
+    assert payload.sourcetype == 'st'
+    assert payload.time == 1234
+    assert json.loads(str(payload)) == {
+        'host': 'h', 'index': 'i', 'sourcetype': 'st', 'time': 1234,
+        'event': {'minion_id': 'm', 'action': 'default', 'custom_site': 'x',
+                  'path': '/etc/passwd', 'size': 1},
+        'fields': {'meta_minion_id': 'm', 'meta_path': '/etc/passwd', 'meta_custom_site': 'x'}}
+
+    # events redefining template fields: defaults < event < overrides
+    payload = tpl.payload({'action': 'read', 'custom_site': 'y', 'minion_id': ''})
+    dat = json.loads(str(payload))
+    assert dat['event'] == {'action': 'read', 'custom_site': 'x'}
+    assert dat['fields'] == {'meta_custom_site': 'x'}
+    assert dat['time'] == payload.time
+
+def test_count_inputs_in_bulk():
+    from hubblestack.hec.obj import Payload, count_inputs, hubble_status
+    payloads = [Payload({'sourcetype': 'bulk_count_test', 'event': i}, eventtime=1000000 + i) for i in range(5)]
+    count_inputs(payloads)
+    stat = hubble_status.dat['hubblestack.hec.obj.input:bulk_count_test']
+    assert sum(bucket.count for bucket in stat) == 5
+    assert min(bucket.first_t for bucket in stat if bucket.count) == 1000000
+    assert max(bucket.last_t for bucket in stat) == 1000004
+
+@mock.patch.object(HEC, '_send')
+def test_gzip_batches_respect_compressed_budget(mock_send):
+    import gzip
+    import random
+    from hubblestack.hec.obj import hubble_status
+    hec = HEC('token', 'index', 'server', gzip=True, max_compressed_bytes=4000)
+    rng = random.Random(1)
+    events = [{'event': i, 'noise': '%x' % rng.getrandbits(128)} for i in range(400)]
+    for event in events:
+        hec.batchEvent(event)
+    hec.flushBatch()
+
+    bodies = [call.args[0] for call in mock_send.call_args_list]
+    assert len(bodies) > 1
+    sent = list()
+    for body in bodies:
+        assert body[:2] == b'\x1f\x8b'
+        assert len(body) <= 4000
+        sent.extend(json.loads('[' + gzip.decompress(body).decode().replace('} {', '},{') + ']'))
+    assert [x['event'] for x in sent] == list(range(400))
+    raw = sum(bucket.count for bucket in hubble_status.dat['hubblestack.hec.obj.gzip:bytes_in'])
+    out = sum(bucket.count for bucket in hubble_status.dat['hubblestack.hec.obj.gzip:bytes_out'])
+    assert out == sum(len(body) for body in bodies)
+    assert out < raw
+    # the ratio covers every body this process compressed
+    assert 0 < hubble_status.gauges['hubblestack.hec.obj.gzip:ratio'] < 1
+
+def test_fan_out_endpoints_concurrently():
+    import threading
+    from hubblestack.hec import fan_out
+    barrier = threading.Barrier(3, timeout=5)
+    def send(opts, suffix):
+        if opts['indexer'] == 'broken':
+            raise Exception('endpoint down')
+        # only passes if all three endpoints are being sent to at once
+        barrier.wait()
+        return opts['indexer'] + suffix
+    opts_list = [{'indexer': 'one'}, {'indexer': 'broken'}, {'indexer': 'two'}, {'indexer': 'three'}]
+    assert fan_out(opts_list, send, '!') == ['one!', None, 'two!', 'three!']
+
+def test_queue_state_per_endpoint():
+    hec1 = HEC('token', 'index', 'server1')
+    hec2 = HEC('token', 'index', 'server2')
+    assert hec1.queue_state is HEC('token', 'index', 'server1').queue_state
+    assert hec1.queue_state is not hec2.queue_state
+
+def _wait_for(cond, timeout=5):
+    import time
+    until = time.time() + timeout
+    while not cond() and time.time() < until:
+        time.sleep(0.01)
+    return cond()
+
+@mock.patch.object(HEC, '_direct_send_msg')
+@mock.patch.object(HEC, '_send')
+def test_background_queue_flush(mock_send, _mock_msg):
+    import threading
+    import time
+    ok = mock.Mock(status=200, reason='OK')
+    release = threading.Event()
+    replayed = list()
+    def side_effect(*x, **kw):
+        if 'meta_data' in kw:
+            # replaying the disk queue
+            release.wait(5)
+            replayed.append((time.monotonic(), x[0].count('queued-')))
+        return ok
+    mock_send.side_effect = side_effect
+
+    # small batches, so the rate limit has to space them out
+    hec = HEC('token', 'index', 'bg-flush-server', disk_queue=TEST_DQ_DIR + '.bg',
+              flush_background=True, flush_events_per_second=40, max_bytes=600)
+    hec.queue.clear()
+    flusher = hec.queue_state.flusher
+    try:
+        for i in range(20):
+            hec.queueEvent({'event': 'queued-{0}'.format(i)})
+        assert hec.queue.cn == 20
+
+        # the live send returns without replaying the queue
+        hec.sendEvent({'event': 'live'})
+        assert _wait_for(lambda: flusher.thread.is_alive())
+        assert not replayed
+
+        started = time.monotonic()
+        release.set()
+        assert _wait_for(lambda: hec.queue.cn == 0 and flusher.drained_events == 20)
+        drained = time.monotonic() - started
+        assert sum(count for _, count in replayed) == 20
+        assert len(replayed) > 1
+        # every batch waits for the previous one to fit in 40 events/s, so the
+        # 20 events take at least half a second to drain
+        for (sent, count), (next_sent, _) in zip(replayed, replayed[1:]):
+            assert next_sent - sent >= count / 40.0 - 0.02
+        assert drained >= 0.45
+        stats = hec.flushStats()
+        assert stats['drained_events'] == 20
+        assert stats['eta_seconds'] == 0
+        assert 0 < stats['drain_events_per_second'] <= 45
+    finally:
+        flusher.stop(5)
+
+@mock.patch.object(HEC, '_direct_send_msg')
+@mock.patch.object(HEC, '_send')
+def test_background_queue_flush_backoff(mock_send, _mock_msg):
+    ok = mock.Mock(status=200, reason='OK')
+    attempts = list()
+    def side_effect(*x, **kw):
+        if 'meta_data' in kw:
+            attempts.append(x[0])
+            if len(attempts) == 1:
+                return None # the endpoint is down (_send would requeue it)
+        return ok
+    mock_send.side_effect = side_effect
+
+    hec = HEC('token', 'index', 'bg-backoff-server', disk_queue=TEST_DQ_DIR + '.bgb',
+              flush_background=True, flush_backoff=0.2)
+    hec.queue.clear()
+    flusher = hec.queue_state.flusher
+    try:
+        hec.queueEvent({'event': 'queued'})
+        hec.sendEvent({'event': 'live'})
+        assert _wait_for(lambda: flusher.failures == 1)
+        # nothing else is tried until the backoff is over or a live send kicks
+        flusher.thread.join(0.1)
+        assert len(attempts) == 1
+        hec.queueEvent({'event': 'queued-again'})
+        hec.sendEvent({'event': 'live'})
+        assert _wait_for(lambda: hec.queue.cn == 0 and flusher.failures == 0)
+        assert len(attempts) == 2
+    finally:
+        flusher.stop(5)
+
+def test_payload_template_payloads():
+    from hubblestack.hec import PayloadTemplate
+    for extracted in ([], ['minion_id', 'path']):
+        tpl = PayloadTemplate(host='h', index='i', sourcetype='st',
+            defaults={'minion_id': 'm', 'action': 'default'}, overrides={'custom_site': 'x'},
+            index_extracted_fields=extracted)
+        rows = [({'path': '/etc/passwd', 'size': 1}, 1234), ({}, 1235.5),
+                ({'action': 'read', 'empty': ''}, 1236), ({'big': 2 ** 70}, 1237)]
+        many = tpl.payloads(rows)
+        assert [str(x) for x in many] == [str(tpl.payload(e, eventtime=t)) for e, t in rows]
+        assert [x.time for x in many] == [1234, 1235.5, 1236, 1237]
+
+@mock.patch.object(HEC, '_send')
+def test_batch_payloads(mock_send):
+    hec = HEC('token', 'index', 'server', max_bytes=1000)
+    hec.batchPayloads([{'event': 'x' * 100} for _ in range(25)])
+    hec.flushBatch()
+    sizes = [sum(len(x) for x in call.args) for call in mock_send.call_args_list]
+    assert sum(len(call.args) for call in mock_send.call_args_list) == 25
+    assert len(sizes) > 1 and max(sizes) <= 1000
@@ -0,0 +1,150 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from hubblestack.module_runner.fdg_runner import FdgRunner
+from hubblestack.utils import http_sessions
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def _reply(self):
+        self.server.hits.append((self.command, self.path))
+        time.sleep(self.server.delay)
+        body = '{{"path": "{0}"}}'.format(self.path).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Set-Cookie', 'session=1')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.cookies.append(self.headers.get('Cookie'))
+        self._reply()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._reply()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.connections = 0
+    httpd.hits = []
+    httpd.cookies = []
+    httpd.delay = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_pool(server):
+    url = 'http://127.0.0.1:{0}'.format(server.server_address[1])
+    pool = http_sessions.SessionPool(cache_responses=True)
+    for _ in range(3):
+        response = pool.request('GET', url + '/health', timeout=5)
+        assert response.json() == {'path': '/health'}
+    pool.request('GET', url + '/health', params={'a': 1}, timeout=5)
+    pool.request('POST', url + '/health', data='x', timeout=5)
+    pool.request('POST', url + '/health', data='x', timeout=5)
+    pool.request('GET', url + '/other', timeout=5)
+    # identical GETs are sent once, everything shares one connection
+    assert server.hits == [('GET', '/health'), ('GET', '/health?a=1'), ('POST', '/health'),
+                           ('POST', '/health'), ('GET', '/other')]
+    assert server.connections == 1
+    # no cookies carried from one request to the next
+    assert server.cookies == [None, None, None]
+    assert pool.session(url + '/a') is pool.session(url + '/b')
+    assert pool.session(url + '/a') is not pool.session(url + '/a', verify=False)
+    pool.close()
+
+
+def test_run_scope(server):
+    url = 'http://127.0.0.1:{0}/health'.format(server.server_address[1])
+    pool = http_sessions.reset()
+    assert http_sessions.get_pool() is pool
+    http_sessions.request('GET', url, timeout=5)
+    http_sessions.request('GET', url, timeout=5)
+    assert len(server.hits) == 1
+
+    # a new run asks again
+    http_sessions.reset()
+    http_sessions.request('GET', url, timeout=5)
+    assert len(server.hits) == 2
+
+    pool = http_sessions.get_pool()
+    pool.started -= http_sessions.RUN_TTL + 1
+    assert http_sessions.get_pool() is not pool
+
+    # outside of a run only the connections are kept
+    http_sessions.request('GET', url, timeout=5)
+    http_sessions.request('GET', url, timeout=5)
+    assert len(server.hits) == 4
+    assert server.connections == 3
+    http_sessions.get_pool().prefetch([(url, {'timeout': 5})])
+    assert len(server.hits) == 4
+
+
+def test_fdg_run_scope(server, monkeypatch):
+    url = 'http://127.0.0.1:{0}/health'.format(server.server_address[1])
+    runner = FdgRunner()
+
+    def _fdg_execute(block_id, block_data, chained=None, chained_status=True):
+        http_sessions.request('GET', url, timeout=5)
+        http_sessions.request('GET', url, timeout=5)
+        return None, True
+
+    monkeypatch.setattr(runner, '_fdg_execute', _fdg_execute)
+    runner._execute({}, 'health.fdg', {})
+    assert len(server.hits) == 1
+    # the next execution (eg: a scheduled health check) doesn't get the old response
+    runner._execute({}, 'health.fdg', {})
+    assert len(server.hits) == 2
+
+
+def test_prefetch(server):
+    url = 'http://127.0.0.1:{0}/{1}'
+    server.delay = 0.2
+    pool = http_sessions.SessionPool(cache_responses=True)
+    started = time.time()
+    pool.prefetch([(url.format(server.server_address[1], i), {'timeout': 5}) for i in range(8)]
+                  + [('http://127.0.0.1:1/refused', {'timeout': 1})])
+    assert time.time() - started < 1
+    assert len(server.hits) == 8
+    pool.request('GET', url.format(server.server_address[1], 3), timeout=5)
+    assert len(server.hits) == 8
+    pool.close()
+
+
+def test_xpipe_workers():
+    runner = FdgRunner()
+    running = []
+    peak = []
+
+    def _fdg_execute(block_id, block_data, chained=None, chained_status=True):
+        running.append(chained)
+        peak.append(len(running))
+        time.sleep(0.05)
+        running.remove(chained)
+        return chained * 2, True
+
+    runner._fdg_execute = _fdg_execute
+    assert runner._xpipe([1, 2, 3, 4], True, {}, 'b') == [(2, True), (4, True), (6, True), (8, True)]
+    assert max(peak) == 1
+    del peak[:]
+    assert runner._xpipe([1, 2, 3, 4], True, {}, 'b', workers=4) == [(2, True), (4, True), (6, True), (8, True)]
+    assert max(peak) > 1
@@ -34,3 +34,76 @@ def test_can_find_hubblestack_module_file(module_dirs):
 
 def test_can_find_hubblestack_module(__mods__):
     assert 'pulsar.canary' in __mods__
+
+class _FakeGrainLoader(dict):
+    def clear(self):
+        """ a LazyLoader reloads its modules after clear() """
+
+def _grain_funcs(calls):
+    """ fake grain functions; "slow" is volatile and blocks, "cpu" is cached
+        for the boot and "uses_grains" needs the others' grains
+    """
+    mod_globals = {'__grains_ttl__': {'cpu': 'boot'}, 'calls': calls, 'time': __import__('time')}
+    exec('''
+def cpu():
+    calls.append('cpu')
+    return {'num_cpus': len(calls)}
+
+def slow():
+    calls.append('slow')
+    time.sleep(5)
+    return {'slow': True}
+
+def quick():
+    calls.append('quick')
+    return {'quick': True}
+
+def uses_grains(grains):
+    return {'doubled_cpus': grains['num_cpus'] * 2}
+''', mod_globals)
+    return _FakeGrainLoader(('fake.' + name, mod_globals[name]) for name in ('cpu', 'slow', 'quick', 'uses_grains'))
+
+def test_grains_deadline_and_ttl(tmpdir, monkeypatch):
+    calls = list()
+    funcs = _grain_funcs(calls)
+    monkeypatch.setattr(L, 'grain_funcs', lambda opts, proxy=None: funcs)
+    monkeypatch.setattr(L, '_GRAINS_CACHE', {})
+    opts = {'cachedir': str(tmpdir), 'grains_timeout': 1, 'grains_max_workers': 4}
+
+    grains = L.grains(opts)
+    assert grains == {'num_cpus': grains['num_cpus'], 'quick': True, 'doubled_cpus': 2 * grains['num_cpus']}
+    assert sorted(calls) == ['cpu', 'quick', 'slow']
+    assert 'fake.slow' not in L._GRAINS_CACHE
+    assert L._GRAINS_CACHE['fake.cpu']['ttl'] == 'boot'
+    assert L.hubble_status.latency()['hubblestack.loader.grains.fake.quick']['count'] >= 1
+
+    # the boot scoped grain is served from the cache on the next refresh
+    del calls[:]
+    assert L.grains(opts)['num_cpus'] == grains['num_cpus']
+    assert 'cpu' not in calls and 'quick' in calls
+
+    # unless the refresh is forced
+    L.grains(opts, force_refresh=True)
+    assert 'cpu' in calls
+
+def test_grains_empty_results_not_cached(tmpdir, monkeypatch):
+    answers = [{}, {'cloud_instance_id': None}, {'cloud_instance_id': 'i-0123'}]
+    calls = list()
+    mod_globals = {'__grains_ttl__': 'boot', 'answers': answers, 'calls': calls}
+    exec('''
+def get_cloud_details():
+    calls.append('cloud')
+    return answers[min(len(calls), len(answers)) - 1]
+''', mod_globals)
+    funcs = _FakeGrainLoader([('cloud_details.get_cloud_details', mod_globals['get_cloud_details'])])
+    monkeypatch.setattr(L, 'grain_funcs', lambda opts, proxy=None: funcs)
+    monkeypatch.setattr(L, '_GRAINS_CACHE', {})
+    opts = {'cachedir': str(tmpdir), 'grains_cache': True}
+
+    # the metadata services didn't answer: asked again on the next refresh
+    assert L.grains(opts) == {}
+    assert L.grains(opts) == {'cloud_instance_id': None}
+    assert 'cloud_details.get_cloud_details' not in L._GRAINS_CACHE
+    assert L.grains(opts) == {'cloud_instance_id': 'i-0123'}
+    assert L.grains(opts) == {'cloud_instance_id': 'i-0123'}
+    assert calls == ['cloud'] * 3
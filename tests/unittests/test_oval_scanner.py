@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+
+import mock
+
+import hubblestack.files.hubblestack_nova.oval_scanner as oval_scanner
+
+OVAL_SOURCE = """<?xml version="1.0" encoding="UTF-8"?>
+<oval_definitions xmlns="http://oval.mitre.org/XMLSchema/oval-definitions-5"
+                  xmlns:oval="http://oval.mitre.org/XMLSchema/oval-common-5"
+                  xmlns:linux="http://oval.mitre.org/XMLSchema/oval-definitions-5#linux">
+  <generator>
+    <oval:product_name>Test OVAL</oval:product_name>
+    <oval:timestamp>2020-01-01T00:00:00</oval:timestamp>
+  </generator>
+  <definitions>
+    <definition id="oval:def:1" class="patch">
+      <metadata>
+        <title>RHSA-2020:0001: openssl security update</title>
+        <reference ref_id="RHSA-2020:0001" ref_url="https://access.redhat.com/errata/RHSA-2020:0001" source="RHSA"/>
+        <reference ref_id="CVE-2020-0001" ref_url="https://access.redhat.com/security/cve/CVE-2020-0001" source="CVE"/>
+        <advisory>
+          <severity>Important</severity>
+        </advisory>
+      </metadata>
+      <criteria operator="AND">
+        <criterion test_ref="oval:tst:1" comment="openssl is earlier than 1:1.0.2k-19"/>
+      </criteria>
+    </definition>
+    <definition id="oval:def:2" class="patch">
+      <metadata>
+        <title>RHSA-2020:0002: bash security update</title>
+        <reference ref_id="RHSA-2020:0002" ref_url="https://access.redhat.com/errata/RHSA-2020:0002" source="RHSA"/>
+      </metadata>
+      <criteria operator="OR">
+        <criterion test_ref="oval:tst:2" comment="bash is earlier than 0:4.2.46-34"/>
+        <criterion test_ref="oval:tst:3" comment="variable packages"/>
+      </criteria>
+    </definition>
+  </definitions>
+  <tests>
+    <linux:rpminfo_test id="oval:tst:1" check="at least one" comment="openssl">
+      <linux:object object_ref="oval:obj:1"/>
+      <linux:state state_ref="oval:ste:1"/>
+    </linux:rpminfo_test>
+    <linux:rpminfo_test id="oval:tst:2" check="at least one" comment="bash">
+      <linux:object object_ref="oval:obj:2"/>
+      <linux:state state_ref="oval:ste:2"/>
+    </linux:rpminfo_test>
+    <linux:rpminfo_test id="oval:tst:3" check="at least one" comment="libs">
+      <linux:object object_ref="oval:obj:3"/>
+      <linux:state state_ref="oval:ste:2"/>
+    </linux:rpminfo_test>
+  </tests>
+  <objects>
+    <linux:rpminfo_object id="oval:obj:1"><linux:name>openssl</linux:name></linux:rpminfo_object>
+    <linux:rpminfo_object id="oval:obj:2"><linux:name>bash</linux:name></linux:rpminfo_object>
+    <linux:rpminfo_object id="oval:obj:3"><linux:name var_ref="oval:var:1"/></linux:rpminfo_object>
+  </objects>
+  <states>
+    <linux:rpminfo_state id="oval:ste:1"><linux:evr datatype="evr_string" operation="less than">1:1.0.2k-19</linux:evr></linux:rpminfo_state>
+    <linux:rpminfo_state id="oval:ste:2"><linux:evr datatype="evr_string" operation="less than">0:4.2.46-34</linux:evr></linux:rpminfo_state>
+  </states>
+  <variables>
+    <constant_variable id="oval:var:1" datatype="string">
+      <value>bash-doc</value>
+      <value>bash-completion</value>
+    </constant_variable>
+  </variables>
+</oval_definitions>
+"""
+
+
+class TestOvalScanner():
+
+    def _write_source(self, tmpdir):
+        source = tmpdir.join('oval.xml')
+        source.write(OVAL_SOURCE)
+        return str(source)
+
+    def test_build_index(self, tmpdir):
+        index = oval_scanner.build_index(self._write_source(tmpdir))
+        assert index['generator'] == {'product_name': 'Test OVAL', 'timestamp': '2020-01-01T00:00:00'}
+        assert index['packages'] == {'openssl': [['1:1.0.2k-19', 'oval:def:1']],
+                                     'bash': [['0:4.2.46-34', 'oval:def:2']],
+                                     'bash-doc': [['0:4.2.46-34', 'oval:def:2']],
+                                     'bash-completion': [['0:4.2.46-34', 'oval:def:2']]}
+        definition = index['definitions']['oval:def:1']
+        assert definition['severity'] == 'Important'
+        assert definition['rhsa'] == {'RHSA-2020:0001': 'https://access.redhat.com/errata/RHSA-2020:0001'}
+        assert 'tests' not in definition
+
+    def test_load_index_is_keyed_by_checksum(self, tmpdir):
+        source = self._write_source(tmpdir)
+        index_dir = str(tmpdir.mkdir('index'))
+        index = oval_scanner.load_index(source, 'abc', index_dir)
+        assert os.listdir(index_dir) == ['index-abc.json']
+        # a cached index for the same checksum is used without reparsing
+        with open(os.path.join(index_dir, 'index-abc.json')) as fh:
+            cached = json.load(fh)
+        cached['packages'] = {}
+        with open(os.path.join(index_dir, 'index-abc.json'), 'w') as fh:
+            json.dump(cached, fh)
+        assert oval_scanner.load_index(source, 'abc', index_dir)['packages'] == {}
+        # a new checksum rebuilds and replaces the stale index
+        assert oval_scanner.load_index(source, 'def', index_dir) == dict(index, checksum='def')
+        assert os.listdir(index_dir) == ['index-def.json']
+
+    def test_audit_local_file(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(oval_scanner, '__grains__',
+                            {'os': 'CentOS', 'osmajorrelease': 7, 'lsb_distrib_codename': 'Core'}, raising=False)
+        monkeypatch.setattr(oval_scanner, '__opts__', {'cachedir': str(tmpdir.mkdir('cache'))}, raising=False)
+        monkeypatch.setattr(oval_scanner, '__mods__',
+                            {'pkg.list_pkgs': lambda: {'openssl': '1:1.0.2k-16', 'bash': '0:4.2.46-34',
+                                                       'vim': '2:7.4.629-6'}}, raising=False)
+        data_list = [('cve.oval', {'oval_scanner': {'opt_local_sourcefile': self._write_source(tmpdir)}})]
+        ret = oval_scanner.audit(data_list, '*', [])
+        assert len(ret['Failure']) == 1
+        assert ret['Failure'][0]['tag'] == 'RHSA-2020:0001: openssl security update'
+        assert ret['Failure'][0]['description'] == 'Vulnerable Package(s): openssl-1:1.0.2k-16'
+        assert ret['Success'] == [{'tag': 'Secure Package(s)', 'description': '2 out of 3'}]
+
+    def test_remote_source_is_fetched_conditionally(self, tmpdir, monkeypatch):
+        requests_made = list()
+        feed = {'body': OVAL_SOURCE.encode('utf-8'), 'etag': '"v1"'}
+
+        def _get(url, stream=False, headers=None):
+            requests_made.append(dict(headers or {}))
+            response = mock.Mock(headers={'ETag': feed['etag'], 'Last-Modified': 'Wed, 01 Jan 2020 00:00:00 GMT'})
+            if headers and headers.get('If-None-Match') == feed['etag']:
+                response.status_code = 304
+                response.iter_content.side_effect = AssertionError('an unchanged feed is not read')
+            else:
+                response.status_code = 200
+                response.iter_content.return_value = [feed['body'][:100], feed['body'][100:]]
+            return response
+
+        monkeypatch.setattr(oval_scanner.requests, 'get', _get)
+        index_dir = str(tmpdir)
+
+        def _fetch():
+            return oval_scanner.get_source_file('centos', 7, 'Core', 'https://example.com/oval/', None,
+                                                index_dir=index_dir)
+
+        path, checksum = _fetch()
+        assert path == os.path.join(index_dir, 'com.redhat.rhsa-RHEL7.xml')
+        assert checksum == hashlib.sha256(feed['body']).hexdigest()
+        assert requests_made == [{}]
+
+        # unchanged upstream: 304, nothing downloaded
+        assert _fetch() == (path, checksum)
+        assert requests_made[-1] == {'If-None-Match': '"v1"', 'If-Modified-Since': 'Wed, 01 Jan 2020 00:00:00 GMT'}
+
+        # changed upstream: downloaded again
+        feed['body'] = feed['body'].replace(b'Test OVAL', b'New OVAL')
+        feed['etag'] = '"v2"'
+        assert _fetch() == (path, hashlib.sha256(feed['body']).hexdigest())
+        with open(path, 'rb') as fh:
+            assert fh.read() == feed['body']
+
+        # without the downloaded copy, the validators aren't sent
+        os.unlink(path)
+        _fetch()
+        assert requests_made[-1] == {}
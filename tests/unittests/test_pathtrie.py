@@ -0,0 +1,82 @@
+import pytest
+
+from hubblestack.utils.pathtrie import PathTrie, OwnedView
+
+
+def test_mapping():
+    db = PathTrie()
+    db['/etc'] = 1
+    db['/etc/ssh/sshd_config'] = 2
+    db['/'] = 3
+    assert len(db) == 3
+    assert db['/etc'] == 1
+    assert db.get('/etc/ssh') is None
+    assert '/etc/ssh' not in db
+    assert 'etc' not in db
+    assert db.get(None) is None
+    assert dict(db.items()) == {'/': 3, '/etc': 1, '/etc/ssh/sshd_config': 2}
+    assert set(db) == {'/', '/etc', '/etc/ssh/sshd_config'}
+
+    db['/etc'] = 4
+    assert db.paths_of(4) == ['/etc']
+    assert db.paths_of(1) == []
+
+    del db['/etc/ssh/sshd_config']
+    assert len(db) == 2
+    assert db.paths_of(2) == []
+    # the nodes of /etc/ssh are reused
+    db['/var/log'] = 5
+    assert db.get('/var/log') == 5
+    assert db.get('/etc/ssh') is None
+
+    with pytest.raises(KeyError):
+        del db['/etc/ssh']
+    with pytest.raises(KeyError):
+        db['relative/path'] = 6
+    with pytest.raises(ValueError):
+        db['/tmp'] = 0
+
+
+def test_shared_values():
+    db = PathTrie()
+    db['/a/b'] = 7
+    db['/c/b'] = 7
+    assert sorted(db.paths_of(7)) == ['/a/b', '/c/b']
+    del db['/a/b']
+    assert db.paths_of(7) == ['/c/b']
+    del db['/c/b']
+    assert db.paths_of(7) == []
+    assert len(db) == 0
+
+
+def test_owners():
+    db = PathTrie()
+    db['/srv'] = 1
+    db['/srv/a'] = 2
+    db['/srv/a/b'] = 3
+    db['/srv/a/b/file'] = 4
+    for path in ('/srv/a', '/srv/a/b', '/srv/a/b/file'):
+        db.set_owner(path, '/srv')
+    # the nearest owner wins
+    db.set_owner('/srv/a/b/file', '/srv/a')
+    db.set_owner('/srv/a/b/file', '/srv')
+    assert db.owner('/srv/a/b/file') == '/srv/a'
+    assert db.owner('/srv') is None
+    assert sorted(db.owned('/srv')) == ['/srv/a', '/srv/a/b']
+    assert sorted(db.owned_values('/srv')) == [2, 3]
+
+    parents = OwnedView(db)
+    assert len(parents) == 2
+    assert parents.get('/srv/a') == {'/srv/a/b/file'}
+    assert parents.get('/srv/a/b') is None
+    assert '/srv' in parents
+
+    # losing its value forgets what a path owned
+    del db['/srv/a']
+    assert db.owner('/srv/a/b/file') is None
+    assert not db.has_owned('/srv/a')
+    assert parents.get('/srv') == {'/srv/a/b'}
+    del db['/srv/a/b']
+    assert '/srv' not in parents
+    assert len(parents) == 0
+    assert dict(db.items()) == {'/srv': 1, '/srv/a/b/file': 4}
@@ -0,0 +1,110 @@
+import os
+import pstats
+import signal
+import time
+
+import hubblestack.profiler as profiler
+from hubblestack.profiler import StackSampler, JobProfiler
+
+
+def busy_loop(seconds):
+    end = time.monotonic() + seconds
+    x = 0
+    while time.monotonic() < end:
+        x += 1
+    return x
+
+
+def test_stack_sampler():
+    with StackSampler(rate=200) as sampler:
+        busy_loop(0.3)
+    assert sampler.samples > 10
+    assert not sampler.truncated
+    collapsed = sampler.collapsed()
+    assert 'test_profiler.busy_loop' in collapsed
+    for line in collapsed.splitlines():
+        stack, count = line.rsplit(' ', 1)
+        assert int(count) > 0
+        assert stack.split(';')[-1]
+    top = sampler.top(5)
+    assert any(x['frame'].endswith('test_profiler.busy_loop') and x['self'] > 0 for x in top)
+
+
+def test_stack_sampler_max_seconds():
+    with StackSampler(rate=200, max_seconds=0.1) as sampler:
+        busy_loop(0.4)
+    assert sampler.truncated
+    assert sampler.samples < 40
+
+
+def test_job_profiler_sample(tmpdir):
+    cachedir = str(tmpdir)
+    jobdata = {'function': 'test.busy', 'seconds': 60, 'profile': {'rate': 200, 'keep': 2}}
+    for _ in range(3):
+        with JobProfiler('job1', jobdata, cachedir) as jp:
+            busy_loop(0.1)
+        assert jp.summary['mode'] == 'sample'
+        assert jp.summary['samples'] > 0
+        assert os.path.isfile(jp.summary['filename'])
+        assert jp.summary['filename'].endswith('.collapsed')
+    # keep: 2
+    assert len(os.listdir(os.path.join(cachedir, profiler.PROFILE_DIR))) == 2
+
+
+def test_job_profiler_cprofile(tmpdir):
+    cachedir = str(tmpdir)
+    with JobProfiler('job1', {'profile': 'cprofile'}, cachedir) as jp:
+        busy_loop(0.05)
+    assert jp.summary['filename'].endswith('.pstats')
+    stats = pstats.Stats(jp.summary['filename'])
+    assert any(name == 'busy_loop' for _, _, name in stats.stats)
+    assert any('busy_loop' in x['function'] for x in jp.summary['top'])
+
+
+def test_job_profiler_off(tmpdir):
+    cachedir = str(tmpdir)
+    with JobProfiler('job1', {'function': 'test.busy', 'seconds': 60}, cachedir) as jp:
+        busy_loop(0.01)
+    assert jp.summary is None
+    assert not os.path.exists(os.path.join(cachedir, profiler.PROFILE_DIR))
+
+
+def test_parse_request():
+    assert profiler.parse_request('job1:3') == ('job1', 3)
+    assert profiler.parse_request('job1') == ('job1', 1)
+    assert profiler.parse_request('a:b') == ('a:b', 1)
+    assert profiler.parse_request('a:b:0') == ('a:b', 1)
+
+
+def test_profile_requests(tmpdir):
+    cachedir = str(tmpdir)
+    pidfile = os.path.join(cachedir, 'hubble.pid')
+    with open(pidfile, 'w') as fh:
+        fh.write('{0}\n'.format(os.getpid()))
+
+    jobdata = {'function': 'test.busy', 'seconds': 60}
+    old_handler = signal.getsignal(signal.SIGUSR2)
+    del profiler._signaled[:]
+    try:
+        profiler.start_sigusr2_signal_handler()
+        assert profiler.request_profile(cachedir, pidfile, 'job1:2') == os.getpid()
+        # the handler only flags the request; the next job run reads it
+        assert profiler._requested
+        summaries = list()
+        for _ in range(3):
+            with JobProfiler('job1', jobdata, cachedir) as jp:
+                busy_loop(0.05)
+            summaries.append(jp.summary)
+        assert summaries[0] and summaries[1]
+        assert summaries[2] is None
+        assert profiler.pending() == {}
+        assert not os.path.exists(os.path.join(cachedir, profiler.REQUEST_FILE))
+    finally:
+        signal.signal(signal.SIGUSR2, old_handler)
+        del profiler._signaled[:]
+        del profiler._requested[:]
+
+
+def test_request_profile_without_daemon(tmpdir):
+    cachedir = str(tmpdir)
+    assert profiler.request_profile(cachedir, os.path.join(cachedir, 'nope.pid'), 'job1') is None
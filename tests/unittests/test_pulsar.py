@@ -448,6 +448,32 @@ class TestPulsar2(object):
         assert set_ == set1
         assert events_ == ['IN_MODIFY({})'.format(self.atfile)]
 
+    def test_watch_files_atomic_replace(self):
+        config = {self.atdir: { 'watch_files': True }}
+        self.reset(**config)
+        self.mk_tdir_and_write_tfile()
+        self.process()
+        assert set(self.watch_manager.watch_db) == set([self.atdir, self.atfile])
+
+        # package managers, sed -i etc. replace a file by renaming a new one
+        # over it; the kernel drops the watch of the replaced file
+        tmpfile = os.path.join(self.atdir, '.file.tmp')
+        with open(tmpfile, 'w') as fh:
+            fh.write('replaced\n')
+        os.rename(tmpfile, self.atfile)
+        self.process()
+        assert set(self.watch_manager.watch_db) == set([self.atdir, self.atfile])
+        self.get_clear_events()
+
+        with open(self.atfile, 'a') as fh:
+            fh.write('supz\n')
+        self.process()
+        assert self.get_clear_events() == ['IN_MODIFY({})'.format(self.atfile)]
+
+        # a refresh of the (unchanged) config walks watch_files paths again
+        to_watch, _ = self.watch_manager.reconcile(self.watch_manager.cm.nc_config)
+        assert self.atdir in to_watch
+
     def test_single_file_events(self):
         config = {self.atfile: dict()}
         self.reset(**config)
@@ -545,3 +571,55 @@ class TestPulsar2(object):
 
         assert set4 == set([self.atfile])
         assert levents4 == 3
+
+    def test_reconcile(self):
+        config = {self.atdir: {'recurse': True, 'auto_add': True}}
+        self.reset(**config)
+        self.mk_subdir_files('blah1', 'a/b/blah2')
+        wm = self.watch_manager
+
+        def reconcile():
+            # only the paths under tdir (top.pulsar has some of its own)
+            to_watch, to_prune = wm.reconcile(wm.cm.nc_config)
+            return [x for x in to_watch if x.startswith(self.atdir)], to_prune
+
+        # everything is walked at startup
+        assert reconcile() == ([self.atdir], True)
+        wm.watch(self.atdir, rec=True, auto_add=True)
+
+        # unchanged and kept current by auto_add: nothing to do
+        assert reconcile() == ([], False)
+
+        # changed settings are watched again and pruned
+        wm.cm.nc_config[self.atdir] = {'recurse': True, 'auto_add': True, 'watch_files': True}
+        assert reconcile() == ([self.atdir], True)
+
+        # recursion without auto_add is walked every time
+        wm.cm.nc_config[self.atdir] = {'recurse': True}
+        assert reconcile() == ([self.atdir], True)
+        assert reconcile() == ([self.atdir], False)
+
+        # removed paths only need pruning
+        del wm.cm.nc_config[self.atdir]
+        assert reconcile() == ([], True)
+
+        # an overflowing queue walks everything again
+        wm.cm.nc_config[self.atdir] = config[self.atdir]
+        reconcile()
+        wm.full_reconcile = True
+        assert reconcile() == ([self.atdir], True)
+
+    def test_reconcile_auto_add(self):
+        config = {self.atdir: {'recurse': True, 'auto_add': True}}
+        self.reset(**config)
+        os.mkdir(self.tdir)
+        self.process()
+        assert set(self.watch_manager.watch_db) == set([self.atdir])
+
+        # the new directory is watched through auto_add, not another walk
+        os.mkdir(os.path.join(self.tdir, 'a'))
+        self.process()
+        to_watch, to_prune = self.watch_manager.reconcile(self.watch_manager.cm.nc_config)
+        assert self.atdir not in to_watch
+        assert not to_prune
+        assert set(self.watch_manager.watch_db) == set([self.atdir, os.path.join(self.atdir, 'a')])
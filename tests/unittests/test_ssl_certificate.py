@@ -1,24 +1,27 @@
 # coding: utf-8
 import os
-import ssl
 import mock
 import hubblestack.fdg.ssl_certificate
+import hubblestack.utils.tls_certs
 
 
 def test_load_certificate_exception():
     host = 'google.com'
     port = 443
-    ssl.get_server_certificate = mock.Mock(side_effect=Exception('Test Exception'))
-    val = hubblestack.fdg.ssl_certificate._load_certificate(host, port, 3)
+    hubblestack.utils.tls_certs.reset()
+    with mock.patch('hubblestack.utils.tls_certs._fetch_pem', side_effect=Exception('Test Exception')):
+        val = hubblestack.fdg.ssl_certificate._load_certificate(host, port, 3)
     assert val.get('result') == False
 
 def test_load_certificate():
     host = 'google.com'
     port = 443
-    cert_details = {'pem_cert': '---BEGIN CERTIFICATE---- ---END CERTIFICATE----'}
-    ssl.get_server_certificate = mock.Mock(return_value=cert_details)
-    val = hubblestack.fdg.ssl_certificate._load_certificate(host, port, 3)
+    cert_details = '---BEGIN CERTIFICATE---- ---END CERTIFICATE----'
+    hubblestack.utils.tls_certs.reset()
+    with mock.patch('hubblestack.utils.tls_certs._fetch_pem', return_value=cert_details):
+        val = hubblestack.fdg.ssl_certificate._load_certificate(host, port, 3)
     assert val.get('result') == True
+    assert val.get('data') == cert_details
 
 def test_parse_cert_positive():
     pem_file = get_pem_file()
@@ -39,17 +42,17 @@ def test_ssl_certificate_positive():
     params = {'params': {'host_ip':'google.com', 'host_port':443}}
     cert_details = {'pem_cert':'---BEGIN CERTIFICATE---- ---END CERTIFICATE----'}
     cert = {'result':True,'data':cert_details}
-    hubblestack.fdg.ssl_certificate._load_certificate = mock.Mock(return_value=cert)
-    hubblestack.fdg.ssl_certificate._parse_cert = mock.Mock(return_value=cert_details)
-    val = hubblestack.fdg.ssl_certificate.get_cert_details(params)
+    with mock.patch('hubblestack.fdg.ssl_certificate._load_certificate', return_value=cert), \
+            mock.patch('hubblestack.fdg.ssl_certificate._parse_cert', return_value=cert_details):
+        val = hubblestack.fdg.ssl_certificate.get_cert_details(params)
     assert val[0] == True
     assert val[1].get('pem_cert') != None
 
 def test_ssl_certificate_negative():
     params = {'params': {'host_ip': '127.0.0.1', 'host_port': 443}}
     cert = {'result':False,'data':'cert not found'}
-    hubblestack.fdg.ssl_certificate._load_certificate = mock.Mock(return_value=cert)
-    val = hubblestack.fdg.ssl_certificate.get_cert_details(params)
+    with mock.patch('hubblestack.fdg.ssl_certificate._load_certificate', return_value=cert):
+        val = hubblestack.fdg.ssl_certificate.get_cert_details(params)
     assert val[0] == True
     assert val[1].get('pem_cert') == None
 
@@ -75,17 +78,17 @@ def test_chained_positive():
     chained = {'host_ip': 'google.com', 'host_port': 443}
     cert_details = {'pem_cert': '---BEGIN CERTIFICATE---- ---END CERTIFICATE----'}
     cert = {'result': True, 'data': cert_details}
-    hubblestack.fdg.ssl_certificate._load_certificate = mock.Mock(return_value=cert)
-    hubblestack.fdg.ssl_certificate._parse_cert = mock.Mock(return_value=cert_details)
-    val = hubblestack.fdg.ssl_certificate.get_cert_details(chained=chained)
+    with mock.patch('hubblestack.fdg.ssl_certificate._load_certificate', return_value=cert), \
+            mock.patch('hubblestack.fdg.ssl_certificate._parse_cert', return_value=cert_details):
+        val = hubblestack.fdg.ssl_certificate.get_cert_details(chained=chained)
     assert val[0] == True
     assert val[1].get('pem_cert') != None
 
 def test_chained_negative():
     chained = {'host_ip': '127.0.0.1', 'host_port': 0}
     cert = {'result': False, 'data': 'cert not found'}
-    hubblestack.fdg.ssl_certificate._load_certificate = mock.Mock(return_value=cert)
-    val = hubblestack.fdg.ssl_certificate.get_cert_details(chained=chained)
+    with mock.patch('hubblestack.fdg.ssl_certificate._load_certificate', return_value=cert):
+        val = hubblestack.fdg.ssl_certificate.get_cert_details(chained=chained)
     assert val[0] == True
     assert val[1].get('pem_cert') == None
 
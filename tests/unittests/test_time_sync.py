@@ -2,14 +2,63 @@
 
 import mock
 import os
-import hubblestack.fdg.time_sync
+import socket
+import threading
+import time
+
+import ntplib
 import pytest
 
+import hubblestack.fdg.time_sync
+import hubblestack.utils.ntp
+
+
+class FakeNtpServer(object):
+    """ answers NTP requests on a local UDP port, with the given clock offset
+        (after the given delay); no answer at all if offset is None
+    """
+
+    def __init__(self, offset, delay=0):
+        self.offset = offset
+        self.delay = delay
+        self.requests = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.address = '127.0.0.1:{0}'.format(self.sock.getsockname()[1])
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                data, peer = self.sock.recvfrom(1024)
+            except OSError:
+                return
+            self.requests += 1
+            if self.offset is None:
+                continue
+            received = ntplib.system_to_ntp_time(time.time() + self.offset)
+            time.sleep(self.delay)
+            request = ntplib.NTPPacket()
+            request.from_data(data)
+            now = ntplib.system_to_ntp_time(time.time() + self.offset)
+            reply = ntplib.NTPPacket(version=3, mode=4, tx_timestamp=now)
+            reply.stratum = 2
+            reply.orig_timestamp = request.tx_timestamp
+            reply.recv_timestamp = received
+            self.sock.sendto(reply.to_data(), peer)
+
+    def close(self):
+        self.sock.close()
+
 class TestTimesync():
     '''
     Class used to test the functions in ``time_sync.py``
     '''
 
+    def setup_method(self, method):
+        hubblestack.utils.ntp.reset()
+
     @mock.patch('hubblestack.fdg.time_sync._query_ntp_server')
     def test_timeCheck_invalidInput_falseReturn(self, mock_offset):
         '''
@@ -73,3 +122,30 @@ class TestTimesync():
         '''
         offset = hubblestack.fdg.time_sync._query_ntp_server('dummy.pool.ntp.org')
         assert offset is None
+
+    def test_timeCheck_localServers_concurrentAndMemoised(self):
+        '''
+        Test that the servers are queried at once (within the deadline), and
+        that their answers are reused by the next check
+        '''
+        servers = [FakeNtpServer(0.5, delay=0.3) for _ in range(4)] + [FakeNtpServer(None)]
+        try:
+            addresses = [server.address for server in servers]
+            started = time.time()
+            status, ret = hubblestack.fdg.time_sync.time_check(
+                list(addresses), max_offset=1, nb_servers=4, extend_chained=False, deadline=1)
+            assert time.time() - started < 1.5
+            assert status is True
+            assert ret is True
+
+            answers = hubblestack.utils.ntp.query_servers(
+                addresses, hubblestack.fdg.time_sync._query_ntp_server, deadline=0.1)
+            for server in servers[:4]:
+                assert abs(answers[server.address]['offset'] - 0.5) < 0.1
+                assert answers[server.address]['elapsed'] >= 0.3
+            assert answers[servers[4].address] == {'offset': None, 'elapsed': None}
+            # the silent server's first query is still running, it isn't queried again
+            assert [server.requests for server in servers] == [1, 1, 1, 1, 1]
+        finally:
+            for server in servers:
+                server.close()
@@ -0,0 +1,178 @@
+import datetime
+import ipaddress
+import os
+import socket
+import ssl
+import threading
+import time
+import types
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+import hubblestack.audit.ssl_certificate
+import hubblestack.fdg.ssl_certificate
+from hubblestack.utils import tls_certs
+
+
+def _self_signed(tmpdir):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COUNTRY_NAME, 'US'),
+                      x509.NameAttribute(NameOID.ORGANIZATION_NAME, 'Hubble'),
+                      x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+    now = datetime.datetime.utcnow()
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(
+        key.public_key()).serial_number(42).not_valid_before(now).not_valid_after(
+        now + datetime.timedelta(hours=1)).add_extension(
+        x509.SubjectAlternativeName([x509.DNSName('localhost'),
+                                     x509.IPAddress(ipaddress.ip_address('127.0.0.1'))]),
+        critical=False).sign(key, hashes.SHA256())
+    cert_file = os.path.join(tmpdir, 'cert.pem')
+    key_file = os.path.join(tmpdir, 'key.pem')
+    with open(cert_file, 'wb') as fh:
+        fh.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_file, 'wb') as fh:
+        fh.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+                                   serialization.NoEncryption()))
+    return cert_file, key_file
+
+
+class TlsServer(object):
+    """ presents a self signed certificate to everyone connecting, after delay seconds """
+
+    def __init__(self, cert_file, key_file):
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(cert_file, key_file)
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+        self.delay = 0
+        self.connections = 0
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._handshake, args=(conn,), daemon=True).start()
+
+    def _handshake(self, conn):
+        time.sleep(self.delay)
+        try:
+            with self.context.wrap_socket(conn, server_side=True) as tls_conn:
+                tls_conn.recv(1)
+        except (OSError, ssl.SSLError):
+            pass
+        finally:
+            conn.close()
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def servers(tmpdir):
+    cert_file, key_file = _self_signed(str(tmpdir))
+    tls_certs.reset()
+    running = [TlsServer(cert_file, key_file) for _ in range(4)]
+    yield running
+    for server in running:
+        server.close()
+    tls_certs.reset()
+
+
+def test_get_certificate(servers):
+    server = servers[0]
+    pem, error = tls_certs.get_certificate('127.0.0.1', server.port, 3)
+    assert error is None
+    assert pem.startswith('-----BEGIN CERTIFICATE-----')
+    # the timeout belongs to the connection, not to the process
+    assert socket.getdefaulttimeout() is None
+    assert tls_certs.get_certificate('127.0.0.1', str(server.port), 3) == (pem, None)
+    assert server.connections == 1
+
+    details = tls_certs.parse_certificate(pem)
+    assert details['ssl_subject_common_name'] == 'localhost'
+    assert details['ssl_subject_organisation'] == 'Hubble'
+    assert details['ssl_serial_number'] == '42'
+    assert details['ssl_has_expired'] is False
+    # callers get a copy of the details they are free to change
+    details['ssl_subject_alternative_names'].append('changed')
+    details['ssl_src_port'] = '443'
+    assert 'changed' not in tls_certs.parse_certificate(pem)['ssl_subject_alternative_names']
+    assert 'ssl_src_port' not in tls_certs.parse_certificate(pem)
+
+    with pytest.raises(Exception):
+        tls_certs.parse_certificate('garbage')
+
+
+def test_parsed_details_expire(servers, monkeypatch):
+    pem, _error = tls_certs.get_certificate('127.0.0.1', servers[0].port, 3)
+    assert tls_certs.parse_certificate(pem)['ssl_has_expired'] is False
+
+    # expiry is decided when the details are asked for, not when parsed
+    class _Later(datetime.datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime.datetime(2999, 1, 1)
+    monkeypatch.setattr(tls_certs, 'datetime', _Later)
+    assert tls_certs.parse_certificate(pem)['ssl_has_expired'] is True
+
+    # parsed details are only kept for RUN_TTL
+    later = time.time() + tls_certs.RUN_TTL + 1
+    monkeypatch.setattr(tls_certs, 'time', types.SimpleNamespace(time=lambda: later))
+    tls_certs.parse_certificate(pem.replace('\n', '\r\n'))
+    assert list(tls_certs._parsed) == [pem.replace('\n', '\r\n')]
+
+
+def test_failure(servers):
+    server = servers[0]
+    server.delay = 0.5
+    pem, error = tls_certs.get_certificate('127.0.0.1', server.port, 0.1)
+    assert pem is None and error
+    # remembered for checks not willing to wait longer, retried for the others
+    assert tls_certs.get_certificate('127.0.0.1', server.port, 0.1) == (None, error)
+    assert server.connections == 1
+    pem, error = tls_certs.get_certificate('127.0.0.1', server.port, 3)
+    assert error is None and pem
+    assert server.connections == 2
+
+
+def test_fetch_certificates(servers):
+    for server in servers:
+        server.delay = 0.3
+    endpoints = [('127.0.0.1', server.port) for server in servers]
+    started = time.time()
+    tls_certs.fetch_certificates(endpoints + endpoints, timeout=3)
+    assert time.time() - started < 1
+    assert [server.connections for server in servers] == [1, 1, 1, 1]
+
+    # the audit and fdg modules find the certificates (and their details) waiting
+    ret = hubblestack.fdg.ssl_certificate.get_cert_details(
+        {'params': {'host_ip': '127.0.0.1', 'host_port': servers[0].port}})
+    assert ret[0] is True
+    assert ret[1]['ssl_subject_common_name'] == 'localhost'
+    status, ret = hubblestack.audit.ssl_certificate.execute(
+        'test-1', {'args': {'host_ip': '127.0.0.1', 'host_port': servers[0].port}}, {})
+    assert status is True
+    assert ret['result']['ssl_subject_common_name'] == 'localhost'
+    assert ret['result']['ssl_src_port'] == str(servers[0].port)
+    assert [server.connections for server in servers] == [1, 1, 1, 1]
+
+
+def test_prefetch(servers):
+    tls_certs.get_certificate('127.0.0.1', servers[0].port, 3)
+    block_list = [('check-{0}'.format(i), {'args': {'host_ip': '127.0.0.1', 'host_port': server.port,
+                                                     'ssl_timeout': 2}})
+                  for i, server in enumerate(servers)]
+    block_list.append(('check-path', {'args': {'path': '/etc/ssl/cert.pem'}}))
+    # a new run fetches again
+    hubblestack.audit.ssl_certificate.prefetch(block_list)
+    assert [server.connections for server in servers] == [2, 1, 1, 1]
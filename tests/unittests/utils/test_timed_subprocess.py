@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import subprocess
+import time
+
 from tests.support.unit import TestCase
 import hubblestack.utils.timed_subprocess as timed_subprocess
 
@@ -14,3 +17,32 @@ class TestTimedSubprocess(TestCase):
         '''
         p = timed_subprocess.TimedProc(['echo', 'foo'], shell=True)
         del p  # Don't need this anymore
+
+    def test_run_many_keeps_input_order(self):
+        '''
+        Results come back in input order no matter which child exits first
+        '''
+        jobs = [(['sh', '-c', 'sleep 0.3; echo slow'], {'stdout': subprocess.PIPE}),
+                (['echo', 'fast'], {'stdout': subprocess.PIPE}),
+                (['cat'], {'stdout': subprocess.PIPE, 'stdin': 'x' * 100000})]
+        ret = timed_subprocess.run_many(jobs, max_procs=2)
+        self.assertEqual(ret[0].stdout, b'slow\n')
+        self.assertEqual(ret[1].stdout, b'fast\n')
+        self.assertEqual(len(ret[2].stdout), 100000)
+        self.assertEqual([proc.process.returncode for proc in ret], [0, 0, 0])
+
+    def test_run_many_timeout_and_spawn_error(self):
+        '''
+        A child past its timeout is killed and flagged, a child that cannot be
+        started is reported by its exception, the others are unaffected
+        '''
+        jobs = [(['sleep', '10'], {'stdout': subprocess.PIPE, 'timeout': 0.2}),
+                (['/nonexistent/command'], {'stdout': subprocess.PIPE}),
+                (['echo', 'ok'], {'stdout': subprocess.PIPE, 'timeout': 5})]
+        start = time.time()
+        ret = timed_subprocess.run_many(jobs)
+        self.assertLess(time.time() - start, 5)
+        self.assertTrue(ret[0].timed_out)
+        self.assertIsInstance(ret[1], OSError)
+        self.assertFalse(ret[2].timed_out)
+        self.assertEqual(ret[2].stdout, b'ok\n')
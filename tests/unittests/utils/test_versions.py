@@ -42,3 +42,61 @@ class VersionTestCase(TestCase):
                              'cmp(%s, %s) should be %s, got %s' %
                              (v1, v2, wanted, res))
 
+
+
+class PackageVersionTestCase(TestCase):
+
+    def _check(self, scheme, versions):
+        for v1, v2, wanted in versions:
+            res = hubblestack.utils.versions.compare(v1, v2, scheme)
+            self.assertEqual(res, wanted,
+                             '%s cmp(%s, %s) should be %s, got %s' %
+                             (scheme, v1, v2, wanted, res))
+
+    def test_dpkg(self):
+        self._check('dpkg', (('1.0~rc1', '1.0', -1),
+                             ('1.0', '1.0.0', -1),
+                             ('1.0', '1.00', 0),
+                             ('1.0a', '1.0+b1', -1),
+                             ('1:0.9', '2.0', 1),
+                             ('2.0-1~bpo', '2.0-1', -1),
+                             ('1.2.10', '1.2.9', 1),
+                             ('1.2-3-1', '1.2-3', 1),
+                             ('2.30-0ubuntu2', '2.30-0ubuntu10', -1)))
+
+    def test_rpm(self):
+        self._check('rpm', (('1.0~rc1', '1.0', -1),
+                            ('1.0^git1', '1.0', 1),
+                            ('1.0^git1', '1.0a', -1),
+                            ('1.0a', '1.0.1', -1),
+                            ('1.0', '1.0-1', -1),
+                            ('1.0.', '1.0', 0),
+                            ('1:1.0.2k-16', '1:1.0.2k-19', -1),
+                            ('1:1.0', '2.0', 1),
+                            ('3.10.0-514.el7', '3.10.0-514.6.1.el7', -1),
+                            ('8.0.3-a6754d8441bf', '8.0.3-a6754d8441bg', -1)))
+
+    def test_apk(self):
+        self._check('apk', (('1.2.3_rc1', '1.2.3', -1),
+                            ('1.2.3', '1.2.3-r1', -1),
+                            ('1.2.3-r1', '1.2.3_p1', -1),
+                            ('1.2.3_p1', '1.2.3a', -1),
+                            ('1.2', '1.2.3', -1),
+                            ('1.2.10', '1.2.9', 1),
+                            ('not-a-version', '0.1', -1)))
+
+    def test_sort_versions(self):
+        self.assertEqual(hubblestack.utils.versions.sort_versions(['1.10', '1.9', '1.9~beta', '1:0.1'], 'dpkg'),
+                         ['1.9~beta', '1.9', '1.10', '1:0.1'])
+        with self.assertRaises(ValueError):
+            hubblestack.utils.versions.version_key('1.0', 'msi')
+
+    def test_below_fixed(self):
+        installed = {'openssl': '1:1.0.2k-16', 'bash': ['4.2.46-33', '4.2.46-34'], 'vim': '2:7.4.629-6'}
+        fixed = {'openssl': [('1:1.0.2k-19', 'A2'), ('1:1.0.2k-12', 'A0'), ('1:1.0.2k-17', 'A1')],
+                 'bash': ['4.2.46-34'],
+                 'vim': ['2:7.4.629-6'],
+                 'curl': ['7.29.0-60']}
+        self.assertEqual(hubblestack.utils.versions.below_fixed(installed, fixed),
+                         {'openssl': {'1:1.0.2k-16': [('1:1.0.2k-17', 'A1'), ('1:1.0.2k-19', 'A2')]},
+                          'bash': {'4.2.46-33': ['4.2.46-34']}})